@@ -0,0 +1,64 @@
+"""Unique interval keys for meter and BESS readings
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+Bulk imports upsert readings on their natural key, which needs a unique
+index to resolve conflicts against:
+- meter_readings(meter_id, timestamp) replaces the non-unique
+  ix_meter_readings_meter_timestamp index
+- bess_data_readings(dataset_id, timestamp)
+
+Existing duplicates are removed first, keeping the most recent row.
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNIQUE_KEYS = [
+    ('uq_meter_readings_meter_timestamp', 'meter_readings', ['meter_id', 'timestamp']),
+    ('uq_bess_data_readings_dataset_timestamp', 'bess_data_readings', ['dataset_id', 'timestamp']),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = Inspector.from_engine(bind).get_table_names()
+
+    for index_name, table, columns in UNIQUE_KEYS:
+        if table not in tables:
+            continue
+        key = ', '.join(columns)
+        op.execute(sa.text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MAX(id) FROM {table} GROUP BY {key})"
+        ))
+        op.create_index(index_name, table, columns, unique=True, if_not_exists=True)
+
+    if 'meter_readings' in tables:
+        op.drop_index('ix_meter_readings_meter_timestamp', table_name='meter_readings', if_exists=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    tables = Inspector.from_engine(bind).get_table_names()
+
+    if 'meter_readings' in tables:
+        op.create_index(
+            'ix_meter_readings_meter_timestamp',
+            'meter_readings',
+            ['meter_id', 'timestamp'],
+            unique=False,
+            if_not_exists=True
+        )
+
+    for index_name, table, _ in reversed(UNIQUE_KEYS):
+        if table in tables:
+            op.drop_index(index_name, table_name=table, if_exists=True)
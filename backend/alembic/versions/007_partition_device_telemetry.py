@@ -0,0 +1,157 @@
+"""Partition device_telemetry by month
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+Converts device_telemetry into a native PostgreSQL range-partitioned table
+so retention can drop whole months instead of DELETEing rows:
+- The existing table is renamed to device_telemetry_legacy
+- A partitioned table with the same columns is created; the primary key
+  becomes (id, timestamp) because it must include the partition key
+- Monthly partitions are created from the oldest row to three months ahead,
+  plus a default partition for anything outside those ranges
+- Rows are copied one month at a time and the legacy table is dropped
+
+Skipped on non-PostgreSQL databases, when TimescaleDB is installed (the
+table is a hypertable there) and when the table is already partitioned.
+"""
+from datetime import datetime
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'device_telemetry'
+LEGACY = 'device_telemetry_legacy'
+MONTHS_AHEAD = 3
+
+INDEXES = [
+    ('ix_telemetry_device_time', ['device_id', 'timestamp']),
+    ('ix_telemetry_datapoint_time', ['datapoint_id', 'timestamp']),
+    ('ix_device_telemetry_timestamp', ['timestamp']),
+]
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _relkind(bind) -> Union[str, None]:
+    return bind.execute(sa.text(
+        "SELECT relkind FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"
+    ), {'table': TABLE}).scalar()
+
+
+def _has_timescale(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'"
+    )).scalar() is not None
+
+
+def _move_table(bind, source: str, target: str) -> None:
+    """Rename ``source`` to ``target``, freeing index names and the sequence."""
+    op.execute(f"ALTER TABLE {source} RENAME TO {target}")
+    for index_name, _ in INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {index_name} RENAME TO {index_name}_old")
+    op.execute(f"ALTER TABLE {target} DROP CONSTRAINT IF EXISTS {source}_pkey")
+
+
+def _create_indexes() -> None:
+    for index_name, columns in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {TABLE} ({', '.join(columns)})")
+
+
+def _copy_sequence(bind, source: str) -> None:
+    """Hand the id sequence over to the new table before the old one is dropped."""
+    sequence = bind.execute(sa.text(
+        "SELECT pg_get_serial_sequence(:table, 'id')"
+    ), {'table': source}).scalar()
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    if TABLE not in Inspector.from_engine(bind).get_table_names():
+        return
+    if _relkind(bind) == 'p' or _has_timescale(bind):
+        return
+
+    _move_table(bind, TABLE, LEGACY)
+
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            LIKE {LEGACY} INCLUDING DEFAULTS,
+            PRIMARY KEY (id, timestamp),
+            FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE,
+            FOREIGN KEY (datapoint_id) REFERENCES datapoints(id) ON DELETE SET NULL
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    _create_indexes()
+    op.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    oldest = bind.execute(sa.text(f"SELECT MIN(timestamp) FROM {LEGACY}")).scalar()
+    now = datetime.utcnow()
+    start = datetime((oldest or now).year, (oldest or now).month, 1)
+    last = _add_months(datetime(now.year, now.month, 1), MONTHS_AHEAD)
+
+    while start <= last:
+        end = _add_months(start, 1)
+        op.execute(
+            f"CREATE TABLE {TABLE}_p{start:%Y%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+        # One month per statement keeps each copy bounded to a single partition
+        op.execute(
+            f"INSERT INTO {TABLE} SELECT * FROM {LEGACY} "
+            f"WHERE timestamp >= '{start:%Y-%m-%d}' AND timestamp < '{end:%Y-%m-%d}'"
+        )
+        start = end
+
+    # Rows past the last monthly partition land in the default partition
+    op.execute(
+        f"INSERT INTO {TABLE} SELECT * FROM {LEGACY} "
+        f"WHERE timestamp >= '{start:%Y-%m-%d}'"
+    )
+
+    copied = bind.execute(sa.text(f"SELECT COUNT(*) FROM {TABLE}")).scalar()
+    expected = bind.execute(sa.text(f"SELECT COUNT(*) FROM {LEGACY}")).scalar()
+    if copied != expected:
+        raise RuntimeError(f"Copied {copied} of {expected} {LEGACY} rows; keeping the legacy table")
+
+    _copy_sequence(bind, LEGACY)
+    op.execute(f"DROP TABLE {LEGACY}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    if _relkind(bind) != 'p':
+        return
+
+    _move_table(bind, TABLE, LEGACY)
+
+    op.execute(f"""
+        CREATE TABLE {TABLE} (
+            LIKE {LEGACY} INCLUDING DEFAULTS,
+            PRIMARY KEY (id),
+            FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE,
+            FOREIGN KEY (datapoint_id) REFERENCES datapoints(id) ON DELETE SET NULL
+        )
+    """)
+    _create_indexes()
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY}")
+
+    _copy_sequence(bind, LEGACY)
+    # Dropping the partitioned parent drops every partition with it
+    op.execute(f"DROP TABLE {LEGACY}")
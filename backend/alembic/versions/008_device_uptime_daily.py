@@ -0,0 +1,53 @@
+"""Daily device uptime rollup
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+Adds device_uptime_daily, the per-device per-day online/offline time
+materialized from device_online/device_offline events, so availability
+reports sum precomputed rows instead of replaying events.
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if 'device_uptime_daily' in Inspector.from_engine(bind).get_table_names():
+        return
+
+    op.create_table('device_uptime_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('online_seconds', sa.Float(), nullable=True),
+        sa.Column('offline_seconds', sa.Float(), nullable=True),
+        sa.Column('transitions', sa.Integer(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+        sa.UniqueConstraint('device_id', 'day', name='uq_device_uptime_daily_device_day')
+    )
+    op.create_index('ix_device_uptime_daily_id', 'device_uptime_daily', ['id'])
+    op.create_index('ix_device_uptime_daily_device_id', 'device_uptime_daily', ['device_id'])
+    op.create_index('ix_device_uptime_daily_day', 'device_uptime_daily', ['day'])
+    # Interval queries look up each device's status events by time
+    op.create_index(
+        'ix_device_event_type_time',
+        'device_events',
+        ['event_type', 'device_id', 'triggered_at'],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_device_event_type_time', table_name='device_events', if_exists=True)
+    op.drop_table('device_uptime_daily')
@@ -0,0 +1,60 @@
+"""Covering index for device event correlation
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+
+Event correlation, timelines and statistics run as window and GROUP BY
+queries over one device or site in a time range. On PostgreSQL
+ix_device_event_time(device_id, triggered_at) is rebuilt to INCLUDE the
+columns those queries read, so they are answered from the index alone.
+The replacement is built CONCURRENTLY under a temporary name and swapped
+in, so writes to device_events are not blocked and the table is never
+left without the index. Other databases get the plain
+(device_id, triggered_at) index.
+"""
+from typing import Sequence, Union
+from alembic import op
+from sqlalchemy.engine.reflection import Inspector
+
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = 'ix_device_event_time'
+TABLE = 'device_events'
+INCLUDE = ['id', 'event_type', 'severity', 'is_active', 'acknowledged_at', 'cleared_at']
+BUILD_INDEX = f'{INDEX}_build'
+
+
+def _swap_index(**kw) -> None:
+    """Build the index under a temporary name without locking writes, then replace INDEX with it."""
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # A failed concurrent build leaves an invalid index behind
+        op.drop_index(BUILD_INDEX, table_name=TABLE, if_exists=True, postgresql_concurrently=True)
+        op.create_index(BUILD_INDEX, TABLE, ['device_id', 'triggered_at'], postgresql_concurrently=True, **kw)
+        op.drop_index(INDEX, table_name=TABLE, if_exists=True, postgresql_concurrently=True)
+        op.execute(f'ALTER INDEX {BUILD_INDEX} RENAME TO {INDEX}')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if TABLE not in Inspector.from_engine(bind).get_table_names():
+        return
+
+    if bind.dialect.name == 'postgresql':
+        _swap_index(postgresql_include=INCLUDE)
+    else:
+        op.create_index(INDEX, TABLE, ['device_id', 'triggered_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    if TABLE not in Inspector.from_engine(bind).get_table_names():
+        return
+
+    _swap_index()
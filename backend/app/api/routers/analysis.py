@@ -1,14 +1,14 @@
 """Analysis and Optimization API endpoints."""
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-import numpy_financial as npf
+import numpy as np
 
 from app.core.database import get_db
-from app.models import Site, Meter, Bill, Asset, Tariff
+from app.models import Site, Meter, Bill, Tariff
 from app.schemas import (
     GapAnalysisResult,
     BESSSimulationInput,
@@ -17,6 +17,14 @@ from app.schemas import (
     PVSizingResponse,
 )
 from app.services.digital_twin.gap_analysis import GapAnalysisService
+from app.services.digital_twin.hierarchy import HierarchyService
+from app.services.optimization.bess_dispatch import (
+    BatteryConfig,
+    DispatchStrategy,
+    LoadProfile,
+    project_financials,
+    simulate_dispatch,
+)
 from app.services.optimization.solar_roi import SolarROICalculator, SolarROIInput, SolarROIResult
 
 router = APIRouter(prefix="/api/v1/analysis", tags=["analysis"])
@@ -66,50 +74,58 @@ def calculate_solar_roi(inputs: SolarROIInput):
 
 @router.post("/bess-simulation", response_model=BESSSimulationResult)
 def run_bess_simulation(request: BESSSimulationInput, db: Session = Depends(get_db)):
-    """Run BESS financial simulation."""
-    cycles_per_day = request.cycles_per_day or 1.5
-    annual_savings = (
-        request.capacity_kwh * cycles_per_day * 365 *
-        (request.peak_rate - request.off_peak_rate) *
-        request.round_trip_efficiency
-    )
-
-    maintenance = request.annual_maintenance_cost or (request.total_investment * 0.01)
-    net_annual = annual_savings - maintenance
-
-    cash_flows = [-request.total_investment]
-    for year in range(1, request.project_life_years + 1):
-        degraded_capacity = request.capacity_kwh * (1 - (request.degradation_rate_per_year * year))
-        year_savings = (
-            degraded_capacity * cycles_per_day * 365 *
-            (request.peak_rate - request.off_peak_rate) *
-            request.round_trip_efficiency
-        ) - maintenance
-        cash_flows.append(year_savings)
-
-    npv = npf.npv(request.discount_rate, cash_flows)
-    try:
-        irr = npf.irr(cash_flows)
-        irr = float(irr) if irr and not (irr != irr) else None
-    except (ValueError, FloatingPointError):
-        irr = None
+    """
+    Run BESS financial simulation.
 
-    payback = request.total_investment / net_annual if net_annual > 0 else 99
-    lcoe = request.total_investment / (request.capacity_kwh * cycles_per_day * 365 * request.project_life_years)
+    Dispatches the battery hour by hour over the submitted load profile
+    (combined peak shaving and TOU arbitrage), then projects the year-one
+    savings over the analysis period.
+    """
+    hours = len(request.load_profile_kwh)
+    if hours == 0:
+        raise HTTPException(status_code=400, detail="Load profile is empty")
+    if len(request.tariff_rates) != hours:
+        raise HTTPException(status_code=400, detail="Tariff rates must align with the load profile")
+    demand_charges = np.zeros(12)
+    if request.demand_charges:
+        if len(request.demand_charges) != 12:
+            raise HTTPException(status_code=400, detail="Demand charges must have 12 monthly values")
+        demand_charges = np.array(request.demand_charges, dtype=np.float64)
+
+    # Hourly profile: kWh per hour equals average kW. Profiles are laid on a non-leap year.
+    profile = LoadProfile(
+        timestamps=np.datetime64("2025-01-01T00:00") + np.arange(hours).astype("timedelta64[h]"),
+        demand_kw=np.array(request.load_profile_kwh, dtype=np.float64),
+        rates=np.array(request.tariff_rates, dtype=np.float64),
+        interval_hours=1.0,
+        demand_charges=demand_charges,
+    )
+    battery = BatteryConfig(
+        capacity_kwh=request.battery_capacity_kwh,
+        power_kw=request.battery_power_kw,
+        round_trip_efficiency=request.round_trip_efficiency,
+        depth_of_discharge=request.depth_of_discharge,
+        price=request.capex,
+    )
+    result = simulate_dispatch(profile, [battery], DispatchStrategy.COMBINED)[0]
+
+    arbitrage = result.annual_arbitrage_savings
+    peak_shaving = result.annual_peak_shaving_savings
+    financials = project_financials(
+        annual_savings=arbitrage + peak_shaving,
+        capex=request.capex,
+        opex_annual=request.opex_annual,
+        years=request.analysis_years,
+        discount_rate=request.discount_rate,
+        degradation_rate=request.degradation_rate,
+    )
 
     return BESSSimulationResult(
-        npv=round(npv, 2),
-        irr=round(irr * 100, 2) if irr else None,
-        payback_years=round(payback, 2),
-        lcoe=round(lcoe, 4),
-        annual_savings=round(annual_savings, 2),
-        total_savings=round(annual_savings * request.project_life_years, 2),
-        co2_offset_kg=round(request.capacity_kwh * cycles_per_day * 365 * 0.4, 0),
-        monthly_projections=[{
-            "month": i + 1,
-            "savings": round(annual_savings / 12 * (1 - request.degradation_rate_per_year * (i // 12)), 2),
-            "cumulative": round((annual_savings / 12) * (i + 1), 2)
-        } for i in range(12)]
+        arbitrage_savings_year1=round(arbitrage, 2),
+        peak_shaving_savings_year1=round(peak_shaving, 2),
+        total_savings_year1=round(arbitrage + peak_shaving, 2),
+        monthly_peak_reduction=[round(v, 2) for v in result.monthly_peak_reduction_kw],
+        **financials,
     )
 
 
@@ -120,33 +136,43 @@ def get_panel_diagram(site_id: int, db: Session = Depends(get_db)):
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
     
-    assets = db.query(Asset).filter(Asset.site_id == site_id).all()
-    meters = db.query(Meter).filter(Meter.site_id == site_id).all()
-    
-    def build_tree(parent_id: Optional[int] = None):
-        children = [a for a in assets if a.parent_id == parent_id]
-        return [{
-            "id": f"asset-{a.id}",
-            "name": a.name,
-            "type": str(a.asset_type.value) if hasattr(a.asset_type, 'value') else str(a.asset_type),
-            "rated_capacity_kw": a.rated_capacity_kw,
-            "rated_voltage": a.rated_voltage,
-            "is_critical": bool(a.is_critical),
-            "has_meter": any(m.asset_id == a.id for m in meters),
-            "meter_id": next((m.meter_id for m in meters if m.asset_id == a.id), None),
-            "children": build_tree(a.id)
-        } for a in children]
-    
+    hierarchy = HierarchyService(db).get_hierarchy(site_id)
+
     return {
         "site_id": site_id,
         "site_name": site.name,
         "diagram_type": "single_line",
-        "nodes": build_tree(None),
-        "total_assets": len(assets),
-        "metered_assets": len([a for a in assets if any(m.asset_id == a.id for m in meters)])
+        "nodes": hierarchy.panel_nodes(None),
+        "total_assets": len(hierarchy.nodes),
+        "metered_assets": sum(1 for n in hierarchy.nodes if hierarchy.first_meter(n.id) is not None)
     }
 
 
+@router.get("/energy-balance/{site_id}")
+def get_energy_balance(
+    site_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    loss_threshold_percent: float = Query(5.0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """
+    Compare each metered branch with the sum of its metered descendants.
+
+    Flags branches whose unmetered losses exceed the threshold. Defaults to the last 30 days.
+    """
+    site = db.query(Site).filter(Site.id == site_id).first()
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+
+    if not end:
+        end = datetime.utcnow()
+    if not start:
+        start = end - timedelta(days=30)
+
+    return HierarchyService(db).energy_balance(site_id, start, end, loss_threshold_percent)
+
+
 @router.get("/compare-sites", response_model=SiteComparisonResponse)
 def compare_sites(
     site_ids: str = Query(..., description="Comma-separated site IDs (max 5)"),
@@ -206,8 +232,8 @@ def compare_sites(
         # Calculate consumption from bills or estimates
         bills = db.query(Bill).filter(
             Bill.site_id == site.id,
-            Bill.billing_start >= start,
-            Bill.billing_end <= end
+            Bill.period_start >= start.date(),
+            Bill.period_end <= end.date()
         ).all()
 
         total_consumption = sum(b.total_kwh or 0 for b in bills) if bills else 0
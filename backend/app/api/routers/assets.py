@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models import Asset
 from app.schemas import AssetCreate, AssetUpdate, AssetResponse, AssetTreeNode
+from app.services.digital_twin.hierarchy import HierarchyService
 
 router = APIRouter(prefix="/api/v1/assets", tags=["assets"])
 
@@ -28,21 +29,22 @@ def list_assets(
 @router.get("/tree/{site_id}", response_model=List[AssetTreeNode])
 def get_asset_tree(site_id: int, db: Session = Depends(get_db)):
     """Get the asset hierarchy tree for a site (SLD view)."""
-    assets = db.query(Asset).filter(Asset.site_id == site_id).all()
+    hierarchy = HierarchyService(db).get_hierarchy(site_id)
     
     def build_tree(parent_id: Optional[int] = None) -> List[AssetTreeNode]:
-        children = [a for a in assets if a.parent_id == parent_id]
-        return [
-            AssetTreeNode(
+        nodes = []
+        for asset_id in hierarchy.children.get(parent_id, []):
+            asset = hierarchy.get(asset_id)
+            meter = hierarchy.first_meter(asset_id)
+            nodes.append(AssetTreeNode(
                 id=asset.id,
                 name=asset.name,
                 asset_type=asset.asset_type,
-                has_meter=asset.meter is not None,
-                meter_id=asset.meter.meter_id if asset.meter else None,
+                has_meter=meter is not None,
+                meter_id=meter.meter_id if meter else None,
                 children=build_tree(asset.id)
-            )
-            for asset in children
-        ]
+            ))
+        return nodes
     
     return build_tree(None)
 
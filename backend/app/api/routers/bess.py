@@ -1,12 +1,12 @@
 """BESS (Battery Energy Storage System) API endpoints."""
+import uuid
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-import pandas as pd
-import io
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
 
 from app.core.database import get_db
-from app.models import BESSVendor, BESSModel, BESSDataset, BESSDataReading
+from app.models import BESSVendor, BESSModel, BESSDataset
 from app.schemas import (
     BESSVendorResponse,
     BESSModelResponse,
@@ -14,7 +14,12 @@ from app.schemas import (
     BESSDatasetResponse,
     BESSRecommendationRequest,
     BESSRecommendation,
+    BESSDispatchRequest,
+    BESSDispatchResult,
 )
+from app.services.job_queue import job_queue
+from app.services.optimization.bess_dispatch import BatteryConfig, BESSDispatchSimulator, DispatchStrategy
+from app.services.reading_import import import_bess_readings_csv, run_bess_csv_import_job, spool_upload
 
 router = APIRouter(prefix="/api/v1/bess", tags=["bess-catalog"])
 
@@ -105,74 +110,103 @@ async def upload_bess_csv(
     file: UploadFile = File(...),
     timestamp_column: str = Form("timestamp"),
     demand_column: str = Form("demand_kw"),
+    energy_column: Optional[str] = Form(None),
     date_format: str = Form("%Y-%m-%d %H:%M:%S"),
+    background: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Upload CSV file with interval meter readings for BESS simulation."""
+    """
+    Upload CSV file with interval meter readings for BESS simulation.
+
+    Replaces the dataset's readings; the file is parsed in chunks and
+    duplicate timestamps collapse to the last row. With ``background`` the
+    import runs as a job whose progress is reported at /api/v1/system/jobs/{job_id}.
+    """
     dataset = db.query(BESSDataset).filter(BESSDataset.id == dataset_id).first()
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    try:
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        if timestamp_column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{timestamp_column}' not found in CSV")
-        if demand_column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{demand_column}' not found in CSV")
-        
-        df[timestamp_column] = pd.to_datetime(df[timestamp_column], format=date_format, errors='coerce')
-        df = df.dropna(subset=[timestamp_column, demand_column])
-        
-        db.query(BESSDataReading).filter(BESSDataReading.dataset_id == dataset_id).delete()
-        
-        readings = []
-        for _, row in df.iterrows():
-            reading = BESSDataReading(
-                dataset_id=dataset_id,
-                timestamp=row[timestamp_column],
-                demand_kw=float(row[demand_column]),
-            )
-            readings.append(reading)
-        
-        db.bulk_save_objects(readings)
-        
-        dataset.total_records = len(readings)
-        dataset.file_name = file.filename
-        dataset.upload_status = "completed"
-        
-        if readings:
-            demands = [r.demand_kw for r in readings]
-            dataset.peak_demand_kw = max(demands)
-            dataset.avg_demand_kw = sum(demands) / len(demands)
-            dataset.total_consumption_kwh = sum(demands) * (dataset.interval_minutes / 60)
-            
-            timestamps = [r.timestamp for r in readings]
-            dataset.start_date = min(timestamps).date()
-            dataset.end_date = max(timestamps).date()
-        
+
+    options = dict(
+        timestamp_column=timestamp_column,
+        demand_column=demand_column,
+        energy_column=energy_column,
+        date_format=date_format or None,
+    )
+    dataset.file_name = file.filename
+
+    if background:
+        dataset.upload_status = "processing"
         db.commit()
-        db.refresh(dataset)
-        
-        return {
-            "message": "Upload successful",
-            "records_imported": len(readings),
-            "dataset_id": dataset_id,
-            "peak_demand_kw": dataset.peak_demand_kw,
-            "avg_demand_kw": dataset.avg_demand_kw,
-        }
-        
+        job_id = str(uuid.uuid4())
+        path = await spool_upload(file)
+        job_queue.enqueue(
+            run_bess_csv_import_job,
+            kwargs=dict(job_id=job_id, path=path, dataset_id=dataset_id, **options),
+            name="bess_csv_import",
+            max_retries=1,
+            job_id=job_id,
+        )
+        return {"message": "Import queued", "job_id": job_id, "dataset_id": dataset_id}
+
+    try:
+        result = await run_in_threadpool(import_bess_readings_csv, db, file.file, dataset, **options)
     except Exception as e:
+        db.rollback()
         dataset.upload_status = "failed"
         db.commit()
         raise HTTPException(status_code=400, detail=f"Failed to process CSV: {str(e)}")
 
+    return {
+        "message": "Upload successful",
+        "records_imported": result.rows_imported,
+        "records_rejected": result.rows_rejected,
+        "duplicate_rows": result.duplicate_rows,
+        "dataset_id": dataset_id,
+        "peak_demand_kw": dataset.peak_demand_kw,
+        "avg_demand_kw": dataset.avg_demand_kw,
+    }
+
+
+@router.post("/datasets/{dataset_id}/simulate", response_model=List[BESSDispatchResult])
+def simulate_bess_dispatch(dataset_id: int, request: BESSDispatchRequest, db: Session = Depends(get_db)):
+    """Simulate dispatch of catalog batteries over a dataset's interval data, best savings first."""
+    try:
+        strategy = DispatchStrategy(request.strategy)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid strategy: {request.strategy}")
+    if any(units < 1 for units in request.unit_counts):
+        raise HTTPException(status_code=400, detail="Unit counts must be positive")
+
+    simulator = BESSDispatchSimulator(db)
+    configs = simulator.catalog_configs(request.model_ids, request.unit_counts)
+    if not configs:
+        raise HTTPException(status_code=404, detail="No matching BESS models")
+
+    try:
+        results = simulator.simulate_dataset(
+            dataset_id,
+            configs,
+            strategy=strategy,
+            tariff_id=request.tariff_id,
+            peak_target_kw=request.peak_target_kw,
+            max_workers=request.max_workers,
+        )
+    except ValueError as e:
+        status = 404 if "not found" in str(e) else 400
+        raise HTTPException(status_code=status, detail=str(e))
+
+    return [BESSDispatchResult(**r.to_dict()) for r in results]
+
 
 @router.post("/recommendations", response_model=List[BESSRecommendation])
 def get_bess_recommendations(request: BESSRecommendationRequest, db: Session = Depends(get_db)):
-    """Get BESS model recommendations based on site requirements."""
-    query = db.query(BESSModel).filter(BESSModel.is_active == 1)
+    """
+    Get BESS model recommendations based on site requirements.
+
+    With a dataset, savings come from simulating each model's dispatch over
+    the interval data; otherwise a flat per-kWh estimate is used.
+    """
+    query = db.query(BESSModel).options(joinedload(BESSModel.vendor)).filter(BESSModel.is_active == 1)
     
     if request.preferred_chemistry:
         query = query.filter(BESSModel.chemistry == request.preferred_chemistry)
@@ -184,11 +218,31 @@ def get_bess_recommendations(request: BESSRecommendationRequest, db: Session = D
     recommendations = []
     
     base_savings_per_kwh = 150
+
+    simulated = {}
+    if request.dataset_id and models:
+        try:
+            results = BESSDispatchSimulator(db).simulate_dataset(
+                request.dataset_id, [BatteryConfig.from_model(m) for m in models]
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        simulated = {r.config.model_id: r for r in results}
+        models = sorted(models, key=lambda m: simulated[m.id].annual_savings, reverse=True)
     
     for model in models[:5]:
-        vendor = db.query(BESSVendor).filter(BESSVendor.id == model.vendor_id).first()
+        vendor = model.vendor
         
-        annual_savings = model.capacity_kwh * base_savings_per_kwh * model.round_trip_efficiency
+        if model.id in simulated:
+            result = simulated[model.id]
+            annual_savings = result.annual_savings
+            reasoning = (
+                f"Simulated over dataset {request.dataset_id}: peak reduced by "
+                f"{result.baseline_peak_kw - result.peak_kw:.1f} kW. "
+            )
+        else:
+            annual_savings = model.capacity_kwh * base_savings_per_kwh * model.round_trip_efficiency
+            reasoning = ""
         price = model.price_usd or (model.capacity_kwh * 400)
         payback = price / annual_savings if annual_savings > 0 else 99
         
@@ -204,7 +258,7 @@ def get_bess_recommendations(request: BESSRecommendationRequest, db: Session = D
             estimated_annual_savings=annual_savings,
             estimated_payback_years=payback,
             fit_score=fit_score,
-            reasoning=f"Based on {model.chemistry} chemistry with {model.cycle_life} cycle life and {model.warranty_years}-year warranty."
+            reasoning=reasoning + f"Based on {model.chemistry} chemistry with {model.cycle_life} cycle life and {model.warranty_years}-year warranty."
         ))
     
     return sorted(recommendations, key=lambda x: x.fit_score, reverse=True)
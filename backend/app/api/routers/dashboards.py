@@ -3,7 +3,7 @@ Dashboards API Router for SAVE-IT.AI
 Endpoints for custom dashboards and widgets.
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Optional, List
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
@@ -102,7 +102,7 @@ class WidgetDataResponse(BaseModel):
     widget_id: int
     widget_type: str
     title: Optional[str]
-    data: Optional[dict]
+    data: Optional[Any]
     last_updated: datetime
     error: Optional[str] = None
 
@@ -1,13 +1,23 @@
 """Data Ingestion API endpoints."""
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+import uuid
+import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-import pandas as pd
-import io
+from starlette.concurrency import run_in_threadpool
 
 from app.core.database import get_db
-from app.models import Meter, MeterReading
+from app.models import Meter
+from app.services.job_queue import job_queue
+from app.services.reading_import import (
+    INSERT_BATCH_ROWS,
+    MAX_BULK_READINGS,
+    BulkReadingWriter,
+    import_meter_readings_csv,
+    run_meter_csv_import_job,
+    spool_upload,
+)
+from app.services.virtual_meter_engine import invalidate_meter_series
 
 router = APIRouter(prefix="/api/v1/ingestion", tags=["ingestion"])
 
@@ -20,47 +30,56 @@ async def upload_meter_readings_csv(
     energy_column: str = Form("energy_kwh"),
     power_column: Optional[str] = Form(None),
     date_format: str = Form("%Y-%m-%d %H:%M:%S"),
+    background: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Upload CSV file with meter readings."""
+    """
+    Upload CSV file with meter readings.
+
+    The file is parsed in chunks and upserted on (meter_id, timestamp), so
+    re-uploading overlapping files updates readings instead of duplicating
+    them. Unlike the JSON upload, existing readings take the file's values.
+    With ``background`` the import runs as a job whose progress is
+    reported at /api/v1/system/jobs/{job_id}.
+    """
     meter = db.query(Meter).filter(Meter.id == meter_id).first()
     if not meter:
         raise HTTPException(status_code=404, detail="Meter not found")
-    
+
+    options = dict(
+        meter_id=meter_id,
+        timestamp_column=timestamp_column,
+        energy_column=energy_column,
+        power_column=power_column,
+        date_format=date_format or None,
+    )
+
+    if background:
+        job_id = str(uuid.uuid4())
+        path = await spool_upload(file)
+        job_queue.enqueue(
+            run_meter_csv_import_job,
+            kwargs=dict(job_id=job_id, path=path, **options),
+            name="meter_csv_import",
+            max_retries=1,
+            job_id=job_id,
+        )
+        return {"message": "Import queued", "job_id": job_id, "meter_id": meter_id}
+
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        if timestamp_column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{timestamp_column}' not found in CSV")
-        if energy_column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column '{energy_column}' not found in CSV")
-        
-        df[timestamp_column] = pd.to_datetime(df[timestamp_column], format=date_format, errors='coerce')
-        df = df.dropna(subset=[timestamp_column, energy_column])
-        
-        readings = []
-        for _, row in df.iterrows():
-            reading = MeterReading(
-                meter_id=meter_id,
-                timestamp=row[timestamp_column],
-                energy_kwh=float(row[energy_column]),
-                power_kw=float(row[power_column]) if power_column and power_column in df.columns else None,
-            )
-            readings.append(reading)
-        
-        db.bulk_save_objects(readings)
-        db.commit()
-        
-        return {
-            "message": "Upload successful",
-            "records_imported": len(readings),
-            "meter_id": meter_id,
-        }
-        
+        result = await run_in_threadpool(import_meter_readings_csv, db, file.file, **options)
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=400, detail=f"Failed to process CSV: {str(e)}")
 
+    return {
+        "message": "Upload successful",
+        "records_imported": result.rows_imported,
+        "records_rejected": result.rows_rejected,
+        "duplicate_rows": result.duplicate_rows,
+        "meter_id": meter_id,
+    }
+
 
 @router.post("/meter-readings/json")
 def upload_meter_readings_json(
@@ -68,29 +87,32 @@ def upload_meter_readings_json(
     meter_id: int,
     db: Session = Depends(get_db)
 ):
-    """Upload meter readings as JSON."""
+    """
+    Upload meter readings as JSON (idempotent on timestamp).
+
+    Like /api/v1/meters/readings/bulk, readings that already exist are kept
+    unchanged and counted as duplicates, so a retried request is a no-op.
+    The CSV upload instead overwrites them; use it (or
+    /api/v1/meters/readings/batch) to correct stored values.
+    """
     meter = db.query(Meter).filter(Meter.id == meter_id).first()
     if not meter:
         raise HTTPException(status_code=404, detail="Meter not found")
-    
-    readings = []
-    for data in readings_data:
-        reading = MeterReading(
-            meter_id=meter_id,
-            timestamp=datetime.fromisoformat(data["timestamp"]) if isinstance(data["timestamp"], str) else data["timestamp"],
-            energy_kwh=float(data["energy_kwh"]),
-            power_kw=float(data.get("power_kw")) if data.get("power_kw") else None,
-            voltage=float(data.get("voltage")) if data.get("voltage") else None,
-            current=float(data.get("current")) if data.get("current") else None,
-            power_factor=float(data.get("power_factor")) if data.get("power_factor") else None,
-        )
-        readings.append(reading)
-    
-    db.bulk_save_objects(readings)
+    if len(readings_data) > MAX_BULK_READINGS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BULK_READINGS} readings")
+
+    frame = pd.DataFrame.from_records(readings_data)
+    frame["meter_id"] = meter_id
+    writer = BulkReadingWriter(db)
+    for start in range(0, len(frame), INSERT_BATCH_ROWS):
+        writer.write(frame.iloc[start:start + INSERT_BATCH_ROWS])
     db.commit()
+    invalidate_meter_series(db, writer.meter_ids)
     
     return {
         "message": "Upload successful",
-        "records_imported": len(readings),
+        "records_imported": writer.result.inserted,
+        "records_rejected": writer.result.rejected,
+        "duplicate_rows": writer.result.duplicates,
         "meter_id": meter_id,
     }
@@ -11,7 +11,7 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.services.kpi_engine import KPIEngine, TimeRange
-from app.models.telemetry import KPIDefinition, KPIValue, KPIType
+from app.models.telemetry import KPIDefinition, KPIValue, KPIType, AggregationPeriod
 
 router = APIRouter(prefix="/kpis", tags=["KPIs"])
 
@@ -248,6 +248,53 @@ def get_kpi_history(
     return [KPIValueResponse(**h) for h in history]
 
 
+@router.get("/{kpi_id}/series", response_model=List[KPIValueResponse])
+def get_kpi_series(
+    kpi_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    period: str = "hourly",
+    store: bool = False,
+    engine: KPIEngine = Depends(get_kpi_engine)
+):
+    """
+    Evaluate a formula KPI per aggregation interval in one vectorized pass.
+
+    Defaults to the last 7 days. Set store=true to persist the intervals as KPI history.
+    """
+    if not end:
+        end = datetime.utcnow()
+    if not start:
+        start = end - timedelta(days=7)
+
+    try:
+        aggregation_period = AggregationPeriod(period)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid period: {period}")
+
+    try:
+        series = engine.calculate_formula_series(
+            kpi_id, TimeRange(start=start, end=end), aggregation_period, store=store
+        )
+    except ValueError as e:
+        status_code = 404 if str(e) == "KPI not found" else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+    if store:
+        engine.db.commit()
+
+    return [
+        KPIValueResponse(
+            period_start=r["period_start"].isoformat(),
+            period_end=r["period_end"].isoformat(),
+            value=r["value"],
+            status=r["status"],
+            data_points_used=r["data_points_used"],
+        )
+        for r in series
+    ]
+
+
 @router.post("/devices/{device_id}/calculate")
 def calculate_device_kpis(
     device_id: int,
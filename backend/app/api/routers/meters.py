@@ -1,18 +1,31 @@
 """Meter API endpoints."""
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.core.database import get_db
 from app.models import Meter, MeterReading, User, UserRole, Site
 from app.models.base import soft_delete_filter, include_deleted_filter
 from app.schemas import (
     MeterCreate, MeterUpdate, MeterResponse,
-    MeterReadingCreate, MeterReadingResponse
+    MeterReadingCreate, MeterReadingResponse,
+    MeterReadingColumns, MeterReadingBulkResult,
 )
 from app.middleware.multi_tenant import TenantContext, MultiTenantValidation
 from app.api.routers.auth import get_current_user
+from app.services.reading_import import (
+    INSERT_BATCH_ROWS,
+    MAX_BULK_READINGS,
+    BulkReadingWriter,
+    columns_to_frame,
+    insert_returning,
+    iter_ndjson_frames,
+)
+from app.services.virtual_meter_engine import invalidate_meter_series
 
 router = APIRouter(prefix="/api/v1/meters", tags=["meters"])
 
@@ -180,7 +193,12 @@ def create_meter_reading(reading: MeterReadingCreate, db: Session = Depends(get_
     
     db_reading = MeterReading(**reading.model_dump())
     db.add(db_reading)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Reading already exists for this meter and timestamp")
+    invalidate_meter_series(db, [reading.meter_id])
     db.refresh(db_reading)
     return db_reading
 
@@ -190,14 +208,90 @@ def create_batch_readings(
     readings: List[MeterReadingCreate],
     db: Session = Depends(get_db)
 ):
-    """Create multiple meter readings in batch."""
-    db_readings = []
-    for reading in readings:
-        db_reading = MeterReading(**reading.model_dump())
-        db.add(db_reading)
-        db_readings.append(db_reading)
-    
+    """
+    Create multiple meter readings in batch.
+
+    Readings are upserted on (meter_id, timestamp) and echoed back from
+    ``INSERT ... RETURNING``; a reading repeated within the batch keeps its
+    last value. Unknown meters are rejected with 404 before anything is
+    written; other constraint violations return 409.
+    """
+    if not readings:
+        return []
+    if len(readings) > MAX_BULK_READINGS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BULK_READINGS} readings")
+
+    meter_ids = {r.meter_id for r in readings}
+    found = {row[0] for row in db.query(Meter.id).filter(Meter.id.in_(meter_ids)).all()}
+    if found != meter_ids:
+        raise HTTPException(status_code=404, detail=f"Meters not found: {sorted(meter_ids - found)}")
+
+    frame = pd.DataFrame([r.model_dump() for r in readings])
+    frame = frame.drop_duplicates(subset=["meter_id", "timestamp"], keep="last")
+    frame["created_at"] = datetime.utcnow()
+    table = MeterReading.__table__
+    try:
+        rows = insert_returning(
+            db, table, frame, ("meter_id", "timestamp"),
+            returning=[c.name for c in table.columns], update=True,
+        )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Readings violate a database constraint")
+    invalidate_meter_series(db, meter_ids)
+    return [MeterReadingResponse.model_validate(row) for row in rows]
+
+
+@router.post("/readings/bulk", response_model=MeterReadingBulkResult)
+def create_bulk_readings(
+    payload: MeterReadingColumns,
+    return_ids: bool = Query(False, description="Return ids of inserted readings"),
+    db: Session = Depends(get_db)
+):
+    """
+    Insert up to 100k readings from a columnar payload.
+
+    Idempotent on (meter_id, timestamp): readings that already exist are
+    counted as duplicates and left unchanged; readings for unknown meters
+    are rejected. Only counts (and optionally ids) are returned.
+    """
+    if payload.meter_id is not None and not db.query(Meter.id).filter(Meter.id == payload.meter_id).first():
+        raise HTTPException(status_code=404, detail="Meter not found")
+    try:
+        frame = columns_to_frame(payload)
+    except ValueError as e:
+        status = 413 if "exceeds" in str(e) else 400
+        raise HTTPException(status_code=status, detail=str(e))
+
+    writer = BulkReadingWriter(db, return_ids=return_ids, reading_type=payload.reading_type)
+    for start in range(0, len(frame), INSERT_BATCH_ROWS):
+        writer.write(frame.iloc[start:start + INSERT_BATCH_ROWS])
     db.commit()
-    for r in db_readings:
-        db.refresh(r)
-    return db_readings
+    invalidate_meter_series(db, writer.meter_ids)
+    return writer.result.to_dict(include_ids=return_ids)
+
+
+@router.post("/readings/bulk/ndjson", response_model=MeterReadingBulkResult)
+async def create_bulk_readings_ndjson(
+    request: Request,
+    return_ids: bool = Query(False, description="Return ids of inserted readings"),
+    db: Session = Depends(get_db)
+):
+    """
+    Insert up to 100k readings streamed as newline-delimited JSON.
+
+    Each line is an object with meter_id, timestamp, energy_kwh and optional
+    electrical values. The body is parsed and inserted in bounded batches
+    and committed once at the end; same idempotency rules as /readings/bulk.
+    """
+    writer = BulkReadingWriter(db, return_ids=return_ids)
+    try:
+        async for frame in iter_ndjson_frames(request.stream()):
+            await run_in_threadpool(writer.write, frame)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=413, detail=str(e))
+    await run_in_threadpool(db.commit)
+    await run_in_threadpool(invalidate_meter_series, db, writer.meter_ids)
+    return writer.result.to_dict(include_ids=return_ids)
@@ -1,13 +1,16 @@
 """System administration router for API keys, GDPR, and backups."""
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from urllib.parse import urlsplit
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models.platform import APIKey, Organization, User, AuditLog, UserRole
 from app.middleware.api_key_auth import generate_api_key, hash_api_key
 from app.api.routers.auth import get_current_user
+from app.api.routers.admin import require_super_admin
 
 router = APIRouter(prefix="/api/v1/system", tags=["System"])
 
@@ -417,3 +420,80 @@ def refresh_materialized_views(db: Session = Depends(get_db), admin: User = Depe
     db.commit()
     
     return {"views": refreshed}
+
+
+@router.post("/profile")
+async def profile_process(
+    duration: float = Query(10, gt=0, le=60, description="Seconds to sample"),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    threads: bool = Query(True, description="Sample worker threads"),
+    tasks: bool = Query(True, description="Sample pending asyncio tasks"),
+    memory_top: int = Query(0, ge=0, le=100, description="Include the top N allocation sites"),
+    output: str = Query("json", pattern="^(json|collapsed)$"),
+    admin: User = Depends(require_super_admin),
+):
+    """
+    Sample the stacks of this process for a few seconds.
+    
+    Returns a flamegraph tree (json) or collapsed stacks for flamegraph.pl / speedscope.
+    """
+    from app.services.profiler import SamplingProfiler, ProfilerBusyError
+    
+    profiler = SamplingProfiler(
+        interval=interval_ms / 1000,
+        threads=threads,
+        tasks=tasks,
+        memory_top=memory_top,
+    )
+    try:
+        profile = await profiler.run(duration)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if output == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return profile.to_dict()
+
+
+@router.post("/profile/load-test")
+async def profile_load_test(
+    request: Request,
+    path: str = Query(..., description="Path on this server to load, e.g. /api/v1/sites"),
+    method: str = Query("GET", pattern="^(GET|POST|PUT|DELETE)$"),
+    num_requests: int = Query(100, ge=1, le=2000),
+    concurrency: int = Query(10, ge=1, le=50),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    memory_top: int = Query(0, ge=0, le=100),
+    output: str = Query("json", pattern="^(json|collapsed)$"),
+    admin: User = Depends(require_super_admin),
+):
+    """
+    Load an endpoint of this server and profile this process while it runs.
+
+    Only relative paths are accepted: the profiler samples this process, so
+    loading another host would profile nothing useful.
+    """
+    from app.services.load_testing import load_test_runner
+    from app.services.profiler import SamplingProfiler, ProfilerBusyError
+    
+    target = urlsplit(path)
+    if target.scheme or target.netloc or not path.startswith("/"):
+        raise HTTPException(status_code=400, detail="path must be a relative path on this server")
+    url = str(request.base_url).rstrip("/") + path
+
+    profiler = SamplingProfiler(interval=interval_ms / 1000, memory_top=memory_top)
+    try:
+        result = await load_test_runner.run_http_test(
+            name=f"profile {method} {path}",
+            url=url,
+            method=method,
+            num_requests=num_requests,
+            concurrency=concurrency,
+            profiler=profiler,
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if output == "collapsed":
+        return PlainTextResponse(result.profile.collapsed())
+    return result.to_dict()
@@ -1,4 +1,5 @@
 """Virtual Meter API endpoints."""
+from datetime import datetime, timedelta
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
@@ -6,6 +7,11 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models import VirtualMeter, VirtualMeterComponent
 from app.schemas import VirtualMeterCreate, VirtualMeterUpdate, VirtualMeterResponse
+from app.services.virtual_meter_engine import (
+    VirtualMeterEngine,
+    VirtualMeterError,
+    invalidate_virtual_meter_cache,
+)
 
 router = APIRouter(prefix="/api/v1/virtual-meters", tags=["virtual-meters"])
 
@@ -45,6 +51,7 @@ def create_virtual_meter(vm: VirtualMeterCreate, db: Session = Depends(get_db)):
     
     db.commit()
     db.refresh(db_vm)
+    invalidate_virtual_meter_cache(db_vm.site_id)
     return db_vm
 
 
@@ -86,6 +93,7 @@ def update_virtual_meter(vm_id: int, update: VirtualMeterUpdate, db: Session = D
 
     db.commit()
     db.refresh(vm)
+    invalidate_virtual_meter_cache(vm.site_id)
     return vm
 
 
@@ -99,6 +107,62 @@ def delete_virtual_meter(vm_id: int, db: Session = Depends(get_db)):
     db.query(VirtualMeterComponent).filter(
         VirtualMeterComponent.virtual_meter_id == vm_id
     ).delete()
+    site_id = vm.site_id
     db.delete(vm)
     db.commit()
+    invalidate_virtual_meter_cache(site_id)
     return {"message": "Virtual meter deleted"}
+
+
+@router.get("/{vm_id}/series")
+def get_virtual_meter_series(
+    vm_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: str = "hourly",
+    db: Session = Depends(get_db)
+):
+    """
+    Evaluate a virtual meter as an interval series.
+
+    Defaults to the last 24 hours. Intervals: 15min, 30min, hourly, daily.
+    Series are cached per site and window; readings written through the
+    meter and ingestion APIs and changes to meters drop the cache, and any
+    other write shows up within SERIES_CACHE_TTL (5 minutes).
+    """
+    if not end:
+        end = datetime.utcnow()
+    if not start:
+        start = end - timedelta(days=1)
+
+    try:
+        series = VirtualMeterEngine(db).evaluate(vm_id, start, end, interval)
+    except VirtualMeterError as e:
+        status_code = 404 if str(e) == "Virtual meter not found" else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+    return series.to_dict()
+
+
+@router.get("/sites/{site_id}/series")
+def get_site_virtual_meter_series(
+    site_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: str = "hourly",
+    db: Session = Depends(get_db)
+):
+    """
+    Evaluate all active virtual meters of a site for one time window.
+
+    Meters that cannot be evaluated are returned with an ``error`` and null points.
+    """
+    if not end:
+        end = datetime.utcnow()
+    if not start:
+        start = end - timedelta(days=1)
+
+    try:
+        results = VirtualMeterEngine(db).evaluate_site(site_id, start, end, interval)
+    except VirtualMeterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [series.to_dict() for series in results.values()]
@@ -88,6 +88,10 @@ class Settings(BaseSettings):
     WEBHOOK_BASE_URL: str = ""
     API_BASE_URL: str = ""
 
+    # SQL statements allowed per request before a warning (or an error when strict)
+    SQL_QUERY_BUDGET: int = 100
+    SQL_QUERY_BUDGET_STRICT: bool = False
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -33,6 +33,7 @@ from app.middleware import (
     SecurityHeadersMiddleware,
     CSRFMiddleware,
     UserContextMiddleware,
+    QueryBudgetMiddleware,
 )
 from app.middleware.multi_tenant import MultiTenantMiddleware
 from app.core.config import validate_startup_config
@@ -101,12 +102,23 @@ async def lifespan(app: FastAPI):
         # Initialize AlarmEngine singleton
         from app.services.alarm_engine import AlarmEngine
         alarm_db = SessionLocal()
-        alarm_engine = AlarmEngine(alarm_db)
+        alarm_engine = AlarmEngine(
+            alarm_db, reopen_window_seconds=float(os.getenv("ALARM_REOPEN_WINDOW_SECONDS", "0"))
+        )
         alarm_engine.load_active_alarms()
         app.state.alarm_engine = alarm_engine
         app.state.alarm_engine_db = alarm_db  # Keep reference for cleanup
         logger.info("AlarmEngine initialized and active alarms loaded")
 
+        # Batch alarm commits, realtime broadcasts and notifications
+        from app.services.alarm_aggregator import AlarmEventAggregator
+        alarm_notify_user_ids = [
+            int(u) for u in os.getenv("ALARM_NOTIFY_USER_IDS", "").split(",") if u.strip().isdigit()
+        ]
+        alarm_aggregator = AlarmEventAggregator(alarm_engine, notify_user_ids=alarm_notify_user_ids)
+        await alarm_aggregator.start()
+        app.state.alarm_aggregator = alarm_aggregator
+
         # Initialize KPIEngine singleton
         from app.services.kpi_engine import KPIEngine
         kpi_db = SessionLocal()
@@ -122,6 +134,14 @@ async def lifespan(app: FastAPI):
         await scheduler_service.start()
         logger.info("Scheduler service started")
 
+        from app.services.notification_dispatcher import notification_dispatcher
+        await notification_dispatcher.start()
+        logger.info("Notification dispatcher started")
+
+        from app.services.presence_tracker import presence_tracker
+        await presence_tracker.start()
+        logger.info("Presence tracker started")
+
         await register_default_handlers()
         logger.info("Event handlers registered")
 
@@ -132,11 +152,19 @@ async def lifespan(app: FastAPI):
         await service_registry.start()
         logger.info("Service registry started")
 
+        # Multi-worker deployments merge per-worker metric snapshots at scrape time
+        from app.services.metrics_service import metrics_registry
+        metrics_registry.start_multiprocess_writer()
+
         shutdown_service.register_handler("polling", polling_service.stop, priority=100)
+        shutdown_service.register_handler("alarm_aggregator", alarm_aggregator.stop, priority=95)
+        shutdown_service.register_handler("presence", presence_tracker.stop, priority=93)
         shutdown_service.register_handler("scheduler", scheduler_service.stop, priority=90)
+        shutdown_service.register_handler("notifications", notification_dispatcher.stop, priority=85)
         shutdown_service.register_handler("health", health_service.stop, priority=80)
         shutdown_service.register_handler("service_registry", service_registry.stop, priority=70)
         shutdown_service.register_handler("job_queue", job_queue.stop, priority=60)
+        shutdown_service.register_handler("metrics", metrics_registry.stop, priority=20)
 
         async def cleanup_alarm_engine(metadata=None):
             """Close AlarmEngine DB session on shutdown."""
@@ -295,6 +323,8 @@ app.add_middleware(
         "X-RateLimit-Limit",
         "X-RateLimit-Remaining",
         "X-RateLimit-Reset",
+        "X-DB-Query-Count",
+        "X-DB-Time-Ms",
     ],
 )
 
@@ -305,6 +335,11 @@ app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(CSRFMiddleware)
 
 app.add_middleware(RequestLogMiddleware)
+app.add_middleware(
+    QueryBudgetMiddleware,
+    default_budget=settings.SQL_QUERY_BUDGET,
+    strict=settings.SQL_QUERY_BUDGET_STRICT,
+)
 app.add_middleware(CacheMiddleware)
 app.add_middleware(RequestValidationMiddleware)
 app.add_middleware(MultiTenantMiddleware)
@@ -18,6 +18,7 @@ from app.middleware.validation import RequestValidationMiddleware
 from app.middleware.security_headers import SecurityHeadersMiddleware
 from app.middleware.csrf import CSRFMiddleware, get_csrf_token
 from app.middleware.user_context import UserContextMiddleware
+from app.middleware.query_budget import QueryBudgetMiddleware, assert_max_queries, track_queries
 
 __all__ = [
     "RateLimitMiddleware",
@@ -38,4 +39,7 @@ __all__ = [
     "CSRFMiddleware",
     "get_csrf_token",
     "UserContextMiddleware",
+    "QueryBudgetMiddleware",
+    "assert_max_queries",
+    "track_queries",
 ]
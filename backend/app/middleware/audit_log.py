@@ -3,7 +3,7 @@ import json
 import time
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 
@@ -31,6 +31,9 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
     
     SENSITIVE_FIELDS = {"password", "token", "secret", "api_key", "authorization"}
     
+    # Larger (bulk) bodies are not buffered or stored in the audit trail
+    MAX_AUDIT_BODY_BYTES = 64 * 1024
+    
     def __init__(self, app, db_session_factory=None):
         super().__init__(app)
         self.db_session_factory = db_session_factory
@@ -51,17 +54,30 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
             return getattr(request.state.user, "id", None)
         return None
     
-    def _sanitize_body(self, body: dict) -> dict:
+    def _sanitize_body(self, body: Any) -> Any:
+        if isinstance(body, list):
+            return [self._sanitize_body(item) for item in body]
+        if not isinstance(body, dict):
+            return body
         sanitized = {}
         for key, value in body.items():
             if key.lower() in self.SENSITIVE_FIELDS:
                 sanitized[key] = "[REDACTED]"
-            elif isinstance(value, dict):
+            elif isinstance(value, (dict, list)):
                 sanitized[key] = self._sanitize_body(value)
             else:
                 sanitized[key] = value
         return sanitized
     
+    def _should_capture_body(self, request: Request) -> bool:
+        content_type = request.headers.get("Content-Type", "")
+        if "json" not in content_type or "ndjson" in content_type:
+            return False
+        try:
+            return int(request.headers.get("Content-Length", "")) <= self.MAX_AUDIT_BODY_BYTES
+        except ValueError:
+            return False
+    
     def _extract_resource_info(self, path: str, method: str) -> tuple:
         parts = path.strip("/").split("/")
         if len(parts) >= 3 and parts[0] == "api" and parts[1] == "v1":
@@ -77,7 +93,7 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
         start_time = time.time()
         
         body = None
-        if request.method in {"POST", "PUT", "PATCH"}:
+        if request.method in {"POST", "PUT", "PATCH"} and self._should_capture_body(request):
             try:
                 body_bytes = await request.body()
                 if body_bytes:
@@ -0,0 +1,206 @@
+"""
+Per-request SQL statement counting and query budgets.
+
+An engine listener attributes every statement to the request being served
+(through a context variable), so N+1 patterns - one query per item in a
+loop - show up as a high statement count on their route. Each response
+carries X-DB-Query-Count and X-DB-Time-Ms, counts and DB time go to
+histograms per route, and a route exceeding its budget logs a warning
+with the fingerprint of its most repeated statement.
+
+In strict mode (SQL_QUERY_BUDGET_STRICT, on in the test suite) exceeding a
+budget raises QueryBudgetExceeded instead; tests can also wrap any code in
+assert_max_queries(n).
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.services.metrics_service import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = 100
+
+# Route templates allowed more (or held to fewer) statements than the default
+ROUTE_QUERY_BUDGETS: Dict[str, int] = {}
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+db_queries_per_request = metrics_registry.histogram(
+    "saveit_db_queries_per_request",
+    "SQL statements executed per HTTP request",
+    buckets=QUERY_COUNT_BUCKETS
+)
+
+db_time_per_request = metrics_registry.histogram(
+    "saveit_db_time_per_request_seconds",
+    "Time spent executing SQL per HTTP request"
+)
+
+db_query_budget_exceeded = metrics_registry.counter(
+    "saveit_db_query_budget_exceeded_total",
+    "HTTP requests that executed more SQL statements than their route budget"
+)
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("saveit_query_stats", default=None)
+
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|:\w+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """A statement with literals and parameters collapsed, so one query issued in a loop has one fingerprint."""
+    text = _QUOTED.sub("?", statement)
+    text = _PARAM.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _PLACEHOLDER_LIST.sub("(...)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More SQL statements ran than allowed."""
+
+
+class QueryStats:
+    """Statements executed within a tracked scope."""
+
+    __slots__ = ("count", "seconds", "statements", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self.parent = parent
+
+    def record(self, statement: str, seconds: float):
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+            stats.statements[statement] += 1
+            stats = stats.parent
+
+    def most_repeated(self, n: int = 3) -> List[Tuple[str, int]]:
+        """The n most frequent statement fingerprints with their counts."""
+        fingerprints: Counter = Counter()
+        for statement, count in self.statements.items():
+            fingerprints[fingerprint(statement)] += count
+        return fingerprints.most_common(n)
+
+    def describe(self, n: int = 3) -> str:
+        lines = [f"{self.count} statements in {self.seconds * 1000:.1f}ms; most repeated:"]
+        lines += [f"  x{count}: {sql}" for sql, count in self.most_repeated(n)]
+        return "\n".join(lines)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("saveit_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("saveit_query_start")
+    if stats is None or not starts:
+        return
+    stats.record(statement, time.perf_counter() - starts.pop())
+
+
+def install():
+    """Attach the statement listeners to every engine (idempotent)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the statements executed inside the block; nested scopes also count toward outer ones."""
+    install()
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(budget: int, label: str = "block") -> Iterator[QueryStats]:
+    """
+    Fail when the block executes more than budget statements.
+
+        with assert_max_queries(3):
+            client.get(f"/telemetry/devices/{device.id}/latest")
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        raise QueryBudgetExceeded(f"{label} exceeded its budget of {budget}: {stats.describe()}")
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Statements of the request or tracked block being served, if any."""
+    return _current.get()
+
+
+class QueryBudgetMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware counting SQL statements and DB time per request.
+
+    Budgets are looked up by route template (e.g.
+    /telemetry/devices/{device_id}/latest) in ROUTE_QUERY_BUDGETS, falling
+    back to default_budget.
+    """
+
+    SKIP_PATHS = {"/docs", "/openapi.json", "/redoc", "/favicon.ico", "/metrics"}
+
+    def __init__(self, app, default_budget: int = DEFAULT_QUERY_BUDGET, strict: bool = False,
+                 route_budgets: Optional[Dict[str, int]] = None):
+        super().__init__(app)
+        self.default_budget = default_budget
+        self.strict = strict
+        self.route_budgets = ROUTE_QUERY_BUDGETS if route_budgets is None else route_budgets
+        install()
+
+    def budget_for(self, route: str) -> int:
+        return self.route_budgets.get(route, self.default_budget)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in self.SKIP_PATHS:
+            return await call_next(request)
+
+        with track_queries() as stats:
+            response = await call_next(request)
+
+        # The router records the matched route in the shared scope
+        matched = request.scope.get("route")
+        route = getattr(matched, "path", None) or "unmatched"
+
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+        db_queries_per_request.labels(route=route).observe(stats.count)
+        db_time_per_request.labels(route=route).observe(stats.seconds)
+
+        budget = self.budget_for(route)
+        if stats.count > budget:
+            db_query_budget_exceeded.labels(route=route).inc()
+            message = f"SQL budget exceeded on {request.method} {route} (budget {budget}): {stats.describe()}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
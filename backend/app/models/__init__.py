@@ -154,6 +154,7 @@ from app.models.telemetry import (
     KPIDefinition,
     KPIValue,
     NoDataTracker,
+    DeviceUptimeDaily,
 )
 
 __all__ = [
@@ -271,4 +272,5 @@ __all__ = [
     "KPIDefinition",
     "KPIValue",
     "NoDataTracker",
+    "DeviceUptimeDaily",
 ]
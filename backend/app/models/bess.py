@@ -1,7 +1,7 @@
 """BESS Simulator models: BESSVendor, BESSModel, BESSDataset, BESSDataReading, BESSSimulationResult."""
 from datetime import datetime, date
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, Date
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, Date, Index
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -89,6 +89,10 @@ class BESSDataReading(Base):
 
     dataset = relationship("BESSDataset", back_populates="readings")
 
+    __table_args__ = (
+        Index("uq_bess_data_readings_dataset_timestamp", "dataset_id", "timestamp", unique=True),
+    )
+
 
 class BESSSimulationResult(Base):
     """Stored results from BESS simulation runs."""
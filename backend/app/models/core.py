@@ -1,7 +1,7 @@
 """Core models: Site, Asset, Meter, MeterReading, Bill, BillLineItem, Tariff, TariffRate, Notification."""
 from datetime import datetime, date, time
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum, Text, Date, Time
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum, Text, Date, Time, Index
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -112,6 +112,10 @@ class MeterReading(Base):
 
     meter = relationship("Meter", back_populates="readings")
 
+    __table_args__ = (
+        Index("uq_meter_readings_meter_timestamp", "meter_id", "timestamp", unique=True),
+    )
+
 
 class Bill(Base):
     """Bill model representing a utility bill for a site."""
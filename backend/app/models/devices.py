@@ -596,5 +596,10 @@ class DeviceEvent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
-        Index("ix_device_event_time", "device_id", "triggered_at"),
+        # Covers correlation, timeline and statistics queries on PostgreSQL
+        Index(
+            "ix_device_event_time", "device_id", "triggered_at",
+            postgresql_include=["id", "event_type", "severity", "is_active", "acknowledged_at", "cleared_at"]
+        ),
+        Index("ix_device_event_type_time", "event_type", "device_id", "triggered_at"),
     )
@@ -6,8 +6,8 @@ from datetime import datetime
 from enum import Enum as PyEnum
 
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, Float,
-    Enum, Text, Index, BigInteger
+    Column, Integer, String, Date, DateTime, ForeignKey, Float,
+    Enum, Text, Index, BigInteger, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 
@@ -228,3 +228,26 @@ class NoDataTracker(Base):
     __table_args__ = (
         Index("ix_no_data_device_datapoint", "device_id", "datapoint_id"),
     )
+
+
+class DeviceUptimeDaily(Base):
+    """
+    Device Uptime Daily - Online/offline time per device per day.
+    Materialized from device_online/device_offline events so SLA reports sum
+    precomputed rows instead of replaying events.
+    """
+    __tablename__ = "device_uptime_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+
+    online_seconds = Column(Float, default=0)
+    offline_seconds = Column(Float, default=0)
+    transitions = Column(Integer, default=0)
+
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("device_id", "day", name="uq_device_uptime_daily_device_day"),
+    )
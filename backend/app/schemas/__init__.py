@@ -28,6 +28,8 @@ from app.schemas.core import (
     MeterResponse,
     MeterReadingCreate,
     MeterReadingResponse,
+    MeterReadingColumns,
+    MeterReadingBulkResult,
     BillLineItemCreate,
     BillLineItemResponse,
     BillCreate,
@@ -72,6 +74,8 @@ from app.schemas.bess import (
     BESSRecommendation,
     BESSSimulationInput,
     BESSSimulationResult,
+    BESSDispatchRequest,
+    BESSDispatchResult,
 )
 
 from app.schemas.pv import (
@@ -244,6 +248,8 @@ __all__ = [
     "MeterResponse",
     "MeterReadingCreate",
     "MeterReadingResponse",
+    "MeterReadingColumns",
+    "MeterReadingBulkResult",
     # Core - Bill
     "BillLineItemCreate",
     "BillLineItemResponse",
@@ -294,6 +300,8 @@ __all__ = [
     "BESSRecommendation",
     "BESSSimulationInput",
     "BESSSimulationResult",
+    "BESSDispatchRequest",
+    "BESSDispatchResult",
     # PV
     "PVModuleResponse",
     "PVSurfaceCreate",
@@ -131,3 +131,34 @@ class BESSSimulationResult(BaseModel):
     lifetime_savings: float
     annual_projections: List[Dict[str, Any]]
     monthly_peak_reduction: List[float]
+
+
+class BESSDispatchRequest(BaseModel):
+    """Request for simulating battery dispatch over a dataset's interval data."""
+    tariff_id: Optional[int] = Field(None, description="Tariff for TOU rates; defaults to the site's active tariff")
+    strategy: str = Field(default="combined", description="peak_shaving, arbitrage or combined")
+    model_ids: Optional[List[int]] = Field(None, description="Catalog models to sweep; defaults to all active models")
+    unit_counts: List[int] = Field(default=[1], description="Number of identical units per configuration")
+    peak_target_kw: Optional[float] = Field(None, gt=0)
+    max_workers: Optional[int] = Field(None, ge=1, le=32)
+
+
+class BESSDispatchResult(BaseModel):
+    """Simulated dispatch outcome for one battery configuration."""
+    model_id: Optional[int] = None
+    model_name: Optional[str] = None
+    units: int
+    capacity_kwh: float
+    power_kw: float
+    strategy: str
+    baseline_peak_kw: float
+    peak_kw: float
+    peak_reduction_kw: float
+    arbitrage_savings: float
+    peak_shaving_savings: float
+    total_savings: float
+    annual_savings: float
+    annual_cycles: float
+    estimated_price: Optional[float] = None
+    simple_payback_years: Optional[float] = None
+    monthly_peak_reduction_kw: List[float]
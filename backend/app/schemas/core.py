@@ -237,6 +237,30 @@ class MeterReadingResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class MeterReadingColumns(BaseModel):
+    """Columnar batch of meter readings: parallel arrays of equal length."""
+    meter_id: Optional[int] = Field(None, description="Meter for every row (alternative to meter_ids)")
+    meter_ids: Optional[List[int]] = Field(None, description="Meter for each row")
+    timestamp: List[datetime]
+    energy_kwh: List[float]
+    power_kw: Optional[List[Optional[float]]] = None
+    voltage: Optional[List[Optional[float]]] = None
+    current: Optional[List[Optional[float]]] = None
+    power_factor: Optional[List[Optional[float]]] = None
+    reactive_power_kvar: Optional[List[Optional[float]]] = None
+    apparent_power_kva: Optional[List[Optional[float]]] = None
+    reading_type: str = "interval"
+
+
+class MeterReadingBulkResult(BaseModel):
+    """Outcome of a bulk reading insert."""
+    received: int
+    inserted: int
+    duplicates: int
+    rejected: int = 0
+    ids: Optional[List[int]] = None
+
+
 class BillLineItemCreate(BaseModel):
     description: str
     category: Optional[str] = None
@@ -0,0 +1,275 @@
+"""
+Alarm event aggregation for SAVE-IT.AI
+Absorbs alarm storms, e.g. a gateway replaying buffered data after a reconnect:
+- Events are coalesced per device/rule within a short window
+- Alarm state changes are committed in one transaction per batch, off the event loop
+- One realtime message per subscriber and one notification digest per batch
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from app.models.telemetry import DeviceAlarm
+from app.services.alarm_engine import AlarmEngine, AlarmEvent
+from app.services.notification_service import NotificationPriority, NotificationService
+
+if TYPE_CHECKING:
+    from app.services.realtime_service import RealtimeService
+
+logger = logging.getLogger(__name__)
+
+# Lines listed in a digest before the rest are summarised as a count
+DIGEST_MAX_LINES = 20
+
+SEVERITY_PRIORITY = {
+    "critical": NotificationPriority.URGENT,
+    "error": NotificationPriority.HIGH,
+}
+
+
+@dataclass
+class CoalescedAlarm:
+    """Latest event for one device/rule, with counts of what it absorbed."""
+    event: AlarmEvent
+    first_at: datetime
+    count: int = 0
+    triggered: int = 0
+    cleared: int = 0
+
+    @classmethod
+    def start(cls, event: AlarmEvent) -> "CoalescedAlarm":
+        coalesced = cls(event=event, first_at=event.timestamp)
+        coalesced.add(event)
+        return coalesced
+
+    def add(self, event: AlarmEvent):
+        self.event = event
+        self.count += 1
+        if event.event_type == "triggered":
+            self.triggered += 1
+        elif event.event_type == "cleared":
+            self.cleared += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        event = self.event
+        return {
+            "alarm_id": event.alarm_id,
+            "device_id": event.device_id,
+            "rule_id": event.rule_id,
+            "rule_name": event.rule_name,
+            "datapoint": event.datapoint_name,
+            "severity": event.severity,
+            "event_type": event.event_type,
+            "value": event.value,
+            "threshold": event.threshold,
+            "message": event.message,
+            "timestamp": event.timestamp.isoformat(),
+            "first_at": self.first_at.isoformat(),
+            "count": self.count,
+            "triggered": self.triggered,
+            "cleared": self.cleared,
+        }
+
+
+class AlarmEventAggregator:
+    """
+    Batches alarm events from an AlarmEngine.
+
+    Registered as an engine handler, ``add`` only records the event. The
+    first event after an idle period opens a window of ``window_seconds``;
+    when it closes (or ``max_pending`` device/rule pairs are waiting) the
+    engine session is committed once in a worker thread, one digest is
+    queued for ``notify_user_ids`` and one realtime message goes to each
+    subscriber.
+    """
+
+    def __init__(
+        self,
+        engine: AlarmEngine,
+        realtime: Optional["RealtimeService"] = None,
+        window_seconds: float = 1.0,
+        max_pending: int = 1000,
+        notify_user_ids: Sequence[int] = (),
+    ):
+        self.engine = engine
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self.notify_user_ids = list(notify_user_ids)
+        self.running = False
+        self._realtime = realtime
+        self._pending: Dict[Tuple[int, int], CoalescedAlarm] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._stats = {"events": 0, "batches": 0, "alarms": 0, "failed": 0}
+
+        engine.add_handler(self.add)
+
+    @property
+    def realtime(self) -> "RealtimeService":
+        if self._realtime is None:
+            from app.services.realtime_service import get_realtime_service
+            self._realtime = get_realtime_service()
+        return self._realtime
+
+    def add(self, event: AlarmEvent):
+        """Record an event for the next batch (thread-safe)."""
+        key = (event.device_id, event.rule_id)
+        with self._lock:
+            self._stats["events"] += 1
+            coalesced = self._pending.get(key)
+            if coalesced is None:
+                self._pending[key] = CoalescedAlarm.start(event)
+            else:
+                coalesced.add(event)
+            pending = len(self._pending)
+
+        if pending == 1:
+            self._signal(self._wakeup)
+        if pending >= self.max_pending:
+            self._signal(self._full)
+
+    def _signal(self, flag: asyncio.Event):
+        if self._loop is not None and self.running:
+            self._loop.call_soon_threadsafe(flag.set)
+
+    async def start(self):
+        """Start the background flush worker."""
+        if self.running:
+            return
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run_loop())
+        if self._pending:
+            self._wakeup.set()
+        logger.info("Alarm event aggregator started")
+
+    async def stop(self):
+        """Stop the worker and flush what is still pending."""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        logger.info("Alarm event aggregator stopped")
+
+    async def _run_loop(self):
+        while self.running:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+            # Events that arrived during the flush open the next window
+            if self._pending:
+                self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Commit, notify and broadcast everything pending as one batch.
+
+        Returns:
+            Number of device/rule pairs in the batch
+        """
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending = {}
+        if not batch:
+            return 0
+
+        if not await asyncio.to_thread(self._commit, batch):
+            return 0
+
+        try:
+            await self.realtime.broadcast_alarm_batch([c.to_dict() for c in batch])
+        except Exception as e:
+            logger.error(f"Alarm batch broadcast failed: {e}")
+
+        self._stats["batches"] += 1
+        self._stats["alarms"] += len(batch)
+        return len(batch)
+
+    def _commit(self, batch: List[CoalescedAlarm]) -> bool:
+        """
+        Commit the engine's pending alarm changes, then write the digest.
+
+        Runs in a worker thread. The digest gets a session of its own so it
+        never touches the engine session between evaluations.
+        """
+        try:
+            self.engine.commit()
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error(f"Alarm batch commit failed ({len(batch)} alarms): {e}")
+            return False
+
+        triggered = [c for c in batch if c.triggered]
+        if not (triggered and self.notify_user_ids):
+            return True
+
+        from app.core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            subject, body = self.build_digest(triggered)
+            NotificationService(db).send_bulk(
+                self.notify_user_ids,
+                body=body,
+                subject=subject,
+                priority=self._priority(triggered),
+            )
+            alarm_ids = {c.event.alarm_id for c in triggered if c.event.alarm_id}
+            if alarm_ids:
+                db.query(DeviceAlarm).filter(DeviceAlarm.id.in_(alarm_ids)).update({
+                    "notification_sent": 1,
+                    "notification_sent_at": datetime.utcnow(),
+                }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Alarm digest failed ({len(triggered)} alarms): {e}")
+        finally:
+            db.close()
+        return True
+
+    @staticmethod
+    def build_digest(alarms: List[CoalescedAlarm]) -> Tuple[str, str]:
+        """Subject and body summarising triggered alarms."""
+        if len(alarms) == 1:
+            event = alarms[0].event
+            return f"Alarm: {event.rule_name}", event.message
+
+        lines = []
+        for coalesced in alarms[:DIGEST_MAX_LINES]:
+            event = coalesced.event
+            repeat = f" (x{coalesced.triggered})" if coalesced.triggered > 1 else ""
+            lines.append(f"[{event.severity}] device {event.device_id} {event.rule_name}: {event.message}{repeat}")
+        if len(alarms) > DIGEST_MAX_LINES:
+            lines.append(f"... and {len(alarms) - DIGEST_MAX_LINES} more")
+        return f"{len(alarms)} alarms triggered", "\n".join(lines)
+
+    @staticmethod
+    def _priority(alarms: List[CoalescedAlarm]) -> NotificationPriority:
+        for severity in ("critical", "error"):
+            if any(c.event.severity == severity for c in alarms):
+                return SEVERITY_PRIORITY[severity]
+        return NotificationPriority.NORMAL
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get aggregator status."""
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "window_seconds": self.window_seconds,
+            "stats": self._stats.copy(),
+        }
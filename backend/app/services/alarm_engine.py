@@ -6,15 +6,18 @@ Real-time alarm evaluation with:
 - Auto-clear capability
 - Acknowledgment workflow
 - Notification triggers
+- Optional flap suppression (re-triggering within a short window reopens the alarm)
 """
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Callable, Tuple
 from dataclasses import dataclass, field
 
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
 
 from app.models.devices import (
     Device, Datapoint, AlarmRule, AlarmCondition, AlarmSeverity
@@ -22,6 +25,8 @@ from app.models.devices import (
 from app.models.telemetry import (
     DeviceAlarm, AlarmStatus, NoDataTracker
 )
+from app.services.last_seen import LastSeenMap, last_seen_map
+from app.services.pipeline_metrics import pipeline
 
 logger = logging.getLogger(__name__)
 
@@ -144,14 +149,22 @@ class AlarmEngine:
     Handles alarm triggering, duration tracking, auto-clear, and notifications.
     """
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, reopen_window_seconds: float = 0.0):
         self.db = db
         self.evaluator = AlarmConditionEvaluator()
+        # Opt-in: an alarm that re-triggers this soon after auto-clearing is
+        # reopened instead of inserting a new row. Off by default because it
+        # changes the alarm lifecycle (a cleared alarm goes back to triggered).
+        self.reopen_window_seconds = reopen_window_seconds
         # In-memory caches for efficient alarm processing
         self._active_alarms: Dict[str, ActiveAlarm] = {}  # key: "{device_id}_{rule_id}"
+        self._recently_cleared: Dict[str, Tuple[int, datetime]] = {}  # key: "{device_id}_{rule_id}"
         self._duration_trackers: Dict[str, DurationTracker] = {}  # key: "{device_id}_{rule_id}"
         self._last_values: Dict[str, Any] = {}  # key: "{device_id}_{datapoint_id}"
         self._alarm_handlers: List[Callable[[AlarmEvent], None]] = []
+        # The session is shared by ingestion threads, the scheduler and the
+        # aggregator's commits; they take turns on it
+        self._lock = threading.RLock()
 
     def evaluate(
         self,
@@ -172,20 +185,41 @@ class AlarmEngine:
         Returns:
             List of triggered or cleared AlarmEvents
         """
+        with pipeline.stage("alarm_evaluate", device_id=device_id), self._lock:
+            return self._evaluate_rules(device_id, datapoint, value, timestamp)
+
+    def commit(self):
+        """Commit pending alarm changes, serialised with evaluation."""
+        with self._lock:
+            try:
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+    def _evaluate_rules(
+        self,
+        device_id: int,
+        datapoint: Datapoint,
+        value: Any,
+        timestamp: Optional[datetime]
+    ) -> List[AlarmEvent]:
         timestamp = timestamp or datetime.utcnow()
         events = []
 
-        # Get device
-        device = self.db.query(Device).filter(Device.id == device_id).first()
-        if not device or not device.model_id:
-            return events
-
-        # Get active alarm rules for this datapoint
-        rules = self.db.query(AlarmRule).filter(
-            AlarmRule.model_id == device.model_id,
-            AlarmRule.datapoint_id == datapoint.id,
-            AlarmRule.is_active == 1
-        ).all()
+        # Pending alarm changes are written when the batch commits, not by
+        # every lookup; the device comes from the identity map when loaded
+        with self.db.no_autoflush:
+            device = self.db.get(Device, device_id)
+            if not device or not device.model_id:
+                return events
+
+            # Get active alarm rules for this datapoint
+            rules = self.db.query(AlarmRule).filter(
+                AlarmRule.model_id == device.model_id,
+                AlarmRule.datapoint_id == datapoint.id,
+                AlarmRule.is_active == 1
+            ).all()
 
         # Get previous value for change detection
         value_key = f"{device_id}_{datapoint.id}"
@@ -285,41 +319,20 @@ class AlarmEngine:
         timestamp: datetime,
         duration_seconds: int = 0
     ) -> AlarmEvent:
-        """Create and persist a new alarm."""
+        """Create and persist a new alarm, or reopen one that just cleared."""
         message = self._build_alarm_message(rule, datapoint, value)
+        alarm_key = f"{device_id}_{rule.id}"
 
-        # Create database record
-        alarm = DeviceAlarm(
-            device_id=device_id,
-            alarm_rule_id=rule.id,
-            datapoint_id=datapoint.id,
-            status=AlarmStatus.TRIGGERED,
-            severity=rule.severity.value,
-            title=f"{rule.name}: {datapoint.display_name or datapoint.name}",
-            message=message,
-            trigger_value=float(value) if self._is_numeric(value) else None,
-            threshold_value=rule.threshold_value,
-            condition=rule.condition.value,
-            triggered_at=timestamp,
-            duration_seconds=duration_seconds,
-            data_json=json.dumps({
-                "datapoint": datapoint.name,
-                "value": value,
-                "threshold": rule.threshold_value,
-                "threshold2": rule.threshold_value_2,
-                "unit": datapoint.unit,
-            }),
-        )
-        self.db.add(alarm)
-        self.db.flush()
+        alarm = self._reopen_alarm(alarm_key, value, message, timestamp)
+        if alarm is None:
+            alarm = self._insert_alarm(device_id, rule, datapoint, value, message, timestamp, duration_seconds)
 
         # Track in memory
-        alarm_key = f"{device_id}_{rule.id}"
         self._active_alarms[alarm_key] = ActiveAlarm(
             alarm_id=alarm.id,
             device_id=device_id,
             rule_id=rule.id,
-            triggered_at=timestamp,
+            triggered_at=alarm.triggered_at,
             value=value
         )
 
@@ -339,6 +352,68 @@ class AlarmEngine:
             timestamp=timestamp
         )
 
+    def _reopen_alarm(
+        self,
+        alarm_key: str,
+        value: Any,
+        message: str,
+        timestamp: datetime
+    ) -> Optional[DeviceAlarm]:
+        """Reopen the alarm auto-cleared within the reopen window, if any."""
+        recent = self._recently_cleared.pop(alarm_key, None)
+        if not recent:
+            return None
+
+        alarm_id, cleared_at = recent
+        if (timestamp - cleared_at).total_seconds() > self.reopen_window_seconds:
+            return None
+
+        alarm = self.db.get(DeviceAlarm, alarm_id)
+        if not alarm or alarm.status != AlarmStatus.AUTO_CLEARED:
+            return None
+
+        alarm.status = AlarmStatus.TRIGGERED
+        alarm.cleared_at = None
+        alarm.message = message
+        alarm.trigger_value = float(value) if self._is_numeric(value) else None
+        return alarm
+
+    def _insert_alarm(
+        self,
+        device_id: int,
+        rule: AlarmRule,
+        datapoint: Datapoint,
+        value: Any,
+        message: str,
+        timestamp: datetime,
+        duration_seconds: int
+    ) -> DeviceAlarm:
+        """Insert a new alarm record."""
+        alarm = DeviceAlarm(
+            device_id=device_id,
+            alarm_rule_id=rule.id,
+            datapoint_id=datapoint.id,
+            status=AlarmStatus.TRIGGERED,
+            severity=rule.severity.value,
+            title=f"{rule.name}: {datapoint.display_name or datapoint.name}",
+            message=message,
+            trigger_value=float(value) if self._is_numeric(value) else None,
+            threshold_value=rule.threshold_value,
+            condition=rule.condition.value,
+            triggered_at=timestamp,
+            duration_seconds=duration_seconds,
+            data_json=json.dumps({
+                "datapoint": datapoint.name,
+                "value": value,
+                "threshold": rule.threshold_value,
+                "threshold2": rule.threshold_value_2,
+                "unit": datapoint.unit,
+            }),
+        )
+        self.db.add(alarm)
+        self.db.flush()
+        return alarm
+
     def _auto_clear_alarm(
         self,
         alarm_key: str,
@@ -354,7 +429,7 @@ class AlarmEngine:
             return None
 
         # Update database record
-        alarm = self.db.query(DeviceAlarm).filter(DeviceAlarm.id == active.alarm_id).first()
+        alarm = self.db.get(DeviceAlarm, active.alarm_id)
         if alarm and alarm.status == AlarmStatus.TRIGGERED:
             alarm.status = AlarmStatus.AUTO_CLEARED
             alarm.cleared_at = timestamp
@@ -363,6 +438,8 @@ class AlarmEngine:
 
             # Remove from active tracking
             del self._active_alarms[alarm_key]
+            if self.reopen_window_seconds > 0:
+                self._recently_cleared[alarm_key] = (alarm.id, timestamp)
 
             return AlarmEvent(
                 alarm_id=alarm.id,
@@ -380,119 +457,137 @@ class AlarmEngine:
 
         return None
 
-    def check_no_data_conditions(self) -> List[AlarmEvent]:
+    def check_no_data_conditions(self, last_seen: Optional[LastSeenMap] = None) -> List[AlarmEvent]:
         """
         Check for devices that stopped sending data.
         Should be called periodically by scheduler.
 
+        Candidate (rule, device) pairs come from one query; last-seen times are
+        the newer of the in-memory map and the database, and are compared with
+        the rule timeouts in one vectorized step. Only pairs that change state
+        are touched afterwards.
+
+        Args:
+            last_seen: Last-seen map fed by ingestion (defaults to the shared map)
+
         Returns:
             List of triggered no-data AlarmEvents
         """
+        with self._lock:
+            return self._check_no_data(last_seen)
+
+    def _check_no_data(self, last_seen: Optional[LastSeenMap]) -> List[AlarmEvent]:
+        last_seen = last_seen or last_seen_map
         events = []
         now = datetime.utcnow()
 
-        # Get all no_data alarm rules
-        no_data_rules = self.db.query(AlarmRule).filter(
-            AlarmRule.condition == AlarmCondition.NO_DATA,
-            AlarmRule.is_active == 1
+        rows = self.db.execute(
+            select(
+                AlarmRule,
+                Device.id,
+                Device.name,
+                Device.last_telemetry_at,
+                NoDataTracker.id,
+                NoDataTracker.last_data_at,
+            )
+            .join(Device, and_(Device.model_id == AlarmRule.model_id, Device.is_active == 1))
+            .outerjoin(NoDataTracker, and_(
+                NoDataTracker.device_id == Device.id,
+                NoDataTracker.alarm_rule_id == AlarmRule.id
+            ))
+            .where(AlarmRule.condition == AlarmCondition.NO_DATA, AlarmRule.is_active == 1)
         ).all()
+        if not rows:
+            return events
 
-        for rule in no_data_rules:
-            # Get devices with this model
-            devices = self.db.query(Device).filter(
-                Device.model_id == rule.model_id,
-                Device.is_active == 1
-            ).all()
-
-            threshold_seconds = int(rule.threshold_value or 300)  # Default 5 minutes
-
-            for device in devices:
-                # Check tracker or device last_telemetry_at
-                tracker = self.db.query(NoDataTracker).filter(
-                    NoDataTracker.device_id == device.id,
-                    NoDataTracker.alarm_rule_id == rule.id
-                ).first()
-
-                last_data_at = tracker.last_data_at if tracker else device.last_telemetry_at
+        last_data = []
+        for rule, device_id, _, device_last, _, tracker_last in rows:
+            stored = tracker_last if tracker_last else device_last
+            seen = last_seen.get(device_id, rule.datapoint_id)
+            last_data.append(max(t for t in (stored, seen) if t) if (stored or seen) else None)
+
+        # NaT (never reported) compares False both ways and is skipped
+        elapsed = (np.datetime64(now, "us") - np.array(last_data, dtype="datetime64[us]")) / np.timedelta64(1, "s")
+        thresholds = np.array([int(rule.threshold_value or 300) for rule, *_ in rows])  # Default 5 minutes
+        stale = elapsed > thresholds
+        fresh = elapsed <= thresholds
+
+        datapoint_names = {}
+        for index in np.flatnonzero(stale | fresh):
+            rule, device_id, device_name, _, tracker_id, _ = rows[index]
+            alarm_key = f"{device_id}_{rule.id}"
+            threshold_seconds = int(thresholds[index])
 
-                if not last_data_at:
+            if stale[index]:
+                # No data for too long - trigger alarm
+                if alarm_key in self._active_alarms:
                     continue
 
-                elapsed = (now - last_data_at).total_seconds()
+                if rule.datapoint_id and rule.datapoint_id not in datapoint_names:
+                    datapoint = self.db.get(Datapoint, rule.datapoint_id)
+                    datapoint_names[rule.datapoint_id] = datapoint.name if datapoint else "device"
+                dp_name = datapoint_names.get(rule.datapoint_id, "device")
+                seconds = float(elapsed[index])
 
-                alarm_key = f"{device.id}_{rule.id}"
+                alarm = DeviceAlarm(
+                    device_id=device_id,
+                    alarm_rule_id=rule.id,
+                    datapoint_id=rule.datapoint_id,
+                    status=AlarmStatus.TRIGGERED,
+                    severity=rule.severity.value,
+                    title=f"No Data: {device_name}",
+                    message=f"No data received for {int(seconds)} seconds (threshold: {threshold_seconds}s)",
+                    threshold_value=float(threshold_seconds),
+                    condition="no_data",
+                    triggered_at=now,
+                )
+                self.db.add(alarm)
+                self.db.flush()
 
-                if elapsed > threshold_seconds:
-                    # No data for too long - trigger alarm
-                    if alarm_key not in self._active_alarms:
-                        # Create pseudo-datapoint for no_data alarm
-                        datapoint = self.db.query(Datapoint).filter(
-                            Datapoint.id == rule.datapoint_id
-                        ).first() if rule.datapoint_id else None
-
-                        dp_name = datapoint.name if datapoint else "device"
-
-                        alarm = DeviceAlarm(
-                            device_id=device.id,
-                            alarm_rule_id=rule.id,
-                            datapoint_id=rule.datapoint_id,
-                            status=AlarmStatus.TRIGGERED,
-                            severity=rule.severity.value,
-                            title=f"No Data: {device.name}",
-                            message=f"No data received for {int(elapsed)} seconds (threshold: {threshold_seconds}s)",
-                            threshold_value=float(threshold_seconds),
-                            condition="no_data",
-                            triggered_at=now,
-                        )
-                        self.db.add(alarm)
-                        self.db.flush()
-
-                        self._active_alarms[alarm_key] = ActiveAlarm(
-                            alarm_id=alarm.id,
-                            device_id=device.id,
-                            rule_id=rule.id,
-                            triggered_at=now,
-                            value=elapsed
-                        )
+                self._active_alarms[alarm_key] = ActiveAlarm(
+                    alarm_id=alarm.id,
+                    device_id=device_id,
+                    rule_id=rule.id,
+                    triggered_at=now,
+                    value=seconds
+                )
 
-                        # Update tracker
-                        if tracker:
-                            tracker.alarm_triggered = 1
-                            tracker.alarm_triggered_at = now
-
-                        event = AlarmEvent(
-                            alarm_id=alarm.id,
-                            device_id=device.id,
-                            rule_id=rule.id,
-                            rule_name=rule.name,
-                            datapoint_name=dp_name,
-                            severity=rule.severity.value,
-                            event_type="triggered",
-                            value=elapsed,
-                            threshold=threshold_seconds,
-                            message=f"No data received for {int(elapsed)} seconds",
-                            timestamp=now
-                        )
-                        events.append(event)
-                        logger.warning(f"No-data alarm triggered for device {device.id}")
+                # Update tracker
+                tracker = self.db.get(NoDataTracker, tracker_id) if tracker_id else None
+                if tracker:
+                    tracker.alarm_triggered = 1
+                    tracker.alarm_triggered_at = now
 
-                else:
-                    # Data received - auto-clear if active
-                    if alarm_key in self._active_alarms and rule.auto_clear:
-                        active = self._active_alarms[alarm_key]
-                        alarm = self.db.query(DeviceAlarm).filter(
-                            DeviceAlarm.id == active.alarm_id
-                        ).first()
+                events.append(AlarmEvent(
+                    alarm_id=alarm.id,
+                    device_id=device_id,
+                    rule_id=rule.id,
+                    rule_name=rule.name,
+                    datapoint_name=dp_name,
+                    severity=rule.severity.value,
+                    event_type="triggered",
+                    value=seconds,
+                    threshold=threshold_seconds,
+                    message=f"No data received for {int(seconds)} seconds",
+                    timestamp=now
+                ))
+                logger.warning(f"No-data alarm triggered for device {device_id}")
 
-                        if alarm and alarm.status == AlarmStatus.TRIGGERED:
-                            alarm.status = AlarmStatus.AUTO_CLEARED
-                            alarm.cleared_at = now
+            elif alarm_key in self._active_alarms and rule.auto_clear:
+                # Data received - auto-clear
+                active = self._active_alarms.pop(alarm_key)
+                alarm = self.db.get(DeviceAlarm, active.alarm_id)
+                if alarm and alarm.status == AlarmStatus.TRIGGERED:
+                    alarm.status = AlarmStatus.AUTO_CLEARED
+                    alarm.cleared_at = now
 
-                        del self._active_alarms[alarm_key]
+                tracker = self.db.get(NoDataTracker, tracker_id) if tracker_id else None
+                if tracker:
+                    tracker.alarm_triggered = 0
+                    tracker.alarm_triggered_at = None
 
-                        if tracker:
-                            tracker.alarm_triggered = 0
-                            tracker.alarm_triggered_at = None
+        for event in events:
+            self._notify_handlers(event)
 
         return events
 
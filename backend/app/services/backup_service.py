@@ -1,8 +1,13 @@
 """Backup service for data archival and verification with cloud storage support."""
 from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
+import asyncio
+import base64
+import hashlib
+import json
 import os
 import logging
 import subprocess
@@ -12,6 +17,15 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Logical backups: uncompressed bytes per chunk file and tables exported in parallel
+BACKUP_CHUNK_BYTES = int(os.getenv("BACKUP_CHUNK_BYTES", str(64 * 1024 * 1024)))
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", "4"))
+# 3: binary values in JSONL chunks are tagged base64 instead of bare hex
+BACKUP_FORMAT_VERSION = 3
+MANIFEST_FILE = "manifest.json"
+FETCH_ROWS = 5_000
+BYTES_TAG = "__bytes__"
+
 # Cloud storage configuration
 CLOUD_STORAGE_TYPE = os.getenv("BACKUP_STORAGE_TYPE", "local")  # local, s3, gcs
 S3_BUCKET = os.getenv("BACKUP_S3_BUCKET", "")
@@ -55,17 +69,112 @@ class BackupJob:
 class RetentionPolicy:
     """Data retention policy configuration."""
     meter_readings_days: int = 365
+    device_telemetry_days: int = 365
     audit_logs_days: int = 90
     notifications_days: int = 30
     alerts_days: int = 180
     invoices_days: int = 2555
     backups_days: int = 90  # Days to keep backup files
+    # Telemetry retention is opt-in and only drops whole monthly partitions
+    enforce_device_telemetry: bool = field(
+        default_factory=lambda: os.getenv("TELEMETRY_RETENTION_ENABLED", "false").lower() == "true"
+    )
     # Backup retention: 7 daily, 4 weekly, 12 monthly
     daily_backups: int = 7
     weekly_backups: int = 4
     monthly_backups: int = 12
 
 
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    # Tagged so the restore can tell binary columns from text
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {BYTES_TAG: base64.b64encode(bytes(value)).decode("ascii")}
+    return str(value)
+
+
+def _json_value(value: Any) -> Any:
+    """Undo _json_default's encoding for one restored value."""
+    if isinstance(value, dict) and value.keys() == {BYTES_TAG}:
+        return base64.b64decode(value[BYTES_TAG])
+    return value
+
+
+def _remove_backup_files(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+class _ChunkWriter:
+    """
+    File-like sink for one table's rows (one per line), split into gzip
+    chunk files of about chunk_bytes uncompressed on line boundaries, so
+    each chunk restores on its own.
+    """
+
+    def __init__(self, directory: str, table: str, chunk_bytes: int):
+        self.directory = directory
+        self.table = table
+        self.chunk_bytes = chunk_bytes
+        self.chunks: List[Dict[str, Any]] = []
+        self._pending = b""
+        self._file = None
+        self._name = None
+        self._rows = 0
+        self._bytes = 0
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._pending += data
+        cut = self._pending.rfind(b"\n") + 1
+        if cut:
+            self._write_lines(self._pending[:cut])
+            self._pending = self._pending[cut:]
+        return len(data)
+
+    def _write_lines(self, lines: bytes):
+        if self._file is None:
+            self._name = f"{self.table}.{len(self.chunks):05d}.gz"
+            self._file = gzip.open(os.path.join(self.directory, self._name), "wb")
+        self._file.write(lines)
+        self._rows += lines.count(b"\n")
+        self._bytes += len(lines)
+        if self._bytes >= self.chunk_bytes:
+            self._finish_chunk()
+
+    def _finish_chunk(self):
+        self._file.close()
+        path = os.path.join(self.directory, self._name)
+        self.chunks.append({
+            "file": self._name,
+            "rows": self._rows,
+            "bytes": os.path.getsize(path),
+            "sha256": _file_sha256(path),
+        })
+        self._file = None
+        self._rows = 0
+        self._bytes = 0
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the last chunk and return the chunk list for the manifest."""
+        if self._pending:
+            self._write_lines(self._pending + b"\n")
+            self._pending = b""
+        if self._file is not None:
+            self._finish_chunk()
+        return self.chunks
+
+
 class BackupService:
     """Service for data backup and archival with cloud storage support."""
 
@@ -74,6 +183,8 @@ class BackupService:
         self.retention_policy = RetentionPolicy()
         self._backup_path = os.getenv("BACKUP_PATH", "/tmp/saveit_backups")
         self._storage_type = CLOUD_STORAGE_TYPE
+        self._chunk_bytes = BACKUP_CHUNK_BYTES
+        self._workers = BACKUP_WORKERS
         os.makedirs(self._backup_path, exist_ok=True)
 
     async def create_pg_dump_backup(
@@ -83,7 +194,6 @@ class BackupService:
     ) -> BackupJob:
         """Create a PostgreSQL dump backup using pg_dump."""
         import uuid
-        import hashlib
 
         job = BackupJob(
             id=str(uuid.uuid4()),
@@ -119,14 +229,9 @@ class BackupService:
             if result.returncode != 0:
                 raise Exception(f"pg_dump failed: {result.stderr}")
 
-            # Calculate checksum
-            with open(file_path, "rb") as f:
-                content = f.read()
-                checksum = hashlib.sha256(content).hexdigest()
-
             job.file_path = file_path
-            job.size_bytes = len(content)
-            job.checksum = checksum
+            job.size_bytes = os.path.getsize(file_path)
+            job.checksum = _file_sha256(file_path)
 
             # Upload to cloud if configured
             if upload_to_cloud and self._storage_type != "local":
@@ -254,7 +359,7 @@ class BackupService:
                 # Delete local file
                 if backup.file_path and os.path.exists(backup.file_path):
                     try:
-                        os.remove(backup.file_path)
+                        _remove_backup_files(backup.file_path)
                         deleted["local"] += 1
                     except Exception as e:
                         logger.error(f"Failed to delete local backup: {e}")
@@ -275,9 +380,14 @@ class BackupService:
         tables: Optional[List[str]] = None,
         metadata: Optional[Dict] = None,
     ) -> BackupJob:
-        """Create a new backup."""
+        """
+        Create a streaming logical backup.
+
+        Each table is written to its own gzip chunk files in a backup
+        directory alongside a manifest of per-chunk row counts and SHA-256
+        checksums; the job checksum covers the manifest.
+        """
         import uuid
-        import hashlib
         
         job = BackupJob(
             id=str(uuid.uuid4()),
@@ -291,24 +401,34 @@ class BackupService:
         self.backup_history.append(job)
         
         try:
-            backup_data = await self._export_data(tables)
-            
-            filename = f"backup_{job.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-            file_path = os.path.join(self._backup_path, filename)
-            
-            import json
-            content = json.dumps(backup_data, default=str)
+            directory = os.path.join(
+                self._backup_path, f"backup_{job.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            )
+            os.makedirs(directory)
+            manifest = await self._export_data(directory, tables)
             
-            with open(file_path, "w") as f:
-                f.write(content)
+            manifest_path = os.path.join(directory, MANIFEST_FILE)
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
             
-            job.file_path = file_path
-            job.size_bytes = len(content.encode())
-            job.checksum = hashlib.sha256(content.encode()).hexdigest()
+            chunks = [c for t in manifest["tables"] for c in t["chunks"]]
+            job.file_path = directory
+            job.tables = [t["name"] for t in manifest["tables"]]
+            job.size_bytes = sum(c["bytes"] for c in chunks) + os.path.getsize(manifest_path)
+            job.checksum = _file_sha256(manifest_path)
+            job.metadata.update({
+                "method": "logical",
+                "chunks": len(chunks),
+                "rows": sum(t["rows"] for t in manifest["tables"]),
+                "table_errors": manifest["errors"],
+            })
             job.status = BackupStatus.COMPLETED
             job.completed_at = datetime.utcnow()
             
-            logger.info(f"Backup completed: {job.id} ({job.size_bytes} bytes)")
+            logger.info(
+                f"Backup completed: {job.id} ({len(job.tables)} tables, "
+                f"{job.metadata['rows']} rows, {job.size_bytes} bytes)"
+            )
             
         except Exception as e:
             job.status = BackupStatus.FAILED
@@ -318,78 +438,144 @@ class BackupService:
         
         return job
     
-    async def _export_data(self, tables: Optional[List[str]] = None) -> dict:
-        """Export data for backup using pg_dump or SQLAlchemy."""
-        from app.core.database import SessionLocal, engine
-        from sqlalchemy import inspect, text
-        import hashlib
+    async def _export_data(self, directory: str, tables: Optional[List[str]] = None) -> dict:
+        """
+        Stream tables into chunk files under directory and return the manifest.
+
+        PostgreSQL (psycopg2) tables are written with COPY TO by parallel
+        workers sharing one exported snapshot, so the backup is consistent
+        across tables. Other databases stream rows through a server-side
+        cursor as JSON lines, one table at a time.
+        """
+        return await asyncio.to_thread(self._export_tables, directory, tables)
+    
+    def _export_tables(self, directory: str, tables: Optional[List[str]]) -> dict:
+        from app.core.database import engine
+        from sqlalchemy import MetaData, inspect
         
-        data = {}
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
+        dialect = engine.dialect
+        use_copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
         
-        target_tables = tables if tables else all_tables
+        all_tables = set(inspect(engine).get_table_names())
+        if dialect.name == "postgresql":
+            # Partitions are exported through their parent table
+            with engine.connect() as conn:
+                all_tables -= set(conn.exec_driver_sql(
+                    "SELECT relname FROM pg_class WHERE relispartition"
+                ).scalars())
+        target = [t for t in (tables or sorted(all_tables)) if t in all_tables]
         
-        db = SessionLocal()
-        try:
-            for table_name in target_tables:
-                if table_name not in all_tables:
-                    continue
-                
-                try:
-                    result = db.execute(text(f'SELECT * FROM "{table_name}" LIMIT 10000'))
-                    columns = result.keys()
-                    rows = []
-                    for row in result.fetchall():
-                        row_dict = {}
-                        for i, col in enumerate(columns):
-                            val = row[i]
-                            if hasattr(val, 'isoformat'):
-                                val = val.isoformat()
-                            elif isinstance(val, bytes):
-                                val = val.hex()
-                            row_dict[col] = val
-                        rows.append(row_dict)
-                    data[table_name] = {
-                        "columns": list(columns),
-                        "row_count": len(rows),
-                        "rows": rows,
-                    }
-                except Exception as e:
-                    logger.warning(f"Failed to export table {table_name}: {e}")
-                    data[table_name] = {"error": str(e)}
-        finally:
-            db.close()
+        metadata = MetaData()
+        metadata.reflect(bind=engine, only=target)
+        # Dependency order, so a restore inserts parents before children
+        ordered = [t for t in metadata.sorted_tables if t.name in target]
+        
+        results: Dict[str, dict] = {}
+        errors: Dict[str, str] = {}
+        
+        def export(table, snapshot=None):
+            try:
+                results[table.name] = self._export_table(engine, table, directory, use_copy, snapshot)
+            except Exception as e:
+                logger.warning(f"Failed to export table {table.name}: {e}")
+                errors[table.name] = str(e)
+        
+        if use_copy:
+            with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+                with conn.begin():
+                    snapshot = conn.exec_driver_sql("SELECT pg_export_snapshot()").scalar()
+                    with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                        list(pool.map(lambda t: export(t, snapshot), ordered))
+        else:
+            for table in ordered:
+                export(table)
+        
+        return {
+            "version": BACKUP_FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "database": dialect.name,
+            "tables": [results[t.name] for t in ordered if t.name in results],
+            "errors": errors,
+        }
+    
+    def _export_table(self, engine, table, directory: str, use_copy: bool, snapshot: Optional[str]) -> dict:
+        """Write one table to chunk files; memory use is bounded by one fetch batch."""
+        from sqlalchemy import text
         
+        columns = [c.name for c in table.columns]
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        writer = _ChunkWriter(directory, table.name, self._chunk_bytes)
+        
+        if use_copy:
+            with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+                with conn.begin():
+                    conn.exec_driver_sql(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+                    cursor = conn.connection.dbapi_connection.cursor()
+                    try:
+                        # COPY (SELECT ...) also works for partitioned parents
+                        cursor.copy_expert(
+                            f'COPY (SELECT {column_list} FROM "{table.name}") TO STDOUT', writer
+                        )
+                    finally:
+                        cursor.close()
+        else:
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=FETCH_ROWS).execute(
+                    text(f'SELECT {column_list} FROM "{table.name}"')
+                )
+                for rows in result.partitions():
+                    writer.write("".join(
+                        json.dumps(list(row), default=_json_default) + "\n" for row in rows
+                    ))
+        
+        chunks = writer.close()
         return {
-            "timestamp": datetime.utcnow().isoformat(),
-            "tables": list(data.keys()),
-            "table_count": len(data),
-            "data": data,
+            "name": table.name,
+            "format": "copy" if use_copy else "jsonl",
+            "columns": columns,
+            "rows": sum(c["rows"] for c in chunks),
+            "chunks": chunks,
         }
     
+    def _load_manifest(self, job: BackupJob) -> dict:
+        with open(os.path.join(job.file_path, MANIFEST_FILE)) as f:
+            return json.load(f)
+    
+    def _verify_chunks(self, job: BackupJob) -> List[str]:
+        """Files of a chunked backup whose checksum doesn't match, manifest included."""
+        manifest_path = os.path.join(job.file_path, MANIFEST_FILE)
+        if _file_sha256(manifest_path) != job.checksum:
+            return [MANIFEST_FILE]
+        bad = []
+        for table in self._load_manifest(job)["tables"]:
+            for chunk in table["chunks"]:
+                path = os.path.join(job.file_path, chunk["file"])
+                if not os.path.exists(path) or _file_sha256(path) != chunk["sha256"]:
+                    bad.append(chunk["file"])
+        return bad
+    
     async def verify_backup(self, backup_id: str) -> bool:
         """Verify a backup's integrity."""
-        import hashlib
-        
         job = next((b for b in self.backup_history if b.id == backup_id), None)
         if not job or not job.file_path:
             return False
         
         try:
-            with open(job.file_path, "r") as f:
-                content = f.read()
-            
-            checksum = hashlib.sha256(content.encode()).hexdigest()
+            if os.path.isdir(job.file_path):
+                bad = await asyncio.to_thread(self._verify_chunks, job)
+                valid = not bad
+            else:
+                bad = []
+                valid = await asyncio.to_thread(_file_sha256, job.file_path) == job.checksum
             
-            if checksum == job.checksum:
+            if valid:
                 job.verification_status = "verified"
                 job.status = BackupStatus.VERIFIED
                 logger.info(f"Backup verified: {backup_id}")
                 return True
             else:
                 job.verification_status = "checksum_mismatch"
-                logger.warning(f"Backup verification failed: {backup_id}")
+                logger.warning(f"Backup verification failed: {backup_id} {bad}")
                 return False
                 
         except Exception as e:
@@ -401,6 +587,10 @@ class BackupService:
         """
         Restore data from a backup.
         
+        Chunks are streamed back one at a time; existing rows are kept
+        (ON CONFLICT DO NOTHING). Each table is restored in its own
+        transaction, in dependency order.
+        
         Args:
             backup_id: ID of backup to restore
             dry_run: If True, only validate backup without restoring
@@ -408,75 +598,33 @@ class BackupService:
         Returns:
             dict with restore status and details
         """
-        import json
-        from app.core.database import SessionLocal, engine
-        from sqlalchemy import text
-        
         job = next((b for b in self.backup_history if b.id == backup_id), None)
         if not job or not job.file_path:
             return {"success": False, "error": "Backup not found"}
         
-        if not os.path.exists(job.file_path):
+        if not os.path.isdir(job.file_path):
             return {"success": False, "error": "Backup file not found"}
         
         try:
-            with open(job.file_path, "r") as f:
-                backup_data = json.load(f)
+            manifest = self._load_manifest(job)
+            bad = await asyncio.to_thread(self._verify_chunks, job)
         except Exception as e:
             return {"success": False, "error": f"Failed to read backup: {e}"}
         
-        data = backup_data.get("data", {})
-        tables_to_restore = list(data.keys())
+        if bad:
+            return {"success": False, "error": f"Checksum mismatch: {', '.join(bad)}"}
         
         if dry_run:
             return {
                 "success": True,
                 "dry_run": True,
-                "tables": tables_to_restore,
-                "total_rows": sum(t.get("row_count", 0) for t in data.values() if isinstance(t, dict)),
+                "tables": [t["name"] for t in manifest["tables"]],
+                "total_rows": sum(t["rows"] for t in manifest["tables"]),
                 "message": "Backup validated successfully. Set dry_run=False to restore.",
             }
         
-        db = SessionLocal()
-        restored_tables = []
-        errors = []
-        
-        try:
-            for table_name, table_data in data.items():
-                if not isinstance(table_data, dict) or "error" in table_data:
-                    continue
-                
-                rows = table_data.get("rows", [])
-                if not rows:
-                    continue
-                
-                try:
-                    columns = table_data.get("columns", list(rows[0].keys()) if rows else [])
-                    
-                    for row in rows:
-                        cols = ", ".join([f'"{c}"' for c in columns])
-                        placeholders = ", ".join([f":val_{i}" for i in range(len(columns))])
-                        params = {f"val_{i}": row.get(col) for i, col in enumerate(columns)}
-                        
-                        db.execute(
-                            text(f'INSERT INTO "{table_name}" ({cols}) VALUES ({placeholders}) ON CONFLICT DO NOTHING'),
-                            params
-                        )
-                    
-                    restored_tables.append(table_name)
-                    
-                except Exception as e:
-                    errors.append(f"{table_name}: {e}")
-                    logger.error(f"Failed to restore table {table_name}: {e}")
-            
-            db.commit()
-            logger.info(f"Restored backup {backup_id}: {len(restored_tables)} tables")
-            
-        except Exception as e:
-            db.rollback()
-            return {"success": False, "error": f"Restore failed: {e}"}
-        finally:
-            db.close()
+        restored_tables, errors = await asyncio.to_thread(self._restore_tables, job.file_path, manifest)
+        logger.info(f"Restored backup {backup_id}: {len(restored_tables)} tables")
         
         return {
             "success": True,
@@ -485,24 +633,98 @@ class BackupService:
             "errors": errors,
         }
     
+    def _restore_tables(self, directory: str, manifest: dict):
+        from app.core.database import engine
+        
+        restored_tables = []
+        errors = []
+        for table in manifest["tables"]:
+            if not table["chunks"]:
+                continue
+            try:
+                with engine.begin() as conn:
+                    if table["format"] == "copy":
+                        self._restore_copy(conn, directory, table)
+                    else:
+                        self._restore_jsonl(conn, directory, table)
+                restored_tables.append(table["name"])
+            except Exception as e:
+                errors.append(f"{table['name']}: {e}")
+                logger.error(f"Failed to restore table {table['name']}: {e}")
+        return restored_tables, errors
+    
+    def _restore_copy(self, conn, directory: str, table: dict):
+        """COPY each chunk into a staging table and merge it into the table."""
+        dialect = conn.dialect
+        if not (dialect.name == "postgresql" and dialect.driver == "psycopg2"):
+            raise ValueError("COPY backups can only be restored to PostgreSQL")
+        
+        name = table["name"]
+        column_list = ", ".join(f'"{c}"' for c in table["columns"])
+        staging = f"_restore_{name}"
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f'CREATE TEMP TABLE "{staging}" (LIKE "{name}" INCLUDING DEFAULTS) ON COMMIT DROP')
+            for chunk in table["chunks"]:
+                with gzip.open(os.path.join(directory, chunk["file"]), "rb") as f:
+                    cursor.copy_expert(f'COPY "{staging}" ({column_list}) FROM STDIN', f)
+                cursor.execute(
+                    f'INSERT INTO "{name}" ({column_list}) SELECT {column_list} FROM "{staging}" '
+                    f"ON CONFLICT DO NOTHING"
+                )
+                cursor.execute(f'TRUNCATE "{staging}"')
+            # Rows came with their ids; move serial sequences past them
+            for column in table["columns"]:
+                cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (f'"{name}"', column))
+                sequence = cursor.fetchone()[0]
+                if sequence:
+                    cursor.execute(
+                        f'SELECT setval(%s, COALESCE(MAX("{column}"), 1)) FROM "{name}"', (sequence,)
+                    )
+        finally:
+            cursor.close()
+    
+    def _restore_jsonl(self, conn, directory: str, table: dict):
+        """Insert each chunk's rows in batches."""
+        from sqlalchemy import text
+        
+        columns = table["columns"]
+        cols = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join(f":val_{i}" for i in range(len(columns)))
+        stmt = text(f'INSERT INTO "{table["name"]}" ({cols}) VALUES ({placeholders}) ON CONFLICT DO NOTHING')
+        for chunk in table["chunks"]:
+            with gzip.open(os.path.join(directory, chunk["file"]), "rt", encoding="utf-8") as f:
+                batch = []
+                for line in f:
+                    batch.append({f"val_{i}": _json_value(v) for i, v in enumerate(json.loads(line))})
+                    if len(batch) >= FETCH_ROWS:
+                        conn.execute(stmt, batch)
+                        batch = []
+                if batch:
+                    conn.execute(stmt, batch)
+    
     async def cleanup_old_data(self) -> dict:
         """Clean up data older than retention policy."""
         now = datetime.utcnow()
         deleted = {
             "meter_readings": 0,
+            "device_telemetry": 0,
             "audit_logs": 0,
             "notifications": 0,
             "alerts": 0,
             "backups": 0,
         }
         
+        if self.retention_policy.enforce_device_telemetry:
+            deleted["device_telemetry"] = await asyncio.to_thread(self._drop_old_telemetry)
+        
         backup_cutoff = now - timedelta(days=self.retention_policy.backups_days)
         old_backups = [b for b in self.backup_history if b.completed_at and b.completed_at < backup_cutoff]
         
         for backup in old_backups:
             if backup.file_path and os.path.exists(backup.file_path):
                 try:
-                    os.remove(backup.file_path)
+                    _remove_backup_files(backup.file_path)
                     deleted["backups"] += 1
                 except Exception as e:
                     logger.error(f"Failed to delete backup file: {e}")
@@ -511,6 +733,32 @@ class BackupService:
         logger.info(f"Cleanup completed: {deleted}")
         return deleted
     
+    def _drop_old_telemetry(self) -> int:
+        """
+        Drop telemetry partitions past the retention period.
+
+        Only whole months are dropped; unpartitioned tables are left alone
+        rather than running a large row DELETE.
+        """
+        from app.core.database import SessionLocal
+        from app.services.telemetry_partitions import drop_partitions_before, is_partitioned
+
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_policy.device_telemetry_days)
+        db = SessionLocal()
+        try:
+            if not is_partitioned(db):
+                logger.warning("Telemetry retention skipped: device_telemetry is not partitioned")
+                return 0
+            dropped = drop_partitions_before(db, cutoff)
+            db.commit()
+            return sum(dropped.values())
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Telemetry retention failed: {e}")
+            return 0
+        finally:
+            db.close()
+    
     def get_backup_history(self, limit: int = 50) -> List[dict]:
         """Get backup history."""
         return [
@@ -532,11 +780,13 @@ class BackupService:
         """Get current retention policy."""
         return {
             "meter_readings_days": self.retention_policy.meter_readings_days,
+            "device_telemetry_days": self.retention_policy.device_telemetry_days,
             "audit_logs_days": self.retention_policy.audit_logs_days,
             "notifications_days": self.retention_policy.notifications_days,
             "alerts_days": self.retention_policy.alerts_days,
             "invoices_days": self.retention_policy.invoices_days,
             "backups_days": self.retention_policy.backups_days,
+            "enforce_device_telemetry": self.retention_policy.enforce_device_telemetry,
         }
     
     def update_retention_policy(self, **kwargs):
@@ -163,6 +163,7 @@ class FeatureFlags:
     
     def __init__(self):
         self._flags: Dict[str, bool] = {}
+        self._watchers: List[callable] = []
         self._load_defaults()
     
     def _load_defaults(self):
@@ -184,6 +185,8 @@ class FeatureFlags:
             "api_key_auth": True,
             "sso_enabled": False,
             "two_factor_auth": False,
+            "pipeline_metrics": True,
+            "pipeline_tracing": False,
         }
         
         for flag, default in self._flags.items():
@@ -200,11 +203,24 @@ class FeatureFlags:
         """Enable a feature flag."""
         self._flags[flag] = True
         logger.info(f"Feature flag enabled: {flag}")
+        self._notify(flag, True)
     
     def disable(self, flag: str):
         """Disable a feature flag."""
         self._flags[flag] = False
         logger.info(f"Feature flag disabled: {flag}")
+        self._notify(flag, False)
+    
+    def _notify(self, flag: str, enabled: bool):
+        for watcher in self._watchers:
+            try:
+                watcher(flag, enabled)
+            except Exception as e:
+                logger.error(f"Feature flag watcher error: {e}")
+    
+    def watch(self, callback: callable):
+        """Register a callback for feature flag changes."""
+        self._watchers.append(callback)
     
     def get_all(self) -> Dict[str, bool]:
         """Get all feature flags."""
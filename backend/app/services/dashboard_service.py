@@ -484,11 +484,13 @@ class DashboardService:
         if not device_id or not datapoint:
             return {"value": 0, "min": 0, "max": 100}
 
-        from app.models.devices import DeviceTelemetry
+        from app.models.devices import Datapoint, DeviceTelemetry
 
-        latest = self.db.query(DeviceTelemetry).filter(
+        latest = self.db.query(DeviceTelemetry).join(
+            Datapoint, DeviceTelemetry.datapoint_id == Datapoint.id
+        ).filter(
             DeviceTelemetry.device_id == device_id,
-            DeviceTelemetry.datapoint_name == datapoint
+            Datapoint.name == datapoint
         ).order_by(DeviceTelemetry.timestamp.desc()).first()
 
         return {
@@ -508,16 +510,18 @@ class DashboardService:
         if not device_id:
             return []
 
-        from app.models.devices import DeviceTelemetry
+        from app.models.devices import Datapoint, DeviceTelemetry
         from datetime import timedelta
 
         cutoff = datetime.utcnow() - timedelta(hours=hours)
 
         results = []
         for dp in datapoints:
-            records = self.db.query(DeviceTelemetry).filter(
+            records = self.db.query(DeviceTelemetry).join(
+                Datapoint, DeviceTelemetry.datapoint_id == Datapoint.id
+            ).filter(
                 DeviceTelemetry.device_id == device_id,
-                DeviceTelemetry.datapoint_name == dp,
+                Datapoint.name == dp,
                 DeviceTelemetry.timestamp >= cutoff
             ).order_by(DeviceTelemetry.timestamp.asc()).all()
 
@@ -14,6 +14,9 @@ from app.models.devices import (
     DeviceEvent, AlarmRule, AlarmSeverity, AlarmCondition
 )
 from app.services.device_onboarding import EdgeKeyResolver
+from app.services.last_seen import last_seen_map
+from app.services.pipeline_metrics import pipeline
+from app.services.presence_tracker import presence_tracker
 
 if TYPE_CHECKING:
     from app.services.alarm_engine import AlarmEngine
@@ -62,19 +65,21 @@ class DataIngestionService:
         
         timestamp = timestamp or datetime.utcnow()
         
-        device = self.resolver.resolve(
-            device_id=device_id,
-            gateway_id=gateway_id,
-            edge_key=edge_key,
-        )
+        with pipeline.stage("resolve_device", source=source):
+            device = self.resolver.resolve(
+                device_id=device_id,
+                gateway_id=gateway_id,
+                edge_key=edge_key,
+            )
         
         if not device:
             logger.warning(f"Device not found: device_id={device_id}, gateway={gateway_id}, edge_key={edge_key}")
             return {"status": "error", "message": "Device not found"}
         
-        device.last_seen_at = timestamp
-        device.last_telemetry_at = timestamp
-        device.is_online = 1
+        # Coming online is written now; routine last-seen updates are batched
+        if presence_tracker.set_device_online(self.db, device, timestamp):
+            device.last_telemetry_at = timestamp
+        presence_tracker.device_seen(device.id, timestamp)
         
         result = {
             "status": "success",
@@ -96,35 +101,38 @@ class DataIngestionService:
             try:
                 dp_def = model_datapoints.get(name)
                 
-                if dp_def:
-                    value = self._normalize_value(raw_value, dp_def)
-                else:
-                    value = self._parse_value(raw_value)
-                
-                telemetry = DeviceTelemetry(
-                    device_id=device.id,
-                    datapoint_id=dp_def.id if dp_def else None,
-                    timestamp=timestamp,
-                    value=value if isinstance(value, (int, float)) else None,
-                    string_value=str(value) if not isinstance(value, (int, float)) else None,
-                    raw_value=float(raw_value) if self._is_numeric(raw_value) else None,
-                    edge_key=edge_key,
-                    quality="good",
-                )
-                self.db.add(telemetry)
-                result["datapoints_stored"] += 1
+                with pipeline.stage("normalize"):
+                    if dp_def:
+                        value = self._normalize_value(raw_value, dp_def)
+                    else:
+                        value = self._parse_value(raw_value)
+                    
+                    telemetry = DeviceTelemetry(
+                        device_id=device.id,
+                        datapoint_id=dp_def.id if dp_def else None,
+                        timestamp=timestamp,
+                        value=value if isinstance(value, (int, float)) else None,
+                        string_value=str(value) if not isinstance(value, (int, float)) else None,
+                        raw_value=float(raw_value) if self._is_numeric(raw_value) else None,
+                        edge_key=edge_key,
+                        quality="good",
+                    )
                 
-                if dp_def:
-                    device_dp = self.db.query(DeviceDatapoint).filter(
-                        DeviceDatapoint.device_id == device.id,
-                        DeviceDatapoint.datapoint_id == dp_def.id
-                    ).first()
+                with pipeline.stage("db_write"):
+                    self.db.add(telemetry)
+                    result["datapoints_stored"] += 1
                     
-                    if device_dp:
-                        device_dp.previous_value = device_dp.current_value
-                        device_dp.current_value = str(value)
-                        device_dp.last_updated_at = timestamp
-                        device_dp.quality = "good"
+                    if dp_def:
+                        device_dp = self.db.query(DeviceDatapoint).filter(
+                            DeviceDatapoint.device_id == device.id,
+                            DeviceDatapoint.datapoint_id == dp_def.id
+                        ).first()
+                        
+                        if device_dp:
+                            device_dp.previous_value = device_dp.current_value
+                            device_dp.current_value = str(value)
+                            device_dp.last_updated_at = timestamp
+                            device_dp.quality = "good"
                 
                 if dp_def and isinstance(value, (int, float)) and self._alarm_engine:
                     events = self._alarm_engine.evaluate(device.id, dp_def, value, timestamp)
@@ -141,6 +149,12 @@ class DataIngestionService:
             except Exception as e:
                 logger.error(f"Error processing datapoint {name}: {e}")
         
+        last_seen_map.touch(
+            device.id,
+            (model_datapoints[name].id for name in datapoints if name in model_datapoints),
+            timestamp
+        )
+
         logger.info(f"Ingested {result['datapoints_stored']} datapoints for device {device.id} from {source}")
         
         return result
@@ -227,7 +241,7 @@ class DataIngestionService:
         device = self.db.query(Device).filter(Device.id == device_id).first()
         if device:
             device.last_seen_at = datetime.utcnow()
-            device.is_online = 1
+            presence_tracker.set_device_online(self.db, device, device.last_seen_at)
         
         logger.info(f"Ingested event from device {device_id}: {title}")
         
@@ -14,6 +14,7 @@ from app.models.devices import (
     DevicePolicy, DeviceType, AuthType, ConfigSyncStatus
 )
 from app.models.integrations import Gateway, GatewayCredentials
+from app.services.presence_tracker import presence_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -243,8 +244,12 @@ class DeviceOnboardingService:
         """Update device online status."""
         device = self.db.query(Device).filter(Device.id == device_id).first()
         if device:
-            device.is_online = 1 if is_online else 0
-            device.last_seen_at = datetime.utcnow()
+            now = datetime.utcnow()
+            if is_online:
+                presence_tracker.set_device_online(self.db, device, now)
+            else:
+                presence_tracker.set_device_offline(self.db, device, now)
+            device.last_seen_at = now
             if last_error:
                 device.last_error = last_error
 
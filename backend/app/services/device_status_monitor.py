@@ -1,11 +1,22 @@
 """Device Status Monitoring Service.
 
-Provides background offline detection for devices based on telemetry timestamps.
+Provides background offline detection for devices and gateways. Each check is
+a single UPDATE ... RETURNING, so the cost does not grow with fleet size and
+the returned rows can be broadcast as status changes.
 """
 from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, update
 from sqlalchemy.orm import Session
 
 from app.models.devices import Device
+from app.models.integrations import Gateway, GatewayStatus
+from app.services.presence_tracker import presence_tracker
+from app.services.uptime_engine import record_status_events
+
+# Gateways without a configured heartbeat interval are expected every 5 minutes
+DEFAULT_HEARTBEAT_SECONDS = 300
+# Missed heartbeat intervals before a gateway is considered offline
+GATEWAY_GRACE_FACTOR = 2
 
 
 def check_device_offline_status(db: Session, offline_threshold_seconds: int = 300):
@@ -17,28 +28,78 @@ def check_device_offline_status(db: Session, offline_threshold_seconds: int = 30
             Default is 300 seconds (5 minutes)
 
     Returns:
-        dict with counts of devices marked offline
+        dict with counts and ids of devices marked offline
     """
     cutoff = datetime.utcnow() - timedelta(seconds=offline_threshold_seconds)
 
-    # Find devices that are marked online but haven't sent telemetry recently
-    devices_to_mark_offline = db.query(Device).filter(
-        Device.is_online == 1,
-        Device.last_telemetry_at < cutoff
-    ).all()
-
-    offline_count = 0
-    for device in devices_to_mark_offline:
-        device.is_online = 0
-        offline_count += 1
-
-    if offline_count > 0:
+    # Flip devices that are marked online but haven't sent telemetry recently
+    went_offline = dict(db.execute(
+        update(Device)
+        .where(Device.is_online == 1, Device.last_telemetry_at < cutoff)
+        .values(is_online=0)
+        .returning(Device.id, Device.last_telemetry_at)
+        .execution_options(synchronize_session=False)
+    ).all())
+    device_ids = list(went_offline)
+
+    if device_ids:
+        # Downtime starts at the last telemetry, not when it was noticed
+        record_status_events(db, went_offline, online=False)
         db.commit()
 
     return {
         "checked_at": datetime.utcnow().isoformat(),
         "threshold_seconds": offline_threshold_seconds,
-        "devices_marked_offline": offline_count
+        "devices_marked_offline": len(device_ids),
+        "device_ids": list(device_ids),
+    }
+
+
+def check_gateway_offline_status(db: Session):
+    """Mark gateways as offline once they miss their heartbeat interval.
+
+    Each gateway gets GATEWAY_GRACE_FACTOR times its own heartbeat interval.
+    The distinct intervals in use are read first so the UPDATE compares
+    against plain timestamps on every database.
+
+    Args:
+        db: Database session
+
+    Returns:
+        dict with counts and ids of gateways marked offline
+    """
+    now = datetime.utcnow()
+    interval = func.coalesce(Gateway.heartbeat_interval_seconds, DEFAULT_HEARTBEAT_SECONDS)
+
+    intervals = db.query(interval).filter(
+        Gateway.status == GatewayStatus.ONLINE
+    ).distinct().all()
+
+    gateways = []
+    if intervals:
+        stale = or_(*(
+            and_(
+                interval == seconds,
+                Gateway.last_seen_at < now - timedelta(seconds=(seconds or DEFAULT_HEARTBEAT_SECONDS) * GATEWAY_GRACE_FACTOR)
+            )
+            for (seconds,) in intervals
+        ))
+        gateways = db.execute(
+            update(Gateway)
+            .where(Gateway.status == GatewayStatus.ONLINE, stale)
+            .values(status=GatewayStatus.OFFLINE)
+            .returning(Gateway.id, Gateway.name)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    if gateways:
+        db.commit()
+
+    return {
+        "checked_at": now.isoformat(),
+        "gateways_marked_offline": len(gateways),
+        "gateway_ids": [g.id for g in gateways],
+        "gateway_names": [g.name for g in gateways],
     }
 
 
@@ -92,7 +153,7 @@ def mark_device_online(db: Session, device_id: int) -> bool:
         return False
 
     now = datetime.utcnow()
-    device.is_online = 1
+    presence_tracker.set_device_online(db, device, now)
     device.last_seen_at = now
     device.last_telemetry_at = now
     device.last_error = None  # Clear any previous error on successful telemetry
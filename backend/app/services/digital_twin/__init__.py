@@ -1,4 +1,9 @@
 """Digital Twin Engine services."""
 from app.services.digital_twin.gap_analysis import GapAnalysisService
+from app.services.digital_twin.hierarchy import (
+    HierarchyService,
+    SiteHierarchy,
+    invalidate_site_hierarchy,
+)
 
-__all__ = ["GapAnalysisService"]
+__all__ = ["GapAnalysisService", "HierarchyService", "SiteHierarchy", "invalidate_site_hierarchy"]
@@ -7,9 +7,10 @@ with the list of active connected Meters to identify missing/unmetered nodes.
 from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 
-from app.models import Asset, Meter, Site
+from app.models import Site
 from app.models.base import AssetType
 from app.schemas import GapAnalysisResult, UnmeteredAsset
+from app.services.digital_twin.hierarchy import HierarchyService
 
 
 class GapAnalysisService:
@@ -21,7 +22,7 @@ class GapAnalysisService:
     for ensuring complete energy monitoring coverage.
     
     Algorithm:
-    1. Build the asset tree for a given site
+    1. Load the cached asset tree for a given site (see HierarchyService)
     2. Identify all assets that require metering (requires_metering = True)
     3. Check which of these assets have an active meter attached
     4. Generate a report of unmetered assets with recommendations
@@ -51,44 +52,28 @@ class GapAnalysisService:
         if not site:
             raise ValueError(f"Site with ID {site_id} not found")
 
-        assets = self.db.query(Asset).filter(Asset.site_id == site_id).all()
-        
-        active_meters = self.db.query(Meter).filter(
-            Meter.site_id == site_id,
-            Meter.is_active == 1
-        ).all()
-        
-        metered_asset_ids = {
-            meter.asset_id for meter in active_meters if meter.asset_id is not None
-        }
+        hierarchy = HierarchyService(self.db).get_hierarchy(site_id)
 
-        asset_dict = {asset.id: asset for asset in assets}
-        
         assets_requiring_metering = [
-            asset for asset in assets if asset.requires_metering
+            asset for asset in hierarchy.nodes if asset.requires_metering
         ]
         
         unmetered_assets: List[UnmeteredAsset] = []
         critical_unmetered_count = 0
 
         for asset in assets_requiring_metering:
-            if asset.id not in metered_asset_ids:
-                hierarchy_path = self._get_hierarchy_path(asset, asset_dict)
-                
-                parent_name = None
-                if asset.parent_id:
-                    parent = asset_dict.get(asset.parent_id)
-                    parent_name = parent.name if parent else None
+            if hierarchy.first_meter(asset.id, active_only=True) is None:
+                parent = hierarchy.get(asset.parent_id) if asset.parent_id else None
 
                 unmetered_asset = UnmeteredAsset(
                     asset_id=asset.id,
                     asset_name=asset.name,
                     asset_type=asset.asset_type,
                     parent_id=asset.parent_id,
-                    parent_name=parent_name,
+                    parent_name=parent.name if parent else None,
                     rated_capacity_kw=asset.rated_capacity_kw,
-                    is_critical=bool(asset.is_critical),
-                    hierarchy_path=hierarchy_path
+                    is_critical=asset.is_critical,
+                    hierarchy_path=hierarchy.path(asset.id)
                 )
                 unmetered_assets.append(unmetered_asset)
 
@@ -109,7 +94,7 @@ class GapAnalysisService:
         return GapAnalysisResult(
             site_id=site_id,
             site_name=site.name,
-            total_assets=len(assets),
+            total_assets=len(hierarchy.nodes),
             metered_assets=metered_count,
             unmetered_assets=len(unmetered_assets),
             coverage_percentage=round(coverage_percentage, 2),
@@ -118,31 +103,6 @@ class GapAnalysisService:
             recommendations=recommendations
         )
 
-    def _get_hierarchy_path(
-        self, asset: Asset, asset_dict: dict
-    ) -> List[str]:
-        """
-        Build the hierarchy path from root to the given asset.
-        
-        Args:
-            asset: The asset to get the path for
-            asset_dict: Dictionary mapping asset IDs to Asset objects
-            
-        Returns:
-            List of asset names from root to the given asset
-        """
-        path = []
-        current = asset
-        
-        while current:
-            path.insert(0, current.name)
-            if current.parent_id:
-                current = asset_dict.get(current.parent_id)
-            else:
-                break
-                
-        return path
-
     def _generate_recommendations(
         self,
         unmetered_assets: List[UnmeteredAsset],
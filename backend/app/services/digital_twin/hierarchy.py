@@ -0,0 +1,369 @@
+"""
+Site Hierarchy Engine for Digital Twin.
+
+Builds the asset/meter tree of a site once in O(n) using parent -> children
+maps, caches it per site (invalidated when changes to assets or meters are
+committed, with a TTL as backstop), and
+computes a vectorized parent-vs-sum-of-children energy balance to flag
+unmetered losses per branch.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.middleware.cache import InMemoryCache
+from app.models import Asset, Meter, MeterReading
+
+logger = logging.getLogger(__name__)
+
+HIERARCHY_CACHE_TTL = 300
+# session.info key for site ids whose cached hierarchy is dropped on commit
+_PENDING_INVALIDATIONS = "hierarchy_invalidations"
+_ALL_SITES = "*"
+
+_hierarchy_cache = InMemoryCache(max_size=512)
+
+
+@dataclass
+class AssetNode:
+    """Lightweight, session-independent snapshot of an asset."""
+    id: int
+    name: str
+    asset_type: Any
+    parent_id: Optional[int]
+    rated_capacity_kw: Optional[float]
+    rated_voltage: Optional[float]
+    is_critical: bool
+    requires_metering: bool
+
+
+@dataclass
+class MeterRef:
+    """Lightweight snapshot of a meter attached to an asset."""
+    id: int
+    meter_id: str
+    asset_id: Optional[int]
+    is_active: bool
+
+
+@dataclass
+class SiteHierarchy:
+    """
+    Asset tree of a site with meters attached.
+
+    Nodes are stored in breadth-first order so that every parent precedes
+    its children; ``parent_index`` and ``metered_ancestor`` are aligned
+    NumPy arrays over that order (-1 where there is none).
+    """
+    site_id: int
+    nodes: List[AssetNode]
+    children: Dict[Optional[int], List[int]]
+    meters_by_asset: Dict[int, List[MeterRef]]
+    index: Dict[int, int] = field(default_factory=dict)
+    parent_index: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    metered_ancestor: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    active_metered: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+
+    @classmethod
+    def build(cls, site_id: int, assets: List[AssetNode], meters: List[MeterRef]) -> "SiteHierarchy":
+        """Build the tree in O(n) from flat asset and meter lists."""
+        by_id = {a.id: a for a in assets}
+        children: Dict[Optional[int], List[int]] = {}
+        for asset in assets:
+            # Orphans (parent missing from the site) are treated as roots
+            parent = asset.parent_id if asset.parent_id in by_id else None
+            children.setdefault(parent, []).append(asset.id)
+
+        meters_by_asset: Dict[int, List[MeterRef]] = {}
+        for meter in meters:
+            if meter.asset_id is not None:
+                meters_by_asset.setdefault(meter.asset_id, []).append(meter)
+
+        # Breadth-first order: parents always precede children
+        order: List[int] = []
+        seen = set()
+
+        def visit(queue: List[int]):
+            while queue:
+                next_level = []
+                for asset_id in queue:
+                    if asset_id in seen:
+                        continue
+                    seen.add(asset_id)
+                    order.append(asset_id)
+                    next_level.extend(children.get(asset_id, []))
+                queue = next_level
+
+        visit(list(children.get(None, [])))
+
+        # Assets in a parent cycle are unreachable from any root; cut the
+        # cycle at its lowest id so they still appear, as roots
+        cut = set()
+        for asset in sorted(assets, key=lambda a: a.id):
+            if asset.id in seen:
+                continue
+            logger.warning(f"Site {site_id}: asset {asset.id} is in a parent cycle; treating it as a root")
+            children[asset.parent_id].remove(asset.id)
+            children.setdefault(None, []).append(asset.id)
+            cut.add(asset.id)
+            visit([asset.id])
+
+        nodes = [by_id[i] for i in order]
+        index = {asset_id: i for i, asset_id in enumerate(order)}
+        parent_index = np.array(
+            [index.get(n.parent_id, -1) if n.parent_id is not None and n.id not in cut else -1 for n in nodes],
+            dtype=np.int64,
+        )
+        active_metered = np.array(
+            [any(m.is_active for m in meters_by_asset.get(n.id, [])) for n in nodes],
+            dtype=bool,
+        )
+
+        metered_ancestor = np.full(len(nodes), -1, dtype=np.int64)
+        for i in range(len(nodes)):
+            parent = parent_index[i]
+            if parent >= 0:
+                metered_ancestor[i] = parent if active_metered[parent] else metered_ancestor[parent]
+
+        return cls(
+            site_id=site_id,
+            nodes=nodes,
+            children=children,
+            meters_by_asset=meters_by_asset,
+            index=index,
+            parent_index=parent_index,
+            metered_ancestor=metered_ancestor,
+            active_metered=active_metered,
+        )
+
+    def get(self, asset_id: int) -> Optional[AssetNode]:
+        i = self.index.get(asset_id)
+        return self.nodes[i] if i is not None else None
+
+    def path(self, asset_id: int) -> List[str]:
+        """Names from the root down to the given asset."""
+        path = []
+        i = self.index.get(asset_id, -1)
+        while i >= 0:
+            path.append(self.nodes[i].name)
+            i = int(self.parent_index[i])
+        return list(reversed(path))
+
+    def first_meter(self, asset_id: int, active_only: bool = False) -> Optional[MeterRef]:
+        for meter in self.meters_by_asset.get(asset_id, []):
+            if meter.is_active or not active_only:
+                return meter
+        return None
+
+    def panel_nodes(self, parent_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Nested node dicts for the single-line panel diagram."""
+        result = []
+        for asset_id in self.children.get(parent_id, []):
+            node = self.get(asset_id)
+            meter = self.first_meter(asset_id)
+            result.append({
+                "id": f"asset-{node.id}",
+                "name": node.name,
+                "type": str(node.asset_type.value) if hasattr(node.asset_type, 'value') else str(node.asset_type),
+                "rated_capacity_kw": node.rated_capacity_kw,
+                "rated_voltage": node.rated_voltage,
+                "is_critical": node.is_critical,
+                "has_meter": meter is not None,
+                "meter_id": meter.meter_id if meter else None,
+                "children": self.panel_nodes(asset_id),
+            })
+        return result
+
+
+class HierarchyService:
+    """Builds, caches and analyzes site asset hierarchies."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_hierarchy(self, site_id: int) -> SiteHierarchy:
+        """Get the cached hierarchy for a site, building it on a miss."""
+        cache_key = f"hierarchy:{site_id}"
+        hierarchy = _hierarchy_cache.get(cache_key)
+        if hierarchy is not None:
+            return hierarchy
+
+        assets = [
+            AssetNode(
+                id=row.id,
+                name=row.name,
+                asset_type=row.asset_type,
+                parent_id=row.parent_id,
+                rated_capacity_kw=row.rated_capacity_kw,
+                rated_voltage=row.rated_voltage,
+                is_critical=bool(row.is_critical),
+                requires_metering=bool(row.requires_metering),
+            )
+            for row in self.db.query(
+                Asset.id, Asset.name, Asset.asset_type, Asset.parent_id,
+                Asset.rated_capacity_kw, Asset.rated_voltage,
+                Asset.is_critical, Asset.requires_metering,
+            ).filter(Asset.site_id == site_id).order_by(Asset.id).all()
+        ]
+        meters = [
+            MeterRef(id=row.id, meter_id=row.meter_id, asset_id=row.asset_id, is_active=bool(row.is_active))
+            for row in self.db.query(
+                Meter.id, Meter.meter_id, Meter.asset_id, Meter.is_active
+            ).filter(Meter.site_id == site_id).order_by(Meter.id).all()
+        ]
+
+        hierarchy = SiteHierarchy.build(site_id, assets, meters)
+        _hierarchy_cache.set(cache_key, hierarchy, ttl=HIERARCHY_CACHE_TTL)
+        return hierarchy
+
+    def energy_balance(
+        self,
+        site_id: int,
+        start: datetime,
+        end: datetime,
+        loss_threshold_percent: float = 5.0
+    ) -> Dict[str, Any]:
+        """
+        Compare each metered branch with the sum of its nearest metered descendants.
+
+        Meter energy for the range is summed in one grouped query; the
+        balance itself is a pair of bincounts over the cached tree arrays.
+
+        Args:
+            site_id: Site ID
+            start: Range start (inclusive)
+            end: Range end (exclusive)
+            loss_threshold_percent: Flag branches whose unmetered share exceeds this
+
+        Returns:
+            Dict with per-branch balance rows and site totals
+        """
+        hierarchy = self.get_hierarchy(site_id)
+        n = len(hierarchy.nodes)
+
+        meter_asset = {
+            m.id: m.asset_id
+            for refs in hierarchy.meters_by_asset.values() for m in refs
+            if m.is_active and m.asset_id in hierarchy.index
+        }
+        energy = np.zeros(n)
+        if meter_asset:
+            rows = self.db.query(
+                MeterReading.meter_id, func.sum(MeterReading.energy_kwh)
+            ).filter(
+                MeterReading.meter_id.in_(meter_asset.keys()),
+                MeterReading.timestamp >= start,
+                MeterReading.timestamp < end
+            ).group_by(MeterReading.meter_id).all()
+            if rows:
+                asset_idx = np.array([hierarchy.index[meter_asset[r[0]]] for r in rows], dtype=np.int64)
+                totals = np.array([r[1] or 0.0 for r in rows], dtype=np.float64)
+                energy = np.bincount(asset_idx, weights=totals, minlength=n)
+
+        metered = hierarchy.active_metered
+        ancestor = hierarchy.metered_ancestor
+        has_ancestor = metered & (ancestor >= 0)
+        children_kwh = np.bincount(ancestor[has_ancestor], weights=energy[has_ancestor], minlength=n)
+        metered_children = np.bincount(ancestor[has_ancestor], minlength=n)
+
+        direct_children = np.bincount(hierarchy.parent_index[hierarchy.parent_index >= 0], minlength=n)
+        direct_unmetered = ~metered & (hierarchy.parent_index >= 0)
+        unmetered_children = np.bincount(hierarchy.parent_index[direct_unmetered], minlength=n)
+
+        loss_kwh = energy - children_kwh
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loss_pct = np.where(energy > 0, loss_kwh / energy * 100.0, 0.0)
+
+        branches = []
+        branch_mask = metered & (direct_children > 0)
+        for i in np.flatnonzero(branch_mask):
+            node = hierarchy.nodes[i]
+            flagged = bool(abs(loss_pct[i]) > loss_threshold_percent)
+            branches.append({
+                "asset_id": node.id,
+                "asset_name": node.name,
+                "hierarchy_path": hierarchy.path(node.id),
+                "metered_kwh": round(float(energy[i]), 3),
+                "children_kwh": round(float(children_kwh[i]), 3),
+                "loss_kwh": round(float(loss_kwh[i]), 3),
+                "loss_percent": round(float(loss_pct[i]), 2),
+                "metered_descendants": int(metered_children[i]),
+                "unmetered_children": int(unmetered_children[i]),
+                "flagged": flagged,
+            })
+
+        roots = metered & (ancestor < 0)
+        return {
+            "site_id": site_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "loss_threshold_percent": loss_threshold_percent,
+            "total_metered_kwh": round(float(energy[roots].sum()), 3),
+            "total_loss_kwh": round(float(loss_kwh[branch_mask].sum()), 3),
+            "flagged_branches": sum(1 for b in branches if b["flagged"]),
+            "branches": branches,
+        }
+
+
+def invalidate_site_hierarchy(site_id: Optional[int] = None) -> None:
+    """Drop the cached hierarchy for a site (or all sites)."""
+    if site_id is None:
+        _hierarchy_cache.clear()
+    else:
+        _hierarchy_cache.delete(f"hierarchy:{site_id}")
+
+
+def _invalidate_on_change(mapper, connection, target):
+    # A meter or asset moved between sites invalidates the old site too
+    site_ids = {target.site_id, *inspect(target).attrs.site_id.history.deleted} - {None}
+    session = object_session(target)
+    if session is None:
+        for site_id in site_ids:
+            invalidate_site_hierarchy(site_id)
+    else:
+        # Evicting at flush would let a concurrent read re-cache the old tree
+        # before commit; defer to after_commit instead
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(site_ids)
+
+
+def _invalidate_on_bulk_change(orm_execute_state):
+    """Bulk UPDATE/DELETE skips mapper events; affected sites are unknown, so drop all on commit."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (Asset, Meter):
+        orm_execute_state.session.info.setdefault(_PENDING_INVALIDATIONS, set()).add(_ALL_SITES)
+
+
+def _apply_invalidations(session):
+    pending = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if not pending:
+        return
+    if _ALL_SITES in pending:
+        invalidate_site_hierarchy()
+        return
+    for site_id in pending:
+        invalidate_site_hierarchy(site_id)
+
+
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+for _model in (Asset, Meter):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _invalidate_on_change)
+
+event.listen(Session, "do_orm_execute", _invalidate_on_bulk_change)
+event.listen(Session, "after_commit", _apply_invalidations)
+event.listen(Session, "after_rollback", _discard_invalidations)
+
+
+def get_hierarchy_service(db: Session) -> HierarchyService:
+    """Factory function to create a HierarchyService instance."""
+    return HierarchyService(db)
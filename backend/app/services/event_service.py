@@ -5,15 +5,22 @@ Handles discrete device events (vs continuous telemetry):
 - System events
 - User actions
 - Maintenance events
+
+Correlation and timeline statistics run in SQL: events are grouped into
+islands with LAG (a gap longer than the correlation window starts a new
+island) and a running SUM numbering the islands, so only correlated
+events come back to Python. ix_device_event_time on (device_id,
+triggered_at) covers these queries on PostgreSQL.
 """
 import json
 import logging
 from datetime import datetime, timedelta
+from itertools import groupby
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import DateTime, and_, case, distinct, or_, func, select
 
 from app.models.devices import Device, DeviceEvent, AlarmSeverity
 
@@ -42,6 +49,8 @@ class CorrelatedEventGroup:
     time_window_end: datetime
     event_count: int
     summary: str
+    device_ids: List[int] = field(default_factory=list)
+    site_id: Optional[int] = None
 
 
 @dataclass
@@ -178,7 +187,8 @@ class EventService:
     def correlate(
         self,
         device_id: int,
-        time_window_seconds: int = 60
+        time_window_seconds: int = 60,
+        hours: int = 24
     ) -> List[CorrelatedEventGroup]:
         """
         Group related events that occurred close together.
@@ -186,52 +196,59 @@ class EventService:
         Args:
             device_id: Device ID
             time_window_seconds: Time window for correlation
+            hours: How far back to look
 
         Returns:
             List of CorrelatedEventGroup
         """
-        # Get recent events
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        events = self.db.query(DeviceEvent).filter(
-            DeviceEvent.device_id == device_id,
-            DeviceEvent.triggered_at >= cutoff
-        ).order_by(DeviceEvent.triggered_at).all()
-
-        if not events:
-            return []
-
-        groups = []
-        current_group = [events[0]]
-        group_start = events[0].triggered_at
-
-        for event in events[1:]:
-            time_diff = (event.triggered_at - current_group[-1].triggered_at).total_seconds()
-
-            if time_diff <= time_window_seconds:
-                # Same group
-                current_group.append(event)
-            else:
-                # New group
-                if len(current_group) > 1:
-                    groups.append(self._create_correlated_group(
-                        current_group, device_id, group_start
-                    ))
-                current_group = [event]
-                group_start = event.triggered_at
-
-        # Handle last group
-        if len(current_group) > 1:
-            groups.append(self._create_correlated_group(
-                current_group, device_id, group_start
-            ))
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
+        return self._correlated_groups(
+            [DeviceEvent.device_id == device_id, DeviceEvent.triggered_at >= cutoff],
+            time_window_seconds
+        )
+
+    def correlate_site(
+        self,
+        site_id: int,
+        start: datetime,
+        end: datetime,
+        time_window_seconds: int = 60,
+        min_devices: int = 2
+    ) -> List[CorrelatedEventGroup]:
+        """
+        Group events across a site's devices that occurred close together,
+        e.g. a feeder trip seen by every meter behind it.
 
+        Args:
+            site_id: Site ID
+            start: Start time
+            end: End time
+            time_window_seconds: Time window for correlation
+            min_devices: Minimum distinct devices in a group
+
+        Returns:
+            List of CorrelatedEventGroup in time order
+        """
+        site_devices = select(Device.id).where(Device.site_id == site_id)
+        groups = self._correlated_groups(
+            [
+                DeviceEvent.device_id.in_(site_devices),
+                DeviceEvent.triggered_at >= start,
+                DeviceEvent.triggered_at <= end
+            ],
+            time_window_seconds,
+            min_devices=min_devices
+        )
+        for group in groups:
+            group.site_id = site_id
         return groups
 
     def get_timeline(
         self,
         device_id: int,
         start: datetime,
-        end: datetime
+        end: datetime,
+        limit: Optional[int] = None
     ) -> EventTimeline:
         """
         Get event timeline for visualization.
@@ -240,50 +257,53 @@ class EventService:
             device_id: Device ID
             start: Start time
             end: End time
+            limit: Max events listed (counts always cover the whole range)
 
         Returns:
             EventTimeline with events and statistics
         """
-        events = self.db.query(DeviceEvent).filter(
+        criteria = [
             DeviceEvent.device_id == device_id,
             DeviceEvent.triggered_at >= start,
             DeviceEvent.triggered_at <= end
-        ).order_by(DeviceEvent.triggered_at).all()
-
-        # Count by type and severity
-        by_type = {}
-        by_severity = {}
-
-        event_list = []
-        for event in events:
-            # Count by type
-            et = event.event_type or "unknown"
-            by_type[et] = by_type.get(et, 0) + 1
-
-            # Count by severity
-            sev = event.severity.value if event.severity else "unknown"
-            by_severity[sev] = by_severity.get(sev, 0) + 1
-
-            # Build event dict
-            event_list.append({
-                "id": event.id,
-                "timestamp": event.triggered_at.isoformat() if event.triggered_at else None,
-                "type": event.event_type,
-                "severity": sev,
-                "title": event.title,
-                "message": event.message,
-                "is_active": bool(event.is_active),
-                "cleared_at": event.cleared_at.isoformat() if event.cleared_at else None
-            })
+        ]
+        counts = self._counts(criteria)
+
+        query = select(
+            DeviceEvent.id,
+            DeviceEvent.triggered_at,
+            DeviceEvent.event_type,
+            DeviceEvent.severity,
+            DeviceEvent.title,
+            DeviceEvent.message,
+            DeviceEvent.is_active,
+            DeviceEvent.cleared_at
+        ).where(*criteria).order_by(DeviceEvent.triggered_at, DeviceEvent.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        event_list = [
+            {
+                "id": row.id,
+                "timestamp": row.triggered_at.isoformat() if row.triggered_at else None,
+                "type": row.event_type,
+                "severity": row.severity.value if row.severity else "unknown",
+                "title": row.title,
+                "message": row.message,
+                "is_active": bool(row.is_active),
+                "cleared_at": row.cleared_at.isoformat() if row.cleared_at else None
+            }
+            for row in self.db.execute(query)
+        ]
 
         return EventTimeline(
             device_id=device_id,
             start=start,
             end=end,
             events=event_list,
-            event_count=len(events),
-            by_type=by_type,
-            by_severity=by_severity
+            event_count=counts["total"],
+            by_type=counts["by_type"],
+            by_severity=counts["by_severity"]
         )
 
     def acknowledge_event(
@@ -375,43 +395,17 @@ class EventService:
         Returns:
             Dict with event statistics
         """
-        query = self.db.query(DeviceEvent)
-
+        criteria = []
         if device_id:
-            query = query.filter(DeviceEvent.device_id == device_id)
+            criteria.append(DeviceEvent.device_id == device_id)
         if site_id:
-            query = query.join(Device).filter(Device.site_id == site_id)
+            criteria.append(DeviceEvent.device_id.in_(select(Device.id).where(Device.site_id == site_id)))
         if start:
-            query = query.filter(DeviceEvent.triggered_at >= start)
+            criteria.append(DeviceEvent.triggered_at >= start)
         if end:
-            query = query.filter(DeviceEvent.triggered_at <= end)
-
-        events = query.all()
-
-        # Calculate statistics
-        total = len(events)
-        active = sum(1 for e in events if e.is_active)
-        acknowledged = sum(1 for e in events if e.acknowledged_at)
-        cleared = sum(1 for e in events if e.cleared_at)
-
-        by_type = {}
-        by_severity = {}
-
-        for event in events:
-            et = event.event_type or "unknown"
-            by_type[et] = by_type.get(et, 0) + 1
+            criteria.append(DeviceEvent.triggered_at <= end)
 
-            sev = event.severity.value if event.severity else "unknown"
-            by_severity[sev] = by_severity.get(sev, 0) + 1
-
-        return {
-            "total": total,
-            "active": active,
-            "acknowledged": acknowledged,
-            "cleared": cleared,
-            "by_type": by_type,
-            "by_severity": by_severity
-        }
+        return self._counts(criteria)
 
     def bulk_clear_events(
         self,
@@ -451,28 +445,111 @@ class EventService:
         """Add handler for new events."""
         self._event_handlers.append(handler)
 
-    def _create_correlated_group(
+    def _counts(self, criteria: List[Any]) -> Dict[str, Any]:
+        """Event totals and breakdowns from one grouped query."""
+        rows = self.db.execute(
+            select(
+                DeviceEvent.event_type,
+                DeviceEvent.severity,
+                func.count().label("total"),
+                func.sum(case((DeviceEvent.is_active != 0, 1), else_=0)).label("active"),
+                func.count(DeviceEvent.acknowledged_at).label("acknowledged"),
+                func.count(DeviceEvent.cleared_at).label("cleared")
+            ).where(*criteria).group_by(DeviceEvent.event_type, DeviceEvent.severity)
+        ).all()
+
+        stats = {"total": 0, "active": 0, "acknowledged": 0, "cleared": 0, "by_type": {}, "by_severity": {}}
+        for row in rows:
+            stats["total"] += row.total
+            stats["active"] += row.active or 0
+            stats["acknowledged"] += row.acknowledged
+            stats["cleared"] += row.cleared
+
+            et = row.event_type or "unknown"
+            stats["by_type"][et] = stats["by_type"].get(et, 0) + row.total
+
+            sev = row.severity.value if row.severity else "unknown"
+            stats["by_severity"][sev] = stats["by_severity"].get(sev, 0) + row.total
+
+        return stats
+
+    def _seconds_between(self, later, earlier):
+        """SQL expression for the seconds from earlier to later."""
+        if self.db.get_bind().dialect.name == "postgresql":
+            return func.extract("epoch", later - earlier)
+        # Rounded to the millisecond so float error in julianday doesn't split groups
+        return func.round((func.julianday(later) - func.julianday(earlier)) * 86400.0, 3)
+
+    def _correlated_groups(
         self,
-        events: List[DeviceEvent],
-        device_id: int,
-        group_start: datetime
-    ) -> CorrelatedEventGroup:
-        """Create a correlated event group."""
+        criteria: List[Any],
+        time_window_seconds: int,
+        min_devices: int = 1
+    ) -> List[CorrelatedEventGroup]:
+        """
+        Gaps-and-islands over the events matching criteria.
+
+        An event more than time_window_seconds after the previous one starts
+        a new island and a running SUM of those starts numbers the islands.
+        Only events of islands with at least two events (and min_devices
+        distinct devices) are returned.
+        """
+        order = (DeviceEvent.triggered_at, DeviceEvent.id)
+        events = select(
+            DeviceEvent.id,
+            DeviceEvent.device_id,
+            DeviceEvent.event_type,
+            DeviceEvent.triggered_at,
+            func.lag(DeviceEvent.triggered_at, type_=DateTime).over(order_by=order).label("previous_at")
+        ).where(*criteria).subquery()
+
+        gap = self._seconds_between(events.c.triggered_at, events.c.previous_at)
+        starts = case((events.c.previous_at.is_(None), 1), (gap > time_window_seconds, 1), else_=0)
+        numbered = select(
+            events.c.id,
+            events.c.device_id,
+            events.c.event_type,
+            events.c.triggered_at,
+            func.sum(starts).over(order_by=(events.c.triggered_at, events.c.id)).label("island")
+        ).cte("numbered")
+
+        islands = select(numbered.c.island).group_by(numbered.c.island).having(
+            func.count() > 1,
+            func.count(distinct(numbered.c.device_id)) >= min_devices
+        )
+        rows = self.db.execute(
+            select(numbered)
+            .where(numbered.c.island.in_(islands))
+            .order_by(numbered.c.island, numbered.c.triggered_at, numbered.c.id)
+        ).all()
+
+        return [
+            self._create_correlated_group(list(members))
+            for _, members in groupby(rows, key=lambda row: row.island)
+        ]
+
+    def _create_correlated_group(self, events: List[Any]) -> CorrelatedEventGroup:
+        """Create a correlated event group from rows in time order."""
         primary = events[0]
-        related_ids = [e.id for e in events[1:]]
+        first_at = primary.triggered_at
+        last_at = events[-1].triggered_at
+        device_ids = sorted(set(e.device_id for e in events))
 
         # Build summary
-        types = set(e.event_type for e in events)
-        summary = f"{len(events)} events ({', '.join(types)}) within {(events[-1].triggered_at - group_start).seconds}s"
+        types = sorted(set(e.event_type for e in events))
+        summary = f"{len(events)} events ({', '.join(types)}) within {int((last_at - first_at).total_seconds())}s"
+        if len(device_ids) > 1:
+            summary += f" on {len(device_ids)} devices"
 
         return CorrelatedEventGroup(
             primary_event_id=primary.id,
-            related_event_ids=related_ids,
-            device_id=device_id,
-            time_window_start=group_start,
-            time_window_end=events[-1].triggered_at,
+            related_event_ids=[e.id for e in events[1:]],
+            device_id=primary.device_id,
+            time_window_start=first_at,
+            time_window_end=last_at,
             event_count=len(events),
-            summary=summary
+            summary=summary,
+            device_ids=device_ids
         )
 
 
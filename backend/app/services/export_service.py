@@ -19,7 +19,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
 
 from app.core.database import Base
-from app.models.devices import Device, DeviceTelemetry
+from app.models.devices import Datapoint, Device, DeviceTelemetry
 
 logger = logging.getLogger(__name__)
 
@@ -240,7 +240,9 @@ class ExportService:
         organization_id: Optional[int] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """Fetch telemetry data."""
-        query = self.db.query(DeviceTelemetry)
+        query = self.db.query(DeviceTelemetry, Datapoint.name, Datapoint.unit).outerjoin(
+            Datapoint, DeviceTelemetry.datapoint_id == Datapoint.id
+        )
 
         if filters.get("device_id"):
             query = query.filter(DeviceTelemetry.device_id == filters["device_id"])
@@ -264,13 +266,13 @@ class ExportService:
             if not batch:
                 break
 
-            for record in batch:
+            for record, datapoint, unit in batch:
                 yield {
                     "timestamp": record.timestamp.isoformat() if record.timestamp else None,
                     "device_id": record.device_id,
-                    "datapoint": record.datapoint_name,
+                    "datapoint": datapoint,
                     "value": record.value,
-                    "unit": getattr(record, 'unit', None)
+                    "unit": unit
                 }
 
             offset += batch_size
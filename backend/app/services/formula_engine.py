@@ -0,0 +1,214 @@
+"""
+Formula Engine for SAVE-IT.AI
+Parses KPI / virtual meter formulas once into a validated AST and compiles
+them into NumPy-vectorized callables:
+- Whitelisted syntax only (numbers, variables, arithmetic, safe functions)
+- Compiled formulas cached by formula text
+- Scalar evaluation and whole time-series evaluation from the same code object
+"""
+import ast
+import logging
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache, reduce
+from typing import Dict, Mapping, FrozenSet
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _variadic(ufunc):
+    """Wrap a binary ufunc so it accepts any number of arguments (min/max)."""
+    def apply(*args):
+        if not args:
+            raise ValueError(f"{ufunc.__name__} requires at least one argument")
+        return reduce(ufunc, args)
+    return apply
+
+
+def _avg(*args):
+    """Element-wise mean of the arguments."""
+    if not args:
+        raise ValueError("avg requires at least one argument")
+    return reduce(np.add, args) / len(args)
+
+
+SAFE_FUNCTIONS = {
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+    'min': _variadic(np.minimum),
+    'max': _variadic(np.maximum),
+    'avg': _avg,
+    'round': np.round,
+    # Powers run in float64 so huge exponents overflow instead of growing big ints
+    'pow': np.float_power,
+    'log': np.log,
+    'log10': np.log10,
+    'exp': np.exp,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'floor': np.floor,
+    'ceil': np.ceil,
+}
+
+SAFE_NAMES = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+_ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod)
+_ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+MAX_FORMULA_LENGTH = 2000
+
+
+class _FormulaValidator(ast.NodeTransformer):
+    """
+    Walks a parsed formula and rejects anything outside the whitelist.
+    Collects the free variable names referenced by the formula.
+    """
+
+    def __init__(self):
+        self.variables = set()
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _ALLOWED_BINOPS):
+            raise ValueError(f"Operator not allowed: {type(node.op).__name__}")
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if isinstance(node.op, ast.Pow):
+            # a ** b becomes pow(a, b): integer ** would compute 9**9**9 exactly
+            call = ast.Call(func=ast.Name(id="pow", ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+            return ast.copy_location(call, node)
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _ALLOWED_UNARYOPS):
+            raise ValueError(f"Operator not allowed: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in SAFE_FUNCTIONS:
+            name = getattr(node.func, "id", type(node.func).__name__)
+            raise ValueError(f"Function not allowed: {name}")
+        if node.keywords:
+            raise ValueError("Keyword arguments are not allowed in formulas")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            raise ValueError(f"Invalid use of name: {node.id}")
+        if node.id.startswith("_"):
+            raise ValueError(f"Invalid variable name: {node.id}")
+        if node.id not in SAFE_FUNCTIONS and node.id not in SAFE_NAMES:
+            self.variables.add(node.id)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Constant not allowed: {node.value!r}")
+        return node
+
+    def generic_visit(self, node):
+        raise ValueError(f"Syntax not allowed in formula: {type(node).__name__}")
+
+
+@dataclass(frozen=True)
+class CompiledFormula:
+    """A validated, compiled formula ready for scalar or vectorized evaluation."""
+    source: str
+    variables: FrozenSet[str]
+    code: object = field(repr=False, compare=False)
+
+    def _namespace(self, values: Mapping[str, object]) -> Dict[str, object]:
+        missing = self.variables - values.keys()
+        if missing:
+            raise ValueError(f"Missing formula variables: {', '.join(sorted(missing))}")
+        namespace = dict(SAFE_FUNCTIONS)
+        namespace.update(SAFE_NAMES)
+        for name in self.variables:
+            namespace[name] = values[name]
+        # Caller-supplied variables shadow built-in constants (e.g. a variable named "e")
+        for name in SAFE_NAMES.keys() & values.keys():
+            namespace[name] = values[name]
+        return namespace
+
+    def evaluate(self, variables: Mapping[str, float]) -> float:
+        """
+        Evaluate the formula for a single set of scalar variable values.
+
+        Raises:
+            ValueError: On missing variables, division by zero or invalid math
+        """
+        namespace = self._namespace({k: np.float64(v) for k, v in variables.items()})
+        try:
+            with np.errstate(divide='raise', invalid='raise', over='raise'):
+                result = eval(self.code, {"__builtins__": {}}, namespace)
+        except Exception as e:
+            raise ValueError(f"Formula evaluation error: {e}")
+        return float(result)
+
+    def evaluate_series(self, series: Mapping[str, object]) -> np.ndarray:
+        """
+        Evaluate the formula over aligned arrays of variable values in one pass.
+
+        All arrays must share the same length (scalars are broadcast).
+        Intervals that divide by zero or hit invalid math yield NaN instead of
+        failing the whole series.
+
+        Returns:
+            float64 array with one result per interval
+        """
+        arrays = {k: np.asarray(v, dtype=np.float64) for k, v in series.items()}
+        namespace = self._namespace(arrays)
+        try:
+            with np.errstate(all='ignore'):
+                result = eval(self.code, {"__builtins__": {}}, namespace)
+        except Exception as e:
+            raise ValueError(f"Formula evaluation error: {e}")
+
+        # A copy, so a formula that is just a variable doesn't hand back the caller's array
+        result = np.array(result, dtype=np.float64)
+        lengths = {a.shape[0] for a in arrays.values() if a.ndim > 0}
+        if result.ndim == 0 and lengths:
+            result = np.full(lengths.pop(), float(result))
+        result[~np.isfinite(result)] = np.nan
+        return result
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    Parse, validate and compile a formula. Results are cached by formula text.
+
+    Raises:
+        ValueError: If the formula is empty, malformed or uses disallowed syntax
+    """
+    if not formula or not formula.strip():
+        raise ValueError("Empty formula")
+    if len(formula) > MAX_FORMULA_LENGTH:
+        raise ValueError(f"Formula exceeds {MAX_FORMULA_LENGTH} characters")
+
+    # Replace ^ with ** for power (before parsing, so precedence matches **)
+    try:
+        tree = ast.parse(formula.strip().replace('^', '**'), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid formula syntax: {e.msg}")
+
+    validator = _FormulaValidator()
+    tree = ast.fix_missing_locations(validator.visit(tree))
+    code = compile(tree, "<formula>", "eval")
+
+    return CompiledFormula(
+        source=formula,
+        variables=frozenset(validator.variables),
+        code=code,
+    )
@@ -0,0 +1,473 @@
+"""
+Ingestion benchmark for SAVE-IT.AI.
+
+Simulates a fleet of gateways publishing saveit-topic and Teltonika
+payloads and drives them through the production path:
+MQTTSubscriber.process_message -> DataIngestionHandler -> AlarmEngine.
+An in-process broker stands in for Mosquitto, so the numbers cover the
+backend and its database only.
+
+Reports sustained messages/sec, publish-to-commit latency percentiles and
+telemetry rows/sec, and compares them with a recorded baseline.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.core import Site
+from app.models.devices import (
+    AlarmCondition, AlarmRule, AlarmSeverity, Datapoint, DatapointType,
+    Device, DeviceDatapoint, DeviceEvent, DeviceModel, DeviceTelemetry
+)
+from app.models.integrations import CommunicationLog, Gateway
+from app.models.telemetry import DeviceAlarm
+from app.services.mqtt_subscriber import DataIngestionHandler, MQTTMessage, MQTTSubscriber
+from app.services.pipeline_metrics import pipeline
+
+logger = logging.getLogger(__name__)
+
+# Nominal values of an energy meter; extra datapoints become generic registers
+METER_DATAPOINTS = {
+    "voltage_l1": 230.0, "voltage_l2": 230.0, "voltage_l3": 230.0,
+    "current_l1": 40.0, "current_l2": 40.0, "current_l3": 40.0,
+    "active_power": 27.0, "reactive_power": 6.0, "apparent_power": 28.0,
+    "power_factor": 0.95, "frequency": 50.0, "total_energy": 150000.0,
+    "import_energy": 140000.0, "export_energy": 10000.0,
+}
+
+# Lower is worse for these; higher is worse for everything else
+THROUGHPUT_METRICS = ("messages_per_second", "rows_per_second")
+LATENCY_METRICS = ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms")
+
+
+@dataclass
+class IngestLoadConfig:
+    """Shape and rate of the simulated fleet."""
+    gateways: int = 10
+    devices_per_gateway: int = 10
+    datapoints_per_device: int = 14
+    rate: float = 0.0  # messages/sec across the fleet; 0 publishes as fast as ingestion keeps up
+    duration: float = 30.0
+    teltonika_ratio: float = 0.5  # share of gateways sending Teltonika Modbus payloads
+    alarm_rules: int = 2  # datapoints per device model with a threshold rule
+    alarm_probability: float = 0.01  # chance a reading crosses its threshold
+    seed: int = 42
+
+
+@dataclass
+class SimulatedDevice:
+    device_id: int
+    edge_key: str
+    slave_id: int
+
+
+@dataclass
+class SimulatedGateway:
+    gateway_id: int
+    serial: str
+    teltonika: bool
+    devices: List[SimulatedDevice] = field(default_factory=list)
+
+
+@dataclass
+class BenchmarkFleet:
+    """Rows created for one benchmark run."""
+    site_id: int
+    model_id: int
+    datapoints: Dict[str, float]
+    thresholds: Dict[str, float]
+    gateways: List[SimulatedGateway]
+
+    @property
+    def device_ids(self) -> List[int]:
+        return [d.device_id for gw in self.gateways for d in gw.devices]
+
+
+def _datapoint_values(count: int) -> Dict[str, float]:
+    values = dict(list(METER_DATAPOINTS.items())[:count])
+    for i in range(len(values), count):
+        values[f"register_{i}"] = 100.0
+    return values
+
+
+def seed_fleet(db: Session, config: IngestLoadConfig) -> BenchmarkFleet:
+    """Create a site, device model, gateways and devices for a run."""
+    tag = uuid.uuid4().hex[:8]
+    site = Site(name=f"Benchmark fleet {tag}")
+    model = DeviceModel(name=f"Benchmark meter {tag}", is_active=1)
+    db.add_all([site, model])
+    db.flush()
+
+    values = _datapoint_values(config.datapoints_per_device)
+    datapoints = [
+        Datapoint(model_id=model.id, name=name, data_type=DatapointType.FLOAT, display_order=i)
+        for i, name in enumerate(values)
+    ]
+    db.add_all(datapoints)
+    db.flush()
+
+    thresholds = {}
+    for dp in datapoints[:config.alarm_rules]:
+        thresholds[dp.name] = values[dp.name] * 1.2
+        db.add(AlarmRule(
+            model_id=model.id,
+            datapoint_id=dp.id,
+            name=f"{dp.name} high",
+            condition=AlarmCondition.GREATER_THAN,
+            threshold_value=thresholds[dp.name],
+            severity=AlarmSeverity.WARNING,
+            auto_clear=1,
+        ))
+
+    teltonika_gateways = round(config.gateways * config.teltonika_ratio)
+    gateways = []
+    for g in range(config.gateways):
+        teltonika = g < teltonika_gateways
+        serial = f"BM{tag}{g:04d}"
+        gateway = Gateway(
+            site_id=site.id,
+            name=f"Benchmark gateway {g}",
+            serial_number=serial,
+            model="RUT240" if teltonika else "SAVE-IT Edge",
+            manufacturer="Teltonika" if teltonika else "SAVE-IT",
+        )
+        db.add(gateway)
+        db.flush()
+        simulated = SimulatedGateway(gateway_id=gateway.id, serial=serial, teltonika=teltonika)
+
+        devices = []
+        for d in range(config.devices_per_gateway):
+            slave_id = d + 1
+            # The Teltonika parser keys peripherals by Modbus slave id
+            edge_key = f"modbus_{slave_id}" if teltonika else f"meter-{d}"
+            devices.append(Device(
+                site_id=site.id,
+                model_id=model.id,
+                gateway_id=gateway.id,
+                name=f"Benchmark meter {g}.{d}",
+                edge_key=edge_key,
+                slave_id=slave_id,
+                is_active=1,
+                is_online=1,
+            ))
+        db.add_all(devices)
+        db.flush()
+        db.add_all([
+            DeviceDatapoint(device_id=device.id, datapoint_id=dp.id)
+            for device in devices for dp in datapoints
+        ])
+        simulated.devices = [
+            SimulatedDevice(device_id=device.id, edge_key=device.edge_key, slave_id=device.slave_id)
+            for device in devices
+        ]
+        gateways.append(simulated)
+
+    db.commit()
+    return BenchmarkFleet(
+        site_id=site.id,
+        model_id=model.id,
+        datapoints=values,
+        thresholds=thresholds,
+        gateways=gateways,
+    )
+
+
+def teardown_fleet(db: Session, fleet: BenchmarkFleet):
+    """Delete everything a run created, telemetry included."""
+    device_ids = fleet.device_ids
+    gateway_ids = [gw.gateway_id for gw in fleet.gateways]
+    for model, column in (
+        (DeviceTelemetry, DeviceTelemetry.device_id),
+        (DeviceAlarm, DeviceAlarm.device_id),
+        (DeviceEvent, DeviceEvent.device_id),
+        (DeviceDatapoint, DeviceDatapoint.device_id),
+        (Device, Device.id),
+    ):
+        db.query(model).filter(column.in_(device_ids)).delete(synchronize_session=False)
+    db.query(CommunicationLog).filter(
+        CommunicationLog.gateway_id.in_(gateway_ids)
+    ).delete(synchronize_session=False)
+    db.query(Gateway).filter(Gateway.id.in_(gateway_ids)).delete(synchronize_session=False)
+    db.query(AlarmRule).filter(AlarmRule.model_id == fleet.model_id).delete(synchronize_session=False)
+    db.query(Datapoint).filter(Datapoint.model_id == fleet.model_id).delete(synchronize_session=False)
+    db.query(DeviceModel).filter(DeviceModel.id == fleet.model_id).delete(synchronize_session=False)
+    db.query(Site).filter(Site.id == fleet.site_id).delete(synchronize_session=False)
+    db.commit()
+
+
+class PayloadFactory:
+    """Builds realistic readings for the fleet's two payload formats."""
+
+    def __init__(self, fleet: BenchmarkFleet, config: IngestLoadConfig):
+        self.fleet = fleet
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    def _value(self, name: str, nominal: float) -> float:
+        threshold = self.fleet.thresholds.get(name)
+        if threshold is not None and self.rng.random() < self.config.alarm_probability:
+            return round(threshold * 1.1, 3)
+        return round(nominal * self.rng.uniform(0.97, 1.03), 3)
+
+    @staticmethod
+    def _register(index: int, name: str, value: float) -> Dict[str, Any]:
+        raw = int(value * 100)
+        return {
+            "address": index * 2,
+            "value": raw,
+            "raw_values": [raw >> 16, raw & 0xFFFF],
+            "type": "holding",
+            "name": name,
+            "data_type": "UINT32",
+            "scale": 0.01,
+        }
+
+    def message(self, gateway: SimulatedGateway, device: SimulatedDevice) -> tuple:
+        """Topic and payload bytes for one reading of a device."""
+        values = {name: self._value(name, nominal) for name, nominal in self.fleet.datapoints.items()}
+        if gateway.teltonika:
+            payload = {
+                "id": gateway.serial,
+                "ts": int(time.time() * 1000),
+                "slave_id": device.slave_id,
+                "registers": [self._register(i, name, value) for i, (name, value) in enumerate(values.items())],
+            }
+        else:
+            payload = {"edge_key": device.edge_key, **values}
+        return f"saveit/{gateway.gateway_id}/telemetry", json.dumps(payload).encode()
+
+
+class InProcessBroker:
+    """
+    Stand-in for Mosquitto: a bounded queue drained the way
+    MQTTSubscriber.start drains the real client.
+    """
+
+    def __init__(self, subscriber: MQTTSubscriber, maxsize: int = 256):
+        self.subscriber = subscriber
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Publish times in delivery order, consumed as readings are committed
+        self.published: Deque[float] = deque()
+        self.delivered = 0
+
+    async def publish(self, topic: str, payload: bytes):
+        await self.queue.put((topic, payload))
+        self.published.append(time.perf_counter())
+
+    async def run(self):
+        while True:
+            topic, payload = await self.queue.get()
+            try:
+                with pipeline.stage("parse"):
+                    message = MQTTMessage.from_raw(topic, payload)
+                await self.subscriber.process_message(message)
+                self.delivered += 1
+            finally:
+                self.queue.task_done()
+
+
+class TimedIngestionHandler(DataIngestionHandler):
+    """DataIngestionHandler that records publish-to-commit latency per reading."""
+
+    def __init__(self, db_session_factory, published: Deque[float], alarm_engine=None):
+        super().__init__(db_session_factory, alarm_engine=alarm_engine)
+        self.published = published
+        self.latencies: List[float] = []
+
+    async def flush_buffer(self):
+        count = len(self._buffer)
+        await super().flush_buffer()
+        committed = time.perf_counter()
+        for _ in range(min(count, len(self.published))):
+            self.latencies.append(committed - self.published.popleft())
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+@dataclass
+class IngestBenchmarkResult:
+    """Outcome of one benchmark run."""
+    config: IngestLoadConfig
+    database: str
+    started_at: datetime
+    duration_seconds: float
+    messages: int
+    rows: int
+    alarms: int
+    latencies: List[float]
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.duration_seconds if self.duration_seconds else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.duration_seconds if self.duration_seconds else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        return {
+            "messages_per_second": round(self.messages_per_second, 1),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "latency_p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "latency_p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "database": self.database,
+            "started_at": self.started_at.isoformat(),
+            "config": asdict(self.config),
+            "duration_seconds": round(self.duration_seconds, 2),
+            "messages": self.messages,
+            "rows": self.rows,
+            "alarms": self.alarms,
+            "metrics": self.metrics(),
+        }
+
+
+async def _publish(broker: InProcessBroker, factory: PayloadFactory, gateway: SimulatedGateway,
+                   interval: float, deadline: float) -> int:
+    """One gateway cycling through its devices until the deadline."""
+    sent = 0
+    next_send = time.perf_counter()
+    while time.perf_counter() < deadline:
+        device = gateway.devices[sent % len(gateway.devices)]
+        await broker.publish(*factory.message(gateway, device))
+        sent += 1
+        if interval:
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif sent % 50 == 0:
+            await asyncio.sleep(0)
+    return sent
+
+
+async def run_ingest_benchmark(
+    config: IngestLoadConfig,
+    session_factory: Optional[Callable[[], Session]] = None,
+    keep_data: bool = False,
+) -> IngestBenchmarkResult:
+    """Seed a fleet, publish for config.duration seconds and measure ingestion."""
+    from app.services.alarm_aggregator import AlarmEventAggregator
+    from app.services.alarm_engine import AlarmEngine
+
+    if session_factory is None:
+        from app.core.database import SessionLocal as session_factory
+
+    db = session_factory()
+    alarm_db = session_factory()
+    fleet = seed_fleet(db, config)
+    database = db.get_bind().dialect.name
+    broker_task = None
+    alarm_engine = AlarmEngine(alarm_db)
+    # Alarm rows are committed in batches by the aggregator, as in production
+    aggregator = AlarmEventAggregator(alarm_engine)
+    try:
+        await aggregator.start()
+        subscriber = MQTTSubscriber()
+        broker = InProcessBroker(subscriber)
+        handler = TimedIngestionHandler(session_factory, broker.published, alarm_engine=alarm_engine)
+        subscriber.add_handler("data", handler.handle_data_message)
+        subscriber.add_handler("telemetry", handler.handle_data_message)
+
+        factory = PayloadFactory(fleet, config)
+        per_gateway_rate = config.rate / len(fleet.gateways) if config.rate else 0
+        interval = 1 / per_gateway_rate if per_gateway_rate else 0
+
+        logger.info(
+            f"Ingest benchmark: {config.gateways} gateways x {config.devices_per_gateway} devices, "
+            f"{config.datapoints_per_device} datapoints, {config.rate or 'max'} msg/s for {config.duration}s"
+        )
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        broker_task = asyncio.create_task(broker.run())
+        deadline = start + config.duration
+        await asyncio.gather(*(
+            _publish(broker, factory, gateway, interval, deadline) for gateway in fleet.gateways
+        ))
+        await broker.queue.join()
+        await handler.flush_buffer()
+        await aggregator.stop()
+        duration = time.perf_counter() - start
+
+        device_ids = fleet.device_ids
+        rows = db.query(func.count(DeviceTelemetry.id)).filter(
+            DeviceTelemetry.device_id.in_(device_ids)
+        ).scalar()
+        alarms = db.query(func.count(DeviceAlarm.id)).filter(
+            DeviceAlarm.device_id.in_(device_ids)
+        ).scalar()
+
+        return IngestBenchmarkResult(
+            config=config,
+            database=database,
+            started_at=started_at,
+            duration_seconds=duration,
+            messages=broker.delivered,
+            rows=rows or 0,
+            alarms=alarms or 0,
+            latencies=handler.latencies,
+        )
+    finally:
+        if broker_task:
+            broker_task.cancel()
+        if aggregator.running:
+            await aggregator.stop()
+        alarm_db.rollback()
+        alarm_db.close()
+        if not keep_data:
+            db.rollback()
+            teardown_fleet(db, fleet)
+        db.close()
+
+
+def baseline_key(result: Dict[str, Any]) -> str:
+    """Baselines are kept per database and offered rate."""
+    rate = result["config"]["rate"]
+    return f"{result['database']}:{f'{rate:g}msg/s' if rate else 'max'}"
+
+
+def compare_with_baseline(
+    result: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.2,
+) -> List[str]:
+    """
+    Regressions of a result against a baseline, both as from to_dict().
+
+    Throughput may drop and latency may rise by up to tolerance (a fraction)
+    before it counts. Latency is only compared for paced runs: at saturation
+    it is time spent waiting in the broker queue. Runs on another database
+    or fleet shape are not compared.
+    """
+    if baseline.get("database") != result["database"] or baseline.get("config") != result["config"]:
+        raise ValueError("Baseline was recorded with a different database or fleet configuration")
+
+    regressions = []
+    for name in THROUGHPUT_METRICS:
+        expected, actual = baseline["metrics"][name], result["metrics"][name]
+        if actual < expected * (1 - tolerance):
+            regressions.append(f"{name}: {actual} < baseline {expected}")
+    for name in LATENCY_METRICS if result["config"]["rate"] else ():
+        expected, actual = baseline["metrics"][name], result["metrics"][name]
+        if actual > expected * (1 + tolerance):
+            regressions.append(f"{name}: {actual} > baseline {expected}")
+    return regressions
@@ -41,6 +41,7 @@ class Job:
     completed_at: Optional[datetime] = None
     retries: int = 0
     max_retries: int = 3
+    progress: Dict[str, Any] = field(default_factory=dict)
 
 
 class JobQueue:
@@ -193,8 +194,9 @@ class JobQueue:
         name: str = None,
         priority: JobPriority = JobPriority.NORMAL,
         max_retries: int = 3,
+        job_id: Optional[str] = None,
     ) -> str:
-        job_id = str(uuid.uuid4())
+        job_id = job_id or str(uuid.uuid4())
         job = Job(
             id=job_id,
             name=name or func.__name__,
@@ -215,6 +217,11 @@ class JobQueue:
     
     def get_job(self, job_id: str) -> Optional[Job]:
         return self._jobs.get(job_id)
+
+    def is_final_attempt(self, job_id: str) -> bool:
+        """Whether a failure of the job's running attempt is terminal (no retry follows)."""
+        job = self._jobs.get(job_id)
+        return job is None or job.retries + 1 >= job.max_retries
     
     def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
         job = self._jobs.get(job_id)
@@ -230,8 +237,15 @@ class JobQueue:
             "completed_at": job.completed_at.isoformat() if job.completed_at else None,
             "retries": job.retries,
             "error": job.error,
+            "progress": job.progress,
         }
     
+    def update_progress(self, job_id: str, **progress) -> None:
+        """Record progress reported by a running job (e.g. rows processed)."""
+        job = self._jobs.get(job_id)
+        if job:
+            job.progress.update(progress)
+    
     def cancel(self, job_id: str) -> bool:
         job = self._jobs.get(job_id)
         if not job or job.status != JobStatus.PENDING:
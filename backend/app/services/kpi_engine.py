@@ -2,25 +2,27 @@
 KPI Engine for SAVE-IT.AI
 Calculates Key Performance Indicators:
 - Simple aggregations (sum, avg, min, max)
-- Formulas with multiple variables
+- Formulas with multiple variables (compiled, vectorized over time series)
 - Cross-device calculations
 - Scheduled and on-demand
 """
 import logging
 import json
-import math
-import re
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set, Tuple
 from dataclasses import dataclass
 
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, and_
 
 from app.models.devices import Device, Datapoint, DeviceTelemetry
 from app.models.telemetry import (
     KPIDefinition, KPIValue, KPIType, TelemetryAggregation, AggregationPeriod
 )
+from app.services.formula_engine import (
+    CompiledFormula, SAFE_FUNCTIONS, SAFE_NAMES, compile_formula
+)
 
 logger = logging.getLogger(__name__)
 
@@ -50,29 +52,22 @@ class FormulaEvaluator:
     """
     Safe formula evaluator for KPI calculations.
     Supports: +, -, *, /, ^, sqrt, abs, min, max, avg, round
+
+    Formulas are parsed once into a validated AST and compiled (see
+    formula_engine); compiled formulas are cached by formula text.
     """
 
-    SAFE_FUNCTIONS = {
-        'sqrt': math.sqrt,
-        'abs': abs,
-        'min': min,
-        'max': max,
-        'round': round,
-        'pow': pow,
-        'log': math.log,
-        'log10': math.log10,
-        'exp': math.exp,
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-        'floor': math.floor,
-        'ceil': math.ceil,
-    }
-
-    SAFE_NAMES = {
-        'pi': math.pi,
-        'e': math.e,
-    }
+    SAFE_FUNCTIONS = SAFE_FUNCTIONS
+    SAFE_NAMES = SAFE_NAMES
+
+    def compile(self, formula: str) -> CompiledFormula:
+        """
+        Compile a formula, reusing the cached result for known formula text.
+
+        Raises:
+            ValueError: If formula is invalid or unsafe
+        """
+        return compile_formula(formula)
 
     def evaluate(self, formula: str, variables: Dict[str, float]) -> float:
         """
@@ -88,35 +83,23 @@ class FormulaEvaluator:
         Raises:
             ValueError: If formula is invalid or unsafe
         """
-        if not formula:
-            raise ValueError("Empty formula")
-
-        # Replace ^ with ** for power
-        formula = formula.replace('^', '**')
-
-        # Build safe namespace
-        namespace = {}
-        namespace.update(self.SAFE_FUNCTIONS)
-        namespace.update(self.SAFE_NAMES)
-        namespace.update(variables)
-
-        # Validate formula contains only safe operations
-        # Remove known safe tokens
-        test_formula = formula
-        for name in list(self.SAFE_FUNCTIONS.keys()) + list(self.SAFE_NAMES.keys()) + list(variables.keys()):
-            test_formula = test_formula.replace(name, '')
-
-        # Check remaining characters are only numbers, operators, parentheses, whitespace
-        safe_chars = set('0123456789.+-*/() ,')
-        remaining = set(test_formula) - safe_chars
-        if remaining:
-            raise ValueError(f"Unsafe characters in formula: {remaining}")
+        return self.compile(formula).evaluate(variables)
 
-        try:
-            result = eval(formula, {"__builtins__": {}}, namespace)
-            return float(result)
-        except Exception as e:
-            raise ValueError(f"Formula evaluation error: {e}")
+    def evaluate_series(self, formula: str, series: Dict[str, Any]) -> np.ndarray:
+        """
+        Evaluate a formula over aligned arrays of variable values in one pass.
+
+        Args:
+            formula: Formula string
+            series: Dict mapping variable names to equal-length arrays
+
+        Returns:
+            Array of results, NaN where the formula is undefined
+
+        Raises:
+            ValueError: If formula is invalid or unsafe
+        """
+        return self.compile(formula).evaluate_series(series)
 
 
 class KPIEngine:
@@ -209,6 +192,267 @@ class KPIEngine:
                 error_message=str(e)
             )
 
+    def calculate_batch(
+        self,
+        jobs: List[Tuple[KPIDefinition, TimeRange]],
+        store: bool = True
+    ) -> Dict[int, KPIResult]:
+        """
+        Calculate many KPIs with a shared query plan.
+
+        KPIs are grouped by time range. For each group every needed aggregate
+        is fetched in a handful of grouped queries (rollups, raw fallback,
+        last values) instead of several queries per KPI, and the resulting
+        KPIValue rows are bulk-inserted.
+
+        Args:
+            jobs: (KPI definition, time range) pairs
+            store: Persist KPIValue rows and update last_calculated_at
+
+        Returns:
+            Dict mapping KPI IDs to results
+        """
+        groups: Dict[Tuple[datetime, datetime], List[KPIDefinition]] = {}
+        for kpi, time_range in jobs:
+            groups.setdefault((time_range.start, time_range.end), []).append(kpi)
+
+        results: Dict[int, KPIResult] = {}
+        for (start, end), kpis in groups.items():
+            results.update(self._calculate_group(kpis, TimeRange(start=start, end=end)))
+
+        if store:
+            rows = [
+                {
+                    "kpi_id": r.kpi_id,
+                    "period_start": r.period_start,
+                    "period_end": r.period_end,
+                    "value": r.value,
+                    "status": r.status,
+                    "data_points_used": r.data_points_used,
+                    "calculation_time_ms": r.calculation_time_ms,
+                }
+                for r in results.values() if r.error_message is None
+            ]
+            if rows:
+                self.db.bulk_insert_mappings(KPIValue, rows)
+                self.db.query(KPIDefinition).filter(
+                    KPIDefinition.id.in_([row["kpi_id"] for row in rows])
+                ).update({KPIDefinition.last_calculated_at: datetime.utcnow()}, synchronize_session=False)
+
+        return results
+
+    def _calculate_group(self, kpis: List[KPIDefinition], time_range: TimeRange) -> Dict[int, KPIResult]:
+        """Calculate KPIs that share a time range from shared grouped queries."""
+        start_time = datetime.utcnow()
+
+        aggregation_sources = set()
+        formula_sources = set()
+        last_sources = set()
+        formula_configs: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        errors: Dict[int, str] = {}
+
+        for kpi in kpis:
+            try:
+                if kpi.kpi_type == KPIType.FORMULA:
+                    var_config = self._parse_formula_variables(kpi)
+                    formula_configs[kpi.id] = var_config
+                    for config in var_config.values():
+                        source = (config["device_id"], config["datapoint_id"])
+                        if config.get("aggregation", "avg") == "last":
+                            last_sources.add(source)
+                        else:
+                            formula_sources.add(source)
+                else:
+                    if not kpi.source_device_id or not kpi.source_datapoint_id:
+                        raise ValueError("Source device and datapoint required for aggregation KPI")
+                    aggregation_sources.add((kpi.source_device_id, kpi.source_datapoint_id))
+            except Exception as e:
+                errors[kpi.id] = str(e)
+
+        period = self._rollup_period(time_range)
+        rollups = self._batch_rollup_stats(aggregation_sources, period, time_range) if period else {}
+        raw = self._batch_raw_stats((aggregation_sources - rollups.keys()) | formula_sources, time_range)
+        last_values = self._batch_last_values(last_sources, time_range)
+
+        calc_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        empty = {"sum": None, "avg": None, "min": None, "max": None, "count": 0}
+
+        results = {}
+        for kpi in kpis:
+            value = None
+            data_points = 0
+            error = errors.get(kpi.id)
+
+            if error is None:
+                try:
+                    if kpi.kpi_type == KPIType.FORMULA:
+                        variables = {}
+                        for var_name, config in formula_configs[kpi.id].items():
+                            source = (config["device_id"], config["datapoint_id"])
+                            aggregation = config.get("aggregation", "avg")
+                            if aggregation == "last":
+                                last = last_values.get(source)
+                                variables[var_name] = last if last is not None else 0
+                                data_points += 1
+                                continue
+                            if aggregation not in ("sum", "avg", "min", "max"):
+                                aggregation = "avg"
+                            stats = raw.get(source, empty)
+                            result = stats[aggregation]
+                            variables[var_name] = float(result) if result is not None else 0
+                            data_points += stats["count"]
+
+                        value = self.formula_evaluator.evaluate(kpi.formula, variables)
+                        if kpi.precision is not None:
+                            value = round(value, kpi.precision)
+                    else:
+                        source = (kpi.source_device_id, kpi.source_datapoint_id)
+                        stats = rollups.get(source) or raw.get(source, empty)
+                        if kpi.kpi_type == KPIType.COUNT:
+                            value = stats["count"]
+                        else:
+                            value = stats[kpi.kpi_type.value]
+                        value = float(value) if value is not None else None
+                        data_points = stats["count"]
+                except Exception as e:
+                    error = str(e)
+
+            if error is not None:
+                logger.error(f"KPI calculation error for {kpi.id}: {error}")
+                results[kpi.id] = KPIResult(
+                    kpi_id=kpi.id,
+                    kpi_name=kpi.name,
+                    value=None,
+                    status="error",
+                    period_start=time_range.start,
+                    period_end=time_range.end,
+                    data_points_used=0,
+                    calculation_time_ms=calc_time,
+                    error_message=error
+                )
+                continue
+
+            results[kpi.id] = KPIResult(
+                kpi_id=kpi.id,
+                kpi_name=kpi.name,
+                value=value,
+                status=self._determine_status(kpi, value),
+                period_start=time_range.start,
+                period_end=time_range.end,
+                data_points_used=data_points,
+                calculation_time_ms=calc_time
+            )
+
+        return results
+
+    def _batch_rollup_stats(
+        self,
+        sources: Set[Tuple[int, int]],
+        period: AggregationPeriod,
+        time_range: TimeRange
+    ) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Aggregate pre-computed rollups for many (device, datapoint) sources in one query."""
+        if not sources:
+            return {}
+
+        rows = self.db.query(
+            TelemetryAggregation.device_id,
+            TelemetryAggregation.datapoint_id,
+            func.sum(TelemetryAggregation.value_sum),
+            func.sum(TelemetryAggregation.value_count),
+            func.min(TelemetryAggregation.value_min),
+            func.max(TelemetryAggregation.value_max),
+        ).filter(
+            TelemetryAggregation.device_id.in_({s[0] for s in sources}),
+            TelemetryAggregation.datapoint_id.in_({s[1] for s in sources}),
+            TelemetryAggregation.period == period,
+            TelemetryAggregation.period_start >= time_range.start,
+            TelemetryAggregation.period_end <= time_range.end
+        ).group_by(
+            TelemetryAggregation.device_id, TelemetryAggregation.datapoint_id
+        ).all()
+
+        stats = {}
+        for device_id, datapoint_id, total, count, minimum, maximum in rows:
+            if (device_id, datapoint_id) not in sources:
+                continue
+            total = total or 0
+            count = count or 0
+            stats[(device_id, datapoint_id)] = {
+                "sum": total,
+                "avg": total / count if count > 0 else None,
+                "min": minimum,
+                "max": maximum,
+                "count": count,
+            }
+        return stats
+
+    def _batch_raw_stats(
+        self,
+        sources: Set[Tuple[int, int]],
+        time_range: TimeRange
+    ) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Aggregate raw telemetry for many (device, datapoint) sources in one query."""
+        if not sources:
+            return {}
+
+        rows = self.db.query(
+            DeviceTelemetry.device_id,
+            DeviceTelemetry.datapoint_id,
+            func.sum(DeviceTelemetry.value),
+            func.avg(DeviceTelemetry.value),
+            func.min(DeviceTelemetry.value),
+            func.max(DeviceTelemetry.value),
+            func.count(DeviceTelemetry.value),
+        ).filter(
+            DeviceTelemetry.device_id.in_({s[0] for s in sources}),
+            DeviceTelemetry.datapoint_id.in_({s[1] for s in sources}),
+            DeviceTelemetry.timestamp >= time_range.start,
+            DeviceTelemetry.timestamp <= time_range.end
+        ).group_by(
+            DeviceTelemetry.device_id, DeviceTelemetry.datapoint_id
+        ).all()
+
+        return {
+            (r[0], r[1]): {"sum": r[2], "avg": r[3], "min": r[4], "max": r[5], "count": r[6]}
+            for r in rows if (r[0], r[1]) in sources
+        }
+
+    def _batch_last_values(
+        self,
+        sources: Set[Tuple[int, int]],
+        time_range: TimeRange
+    ) -> Dict[Tuple[int, int], Optional[float]]:
+        """Fetch the latest value in a time range for many sources in one query."""
+        if not sources:
+            return {}
+
+        latest = self.db.query(
+            DeviceTelemetry.device_id.label("device_id"),
+            DeviceTelemetry.datapoint_id.label("datapoint_id"),
+            func.max(DeviceTelemetry.timestamp).label("timestamp"),
+        ).filter(
+            DeviceTelemetry.device_id.in_({s[0] for s in sources}),
+            DeviceTelemetry.datapoint_id.in_({s[1] for s in sources}),
+            DeviceTelemetry.timestamp >= time_range.start,
+            DeviceTelemetry.timestamp <= time_range.end
+        ).group_by(
+            DeviceTelemetry.device_id, DeviceTelemetry.datapoint_id
+        ).subquery()
+
+        rows = self.db.query(
+            DeviceTelemetry.device_id, DeviceTelemetry.datapoint_id, DeviceTelemetry.value
+        ).join(
+            latest,
+            and_(
+                DeviceTelemetry.device_id == latest.c.device_id,
+                DeviceTelemetry.datapoint_id == latest.c.datapoint_id,
+                DeviceTelemetry.timestamp == latest.c.timestamp,
+            )
+        ).all()
+
+        return {(r[0], r[1]): r[2] for r in rows if (r[0], r[1]) in sources}
+
     def calculate_formula(self, formula: str, variables: Dict[str, float]) -> float:
         """
         Evaluate a formula expression.
@@ -245,9 +489,9 @@ class KPIEngine:
             KPIDefinition.is_active == 1
         ).all()
 
+        batch = self.calculate_batch([(kpi, time_range) for kpi in kpis])
         for kpi in kpis:
-            result = self.calculate(kpi.id, time_range)
-            results[kpi.name] = result
+            results[kpi.name] = batch[kpi.id]
 
         return results
 
@@ -273,9 +517,9 @@ class KPIEngine:
             KPIDefinition.is_active == 1
         ).all()
 
+        batch = self.calculate_batch([(kpi, time_range) for kpi in kpis])
         for kpi in kpis:
-            result = self.calculate(kpi.id, time_range)
-            results[kpi.name] = result
+            results[kpi.name] = batch[kpi.id]
 
         return results
 
@@ -374,41 +618,66 @@ class KPIEngine:
         count = query.count()
         return float(result) if result is not None else None, count
 
+    def _parse_formula_variables(self, kpi: KPIDefinition) -> Dict[str, Dict[str, Any]]:
+        """Parse and validate a formula KPI's variable definitions."""
+        if not kpi.formula or not kpi.formula_variables:
+            raise ValueError("Formula and variables required for formula KPI")
+
+        # Format: {"var1": {"device_id": 1, "datapoint_id": 2, "aggregation": "avg"}, ...}
+        var_config = json.loads(kpi.formula_variables)
+
+        for var_name, config in var_config.items():
+            if not config.get("device_id") or not config.get("datapoint_id"):
+                raise ValueError(f"Variable {var_name} missing device_id or datapoint_id")
+
+        compiled = self.formula_evaluator.compile(kpi.formula)
+        missing = compiled.variables - var_config.keys()
+        if missing:
+            raise ValueError(f"Formula references undefined variables: {', '.join(sorted(missing))}")
+
+        return var_config
+
     def _calculate_formula(
         self,
         kpi: KPIDefinition,
         time_range: TimeRange
     ) -> tuple:
         """Calculate KPI using formula with multiple variables."""
-        if not kpi.formula or not kpi.formula_variables:
-            raise ValueError("Formula and variables required for formula KPI")
-
-        # Parse variable definitions
-        # Format: {"var1": {"device_id": 1, "datapoint_id": 2, "aggregation": "avg"}, ...}
-        var_config = json.loads(kpi.formula_variables)
+        var_config = self._parse_formula_variables(kpi)
+
+        # One grouped query covers every non-"last" variable
+        device_ids = {c["device_id"] for c in var_config.values()}
+        datapoint_ids = {c["datapoint_id"] for c in var_config.values()}
+        rows = self.db.query(
+            DeviceTelemetry.device_id,
+            DeviceTelemetry.datapoint_id,
+            func.sum(DeviceTelemetry.value),
+            func.avg(DeviceTelemetry.value),
+            func.min(DeviceTelemetry.value),
+            func.max(DeviceTelemetry.value),
+            func.count(DeviceTelemetry.id),
+        ).filter(
+            DeviceTelemetry.device_id.in_(device_ids),
+            DeviceTelemetry.datapoint_id.in_(datapoint_ids),
+            DeviceTelemetry.timestamp >= time_range.start,
+            DeviceTelemetry.timestamp <= time_range.end
+        ).group_by(
+            DeviceTelemetry.device_id, DeviceTelemetry.datapoint_id
+        ).all()
+        stats = {
+            (r[0], r[1]): {"sum": r[2], "avg": r[3], "min": r[4], "max": r[5], "count": r[6]}
+            for r in rows
+        }
 
         variables = {}
         total_data_points = 0
 
         for var_name, config in var_config.items():
-            device_id = config.get("device_id")
-            datapoint_id = config.get("datapoint_id")
+            device_id = config["device_id"]
+            datapoint_id = config["datapoint_id"]
             aggregation = config.get("aggregation", "avg")
 
-            if not device_id or not datapoint_id:
-                raise ValueError(f"Variable {var_name} missing device_id or datapoint_id")
-
-            # Get aggregated value for this variable
-            if aggregation == "sum":
-                agg_func = func.sum
-            elif aggregation == "avg":
-                agg_func = func.avg
-            elif aggregation == "min":
-                agg_func = func.min
-            elif aggregation == "max":
-                agg_func = func.max
-            elif aggregation == "last":
-                # Get last value
+            if aggregation == "last":
                 last = self.db.query(DeviceTelemetry.value).filter(
                     DeviceTelemetry.device_id == device_id,
                     DeviceTelemetry.datapoint_id == datapoint_id,
@@ -418,25 +687,14 @@ class KPIEngine:
                 variables[var_name] = last[0] if last else 0
                 total_data_points += 1
                 continue
-            else:
-                agg_func = func.avg
 
-            result = self.db.query(agg_func(DeviceTelemetry.value)).filter(
-                DeviceTelemetry.device_id == device_id,
-                DeviceTelemetry.datapoint_id == datapoint_id,
-                DeviceTelemetry.timestamp >= time_range.start,
-                DeviceTelemetry.timestamp <= time_range.end
-            ).scalar()
-
-            count = self.db.query(DeviceTelemetry).filter(
-                DeviceTelemetry.device_id == device_id,
-                DeviceTelemetry.datapoint_id == datapoint_id,
-                DeviceTelemetry.timestamp >= time_range.start,
-                DeviceTelemetry.timestamp <= time_range.end
-            ).count()
+            if aggregation not in ("sum", "avg", "min", "max"):
+                aggregation = "avg"
 
+            group = stats.get((device_id, datapoint_id), {})
+            result = group.get(aggregation)
             variables[var_name] = float(result) if result is not None else 0
-            total_data_points += count
+            total_data_points += group.get("count", 0)
 
         # Evaluate formula
         value = self.formula_evaluator.evaluate(kpi.formula, variables)
@@ -447,23 +705,123 @@ class KPIEngine:
 
         return value, total_data_points
 
+    def calculate_formula_series(
+        self,
+        kpi_id: int,
+        time_range: TimeRange,
+        period: AggregationPeriod = AggregationPeriod.HOURLY,
+        store: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate a formula KPI for every aggregation interval in a time range.
+
+        Variable series are loaded from pre-computed aggregations in a single
+        query, aligned by period start and evaluated in one vectorized pass.
+
+        Args:
+            kpi_id: Formula KPI definition ID
+            time_range: Time range to cover
+            period: Aggregation interval (hourly, daily, monthly)
+            store: Persist each interval as a KPIValue row
+
+        Returns:
+            List of per-interval results ordered by period start
+        """
+        kpi = self.db.query(KPIDefinition).filter(KPIDefinition.id == kpi_id).first()
+        if not kpi:
+            raise ValueError("KPI not found")
+        if kpi.kpi_type != KPIType.FORMULA:
+            raise ValueError("KPI is not a formula KPI")
+
+        var_config = self._parse_formula_variables(kpi)
+        device_ids = {c["device_id"] for c in var_config.values()}
+        datapoint_ids = {c["datapoint_id"] for c in var_config.values()}
+
+        aggs = self.db.query(
+            TelemetryAggregation.device_id,
+            TelemetryAggregation.datapoint_id,
+            TelemetryAggregation.period_start,
+            TelemetryAggregation.period_end,
+            TelemetryAggregation.value_sum,
+            TelemetryAggregation.value_avg,
+            TelemetryAggregation.value_min,
+            TelemetryAggregation.value_max,
+            TelemetryAggregation.value_last,
+            TelemetryAggregation.value_count,
+        ).filter(
+            TelemetryAggregation.device_id.in_(device_ids),
+            TelemetryAggregation.datapoint_id.in_(datapoint_ids),
+            TelemetryAggregation.period == period,
+            TelemetryAggregation.period_start >= time_range.start,
+            TelemetryAggregation.period_end <= time_range.end
+        ).all()
+
+        if not aggs:
+            return []
+
+        period_ends = {}
+        for a in aggs:
+            period_ends[a.period_start] = max(period_ends.get(a.period_start, a.period_end), a.period_end)
+        starts = sorted(period_ends)
+        index = {ts: i for i, ts in enumerate(starts)}
+
+        columns = {"sum": 4, "avg": 5, "min": 6, "max": 7, "last": 8}
+        by_source = {}
+        for a in aggs:
+            by_source.setdefault((a.device_id, a.datapoint_id), []).append(a)
+
+        series = {}
+        counts = np.zeros(len(starts), dtype=np.int64)
+        for var_name, config in var_config.items():
+            column = columns.get(config.get("aggregation", "avg"), columns["avg"])
+            values = np.full(len(starts), np.nan)
+            for a in by_source.get((config["device_id"], config["datapoint_id"]), []):
+                i = index[a.period_start]
+                if a[column] is not None:
+                    values[i] = a[column]
+                counts[i] += a.value_count or 0
+            series[var_name] = values
+
+        results = self.formula_evaluator.evaluate_series(kpi.formula, series)
+        if kpi.precision is not None:
+            results = np.round(results, kpi.precision)
+
+        output = []
+        for i, period_start in enumerate(starts):
+            value = None if np.isnan(results[i]) else float(results[i])
+            output.append({
+                "period_start": period_start,
+                "period_end": period_ends[period_start],
+                "value": value,
+                "status": self._determine_status(kpi, value),
+                "data_points_used": int(counts[i]),
+            })
+
+        if store:
+            self.db.add_all([
+                KPIValue(
+                    kpi_id=kpi.id,
+                    period_start=r["period_start"],
+                    period_end=r["period_end"],
+                    value=r["value"],
+                    status=r["status"],
+                    data_points_used=r["data_points_used"],
+                )
+                for r in output
+            ])
+            kpi.last_calculated_at = datetime.utcnow()
+
+        return output
+
     def _get_from_aggregations(
         self,
         kpi: KPIDefinition,
         time_range: TimeRange
     ) -> Optional[tuple]:
         """Try to get KPI value from pre-computed aggregations."""
-        # Determine appropriate aggregation period
-        duration = (time_range.end - time_range.start).total_seconds()
-
-        if duration <= 3600:  # 1 hour or less - use raw data
+        period = self._rollup_period(time_range)
+        if period is None:
             return None
-        elif duration <= 86400:  # 1 day or less - use hourly
-            period = AggregationPeriod.HOURLY
-        elif duration <= 2592000:  # 30 days or less - use daily
-            period = AggregationPeriod.DAILY
-        else:  # More than 30 days - use monthly
-            period = AggregationPeriod.MONTHLY
 
         # Query aggregations
         aggs = self.db.query(TelemetryAggregation).filter(
@@ -498,6 +856,19 @@ class KPIEngine:
         count = sum(a.value_count or 0 for a in aggs)
         return value, count
 
+    def _rollup_period(self, time_range: TimeRange) -> Optional[AggregationPeriod]:
+        """Pick the aggregation period to read for a time range (None = raw data)."""
+        duration = (time_range.end - time_range.start).total_seconds()
+
+        if duration <= 3600:  # 1 hour or less - use raw data
+            return None
+        elif duration <= 86400:  # 1 day or less - use hourly
+            return AggregationPeriod.HOURLY
+        elif duration <= 2592000:  # 30 days or less - use daily
+            return AggregationPeriod.DAILY
+        else:  # More than 30 days - use monthly
+            return AggregationPeriod.MONTHLY
+
     def _determine_status(self, kpi: KPIDefinition, value: Optional[float]) -> str:
         """Determine KPI status based on thresholds."""
         if value is None:
@@ -0,0 +1,102 @@
+"""
+In-memory last-seen map for no-data detection.
+Ingestion records when each device and datapoint last reported without
+touching the database. The no-data check reads the map directly, and changed
+entries are bulk-flushed to NoDataTracker rows periodically.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.telemetry import NoDataTracker
+
+logger = logging.getLogger(__name__)
+
+# (device_id, datapoint_id); datapoint_id None is the device as a whole
+LastSeenKey = Tuple[int, Optional[int]]
+
+
+class LastSeenMap:
+    """Latest data timestamp per device and per device datapoint (thread-safe)."""
+
+    def __init__(self):
+        self._seen: Dict[LastSeenKey, datetime] = {}
+        self._dirty: Dict[LastSeenKey, datetime] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def touch(
+        self,
+        device_id: int,
+        datapoint_ids: Iterable[Optional[int]],
+        timestamp: datetime
+    ):
+        """Record that a device reported the given datapoints at ``timestamp``."""
+        keys = [(device_id, None)]
+        keys.extend((device_id, dp_id) for dp_id in datapoint_ids if dp_id is not None)
+        with self._lock:
+            for key in keys:
+                current = self._seen.get(key)
+                # Replayed data must not move last-seen backwards
+                if current is None or timestamp > current:
+                    self._seen[key] = timestamp
+                    self._dirty[key] = timestamp
+
+    def get(self, device_id: int, datapoint_id: Optional[int] = None) -> Optional[datetime]:
+        return self._seen.get((device_id, datapoint_id))
+
+    def flush(self, db: Session) -> int:
+        """
+        Write changed timestamps to existing NoDataTracker rows in one bulk UPDATE.
+        Receiving data also resets the tracker's triggered flag.
+
+        Returns:
+            Number of trackers updated
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        try:
+            trackers = db.query(
+                NoDataTracker.id, NoDataTracker.device_id, NoDataTracker.datapoint_id
+            ).filter(
+                NoDataTracker.device_id.in_({device_id for device_id, _ in dirty})
+            ).all()
+
+            rows = [
+                {
+                    "id": t.id,
+                    "last_data_at": dirty[(t.device_id, t.datapoint_id)],
+                    "alarm_triggered": 0,
+                    "alarm_triggered_at": None,
+                }
+                for t in trackers if (t.device_id, t.datapoint_id) in dirty
+            ]
+            if rows:
+                db.execute(update(NoDataTracker), rows)
+        except Exception:
+            # Keep the entries so the next flush retries them
+            with self._lock:
+                for key, timestamp in dirty.items():
+                    if key not in self._dirty or timestamp > self._dirty[key]:
+                        self._dirty[key] = timestamp
+            raise
+
+        logger.debug(f"Flushed last-seen for {len(dirty)} keys ({len(rows)} trackers)")
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self._dirty.clear()
+
+
+last_seen_map = LastSeenMap()
@@ -19,6 +19,7 @@ from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
 
 from app.core.database import Base
 from app.models.devices import Device, DeviceType
+from app.services.presence_tracker import presence_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -263,7 +264,7 @@ class LifecycleService:
         # Update device
         device.site_id = site_id
         device.is_active = 1
-        device.is_online = 1
+        presence_tracker.set_device_online(self.db, device)
 
         # Update lifecycle info
         lifecycle_info.lifecycle_state = LifecycleState.COMMISSIONED.value
@@ -315,7 +316,7 @@ class LifecycleService:
 
         # Update device
         device.is_active = 0
-        device.is_online = 0
+        presence_tracker.set_device_offline(self.db, device)
 
         # Update lifecycle info
         lifecycle_info.lifecycle_state = LifecycleState.DECOMMISSIONED.value
@@ -377,7 +378,7 @@ class LifecycleService:
 
         # Decommission old device
         old_device.is_active = 0
-        old_device.is_online = 0
+        presence_tracker.set_device_offline(self.db, old_device)
         old_lifecycle.lifecycle_state = LifecycleState.REPLACED.value
 
         # Commission new device
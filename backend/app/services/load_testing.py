@@ -1,5 +1,5 @@
 """Load testing utilities for performance benchmarks."""
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, TYPE_CHECKING
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
@@ -8,6 +8,9 @@ import time
 import statistics
 import logging
 
+if TYPE_CHECKING:
+    from app.services.profiler import ProfileResult, SamplingProfiler
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +25,7 @@ class LoadTestResult:
     failed_requests: int
     response_times: List[float]
     errors: List[str]
+    profile: Optional["ProfileResult"] = None
     
     @property
     def success_rate(self) -> float:
@@ -65,7 +69,7 @@ class LoadTestResult:
         return self.total_requests / duration
     
     def to_dict(self) -> dict:
-        return {
+        result = {
             "test_name": self.test_name,
             "started_at": self.started_at.isoformat(),
             "completed_at": self.completed_at.isoformat(),
@@ -83,6 +87,9 @@ class LoadTestResult:
             },
             "error_count": len(self.errors),
         }
+        if self.profile:
+            result["profile"] = self.profile.to_dict()
+        return result
 
 
 class LoadTestRunner:
@@ -97,9 +104,10 @@ class LoadTestRunner:
         target_func: Callable,
         num_requests: int = 100,
         concurrency: int = 10,
+        profiler: Optional["SamplingProfiler"] = None,
         **kwargs,
     ) -> LoadTestResult:
-        """Run a load test."""
+        """Run a load test, sampled by profiler while it runs if one is given."""
         started_at = datetime.utcnow()
         response_times: List[float] = []
         errors: List[str] = []
@@ -127,8 +135,15 @@ class LoadTestRunner:
                     errors.append(str(e))
                     failed += 1
         
+        profile = None
+        if profiler:
+            profiler.start()
         tasks = [make_request() for _ in range(num_requests)]
-        await asyncio.gather(*tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if profiler:
+                profile = profiler.stop()
         
         completed_at = datetime.utcnow()
         
@@ -141,6 +156,7 @@ class LoadTestRunner:
             failed_requests=failed,
             response_times=response_times,
             errors=errors[:100],
+            profile=profile,
         )
         
         self.results.append(result)
@@ -157,6 +173,7 @@ class LoadTestRunner:
         concurrency: int = 10,
         headers: Optional[Dict] = None,
         body: Optional[Any] = None,
+        profiler: Optional["SamplingProfiler"] = None,
     ) -> LoadTestResult:
         """Run an HTTP load test."""
         import httpx
@@ -177,6 +194,7 @@ class LoadTestRunner:
             target_func=make_http_request,
             num_requests=num_requests,
             concurrency=concurrency,
+            profiler=profiler,
         )
     
     def get_results(self, limit: int = 20) -> List[dict]:
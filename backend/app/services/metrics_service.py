@@ -1,14 +1,37 @@
-"""Metrics collection service for monitoring and observability."""
-from typing import Dict, List, Optional, Any
+"""Metrics collection service for monitoring and observability.
+
+Built to be cheap on hot paths:
+- ``labels()`` resolves a label set to a child once; keep the returned handle
+  and call ``inc``/``observe`` on it directly
+- Counters and histograms write to a per-thread cell, so updates take no lock
+  and threads never contend; reads sum the cells
+- Histograms find the bucket with bisect and keep per-bucket counts that are
+  made cumulative only at exposition
+- The Prometheus text is cached per label set and only re-rendered for the
+  label sets whose values changed since the previous scrape
+- With METRICS_MULTIPROC_DIR set, each worker process writes its values to a
+  snapshot file in that directory and a scrape on any worker merges them all.
+  The directory should be emptied when the deployment restarts.
+"""
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import datetime
 from enum import Enum
-from collections import defaultdict
-import time
+from bisect import bisect_left
+from glob import glob
+from threading import get_ident
+import json
 import logging
+import math
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Sorted (name, value) pairs identifying one child of a metric
+LabelKey = Tuple[Tuple[str, str], ...]
+
 
 class MetricType(str, Enum):
     COUNTER = "counter"
@@ -28,206 +51,480 @@ class Metric:
     help_text: str = ""
 
 
-class Counter:
-    """A counter metric that only increases."""
-    
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [*key, extra] if extra else key
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _ShardedChild:
+    """Values for one label set, written through per-thread cells."""
+
+    __slots__ = ("labels", "_cells", "_size")
+
+    def __init__(self, labels: LabelKey, size: int):
+        self.labels = labels
+        self._cells: Dict[int, List[float]] = {}
+        self._size = size
+
+    def _new_cell(self) -> List[float]:
+        # setdefault is atomic, so a cell only ever belongs to one thread
+        return self._cells.setdefault(get_ident(), [0.0] * self._size)
+
+    def values(self) -> Tuple[float, ...]:
+        cells = list(self._cells.values())
+        if not cells:
+            return (0.0,) * self._size
+        return tuple(sum(column) for column in zip(*cells))
+
+
+class CounterChild(_ShardedChild):
+    """A counter bound to one label set."""
+
+    __slots__ = ()
+
+    def __init__(self, labels: LabelKey):
+        super().__init__(labels, 1)
+
+    def inc(self, amount: float = 1):
+        """Increment the counter."""
+        cell = self._cells.get(get_ident()) or self._new_cell()
+        cell[0] += amount
+
+    def get(self) -> float:
+        return self.values()[0]
+
+
+class HistogramChild(_ShardedChild):
+    """A histogram bound to one label set.
+
+    Each cell holds one count per bucket (the last is +Inf) followed by the sum.
+    """
+
+    __slots__ = ("_upper",)
+
+    def __init__(self, labels: LabelKey, buckets: Tuple[float, ...]):
+        super().__init__(labels, len(buckets) + 2)
+        self._upper = buckets
+
+    def observe(self, value: float):
+        """Record an observation."""
+        cell = self._cells.get(get_ident()) or self._new_cell()
+        cell[bisect_left(self._upper, value)] += 1
+        cell[-1] += value
+
+    def time(self) -> "_Timer":
+        """Context manager to measure execution time."""
+        return _Timer(self)
+
+
+class GaugeChild:
+    """A gauge bound to one label set.
+
+    ``set`` is a plain assignment; ``inc``/``dec`` take a lock because a gauge
+    cannot be split into per-thread cells without breaking ``set``.
+    """
+
+    __slots__ = ("labels", "_value", "_lock")
+
+    def __init__(self, labels: LabelKey):
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self._value -= amount
+
+    def get(self) -> float:
+        return self._value
+
+    def values(self) -> Tuple[float, ...]:
+        return (self._value,)
+
+
+class _MetricFamily:
+    """A named metric and its children, one per label set."""
+
+    type: MetricType
+
     def __init__(self, name: str, help_text: str = ""):
         self.name = name
         self.help_text = help_text
-        self._values: Dict[tuple, float] = defaultdict(float)
-    
-    def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
-        """Increment the counter."""
-        key = tuple(sorted((labels or {}).items()))
-        self._values[key] += amount
-    
+        self._children: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, labels: Optional[Dict[str, Any]] = None, **label_values) -> Any:
+        """Child for a label set; resolve once and keep the handle on hot paths."""
+        if label_values:
+            labels = {**(labels or {}), **label_values}
+        key = _label_key(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child(key)
+        return child
+
+    def _new_child(self, key: LabelKey) -> Any:
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict[LabelKey, Tuple[float, ...]]:
+        """Current values per label set."""
+        return {key: child.values() for key, child in list(self._children.items())}
+
     def get(self, labels: Optional[Dict[str, str]] = None) -> float:
         """Get the current value."""
-        key = tuple(sorted((labels or {}).items()))
-        return self._values[key]
-    
+        child = self._children.get(_label_key(labels))
+        return child.values()[0] if child else 0.0
+
     def collect(self) -> List[Metric]:
         """Collect all metrics."""
         return [
             Metric(
                 name=self.name,
-                type=MetricType.COUNTER,
-                value=value,
+                type=self.type,
+                value=values[0],
                 labels=dict(key),
                 help_text=self.help_text,
             )
-            for key, value in self._values.items()
+            for key, values in self.snapshot().items()
         ]
 
 
-class Gauge:
-    """A gauge metric that can increase or decrease."""
-    
-    def __init__(self, name: str, help_text: str = ""):
-        self.name = name
-        self.help_text = help_text
-        self._values: Dict[tuple, float] = defaultdict(float)
-    
+class Counter(_MetricFamily):
+    """A counter metric that only increases."""
+
+    type = MetricType.COUNTER
+
+    def _new_child(self, key: LabelKey) -> CounterChild:
+        return CounterChild(key)
+
+    def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
+        """Increment the counter."""
+        self.labels(labels).inc(amount)
+
+
+class Gauge(_MetricFamily):
+    """A gauge metric that can increase or decrease.
+
+    ``multiprocess_mode`` decides how values from several workers combine:
+    "sum" for per-worker quantities such as connections, "max" for values
+    every worker computes the same way.
+    """
+
+    type = MetricType.GAUGE
+
+    def __init__(self, name: str, help_text: str = "", multiprocess_mode: str = "sum"):
+        super().__init__(name, help_text)
+        self.multiprocess_mode = multiprocess_mode
+
+    def _new_child(self, key: LabelKey) -> GaugeChild:
+        return GaugeChild(key)
+
     def set(self, value: float, labels: Optional[Dict[str, str]] = None):
         """Set the gauge value."""
-        key = tuple(sorted((labels or {}).items()))
-        self._values[key] = value
-    
+        self.labels(labels).set(value)
+
     def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
         """Increment the gauge."""
-        key = tuple(sorted((labels or {}).items()))
-        self._values[key] += amount
-    
+        self.labels(labels).inc(amount)
+
     def dec(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
         """Decrement the gauge."""
-        key = tuple(sorted((labels or {}).items()))
-        self._values[key] -= amount
-    
-    def get(self, labels: Optional[Dict[str, str]] = None) -> float:
-        """Get the current value."""
-        key = tuple(sorted((labels or {}).items()))
-        return self._values[key]
-    
-    def collect(self) -> List[Metric]:
-        """Collect all metrics."""
-        return [
-            Metric(
-                name=self.name,
-                type=MetricType.GAUGE,
-                value=value,
-                labels=dict(key),
-                help_text=self.help_text,
-            )
-            for key, value in self._values.items()
-        ]
+        self.labels(labels).dec(amount)
 
 
-class Histogram:
+class Histogram(_MetricFamily):
     """A histogram metric for measuring distributions."""
-    
+
+    type = MetricType.HISTOGRAM
     DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
-    
+
     def __init__(self, name: str, help_text: str = "", buckets: tuple = None):
-        self.name = name
-        self.help_text = help_text
-        self.buckets = buckets or self.DEFAULT_BUCKETS
-        self._sums: Dict[tuple, float] = defaultdict(float)
-        self._counts: Dict[tuple, int] = defaultdict(int)
-        self._bucket_counts: Dict[tuple, Dict[float, int]] = defaultdict(
-            lambda: defaultdict(int)
-        )
-    
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+
+    def _new_child(self, key: LabelKey) -> HistogramChild:
+        return HistogramChild(key, self.buckets)
+
     def observe(self, value: float, labels: Optional[Dict[str, str]] = None):
         """Record an observation."""
-        key = tuple(sorted((labels or {}).items()))
-        self._sums[key] += value
-        self._counts[key] += 1
-        for bucket in self.buckets:
-            if value <= bucket:
-                self._bucket_counts[key][bucket] += 1
-    
-    def time(self, labels: Optional[Dict[str, str]] = None):
+        self.labels(labels).observe(value)
+
+    def time(self, labels: Optional[Dict[str, str]] = None) -> "_Timer":
         """Context manager to measure execution time."""
-        return _Timer(self, labels)
-    
+        return _Timer(self.labels(labels))
+
+    def get(self, labels: Optional[Dict[str, str]] = None) -> float:
+        """Get the number of observations."""
+        child = self._children.get(_label_key(labels))
+        return sum(child.values()[:-1]) if child else 0.0
+
     def collect(self) -> List[Metric]:
         """Collect all metrics."""
         metrics = []
-        for key, total in self._sums.items():
+        for key, values in self.snapshot().items():
             labels = dict(key)
+            cumulative = 0.0
+            for upper, count in zip((*self.buckets, math.inf), values[:-1]):
+                cumulative += count
+                metrics.append(Metric(
+                    name=f"{self.name}_bucket",
+                    type=MetricType.HISTOGRAM,
+                    value=cumulative,
+                    labels={**labels, "le": _format_value(upper)},
+                ))
             metrics.append(Metric(
                 name=f"{self.name}_sum",
                 type=MetricType.HISTOGRAM,
-                value=total,
+                value=values[-1],
                 labels=labels,
                 help_text=self.help_text,
             ))
             metrics.append(Metric(
                 name=f"{self.name}_count",
                 type=MetricType.HISTOGRAM,
-                value=self._counts[key],
+                value=cumulative,
                 labels=labels,
             ))
-            for bucket, count in self._bucket_counts[key].items():
-                metrics.append(Metric(
-                    name=f"{self.name}_bucket",
-                    type=MetricType.HISTOGRAM,
-                    value=count,
-                    labels={**labels, "le": str(bucket)},
-                ))
         return metrics
 
 
 class _Timer:
     """Context manager for timing operations."""
-    
-    def __init__(self, histogram: Histogram, labels: Optional[Dict[str, str]]):
-        self.histogram = histogram
-        self.labels = labels
+
+    def __init__(self, child: HistogramChild):
+        self.child = child
         self.start = None
-    
+
     def __enter__(self):
         self.start = time.perf_counter()
         return self
-    
+
     def __exit__(self, *args):
-        duration = time.perf_counter() - self.start
-        self.histogram.observe(duration, self.labels)
+        self.child.observe(time.perf_counter() - self.start)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# name -> (type, help, buckets, values per label set, multiprocess mode)
+_FamilyData = Tuple[MetricType, str, Tuple[float, ...], Dict[LabelKey, Tuple[float, ...]], str]
 
 
 class MetricsRegistry:
     """Registry for all application metrics."""
-    
-    def __init__(self):
+
+    def __init__(self, multiproc_dir: Optional[str] = None):
         self.metrics: Dict[str, Any] = {}
-    
+        self.multiproc_dir = multiproc_dir
+        # Rendered exposition per (metric, label set), with the values it shows
+        self._rendered: Dict[Tuple[str, LabelKey], Tuple[Tuple[float, ...], str]] = {}
+        self._writer: Optional[threading.Thread] = None
+        self._stop_writer = threading.Event()
+
     def counter(self, name: str, help_text: str = "") -> Counter:
         """Create or get a counter metric."""
         if name not in self.metrics:
             self.metrics[name] = Counter(name, help_text)
         return self.metrics[name]
-    
-    def gauge(self, name: str, help_text: str = "") -> Gauge:
+
+    def gauge(self, name: str, help_text: str = "", multiprocess_mode: str = "sum") -> Gauge:
         """Create or get a gauge metric."""
         if name not in self.metrics:
-            self.metrics[name] = Gauge(name, help_text)
+            self.metrics[name] = Gauge(name, help_text, multiprocess_mode)
         return self.metrics[name]
-    
+
     def histogram(self, name: str, help_text: str = "", buckets: tuple = None) -> Histogram:
         """Create or get a histogram metric."""
         if name not in self.metrics:
             self.metrics[name] = Histogram(name, help_text, buckets)
         return self.metrics[name]
-    
+
     def collect_all(self) -> List[Metric]:
         """Collect all registered metrics."""
         all_metrics = []
-        for metric in self.metrics.values():
+        for metric in list(self.metrics.values()):
             all_metrics.extend(metric.collect())
         return all_metrics
-    
+
     def to_prometheus(self) -> str:
         """Export metrics in Prometheus exposition format."""
-        lines = []
-        seen_metrics = set()
-
-        for metric in self.collect_all():
-            # Add HELP and TYPE lines for each metric family (once)
-            base_name = metric.name.rsplit("_", 1)[0] if metric.name.endswith(("_sum", "_count", "_bucket")) else metric.name
-            if base_name not in seen_metrics:
-                if metric.help_text:
-                    lines.append(f"# HELP {base_name} {metric.help_text}")
-                lines.append(f"# TYPE {base_name} {metric.type.value}")
-                seen_metrics.add(base_name)
-
-            # Format labels
-            label_str = ",".join(f'{k}="{v}"' for k, v in sorted(metric.labels.items()))
-            if label_str:
-                lines.append(f"{metric.name}{{{label_str}}} {metric.value}")
-            else:
-                lines.append(f"{metric.name} {metric.value}")
-
-        return "\n".join(lines) + "\n"
+        families = self._merged_families() if self.multiproc_dir else self._local_families()
+
+        parts = []
+        for name, (metric_type, help_text, buckets, children, _) in families.items():
+            if help_text:
+                parts.append(f"# HELP {name} {help_text}\n")
+            parts.append(f"# TYPE {name} {metric_type.value}\n")
+            for key, values in children.items():
+                parts.append(self._render(name, metric_type, buckets, key, values))
+
+        return "".join(parts)
+
+    def _local_families(self) -> Dict[str, _FamilyData]:
+        return {
+            name: (
+                metric.type,
+                metric.help_text,
+                getattr(metric, "buckets", ()),
+                metric.snapshot(),
+                getattr(metric, "multiprocess_mode", "sum"),
+            )
+            for name, metric in list(self.metrics.items())
+        }
+
+    def _render(
+        self,
+        name: str,
+        metric_type: MetricType,
+        buckets: Tuple[float, ...],
+        key: LabelKey,
+        values: Tuple[float, ...]
+    ) -> str:
+        """Exposition lines for one label set, reused while its values are unchanged."""
+        cached = self._rendered.get((name, key))
+        if cached and cached[0] == values:
+            return cached[1]
+
+        labels = _format_labels(key)
+        if metric_type == MetricType.HISTOGRAM:
+            lines = []
+            cumulative = 0.0
+            for upper, count in zip((*buckets, math.inf), values[:-1]):
+                cumulative += count
+                le = _format_labels(key, ("le", _format_value(upper)))
+                lines.append(f"{name}_bucket{le} {_format_value(cumulative)}\n")
+            lines.append(f"{name}_sum{labels} {_format_value(values[-1])}\n")
+            lines.append(f"{name}_count{labels} {_format_value(cumulative)}\n")
+            text = "".join(lines)
+        else:
+            text = f"{name}{labels} {_format_value(values[0])}\n"
+
+        self._rendered[(name, key)] = (values, text)
+        return text
+
+    # Multi-process aggregation
+
+    def _snapshot_path(self, pid: Optional[int] = None) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics_{pid or os.getpid()}.json")
+
+    def write_snapshot(self):
+        """Write this process's values for the other workers to merge."""
+        data = {
+            name: {
+                "type": metric_type.value,
+                "help": help_text,
+                "buckets": list(buckets),
+                "mode": mode,
+                "children": [[[list(pair) for pair in key], list(values)] for key, values in children.items()],
+            }
+            for name, (metric_type, help_text, buckets, children, mode) in self._local_families().items()
+        }
+        path = self._snapshot_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        # Readers only ever see a complete file
+        os.replace(tmp_path, path)
+
+    def _merged_families(self) -> Dict[str, _FamilyData]:
+        """Values of every worker: counters and histograms summed, gauges by their mode."""
+        self.write_snapshot()
+
+        merged: Dict[str, _FamilyData] = {}
+        for path in sorted(glob(os.path.join(self.multiproc_dir, "metrics_*.json"))):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(pid)
+
+            for name, family in data.items():
+                metric_type = MetricType(family["type"])
+                # Counters outlive their worker; gauges describe live state only
+                if metric_type == MetricType.GAUGE and not alive:
+                    continue
+                entry = merged.setdefault(name, (
+                    metric_type, family["help"], tuple(family["buckets"]), {}, family["mode"]
+                ))
+                children, mode = entry[3], entry[4]
+                for key, values in family["children"]:
+                    key = tuple(tuple(pair) for pair in key)
+                    current = children.get(key)
+                    if current is None:
+                        children[key] = tuple(values)
+                    elif mode == "max" and metric_type == MetricType.GAUGE:
+                        children[key] = tuple(map(max, current, values))
+                    else:
+                        children[key] = tuple(a + b for a, b in zip(current, values))
+
+        return merged
+
+    def start_multiprocess_writer(self, interval: float = 5.0):
+        """Periodically write this worker's snapshot (no-op without a multiproc dir)."""
+        if not self.multiproc_dir or self._writer:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        self._stop_writer.clear()
+        self._writer = threading.Thread(
+            target=self._write_loop, args=(interval,), name="metrics-writer", daemon=True
+        )
+        self._writer.start()
+        logger.info(f"Metrics multiprocess mode: writing to {self.multiproc_dir}")
+
+    def _write_loop(self, interval: float):
+        while not self._stop_writer.wait(interval):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logger.warning(f"Metrics snapshot write failed: {e}")
+
+    async def stop(self):
+        """Stop the writer and leave a final snapshot behind."""
+        if not self._writer:
+            return
+        self._stop_writer.set()
+        self._writer = None
+        try:
+            self.write_snapshot()
+        except OSError as e:
+            logger.warning(f"Metrics snapshot write failed: {e}")
 
     def get_metric_value(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[float]:
         """Get a specific metric value."""
@@ -236,7 +533,7 @@ class MetricsRegistry:
         return None
 
 
-metrics_registry = MetricsRegistry()
+metrics_registry = MetricsRegistry(multiproc_dir=os.getenv("METRICS_MULTIPROC_DIR") or None)
 
 http_requests_total = metrics_registry.counter(
     "http_requests_total",
@@ -281,7 +578,8 @@ websocket_connections = metrics_registry.gauge(
 # Additional production metrics
 active_sites = metrics_registry.gauge(
     "saveit_active_sites",
-    "Number of active sites"
+    "Number of active sites",
+    multiprocess_mode="max"
 )
 
 data_points_ingested = metrics_registry.counter(
@@ -12,6 +12,9 @@ from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Modbus application protocol limit for a single read of holding/input registers
+MAX_READ_REGISTERS = 125
+
 
 class ModbusProtocol(str, Enum):
     TCP = "tcp"
@@ -49,6 +52,21 @@ class RegisterMapping:
     function_code: int = 3
     endianness: Endianness = Endianness.BIG
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RegisterMapping":
+        """Build a mapping from a register map entry in device metadata."""
+        return cls(
+            name=data["name"],
+            address=int(data["address"]),
+            data_type=DataType(data.get("data_type", DataType.UINT16.value)),
+            count=int(data.get("count", 1)),
+            scale_factor=float(data.get("scale_factor", 1.0)),
+            offset=float(data.get("offset", 0.0)),
+            unit=data.get("unit", ""),
+            function_code=int(data.get("function_code", 3)),
+            endianness=Endianness(data.get("endianness", Endianness.BIG.value)),
+        )
+
 
 @dataclass
 class ModbusConnection:
@@ -106,6 +124,65 @@ class CircuitBreaker:
         return False
 
 
+@dataclass
+class ReadBlock:
+    """A contiguous register range fetched with a single Modbus request."""
+    function_code: int
+    address: int
+    count: int
+    mappings: List[RegisterMapping] = field(default_factory=list)
+    
+    def slice(self, registers: List[int], mapping: RegisterMapping) -> List[int]:
+        """Return the registers belonging to ``mapping`` from the block response."""
+        start = mapping.address - self.address
+        return registers[start:start + mapping.count]
+
+
+class ReadPlanner:
+    """
+    Coalesces register mappings into as few block reads as possible.
+    
+    Mappings with the same function code are merged while the gap to the
+    previous mapping is at most ``max_gap`` registers and the block stays
+    within ``max_count`` registers. Coils and discrete inputs are read
+    individually.
+    """
+    
+    COALESCABLE_FUNCTION_CODES = {3, 4}
+    
+    def __init__(self, max_gap: int = 8, max_count: int = MAX_READ_REGISTERS):
+        self.max_gap = max_gap
+        self.max_count = max_count
+    
+    def plan(self, mappings: List[RegisterMapping]) -> List[ReadBlock]:
+        """Group mappings into blocks ordered by function code and address."""
+        by_function: Dict[int, List[RegisterMapping]] = {}
+        for mapping in mappings:
+            by_function.setdefault(mapping.function_code, []).append(mapping)
+        
+        blocks: List[ReadBlock] = []
+        for function_code in sorted(by_function):
+            current: Optional[ReadBlock] = None
+            ordered = sorted(by_function[function_code], key=lambda m: (m.address, m.count))
+            for mapping in ordered:
+                if current is not None and self._fits(current, mapping):
+                    end = max(current.address + current.count, mapping.address + mapping.count)
+                    current.count = end - current.address
+                    current.mappings.append(mapping)
+                else:
+                    current = ReadBlock(function_code, mapping.address, mapping.count, [mapping])
+                    blocks.append(current)
+        return blocks
+    
+    def _fits(self, block: ReadBlock, mapping: RegisterMapping) -> bool:
+        if block.function_code not in self.COALESCABLE_FUNCTION_CODES:
+            return False
+        block_end = block.address + block.count
+        if mapping.address - block_end > self.max_gap:
+            return False
+        return max(block_end, mapping.address + mapping.count) - block.address <= self.max_count
+
+
 class RegisterParser:
     """Parses Modbus register values based on data type and endianness."""
     
@@ -169,8 +246,9 @@ class ModbusConnectionManager:
     Manages Modbus TCP/RTU connections with connection pooling and polling.
     """
     
-    def __init__(self, max_connections: int = 50):
+    def __init__(self, max_connections: int = 50, planner: Optional[ReadPlanner] = None):
         self.max_connections = max_connections
+        self.planner = planner or ReadPlanner()
         self._connections: Dict[int, ModbusConnection] = {}
         self._clients: Dict[int, Any] = {}
         self._circuit_breakers: Dict[int, CircuitBreaker] = {}
@@ -180,6 +258,8 @@ class ModbusConnectionManager:
             "total_polls": 0,
             "successful_polls": 0,
             "failed_polls": 0,
+            "block_reads": 0,
+            "block_fallbacks": 0,
             "active_connections": 0,
         }
     
@@ -290,23 +370,8 @@ class ModbusConnectionManager:
         self._stats["total_polls"] += 1
         
         try:
-            if mapping.function_code == 1:
-                result = await client.read_coils(
-                    mapping.address, mapping.count, slave=conn.slave_id
-                )
-            elif mapping.function_code == 2:
-                result = await client.read_discrete_inputs(
-                    mapping.address, mapping.count, slave=conn.slave_id
-                )
-            elif mapping.function_code == 3:
-                result = await client.read_holding_registers(
-                    mapping.address, mapping.count, slave=conn.slave_id
-                )
-            elif mapping.function_code == 4:
-                result = await client.read_input_registers(
-                    mapping.address, mapping.count, slave=conn.slave_id
-                )
-            else:
+            result = await self._request(client, conn, mapping.function_code, mapping.address, mapping.count)
+            if result is None:
                 logger.error(f"Unsupported function code: {mapping.function_code}")
                 return None
             
@@ -331,6 +396,65 @@ class ModbusConnectionManager:
             logger.error(f"Read error on connection {connection_id}: {e}")
             return None
     
+    async def _request(
+        self,
+        client: Any,
+        conn: ModbusConnection,
+        function_code: int,
+        address: int,
+        count: int,
+    ) -> Optional[Any]:
+        """Issue a single read request; returns None for unsupported function codes."""
+        if function_code == 1:
+            return await client.read_coils(address, count, slave=conn.slave_id)
+        if function_code == 2:
+            return await client.read_discrete_inputs(address, count, slave=conn.slave_id)
+        if function_code == 3:
+            return await client.read_holding_registers(address, count, slave=conn.slave_id)
+        if function_code == 4:
+            return await client.read_input_registers(address, count, slave=conn.slave_id)
+        return None
+    
+    async def read_block(self, connection_id: int, block: ReadBlock) -> Optional[List[int]]:
+        """
+        Read a coalesced register block with one request.
+        
+        Returns the raw registers, or None if the device rejected the range
+        or answered short; the caller then falls back to per-mapping reads,
+        which also handle failure accounting and reconnects.
+        """
+        if connection_id not in self._clients:
+            if not await self.connect(connection_id):
+                return None
+        
+        client = self._clients.get(connection_id)
+        conn = self._connections.get(connection_id)
+        
+        if not client or not conn:
+            return None
+        
+        self._stats["total_polls"] += 1
+        self._stats["block_reads"] += 1
+        
+        try:
+            result = await self._request(client, conn, block.function_code, block.address, block.count)
+            if result is None or result.isError():
+                raise Exception(f"Modbus error: {result}")
+            registers = list(result.registers)
+            if len(registers) < block.count:
+                raise Exception(f"Short response: {len(registers)} of {block.count} registers")
+        except Exception as e:
+            self._stats["block_fallbacks"] += 1
+            logger.debug(
+                f"Block read {block.address}+{block.count} on connection {connection_id} failed: {e}"
+            )
+            return None
+        
+        conn.last_poll = datetime.utcnow()
+        conn.consecutive_failures = 0
+        self._stats["successful_polls"] += 1
+        return registers
+    
     async def write_register(
         self,
         connection_id: int,
@@ -367,17 +491,33 @@ class ModbusConnectionManager:
         connection_id: int,
         mappings: List[RegisterMapping],
     ) -> Dict[str, Any]:
-        """Poll all registers from a device."""
+        """
+        Poll all registers from a device.
+        
+        Mappings are coalesced into block reads by the planner and decoded
+        from the combined response, so a typical meter needs a handful of
+        requests instead of one per register.
+        """
         results = {}
         
-        for mapping in mappings:
-            value = await self.read_registers(connection_id, mapping)
-            if value is not None:
-                results[mapping.name] = {
-                    "value": value,
-                    "unit": mapping.unit,
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
+        for block in self.planner.plan(mappings):
+            registers = None
+            if len(block.mappings) > 1:
+                registers = await self.read_block(connection_id, block)
+            timestamp = datetime.utcnow().isoformat()
+            
+            for mapping in block.mappings:
+                if registers is not None:
+                    value = RegisterParser.parse(block.slice(registers, mapping), mapping)
+                else:
+                    value = await self.read_registers(connection_id, mapping)
+                    timestamp = datetime.utcnow().isoformat()
+                if value is not None:
+                    results[mapping.name] = {
+                        "value": value,
+                        "unit": mapping.unit,
+                        "timestamp": timestamp,
+                    }
         
         return results
     
@@ -5,10 +5,15 @@ Subscribes to gateway topics and ingests data into the system.
 import asyncio
 import json
 import logging
+import time
 from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
 from dataclasses import dataclass
 
+from app.services.metrics_service import mqtt_messages_received
+from app.services.pipeline_metrics import pipeline
+from app.services.teltonika_handler import get_teltonika_handler
+
 logger = logging.getLogger(__name__)
 
 
@@ -111,6 +116,7 @@ class MQTTSubscriber:
             "messages_failed": 0,
             "last_message_at": None,
         }
+        self._received = mqtt_messages_received.labels()
     
     def add_handler(self, message_type: str, handler: Callable):
         """Add a handler for a specific message type."""
@@ -126,11 +132,13 @@ class MQTTSubscriber:
             if not handlers:
                 handlers = self._handlers.get("data", [])
             
-            for handler in handlers:
-                try:
-                    await handler(message)
-                except Exception as e:
-                    logger.error(f"Handler error for {message.topic}: {e}")
+            self._received.inc()
+            with pipeline.stage("receive", root=True, topic=message.topic):
+                for handler in handlers:
+                    try:
+                        await handler(message)
+                    except Exception as e:
+                        logger.error(f"Handler error for {message.topic}: {e}")
             
             self._stats["messages_processed"] += 1
             self._stats["last_message_at"] = datetime.utcnow().isoformat()
@@ -178,7 +186,8 @@ class MQTTSubscriber:
                     async for msg in client.messages:
                         if not self._running:
                             break
-                        message = MQTTMessage.from_raw(str(msg.topic), msg.payload)
+                        with pipeline.stage("parse"):
+                            message = MQTTMessage.from_raw(str(msg.topic), msg.payload)
                         await self.process_message(message)
                         
             except ImportError:
@@ -204,6 +213,7 @@ class MQTTSubscriber:
             "broker": f"{self.broker_host}:{self.broker_port}",
             "subscriptions": self._subscriptions,
             "stats": self._stats.copy(),
+            "pipeline": pipeline.get_status(),
         }
 
 
@@ -216,14 +226,25 @@ class DataIngestionHandler:
         self._buffer: List[Dict[str, Any]] = []
         self._buffer_size = 100
         self._last_flush = datetime.utcnow()
+        self._teltonika = get_teltonika_handler()
     
     async def handle_data_message(self, message: MQTTMessage):
         """Handle incoming data message."""
-        payload = message.get_payload_json()
+        with pipeline.stage("decode"):
+            payload = message.get_payload_json()
         if not payload:
             logger.warning(f"Invalid JSON payload from {message.topic}")
             return
         
+        if self._teltonika.is_teltonika_message(payload):
+            # An explicit top-level key wins over the one derived from the Modbus slave id
+            edge_key = payload.get("edge_key") or payload.get("edgeKey")
+            parsed = self._teltonika.parse_teltonika_message(payload, message.gateway_id)
+            payload = parsed["datapoints"]
+            edge_key = edge_key or parsed.get("edge_key")
+            if edge_key:
+                payload["edge_key"] = edge_key
+        
         reading = {
             "gateway_id": message.gateway_id,
             "device_id": message.device_id,
@@ -232,32 +253,20 @@ class DataIngestionHandler:
         }
         
         self._buffer.append(reading)
+        pipeline.buffer_depth(len(self._buffer))
         
         if len(self._buffer) >= self._buffer_size:
             await self.flush_buffer()
     
     async def handle_heartbeat(self, message: MQTTMessage):
-        """Handle gateway heartbeat — mark gateway as online in DB."""
+        """Handle gateway heartbeat — recorded in memory and flushed in batches."""
         if not message.gateway_id:
             logger.debug("Heartbeat with no gateway_id, ignoring")
             return
 
-        db = self.db_session_factory()
-        try:
-            from app.models.integrations import Gateway, GatewayStatus
-            gateway = db.query(Gateway).filter(Gateway.id == message.gateway_id).first()
-            if gateway:
-                gateway.status = GatewayStatus.ONLINE
-                gateway.last_seen_at = message.timestamp
-                db.commit()
-                logger.debug(f"Heartbeat from gateway {message.gateway_id} — marked ONLINE")
-            else:
-                logger.warning(f"Heartbeat from unknown gateway {message.gateway_id}")
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Error processing heartbeat for gateway {message.gateway_id}: {e}")
-        finally:
-            db.close()
+        from app.services.presence_tracker import presence_tracker
+        presence_tracker.gateway_seen(message.gateway_id, message.timestamp)
+        logger.debug(f"Heartbeat from gateway {message.gateway_id}")
 
     async def handle_status(self, message: MQTTMessage):
         """Handle device status update."""
@@ -272,13 +281,16 @@ class DataIngestionHandler:
         readings = self._buffer.copy()
         self._buffer.clear()
         self._last_flush = datetime.utcnow()
+        pipeline.buffer_depth(0)
+        started = time.perf_counter()
         
         logger.info(f"Flushing {len(readings)} readings to database")
 
         db = self.db_session_factory()
         try:
             from app.services.data_ingestion import get_ingestion_service
-            from app.models.integrations import Gateway, GatewayStatus, CommunicationLog
+            from app.models.integrations import CommunicationLog
+            from app.services.presence_tracker import presence_tracker
 
             ingestion_service = get_ingestion_service(db, alarm_engine=self._alarm_engine)
 
@@ -292,7 +304,9 @@ class DataIngestionHandler:
                     device_id = reading.get("device_id")
                     data = reading.get("data", {})
 
-                    edge_key = data.pop("edge_key", None) or data.pop("edgeKey", None)
+                    # Pop both spellings so neither is stored as a datapoint
+                    edge_key, camel_key = data.pop("edge_key", None), data.pop("edgeKey", None)
+                    edge_key = edge_key or camel_key
 
                     ingestion_service.ingest_telemetry(
                         device_id=int(device_id) if device_id and device_id.isdigit() else None,
@@ -308,12 +322,9 @@ class DataIngestionHandler:
                     error_count += 1
                     logger.error(f"Failed to ingest reading: {e}")
 
-            # Update gateway last_seen_at for all gateways that sent data
+            # Gateways that sent data are online; written with the next presence flush
             for gw_id in gateway_ids_seen:
-                gw = db.query(Gateway).filter(Gateway.id == gw_id).first()
-                if gw:
-                    gw.status = GatewayStatus.ONLINE
-                    gw.last_seen_at = datetime.utcnow()
+                presence_tracker.gateway_seen(gw_id)
 
             # Log communication event per gateway
             for gw_id in gateway_ids_seen:
@@ -329,7 +340,8 @@ class DataIngestionHandler:
                 )
                 db.add(comm_log)
 
-            db.commit()
+            with pipeline.stage("db_write", readings=len(readings)):
+                db.commit()
             logger.info(f"Successfully flushed {success_count} readings ({error_count} errors)")
 
         except Exception as e:
@@ -337,6 +349,7 @@ class DataIngestionHandler:
             logger.error(f"Failed to flush buffer: {e}")
         finally:
             db.close()
+            pipeline.flush(len(readings), time.perf_counter() - started)
 
 
 mqtt_subscriber = MQTTSubscriber()
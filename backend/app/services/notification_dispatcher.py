@@ -0,0 +1,439 @@
+"""
+Asynchronous notification dispatcher for SAVE-IT.AI
+Delivers queued DeliveryMessages off the request path:
+- Persistent pooled HTTP client for webhook, Slack and Teams
+- Persistent SMTP connection pool for email
+- Per-channel concurrency limits
+- Duplicate suppression and per-recipient digests
+- Batched background worker for new and retried messages
+"""
+import asyncio
+import logging
+import os
+import smtplib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+
+from app.services.notification_service import (
+    DeliveryMessage,
+    NotificationChannel,
+    NotificationPriority,
+    NotificationStatus,
+    apply_delivery_outcome,
+    slack_payload,
+    teams_payload,
+    webhook_payload,
+)
+
+logger = logging.getLogger(__name__)
+
+# Claimed messages left in "sending" this long (e.g. by a crashed worker) are claimed again
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+DEFAULT_CHANNEL_LIMITS = {
+    NotificationChannel.EMAIL: 10,
+    NotificationChannel.SMS: 10,
+    NotificationChannel.PUSH: 20,
+    NotificationChannel.WEBHOOK: 20,
+    NotificationChannel.SLACK: 5,
+    NotificationChannel.TEAMS: 5,
+}
+
+# Channels read by people, where several messages to one recipient are merged
+DIGEST_CHANNELS = {
+    NotificationChannel.EMAIL,
+    NotificationChannel.SMS,
+    NotificationChannel.PUSH,
+    NotificationChannel.SLACK,
+    NotificationChannel.TEAMS,
+}
+
+
+@dataclass
+class OutboundMessage:
+    """Session-independent copy of a message to deliver."""
+    channel: NotificationChannel
+    recipient: str
+    subject: Optional[str]
+    body: str
+    html_body: Optional[str]
+    priority: str
+    message_ids: Tuple[int, ...]
+
+    @property
+    def dedup_key(self) -> Tuple[str, str, Optional[str], str]:
+        return (self.channel.value, self.recipient, self.subject, self.body)
+
+
+class SMTPPool:
+    """
+    Small pool of persistent SMTP connections.
+
+    smtplib is blocking, so sends run in worker threads; each connection is
+    used by one send at a time and reconnected once if the server dropped it.
+    """
+
+    def __init__(self, size: int = 4):
+        self.host = os.getenv("SMTP_HOST", "")
+        self.port = int(os.getenv("SMTP_PORT", "587"))
+        self.user = os.getenv("SMTP_USER", "")
+        self.password = os.getenv("SMTP_PASSWORD", "")
+        self.from_address = os.getenv("EMAIL_FROM", "noreply@saveit.ai")
+        self._size = size
+        self._idle: Optional[asyncio.Queue] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    async def send(self, message: EmailMessage):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self._size):
+                self._idle.put_nowait(None)
+
+        server = await self._idle.get()
+        try:
+            if server is None:
+                server = await asyncio.to_thread(self._connect)
+            try:
+                await asyncio.to_thread(server.send_message, message)
+            except smtplib.SMTPServerDisconnected:
+                server = await asyncio.to_thread(self._connect)
+                await asyncio.to_thread(server.send_message, message)
+        except Exception:
+            if server is not None:
+                await asyncio.to_thread(self._discard, server)
+            server = None
+            raise
+        finally:
+            self._idle.put_nowait(server)
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        """Close a connection that failed, so its socket isn't leaked."""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    async def close(self):
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            server = self._idle.get_nowait()
+            if server is not None:
+                try:
+                    await asyncio.to_thread(server.quit)
+                except Exception:
+                    pass
+        self._idle = None
+
+
+class NotificationDispatcher:
+    """
+    Delivers queued notifications concurrently in batches.
+
+    Messages are claimed from the DB in batches of ``batch_size``. Identical
+    messages to the same recipient within ``dedup_window`` seconds are sent
+    once, and several messages to one person in the same batch are merged
+    into a digest. Senders run concurrently under per-channel limits.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        poll_interval: float = 5.0,
+        dedup_window: float = 300.0,
+        channel_limits: Optional[Dict[NotificationChannel, int]] = None,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.dedup_window = dedup_window
+        self.running = False
+        self._limits = {**DEFAULT_CHANNEL_LIMITS, **(channel_limits or {})}
+        self._semaphores: Dict[NotificationChannel, asyncio.Semaphore] = {}
+        self._senders: Dict[NotificationChannel, Callable[[OutboundMessage], Awaitable[None]]] = {}
+        self._recent: Dict[Tuple, float] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        self._smtp = SMTPPool()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = asyncio.Event()
+        self._stats = {"batches": 0, "sent": 0, "failed": 0, "deduplicated": 0, "digested": 0}
+
+        self._register_default_senders()
+
+    def _register_default_senders(self):
+        self._senders[NotificationChannel.EMAIL] = self._send_email
+        self._senders[NotificationChannel.SMS] = self._send_log
+        self._senders[NotificationChannel.PUSH] = self._send_log
+        self._senders[NotificationChannel.WEBHOOK] = self._send_webhook
+        self._senders[NotificationChannel.SLACK] = self._send_slack
+        self._senders[NotificationChannel.TEAMS] = self._send_teams
+
+    def register_sender(
+        self,
+        channel: NotificationChannel,
+        sender: Callable[[OutboundMessage], Awaitable[None]],
+    ):
+        """Register an async sender; it should raise on delivery failure."""
+        self._senders[channel] = sender
+
+    async def start(self):
+        """Start the background delivery worker."""
+        if self.running:
+            return
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info("Notification dispatcher started")
+
+    async def stop(self):
+        """Stop the worker and close pooled connections."""
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await self._smtp.close()
+        logger.info("Notification dispatcher stopped")
+
+    def wake(self):
+        """Ask the worker to look for due messages now (thread-safe)."""
+        if self._loop is not None and self.running:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def wake_after_commit(self, db: Session):
+        """Wake the worker once ``db`` commits the messages it just queued."""
+        event.listen(db, "after_commit", lambda session: self.wake(), once=True)
+
+    async def _run_loop(self):
+        from app.core.database import SessionLocal
+
+        while self.running:
+            db = SessionLocal()
+            try:
+                processed = await self.process_due(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Notification dispatch error: {e}")
+                processed = 0
+            finally:
+                db.close()
+
+            # A full batch means more may be waiting
+            if processed >= self.batch_size:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_due(self, db: Session, limit: Optional[int] = None) -> int:
+        """
+        Deliver one batch of queued messages that are due and commit the outcome.
+
+        Messages are claimed first: marked "sending" and committed, so no
+        row lock is held while senders wait on the network. Outcomes are
+        recorded in a second transaction.
+
+        Returns:
+            Number of messages processed
+        """
+        notifications, messages = await asyncio.to_thread(self._claim, db, limit or self.batch_size)
+        if not notifications:
+            return 0
+
+        by_id = {n.id: n for n in notifications}
+        outcomes = await self.deliver(messages)
+
+        def record():
+            for message_ids, error in outcomes:
+                for message_id in message_ids:
+                    apply_delivery_outcome(by_id[message_id], error)
+            db.commit()
+
+        await asyncio.to_thread(record)
+        self._stats["batches"] += 1
+        return len(notifications)
+
+    async def deliver(
+        self,
+        messages: List[OutboundMessage],
+    ) -> List[Tuple[Tuple[int, ...], Optional[str]]]:
+        """
+        Send messages concurrently under per-channel limits.
+
+        Returns:
+            (message_ids, error) pairs; error is None on success
+        """
+        async def send_one(message: OutboundMessage):
+            if self._is_duplicate(message):
+                self._stats["deduplicated"] += len(message.message_ids)
+                return message.message_ids, None
+            sender = self._senders.get(message.channel)
+            if sender is None:
+                return message.message_ids, f"No handler for channel: {message.channel.value}"
+            try:
+                async with self._semaphore(message.channel):
+                    await sender(message)
+            except Exception as e:
+                self._stats["failed"] += len(message.message_ids)
+                logger.warning(f"{message.channel.value} delivery to {message.recipient} failed: {e}")
+                return message.message_ids, str(e) or type(e).__name__
+            self._recent[message.dedup_key] = time.monotonic()
+            self._stats["sent"] += len(message.message_ids)
+            return message.message_ids, None
+
+        self._prune_recent()
+        return list(await asyncio.gather(*(send_one(m) for m in messages)))
+
+    def _claim(self, db: Session, limit: int) -> Tuple[List[DeliveryMessage], List[OutboundMessage]]:
+        """Lock due messages, mark them sending and commit; returns them with their outbound plan."""
+        now = datetime.utcnow()
+        notifications = db.query(DeliveryMessage).filter(
+            or_(
+                DeliveryMessage.status == NotificationStatus.QUEUED.value,
+                DeliveryMessage.status == NotificationStatus.SENDING.value,
+            ),
+            DeliveryMessage.next_retry_at <= now
+        ).order_by(DeliveryMessage.next_retry_at).limit(limit).with_for_update(skip_locked=True).all()
+        if not notifications:
+            return [], []
+
+        # Planned before the commit expires the rows
+        messages = self._plan(notifications)
+        for n in notifications:
+            n.status = NotificationStatus.SENDING.value
+            n.next_retry_at = now + CLAIM_TIMEOUT
+        db.commit()
+        return notifications, messages
+
+    def _plan(self, notifications: List[DeliveryMessage]) -> List[OutboundMessage]:
+        """Collapse a batch into outbound messages: duplicates merged, digests per recipient."""
+        groups: Dict[Tuple, List[DeliveryMessage]] = {}
+        for n in notifications:
+            channel = NotificationChannel(n.channel)
+            if channel in DIGEST_CHANNELS:
+                key = (channel, n.recipient)
+            else:
+                key = (channel, n.recipient, n.subject, n.body)
+            groups.setdefault(key, []).append(n)
+
+        messages = []
+        for key, members in groups.items():
+            channel = key[0]
+            first = members[0]
+            distinct = list(dict.fromkeys((m.subject, m.body) for m in members))
+            if len(distinct) == 1:
+                subject, body, html_body = first.subject, first.body, first.html_body
+            else:
+                self._stats["digested"] += len(members)
+                subject = f"{len(distinct)} notifications"
+                body = "\n\n".join(f"{s}\n{b}" if s else b for s, b in distinct)
+                html_body = None
+            messages.append(OutboundMessage(
+                channel=channel,
+                recipient=first.recipient,
+                subject=subject,
+                body=body,
+                html_body=html_body,
+                priority=max((m.priority or "normal" for m in members), key=_priority_rank),
+                message_ids=tuple(m.id for m in members),
+            ))
+        return messages
+
+    def _is_duplicate(self, message: OutboundMessage) -> bool:
+        sent_at = self._recent.get(message.dedup_key)
+        return sent_at is not None and time.monotonic() - sent_at < self.dedup_window
+
+    def _prune_recent(self):
+        cutoff = time.monotonic() - self.dedup_window
+        for key in [k for k, sent_at in self._recent.items() if sent_at < cutoff]:
+            del self._recent[key]
+
+    def _semaphore(self, channel: NotificationChannel) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(channel)
+        if semaphore is None:
+            semaphore = self._semaphores[channel] = asyncio.Semaphore(self._limits.get(channel, 10))
+        return semaphore
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+        return self._http
+
+    async def _post(self, url: str, payload: Dict, ok: Callable[[int], bool]):
+        response = await self.http.post(url, json=payload)
+        if not ok(response.status_code):
+            raise Exception(f"HTTP {response.status_code}")
+
+    async def _send_webhook(self, message: OutboundMessage):
+        await self._post(message.recipient, webhook_payload(message), lambda status: status < 400)
+
+    async def _send_slack(self, message: OutboundMessage):
+        await self._post(message.recipient, slack_payload(message), lambda status: status == 200)
+
+    async def _send_teams(self, message: OutboundMessage):
+        await self._post(message.recipient, teams_payload(message), lambda status: status == 200)
+
+    async def _send_email(self, message: OutboundMessage):
+        if not self._smtp.configured:
+            logger.info(f"Email to {message.recipient}: {message.subject}")
+            return
+        email = EmailMessage()
+        email["From"] = self._smtp.from_address
+        email["To"] = message.recipient
+        email["Subject"] = message.subject or "Notification"
+        email.set_content(message.body)
+        if message.html_body:
+            email.add_alternative(message.html_body, subtype="html")
+        await self._smtp.send(email)
+
+    async def _send_log(self, message: OutboundMessage):
+        # SMS and push providers are not integrated yet
+        logger.info(f"{message.channel.value} to {message.recipient}: {message.body[:50]}")
+
+    def get_status(self) -> Dict:
+        """Get dispatcher status."""
+        return {
+            "running": self.running,
+            "channel_limits": {c.value: limit for c, limit in self._limits.items()},
+            "stats": self._stats.copy(),
+        }
+
+
+PRIORITY_ORDER = [p.value for p in NotificationPriority]
+
+
+def _priority_rank(priority: str) -> int:
+    return PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else 1
+
+
+notification_dispatcher = NotificationDispatcher()
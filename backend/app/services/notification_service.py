@@ -6,6 +6,7 @@ Multi-channel notification delivery:
 - Push notifications
 - In-app notifications
 - Webhook callbacks
+- Queued bulk delivery through the async NotificationDispatcher
 """
 import json
 import logging
@@ -45,6 +46,7 @@ class NotificationStatus(Enum):
     """Notification delivery status."""
     PENDING = "pending"
     QUEUED = "queued"
+    SENDING = "sending"
     SENT = "sent"
     DELIVERED = "delivered"
     READ = "read"
@@ -174,6 +176,75 @@ class NotificationResult:
     error: Optional[str] = None
 
 
+def webhook_payload(message: Any) -> Dict[str, Any]:
+    """Generic webhook body for a message."""
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "priority": message.priority,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def slack_payload(message: Any) -> Dict[str, Any]:
+    """Slack incoming-webhook body for a message."""
+    return {
+        "text": f"*{message.subject}*\n{message.body}" if message.subject else message.body
+    }
+
+
+def teams_payload(message: Any) -> Dict[str, Any]:
+    """Microsoft Teams MessageCard body for a message."""
+    return {
+        "@type": "MessageCard",
+        "summary": message.subject or "Notification",
+        "sections": [{
+            "activityTitle": message.subject,
+            "text": message.body
+        }]
+    }
+
+
+def apply_delivery_outcome(notification: DeliveryMessage, error: Optional[str]) -> NotificationResult:
+    """
+    Record a delivery attempt on a message.
+
+    Failures are re-queued with linear backoff until max_retries is reached.
+    """
+    channel = NotificationChannel(notification.channel)
+    if error is None:
+        notification.status = NotificationStatus.SENT.value
+        notification.sent_at = datetime.utcnow()
+        notification.next_retry_at = None
+        return NotificationResult(
+            notification_id=notification.id,
+            status=NotificationStatus.SENT,
+            channel=channel,
+            sent_at=notification.sent_at
+        )
+
+    notification.retry_count = (notification.retry_count or 0) + 1
+
+    if notification.retry_count >= (notification.max_retries or 3):
+        notification.status = NotificationStatus.FAILED.value
+        notification.failed_at = datetime.utcnow()
+        notification.next_retry_at = None
+    else:
+        notification.status = NotificationStatus.QUEUED.value
+        notification.next_retry_at = datetime.utcnow() + timedelta(
+            minutes=5 * notification.retry_count
+        )
+
+    notification.error_message = error
+
+    return NotificationResult(
+        notification_id=notification.id,
+        status=NotificationStatus(notification.status),
+        channel=channel,
+        error=error
+    )
+
+
 class NotificationService:
     """
     Multi-channel notification service.
@@ -233,7 +304,8 @@ class NotificationService:
         self,
         request: NotificationRequest,
         user_id: Optional[int] = None,
-        organization_id: Optional[int] = None
+        organization_id: Optional[int] = None,
+        queue: bool = False
     ) -> NotificationResult:
         """
         Send a notification.
@@ -242,6 +314,8 @@ class NotificationService:
             request: NotificationRequest with details
             user_id: User to notify (for tracking)
             organization_id: Organization context
+            queue: Hand external delivery to the background dispatcher
+                instead of sending in the caller
 
         Returns:
             NotificationResult
@@ -282,6 +356,10 @@ class NotificationService:
         )
 
         self.db.add(notification)
+
+        if queue and request.channel != NotificationChannel.IN_APP:
+            return self._enqueue(notification)
+
         self.db.flush()
 
         # Send notification
@@ -289,6 +367,21 @@ class NotificationService:
 
         return result
 
+    def _enqueue(self, notification: DeliveryMessage) -> NotificationResult:
+        """Queue a message for the dispatcher; it is picked up once committed."""
+        from app.services.notification_dispatcher import notification_dispatcher
+
+        notification.status = NotificationStatus.QUEUED.value
+        notification.next_retry_at = datetime.utcnow()
+        self.db.flush()
+        notification_dispatcher.wake_after_commit(self.db)
+
+        return NotificationResult(
+            notification_id=notification.id,
+            status=NotificationStatus.QUEUED,
+            channel=NotificationChannel(notification.channel)
+        )
+
     def send_to_user(
         self,
         user_id: int,
@@ -296,6 +389,7 @@ class NotificationService:
         subject: Optional[str] = None,
         channels: Optional[List[NotificationChannel]] = None,
         priority: NotificationPriority = NotificationPriority.NORMAL,
+        queue: bool = False,
         **kwargs
     ) -> List[NotificationResult]:
         """
@@ -307,6 +401,7 @@ class NotificationService:
             subject: Optional subject
             channels: Specific channels (or use preferences)
             priority: Priority level
+            queue: Deliver external channels through the background dispatcher
 
         Returns:
             List of NotificationResults
@@ -318,34 +413,7 @@ class NotificationService:
 
         results = []
 
-        if not channels:
-            # Use user preferences
-            channels = []
-            if prefs:
-                if prefs.email_enabled and prefs.email:
-                    channels.append((NotificationChannel.EMAIL, prefs.email))
-                if prefs.sms_enabled and prefs.phone:
-                    channels.append((NotificationChannel.SMS, prefs.phone))
-                if prefs.push_enabled and prefs.push_token:
-                    channels.append((NotificationChannel.PUSH, prefs.push_token))
-                if prefs.in_app_enabled:
-                    channels.append((NotificationChannel.IN_APP, str(user_id)))
-            else:
-                # Default to in-app
-                channels.append((NotificationChannel.IN_APP, str(user_id)))
-        else:
-            # Use specified channels with preferences for recipient
-            channel_recipients = []
-            for channel in channels:
-                if channel == NotificationChannel.EMAIL and prefs and prefs.email:
-                    channel_recipients.append((channel, prefs.email))
-                elif channel == NotificationChannel.SMS and prefs and prefs.phone:
-                    channel_recipients.append((channel, prefs.phone))
-                elif channel == NotificationChannel.IN_APP:
-                    channel_recipients.append((channel, str(user_id)))
-            channels = channel_recipients
-
-        for channel, recipient in channels:
+        for channel, recipient in self._resolve_channels(user_id, prefs, channels):
             request = NotificationRequest(
                 recipient=recipient,
                 channel=channel,
@@ -355,11 +423,46 @@ class NotificationService:
                 **kwargs
             )
 
-            result = self.send(request, user_id=user_id)
+            result = self.send(request, user_id=user_id, queue=queue)
             results.append(result)
 
         return results
 
+    def _resolve_channels(
+        self,
+        user_id: int,
+        prefs: Optional[DeliveryPreference],
+        channels: Optional[List[NotificationChannel]]
+    ) -> List[tuple]:
+        """Resolve (channel, recipient) pairs from explicit channels or preferences."""
+        if not channels:
+            # Use user preferences
+            resolved = []
+            if prefs:
+                if prefs.email_enabled and prefs.email:
+                    resolved.append((NotificationChannel.EMAIL, prefs.email))
+                if prefs.sms_enabled and prefs.phone:
+                    resolved.append((NotificationChannel.SMS, prefs.phone))
+                if prefs.push_enabled and prefs.push_token:
+                    resolved.append((NotificationChannel.PUSH, prefs.push_token))
+                if prefs.in_app_enabled:
+                    resolved.append((NotificationChannel.IN_APP, str(user_id)))
+            else:
+                # Default to in-app
+                resolved.append((NotificationChannel.IN_APP, str(user_id)))
+            return resolved
+
+        # Use specified channels with preferences for recipient
+        channel_recipients = []
+        for channel in channels:
+            if channel == NotificationChannel.EMAIL and prefs and prefs.email:
+                channel_recipients.append((channel, prefs.email))
+            elif channel == NotificationChannel.SMS and prefs and prefs.phone:
+                channel_recipients.append((channel, prefs.phone))
+            elif channel == NotificationChannel.IN_APP:
+                channel_recipients.append((channel, str(user_id)))
+        return channel_recipients
+
     def send_bulk(
         self,
         user_ids: List[int],
@@ -368,17 +471,58 @@ class NotificationService:
         channels: Optional[List[NotificationChannel]] = None,
         priority: NotificationPriority = NotificationPriority.NORMAL
     ) -> Dict[int, List[NotificationResult]]:
-        """Send notification to multiple users."""
-        results = {}
+        """
+        Send notification to multiple users.
+
+        Preferences are loaded in one query and all messages are written in
+        one flush. In-app messages are delivered immediately; everything else
+        is queued and sent by the background dispatcher after commit, so the
+        caller never waits on SMTP or HTTP.
+        """
+        prefs_by_user = {
+            p.user_id: p for p in self.db.query(DeliveryPreference).filter(
+                DeliveryPreference.user_id.in_(user_ids)
+            ).all()
+        } if user_ids else {}
 
+        now = datetime.utcnow()
+        pending = []
         for user_id in user_ids:
-            results[user_id] = self.send_to_user(
-                user_id=user_id,
-                body=body,
-                subject=subject,
-                channels=channels,
-                priority=priority
-            )
+            for channel, recipient in self._resolve_channels(user_id, prefs_by_user.get(user_id), channels):
+                notification = DeliveryMessage(
+                    user_id=user_id,
+                    channel=channel.value,
+                    priority=priority.value,
+                    subject=subject,
+                    body=body,
+                    recipient=recipient,
+                    status=NotificationStatus.QUEUED.value,
+                    next_retry_at=now,
+                    retry_count=0,
+                    max_retries=3
+                )
+                pending.append((user_id, notification))
+
+        self.db.add_all([n for _, n in pending])
+        self.db.flush()
+
+        results: Dict[int, List[NotificationResult]] = {user_id: [] for user_id in user_ids}
+        queued = False
+        for user_id, notification in pending:
+            channel = NotificationChannel(notification.channel)
+            if channel == NotificationChannel.IN_APP:
+                results[user_id].append(self._deliver(notification))
+                continue
+            queued = True
+            results[user_id].append(NotificationResult(
+                notification_id=notification.id,
+                status=NotificationStatus.QUEUED,
+                channel=channel
+            ))
+
+        if queued:
+            from app.services.notification_dispatcher import notification_dispatcher
+            notification_dispatcher.wake_after_commit(self.db)
 
         return results
 
@@ -401,40 +545,12 @@ class NotificationService:
 
         try:
             success = handler(notification)
-
-            if success:
-                notification.status = NotificationStatus.SENT.value
-                notification.sent_at = datetime.utcnow()
-
-                return NotificationResult(
-                    notification_id=notification.id,
-                    status=NotificationStatus.SENT,
-                    channel=channel,
-                    sent_at=notification.sent_at
-                )
-            else:
+            if not success:
                 raise Exception("Handler returned failure")
-
         except Exception as e:
-            notification.retry_count += 1
+            return apply_delivery_outcome(notification, str(e))
 
-            if notification.retry_count >= notification.max_retries:
-                notification.status = NotificationStatus.FAILED.value
-                notification.failed_at = datetime.utcnow()
-            else:
-                notification.status = NotificationStatus.QUEUED.value
-                notification.next_retry_at = datetime.utcnow() + timedelta(
-                    minutes=5 * notification.retry_count
-                )
-
-            notification.error_message = str(e)
-
-            return NotificationResult(
-                notification_id=notification.id,
-                status=NotificationStatus(notification.status),
-                channel=channel,
-                error=str(e)
-            )
+        return apply_delivery_outcome(notification, None)
 
     def _render_template(self, template: str, variables: Dict[str, Any]) -> str:
         """Render a template with variables."""
@@ -472,12 +588,7 @@ class NotificationService:
         import requests
 
         try:
-            payload = {
-                "subject": notification.subject,
-                "body": notification.body,
-                "priority": notification.priority,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            payload = webhook_payload(notification)
 
             response = requests.post(
                 notification.recipient,
@@ -495,9 +606,7 @@ class NotificationService:
         import requests
 
         try:
-            payload = {
-                "text": f"*{notification.subject}*\n{notification.body}" if notification.subject else notification.body
-            }
+            payload = slack_payload(notification)
 
             response = requests.post(
                 notification.recipient,  # Slack webhook URL
@@ -515,14 +624,7 @@ class NotificationService:
         import requests
 
         try:
-            payload = {
-                "@type": "MessageCard",
-                "summary": notification.subject or "Notification",
-                "sections": [{
-                    "activityTitle": notification.subject,
-                    "text": notification.body
-                }]
-            }
+            payload = teams_payload(notification)
 
             response = requests.post(
                 notification.recipient,  # Teams webhook URL
@@ -566,22 +668,16 @@ class NotificationService:
 
         return count
 
-    def process_retry_queue(self) -> int:
-        """Process notifications in retry queue."""
-        now = datetime.utcnow()
-
-        notifications = self.db.query(DeliveryMessage).filter(
-            DeliveryMessage.status == NotificationStatus.QUEUED.value,
-            DeliveryMessage.next_retry_at <= now
-        ).all()
-
-        processed = 0
+    async def process_retry_queue(self, limit: Optional[int] = None) -> int:
+        """
+        Deliver one batch of due queued and retried notifications.
 
-        for notification in notifications:
-            self._deliver(notification)
-            processed += 1
+        Normally the background NotificationDispatcher does this; this entry
+        point runs a single batch on the service's session.
+        """
+        from app.services.notification_dispatcher import notification_dispatcher
 
-        return processed
+        return await notification_dispatcher.process_due(self.db, limit)
 
     def get_delivery_stats(
         self,
@@ -1,5 +1,6 @@
 """Optimization Engine services."""
 from app.services.optimization.solar_roi import SolarROICalculator
 from app.services.optimization.notification_service import NotificationService
+from app.services.optimization.bess_dispatch import BESSDispatchSimulator
 
-__all__ = ["SolarROICalculator", "NotificationService"]
+__all__ = ["SolarROICalculator", "NotificationService", "BESSDispatchSimulator"]
@@ -0,0 +1,593 @@
+"""
+BESS Dispatch Simulator for Optimization Engine.
+
+Simulates battery dispatch over interval demand data (the 15/30/60-minute
+BESSDataReading series of a dataset) against time-of-use tariffs:
+- TOU rate arrays built from TariffRate time windows, days and seasons
+- Vectorized state-of-charge model: one pass over time that advances every
+  battery configuration together as NumPy arrays
+- Peak shaving, TOU arbitrage and combined dispatch strategies
+- Monthly demand-charge and energy-cost savings, annualized separately:
+  energy by simulated hours, demand charges by billing months
+- Parameter sweeps over many BESS models and sizes across a process pool
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import numpy_financial as npf
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import BESSDataReading, BESSDataset, BESSModel, Tariff
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_YEAR = 8760.0
+MONTHS_PER_YEAR = 12
+DEFAULT_PRICE_PER_KWH = 400.0
+SWEEP_CHUNK_SIZE = 16
+
+_DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_DAY_GROUPS = {
+    "all": range(7),
+    "daily": range(7),
+    "weekday": range(5),
+    "weekdays": range(5),
+    "weekend": range(5, 7),
+    "weekends": range(5, 7),
+}
+_SEASON_MONTHS = {
+    "summer": (6, 7, 8),
+    "winter": (12, 1, 2),
+    "spring": (3, 4, 5),
+    "autumn": (9, 10, 11),
+    "fall": (9, 10, 11),
+}
+
+
+class DispatchStrategy(str, Enum):
+    """How the battery decides to charge and discharge."""
+    PEAK_SHAVING = "peak_shaving"
+    ARBITRAGE = "arbitrage"
+    COMBINED = "combined"
+
+
+@dataclass(frozen=True)
+class BatteryConfig:
+    """One battery configuration to simulate."""
+    capacity_kwh: float
+    power_kw: float
+    round_trip_efficiency: float = 0.92
+    depth_of_discharge: float = 0.90
+    price: Optional[float] = None
+    model_id: Optional[int] = None
+    name: Optional[str] = None
+    units: int = 1
+
+    @classmethod
+    def from_model(cls, model: BESSModel, units: int = 1) -> "BatteryConfig":
+        """Build a configuration of ``units`` identical catalog batteries."""
+        price = model.price_usd or (model.price_per_kwh or DEFAULT_PRICE_PER_KWH) * model.capacity_kwh
+        return cls(
+            capacity_kwh=model.capacity_kwh * units,
+            power_kw=model.power_rating_kw * units,
+            round_trip_efficiency=model.round_trip_efficiency or 0.92,
+            depth_of_discharge=model.depth_of_discharge or 0.90,
+            price=price * units,
+            model_id=model.id,
+            name=model.model_name,
+            units=units,
+        )
+
+
+@dataclass
+class LoadProfile:
+    """
+    Interval demand series with aligned energy rates.
+
+    ``demand_charges`` holds the $/kW demand charge for each calendar month
+    (index 0 = January).
+    """
+    timestamps: np.ndarray
+    demand_kw: np.ndarray
+    rates: np.ndarray
+    interval_hours: float
+    demand_charges: np.ndarray = field(default_factory=lambda: np.zeros(12))
+
+    @property
+    def hours(self) -> float:
+        return len(self.demand_kw) * self.interval_hours
+
+    def billing_months(self) -> tuple:
+        """Start offsets and calendar month (0-11) of each billing month in the series."""
+        months = self.timestamps.astype("datetime64[M]")
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        calendar = months[starts].astype(np.int64) % 12
+        return starts, calendar
+
+
+@dataclass
+class DispatchResult:
+    """Outcome of simulating one battery configuration over a load profile."""
+    config: BatteryConfig
+    strategy: DispatchStrategy
+    hours: float
+    baseline_energy_cost: float
+    energy_cost: float
+    baseline_demand_cost: float
+    demand_cost: float
+    baseline_peak_kw: float
+    peak_kw: float
+    energy_discharged_kwh: float
+    monthly_peak_reduction_kw: List[float]
+
+    @property
+    def arbitrage_savings(self) -> float:
+        return self.baseline_energy_cost - self.energy_cost
+
+    @property
+    def peak_shaving_savings(self) -> float:
+        return self.baseline_demand_cost - self.demand_cost
+
+    @property
+    def total_savings(self) -> float:
+        return self.arbitrage_savings + self.peak_shaving_savings
+
+    @property
+    def annualization_factor(self) -> float:
+        """Scale from the simulated hours to a year, for energy quantities."""
+        return HOURS_PER_YEAR / self.hours if self.hours > 0 else 0.0
+
+    @property
+    def billing_months(self) -> int:
+        return len(self.monthly_peak_reduction_kw)
+
+    @property
+    def annual_arbitrage_savings(self) -> float:
+        return self.arbitrage_savings * self.annualization_factor
+
+    @property
+    def annual_peak_shaving_savings(self) -> float:
+        """Demand charges are billed per month, so they scale by billing months rather than hours."""
+        if not self.billing_months:
+            return 0.0
+        return self.peak_shaving_savings * MONTHS_PER_YEAR / self.billing_months
+
+    @property
+    def annual_savings(self) -> float:
+        return self.annual_arbitrage_savings + self.annual_peak_shaving_savings
+
+    @property
+    def equivalent_cycles(self) -> float:
+        usable = self.config.capacity_kwh * self.config.depth_of_discharge
+        return self.energy_discharged_kwh / usable if usable > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        annual_savings = self.annual_savings
+        price = self.config.price
+        return {
+            "model_id": self.config.model_id,
+            "model_name": self.config.name,
+            "units": self.config.units,
+            "capacity_kwh": self.config.capacity_kwh,
+            "power_kw": self.config.power_kw,
+            "strategy": self.strategy.value,
+            "baseline_peak_kw": round(self.baseline_peak_kw, 2),
+            "peak_kw": round(self.peak_kw, 2),
+            "peak_reduction_kw": round(self.baseline_peak_kw - self.peak_kw, 2),
+            "arbitrage_savings": round(self.arbitrage_savings, 2),
+            "peak_shaving_savings": round(self.peak_shaving_savings, 2),
+            "total_savings": round(self.total_savings, 2),
+            "annual_savings": round(annual_savings, 2),
+            "annual_cycles": round(self.equivalent_cycles * self.annualization_factor, 1),
+            "estimated_price": round(price, 2) if price is not None else None,
+            "simple_payback_years": round(price / annual_savings, 2) if price and annual_savings > 0 else None,
+            "monthly_peak_reduction_kw": [round(v, 2) for v in self.monthly_peak_reduction_kw],
+        }
+
+
+def _parse_days(days_of_week: Optional[str]) -> Optional[List[int]]:
+    """Parse "mon-fri", "sat,sun", "0,1,2", "weekdays" ... into weekday numbers (Monday=0)."""
+    if not days_of_week or not days_of_week.strip():
+        return None
+    days = set()
+    for token in days_of_week.lower().replace(";", ",").split(","):
+        token = token.strip()
+        if not token:
+            continue
+        if token in _DAY_GROUPS:
+            days.update(_DAY_GROUPS[token])
+            continue
+        bounds = [_day_index(part) for part in token.split("-", 1)]
+        if len(bounds) == 2:
+            first, last = bounds
+            days.update(range(first, last + 1) if first <= last else list(range(first, 7)) + list(range(0, last + 1)))
+        else:
+            days.add(bounds[0])
+    return sorted(days)
+
+
+def _day_index(token: str) -> int:
+    token = token.strip()
+    if token.isdigit():
+        day = int(token)
+        if 0 <= day <= 6:
+            return day
+    elif token[:3] in _DAY_NAMES:
+        return _DAY_NAMES.index(token[:3])
+    raise ValueError(f"Invalid day of week: {token}")
+
+
+def build_tou_rates(timestamps: np.ndarray, tariff: Tariff) -> np.ndarray:
+    """
+    Price every interval of a series according to a tariff.
+
+    Intervals fall back to the tariff's base (or off-peak) rate; each
+    TariffRate then overrides the intervals inside its time window, days
+    and season. Windows that end before they start wrap past midnight.
+
+    Args:
+        timestamps: datetime64 interval start times
+        tariff: Tariff with its TOU rates
+
+    Returns:
+        $/kWh rate for each interval
+    """
+    default = tariff.base_rate
+    if default is None:
+        default = tariff.off_peak_rate if tariff.off_peak_rate is not None else (tariff.peak_rate or 0.0)
+    rates = np.full(len(timestamps), float(default))
+    if len(timestamps) == 0:
+        return rates
+
+    minutes = timestamps.astype("datetime64[m]")
+    minute_of_day = (minutes - minutes.astype("datetime64[D]")).astype(np.int64)
+    weekday = (timestamps.astype("datetime64[D]").astype(np.int64) + 3) % 7
+    month = timestamps.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    for rate in sorted(tariff.rates, key=lambda r: r.id or 0):
+        if rate.tier_min_kwh is not None or rate.tier_max_kwh is not None:
+            continue  # consumption tiers are not time-of-use windows
+        mask = np.ones(len(timestamps), dtype=bool)
+        if rate.time_start is not None and rate.time_end is not None:
+            start = rate.time_start.hour * 60 + rate.time_start.minute
+            end = rate.time_end.hour * 60 + rate.time_end.minute
+            if start < end:
+                mask &= (minute_of_day >= start) & (minute_of_day < end)
+            elif start > end:
+                mask &= (minute_of_day >= start) | (minute_of_day < end)
+        days = _parse_days(rate.days_of_week)
+        if days is not None:
+            mask &= np.isin(weekday, days)
+        season = (rate.season or "").strip().lower()
+        if season in _SEASON_MONTHS:
+            mask &= np.isin(month, _SEASON_MONTHS[season])
+        rates[mask] = rate.rate_per_kwh
+    return rates
+
+
+def simulate_dispatch(
+    profile: LoadProfile,
+    configs: Sequence[BatteryConfig],
+    strategy: DispatchStrategy = DispatchStrategy.COMBINED,
+    peak_target_kw: Optional[float] = None,
+) -> List[DispatchResult]:
+    """
+    Simulate dispatch of several battery configurations over one load profile.
+
+    Charge/discharge requests are computed for the whole series up front;
+    the state-of-charge recursion then walks the series once, updating all
+    configurations per interval as vectors. Batteries start full, never
+    export to the grid and split round-trip losses evenly between charge
+    and discharge. In combined mode arbitrage only spends charge that is
+    not needed for the rest of the day's peak shaving.
+
+    Args:
+        profile: Interval demand and rates
+        configs: Battery configurations to simulate side by side
+        strategy: Dispatch strategy
+        peak_target_kw: Grid import target for peak shaving; defaults to
+            each billing month's peak minus the battery power rating
+
+    Returns:
+        One DispatchResult per configuration, in input order
+
+    Raises:
+        ValueError: If the profile is empty
+    """
+    if not configs:
+        return []
+    if len(profile.demand_kw) == 0:
+        raise ValueError("Load profile is empty")
+
+    demand = np.asarray(profile.demand_kw, dtype=np.float64)
+    rates = np.asarray(profile.rates, dtype=np.float64)
+    dt = profile.interval_hours
+    steps = len(demand)
+
+    capacity = np.array([c.capacity_kwh for c in configs], dtype=np.float64)
+    power = np.array([c.power_kw for c in configs], dtype=np.float64)
+    rte = np.array([c.round_trip_efficiency for c in configs], dtype=np.float64)
+    efficiency = np.sqrt(rte)
+    min_soc = capacity * (1.0 - np.array([c.depth_of_discharge for c in configs], dtype=np.float64))
+
+    starts, calendar = profile.billing_months()
+    month_of_step = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, steps]))
+    baseline_month_peak = np.maximum.reduceat(demand, starts)
+    month_peak = baseline_month_peak[month_of_step][:, None]
+
+    if peak_target_kw is not None:
+        target = np.full((steps, len(configs)), float(peak_target_kw))
+    else:
+        target = np.maximum(month_peak - power[None, :], 0.0)
+
+    load = demand[:, None]
+    shave = np.maximum(load - target, 0.0)
+    headroom = np.maximum(target - load, 0.0)
+
+    zeros = np.zeros_like(shave)
+    reserve = zeros
+    if strategy == DispatchStrategy.PEAK_SHAVING:
+        shave_req, arbitrage_req = shave, zeros
+        charge_req = headroom
+    else:
+        # Arbitrage only pays when the spread beats the round-trip loss
+        midpoint = (rates.min() + rates.max()) / 2.0
+        high = (rates > midpoint)[:, None]
+        low = (rates < midpoint)[:, None]
+        profitable = (rates.max() * rte > rates.min())[None, :]
+        high = high & profitable
+        low = low & profitable
+        if strategy == DispatchStrategy.ARBITRAGE:
+            shave_req, arbitrage_req = zeros, np.where(high, load, 0.0)
+            # Charge without setting a new monthly peak
+            charge_req = np.where(low, np.maximum(month_peak - load, 0.0), 0.0)
+        else:
+            shave_req, arbitrage_req = shave, np.where(high, load - shave, 0.0)
+            charge_req = np.where(high, 0.0, headroom)
+            reserve = _remaining_daily_energy(profile.timestamps, shave * dt / efficiency)
+
+    discharge = np.empty((steps, len(configs)))
+    charge = np.empty((steps, len(configs)))
+    soc = capacity.copy()
+    for t in range(steps):
+        available = np.maximum(soc - min_soc, 0.0)
+        d = np.minimum(np.minimum(shave_req[t], power), available * efficiency / dt)
+        # Arbitrage spends only charge not reserved for later peaks that day
+        spare = np.maximum(available - d * dt / efficiency - reserve[t], 0.0)
+        d = d + np.minimum(np.minimum(arbitrage_req[t], power - d), spare * efficiency / dt)
+        c = np.minimum(np.minimum(charge_req[t], power), np.maximum(capacity - soc, 0.0) / (efficiency * dt))
+        c = np.where(d > 0, 0.0, c)
+        soc += (c * efficiency - d / efficiency) * dt
+        discharge[t] = d
+        charge[t] = c
+
+    net = load - discharge + charge
+    baseline_energy_cost = float(np.dot(demand, rates) * dt)
+    energy_cost = (net * rates[:, None]).sum(axis=0) * dt
+
+    month_charges = np.asarray(profile.demand_charges, dtype=np.float64)[calendar]
+    net_month_peak = np.maximum.reduceat(net, starts, axis=0)
+    baseline_demand_cost = float(np.dot(baseline_month_peak, month_charges))
+    demand_cost = (net_month_peak * month_charges[:, None]).sum(axis=0)
+    peak_reduction = baseline_month_peak[:, None] - net_month_peak
+    discharged = discharge.sum(axis=0) * dt
+    baseline_peak = float(demand.max())
+    new_peak = net.max(axis=0)
+
+    return [
+        DispatchResult(
+            config=config,
+            strategy=strategy,
+            hours=profile.hours,
+            baseline_energy_cost=baseline_energy_cost,
+            energy_cost=float(energy_cost[i]),
+            baseline_demand_cost=baseline_demand_cost,
+            demand_cost=float(demand_cost[i]),
+            baseline_peak_kw=baseline_peak,
+            peak_kw=float(new_peak[i]),
+            energy_discharged_kwh=float(discharged[i]),
+            monthly_peak_reduction_kw=peak_reduction[:, i].tolist(),
+        )
+        for i, config in enumerate(configs)
+    ]
+
+
+def _remaining_daily_energy(timestamps: np.ndarray, energy: np.ndarray) -> np.ndarray:
+    """Energy still needed after each interval until the end of its day (per column)."""
+    days = timestamps.astype("datetime64[D]")
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    day_of_step = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(days)]))
+    cumulative = np.cumsum(energy, axis=0)
+    day_total = np.add.reduceat(energy, starts, axis=0)
+    before_day = cumulative[starts] - energy[starts]
+    return (before_day + day_total)[day_of_step] - cumulative
+
+
+def sweep(
+    profile: LoadProfile,
+    configs: Sequence[BatteryConfig],
+    strategy: DispatchStrategy = DispatchStrategy.COMBINED,
+    peak_target_kw: Optional[float] = None,
+    max_workers: Optional[int] = None,
+    chunk_size: int = SWEEP_CHUNK_SIZE,
+) -> List[DispatchResult]:
+    """
+    Simulate many configurations, spreading chunks across a process pool.
+
+    Each worker runs the vectorized simulator on a chunk of configurations;
+    small sweeps (a single chunk or ``max_workers=1``) run in-process.
+
+    Returns:
+        One DispatchResult per configuration, in input order
+    """
+    configs = list(configs)
+    chunks = [configs[i:i + chunk_size] for i in range(0, len(configs), chunk_size)]
+    workers = min(len(chunks), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return simulate_dispatch(profile, configs, strategy, peak_target_kw)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(simulate_dispatch, profile, chunk, strategy, peak_target_kw)
+                for chunk in chunks
+            ]
+            results: List[DispatchResult] = []
+            for future in futures:
+                results.extend(future.result())
+            return results
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Process pool unavailable for BESS sweep, running in-process: {e}")
+        return simulate_dispatch(profile, configs, strategy, peak_target_kw)
+
+
+def project_financials(
+    annual_savings: float,
+    capex: float,
+    opex_annual: float = 0.0,
+    years: int = 15,
+    discount_rate: float = 0.08,
+    degradation_rate: float = 0.02,
+) -> Dict[str, Any]:
+    """
+    Project simulated year-one savings over the battery lifetime.
+
+    Savings degrade linearly with capacity; operating costs are constant.
+
+    Returns:
+        Dict with payback, NPV, IRR (percent), lifetime savings and yearly rows
+    """
+    cash_flows = [-capex]
+    projections = []
+    cumulative = -capex
+    for year in range(1, years + 1):
+        savings = annual_savings * max(0.0, 1.0 - degradation_rate * (year - 1))
+        net = savings - opex_annual
+        cumulative += net
+        cash_flows.append(net)
+        projections.append({
+            "year": year,
+            "savings": round(savings, 2),
+            "opex": round(opex_annual, 2),
+            "net_cash_flow": round(net, 2),
+            "cumulative_cash_flow": round(cumulative, 2),
+        })
+
+    net_year1 = annual_savings - opex_annual
+    try:
+        irr = float(npf.irr(cash_flows))
+        irr = None if np.isnan(irr) else irr
+    except (ValueError, FloatingPointError):
+        irr = None
+
+    return {
+        "simple_payback_years": round(capex / net_year1, 2) if net_year1 > 0 else 99.0,
+        "net_present_value": round(float(npf.npv(discount_rate, cash_flows)), 2),
+        "internal_rate_of_return": round(irr * 100, 2) if irr is not None else None,
+        "lifetime_savings": round(sum(p["savings"] for p in projections), 2),
+        "annual_projections": projections,
+    }
+
+
+class BESSDispatchSimulator:
+    """Loads BESS datasets and tariffs and runs dispatch simulations over them."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_profile(self, dataset_id: int, tariff_id: Optional[int] = None) -> LoadProfile:
+        """
+        Load a dataset's interval readings as a priced load profile.
+
+        Uses the given tariff, or the site's active tariff, for TOU rates and
+        demand charges; a rate stored on the reading itself takes precedence.
+
+        Raises:
+            ValueError: If the dataset or tariff is missing or has no readings
+        """
+        dataset = self.db.query(BESSDataset).filter(BESSDataset.id == dataset_id).first()
+        if not dataset:
+            raise ValueError("Dataset not found")
+
+        query = self.db.query(Tariff).options(selectinload(Tariff.rates))
+        if tariff_id is not None:
+            tariff = query.filter(Tariff.id == tariff_id).first()
+            if not tariff:
+                raise ValueError("Tariff not found")
+        else:
+            tariff = query.filter(
+                Tariff.site_id == dataset.site_id,
+                Tariff.is_active == 1
+            ).order_by(Tariff.id).first()
+
+        rows = self.db.query(
+            BESSDataReading.timestamp, BESSDataReading.demand_kw, BESSDataReading.rate_per_kwh
+        ).filter(
+            BESSDataReading.dataset_id == dataset_id
+        ).order_by(BESSDataReading.timestamp).all()
+        if not rows:
+            raise ValueError("Dataset has no readings")
+
+        timestamps = np.array([r[0] for r in rows], dtype="datetime64[m]")
+        demand = np.fromiter((r[1] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+        stored_rates = np.fromiter(
+            (np.nan if r[2] is None else r[2] for r in rows), dtype=np.float64, count=len(rows)
+        )
+
+        rates = build_tou_rates(timestamps, tariff) if tariff else np.zeros(len(rows))
+        rates = np.where(np.isnan(stored_rates), rates, stored_rates)
+
+        demand_charge = 0.0
+        if tariff:
+            demand_charge = tariff.demand_charge_per_kw or tariff.demand_charge or 0.0
+
+        return LoadProfile(
+            timestamps=timestamps,
+            demand_kw=demand,
+            rates=rates,
+            interval_hours=(dataset.interval_minutes or 30) / 60.0,
+            demand_charges=np.full(12, float(demand_charge)),
+        )
+
+    def catalog_configs(
+        self,
+        model_ids: Optional[List[int]] = None,
+        unit_counts: Sequence[int] = (1,),
+    ) -> List[BatteryConfig]:
+        """Battery configurations for catalog models at each unit count."""
+        query = self.db.query(BESSModel).filter(BESSModel.is_active == 1)
+        if model_ids:
+            query = query.filter(BESSModel.id.in_(model_ids))
+        models = query.order_by(BESSModel.id).all()
+        return [BatteryConfig.from_model(m, units) for m in models for units in unit_counts]
+
+    def simulate_dataset(
+        self,
+        dataset_id: int,
+        configs: Sequence[BatteryConfig],
+        strategy: Union[DispatchStrategy, str] = DispatchStrategy.COMBINED,
+        tariff_id: Optional[int] = None,
+        peak_target_kw: Optional[float] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[DispatchResult]:
+        """Sweep battery configurations over a dataset, best annual savings first."""
+        profile = self.load_profile(dataset_id, tariff_id)
+        started = datetime.utcnow()
+        results = sweep(profile, configs, DispatchStrategy(strategy), peak_target_kw, max_workers)
+        logger.info(
+            f"Simulated {len(results)} BESS configurations over {len(profile.demand_kw)} intervals "
+            f"in {(datetime.utcnow() - started).total_seconds():.2f}s"
+        )
+        return sorted(results, key=lambda r: r.annual_savings, reverse=True)
+
+
+def get_bess_dispatch_simulator(db: Session) -> BESSDispatchSimulator:
+    """Factory function to create a BESSDispatchSimulator instance."""
+    return BESSDispatchSimulator(db)
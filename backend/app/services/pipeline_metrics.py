@@ -0,0 +1,167 @@
+"""
+Hot-path instrumentation for the telemetry pipeline.
+
+Times each stage a reading passes through:
+MQTT receive -> parse (topic) -> decode (JSON payload) -> resolve device ->
+normalize -> DB write -> alarm evaluate -> realtime broadcast, plus the
+ingestion buffer.
+
+Stage timings go to histograms and, when the pipeline_tracing feature flag
+is on, to spans via tracing_service.create_span. Both are switched at
+runtime with the pipeline_metrics / pipeline_tracing feature flags; when
+both are off a stage costs one attribute check.
+"""
+import logging
+import time
+from contextlib import nullcontext
+from typing import Any, Dict
+
+from app.services.config_service import feature_flags
+from app.services.metrics_service import metrics_registry
+from app.services.tracing_service import create_span, end_span, tracing_service
+
+logger = logging.getLogger(__name__)
+
+STAGES = (
+    "receive",
+    "parse",
+    "decode",
+    "resolve_device",
+    "normalize",
+    "db_write",
+    "alarm_evaluate",
+    "broadcast",
+)
+
+METRICS_FLAG = "pipeline_metrics"
+TRACING_FLAG = "pipeline_tracing"
+
+# Stages run from microseconds (normalize) to seconds (a slow commit)
+STAGE_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+)
+FLUSH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+pipeline_stage_seconds = metrics_registry.histogram(
+    "saveit_pipeline_stage_seconds",
+    "Time spent in each telemetry pipeline stage",
+    buckets=STAGE_BUCKETS
+)
+
+pipeline_stage_errors = metrics_registry.counter(
+    "saveit_pipeline_stage_errors_total",
+    "Telemetry pipeline stages that raised"
+)
+
+ingest_buffer_depth = metrics_registry.gauge(
+    "saveit_ingest_buffer_depth",
+    "Readings waiting in the MQTT ingestion buffer"
+)
+
+ingest_flush_size = metrics_registry.histogram(
+    "saveit_ingest_flush_size",
+    "Readings written per ingestion buffer flush",
+    buckets=FLUSH_SIZE_BUCKETS
+)
+
+ingest_flush_seconds = metrics_registry.histogram(
+    "saveit_ingest_flush_seconds",
+    "Ingestion buffer flush latency in seconds"
+)
+
+_NOOP = nullcontext()
+
+
+class _StageTimer:
+    """Times one pass through a stage; also a span when tracing is on."""
+
+    __slots__ = ("_pipeline", "_name", "_attributes", "_root", "_start", "_span", "_trace")
+
+    def __init__(self, pipeline: "PipelineInstrumentation", name: str, attributes: Dict[str, Any], root: bool):
+        self._pipeline = pipeline
+        self._name = name
+        self._attributes = attributes
+        self._root = root
+        self._span = None
+        self._trace = False
+
+    def __enter__(self):
+        if self._pipeline.tracing_enabled:
+            if self._root and tracing_service.get_current_trace() is None:
+                tracing_service.start_trace(attributes={"pipeline": self._name})
+                self._trace = True
+            self._span = create_span(f"pipeline.{self._name}", self._attributes)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        pipeline = self._pipeline
+        if pipeline.metrics_enabled:
+            pipeline._stage_children[self._name].observe(elapsed)
+            if exc_type is not None:
+                pipeline._error_children[self._name].inc()
+        if self._span is not None:
+            end_span(self._span, "error" if exc_type else "ok")
+        if self._trace:
+            tracing_service.end_trace()
+        return False
+
+
+class PipelineInstrumentation:
+    """Stage timers and ingestion buffer metrics, switched by feature flags."""
+
+    def __init__(self):
+        self._stage_children = {stage: pipeline_stage_seconds.labels(stage=stage) for stage in STAGES}
+        self._error_children = {stage: pipeline_stage_errors.labels(stage=stage) for stage in STAGES}
+        self._buffer_depth = ingest_buffer_depth.labels()
+        self._flush_size = ingest_flush_size.labels()
+        self._flush_seconds = ingest_flush_seconds.labels()
+        self.refresh()
+
+    def refresh(self, flag: str = None, enabled: bool = None):
+        """Re-read the feature flags; registered as a feature flag watcher."""
+        self.metrics_enabled = feature_flags.is_enabled(METRICS_FLAG)
+        self.tracing_enabled = feature_flags.is_enabled(TRACING_FLAG)
+        self.active = self.metrics_enabled or self.tracing_enabled
+
+    def stage(self, name: str, root: bool = False, **attributes):
+        """
+        Context manager timing one pass through a pipeline stage.
+
+        Args:
+            name: One of STAGES
+            root: Start a trace for the spans of this pass if none is active
+            **attributes: Span attributes
+        """
+        if not self.active:
+            return _NOOP
+        return _StageTimer(self, name, attributes, root)
+
+    def buffer_depth(self, depth: int):
+        """Record the ingestion buffer depth."""
+        if self.metrics_enabled:
+            self._buffer_depth.set(depth)
+
+    def flush(self, size: int, seconds: float):
+        """Record one ingestion buffer flush."""
+        if self.metrics_enabled:
+            self._flush_size.observe(size)
+            self._flush_seconds.observe(seconds)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Current switches and per-stage totals."""
+        stages = {}
+        for stage, child in self._stage_children.items():
+            values = child.values()
+            stages[stage] = {"count": int(sum(values[:-1])), "sum_seconds": values[-1]}
+        return {
+            "metrics_enabled": self.metrics_enabled,
+            "tracing_enabled": self.tracing_enabled,
+            "stages": stages,
+        }
+
+
+pipeline = PipelineInstrumentation()
+feature_flags.watch(pipeline.refresh)
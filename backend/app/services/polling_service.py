@@ -5,6 +5,9 @@ from datetime import datetime, timedelta
 from enum import Enum
 import asyncio
 import logging
+import random
+
+from app.services.timer_queue import TimerQueue
 
 logger = logging.getLogger(__name__)
 
@@ -34,13 +37,33 @@ class PollingTask:
 
 
 class PollingService:
-    """Background service for polling data from devices."""
+    """
+    Background service for polling data from devices.
+    
+    Tasks are kept in a deadline heap, so the service sleeps until the next
+    poll is due. Concurrent polls are bounded overall, per protocol and per
+    gateway, and each deadline gets a small random jitter so tasks with the
+    same interval do not all hit the network at once.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrent_polls: int = 200,
+        max_polls_per_protocol: int = 100,
+        max_polls_per_gateway: int = 4,
+        jitter_ratio: float = 0.1,
+    ):
         self.tasks: Dict[str, PollingTask] = {}
         self.running = False
+        self.jitter_ratio = jitter_ratio
         self._task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
+        self._timers = TimerQueue(
+            "polling",
+            self._dispatch,
+            max_concurrency=max_concurrent_polls,
+            group_limits={"protocol": max_polls_per_protocol, "gateway": max_polls_per_gateway},
+        )
     
     async def start(self):
         """Start the polling service."""
@@ -48,12 +71,13 @@ class PollingService:
             return
         
         self.running = True
-        self._task = asyncio.create_task(self._run_loop())
+        self._task = asyncio.create_task(self._timers.run())
         logger.info("Polling service started")
     
     async def stop(self):
         """Stop the polling service."""
         self.running = False
+        await self._timers.stop()
         if self._task:
             self._task.cancel()
             try:
@@ -71,19 +95,19 @@ class PollingService:
         callback: Callable,
         metadata: Optional[Dict] = None,
     ):
-        """Add a new polling task."""
+        """Add a new polling task; the first poll is jittered within a fraction of the interval."""
         task = PollingTask(
             id=task_id,
             data_source_id=data_source_id,
             protocol=protocol,
             interval_seconds=interval_seconds,
             callback=callback,
-            next_poll=datetime.utcnow(),
             metadata=metadata or {},
         )
         
         async with self._lock:
             self.tasks[task_id] = task
+            self._schedule(task, self._jitter(task))
         
         logger.info(f"Added polling task: {task_id} (interval={interval_seconds}s)")
     
@@ -92,6 +116,7 @@ class PollingService:
         async with self._lock:
             if task_id in self.tasks:
                 del self.tasks[task_id]
+                self._timers.cancel(task_id)
                 logger.info(f"Removed polling task: {task_id}")
     
     async def pause_task(self, task_id: str):
@@ -99,36 +124,41 @@ class PollingService:
         async with self._lock:
             if task_id in self.tasks:
                 self.tasks[task_id].status = PollingStatus.PAUSED
+                self.tasks[task_id].next_poll = None
+                self._timers.cancel(task_id)
     
     async def resume_task(self, task_id: str):
         """Resume a paused polling task."""
         async with self._lock:
             if task_id in self.tasks:
                 self.tasks[task_id].status = PollingStatus.IDLE
-                self.tasks[task_id].next_poll = datetime.utcnow()
+                self._schedule(self.tasks[task_id], 0)
     
-    async def _run_loop(self):
-        """Main polling loop."""
-        while self.running:
-            try:
-                now = datetime.utcnow()
-                tasks_to_poll = []
-                
-                async with self._lock:
-                    for task in self.tasks.values():
-                        if task.status == PollingStatus.PAUSED:
-                            continue
-                        if task.next_poll and task.next_poll <= now:
-                            tasks_to_poll.append(task)
-                
-                for task in tasks_to_poll:
-                    asyncio.create_task(self._execute_poll(task))
-                
-                await asyncio.sleep(1)
-            
-            except Exception as e:
-                logger.error(f"Polling loop error: {e}")
-                await asyncio.sleep(5)
+    def _jitter(self, task: PollingTask) -> float:
+        return random.uniform(0, task.interval_seconds * self.jitter_ratio)
+    
+    def _groups(self, task: PollingTask) -> List[str]:
+        groups = [f"protocol:{task.protocol}"]
+        gateway_id = task.metadata.get("gateway_id")
+        if gateway_id is not None:
+            groups.append(f"gateway:{gateway_id}")
+        return groups
+    
+    def _schedule(self, task: PollingTask, delay: float):
+        task.next_poll = datetime.utcnow() + timedelta(seconds=delay)
+        self._timers.schedule_in(task.id, delay, self._groups(task))
+    
+    async def _dispatch(self, task_id: str):
+        """Run a due poll and arm the task's next deadline."""
+        task = self.tasks.get(task_id)
+        if task is None or task.status == PollingStatus.PAUSED:
+            return
+        
+        await self._execute_poll(task)
+        
+        if self.tasks.get(task_id) is task and task.status != PollingStatus.PAUSED:
+            backoff = min(task.error_count * 2, 60) if task.error_count > 0 else 0
+            self._schedule(task, task.interval_seconds + backoff + self._jitter(task))
     
     async def _execute_poll(self, task: PollingTask):
         """Execute a single poll for a task."""
@@ -150,19 +180,16 @@ class PollingService:
             
             if task.error_count >= 5:
                 task.status = PollingStatus.PAUSED
+                task.next_poll = None
                 logger.warning(f"Task {task.id} paused after 5 consecutive errors")
-        
-        finally:
-            backoff = min(task.error_count * 2, 60) if task.error_count > 0 else 0
-            task.next_poll = datetime.utcnow() + timedelta(
-                seconds=task.interval_seconds + backoff
-            )
     
     def get_status(self) -> dict:
         """Get polling service status."""
         return {
             "running": self.running,
             "task_count": len(self.tasks),
+            "scheduled": len(self._timers),
+            "in_flight": self._timers.in_flight,
             "tasks": [
                 {
                     "id": t.id,
@@ -189,7 +216,7 @@ async def poll_modbus_device(data_source_id: int, metadata: Dict):
     logger.debug(f"Polling Modbus device: {data_source_id}")
     
     try:
-        from app.services.modbus_manager import modbus_manager
+        from app.services.modbus_manager import modbus_manager, RegisterMapping
         
         connection_id = metadata.get("connection_id")
         register_map = metadata.get("register_map", [])
@@ -198,18 +225,14 @@ async def poll_modbus_device(data_source_id: int, metadata: Dict):
             logger.warning(f"No connection_id for Modbus device {data_source_id}")
             return
         
-        readings = {}
+        mappings = []
         for reg in register_map:
             try:
-                value = await modbus_manager.read_register(
-                    connection_id,
-                    reg.get("address"),
-                    reg.get("count", 1),
-                    reg.get("function_code", 3),
-                )
-                readings[reg.get("name")] = value
-            except Exception as e:
-                logger.error(f"Failed to read register {reg}: {e}")
+                mappings.append(RegisterMapping.from_dict(reg))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Invalid register mapping {reg}: {e}")
+        
+        readings = await modbus_manager.poll_device(connection_id, mappings)
         
         if readings:
             logger.info(f"Polled {len(readings)} registers from device {data_source_id}")
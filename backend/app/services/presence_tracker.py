@@ -0,0 +1,274 @@
+"""
+Presence tracking for devices and gateways.
+- Heartbeats and telemetry update an in-memory last-seen table
+- The table is flushed in batches: one UPDATE ... RETURNING finds rows that
+  came online and one executemany writes last_seen_at, however many
+  heartbeats arrived in between
+- Devices flipped online directly by a request go through
+  ``set_device_online`` (or ``set_devices_online`` for batches), and
+  devices taken out of service through ``set_device_offline``; both record
+  the uptime event and queue the transition for the next broadcast
+- Status transitions are broadcast to realtime subscribers
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.devices import Device
+from app.models.integrations import Gateway, GatewayStatus
+from app.services.uptime_engine import record_status_events
+
+if TYPE_CHECKING:
+    from app.services.realtime_service import RealtimeService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StatusChange:
+    """A device or gateway that went online or offline."""
+    kind: str  # "device" or "gateway"
+    id: int
+    online: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f"{self.kind}_id": self.id, "online": self.online}
+
+
+class PresenceTracker:
+    """
+    Batches last-seen updates for devices and gateways.
+
+    ``device_seen`` and ``gateway_seen`` only touch memory. ``flush`` writes
+    everything recorded since the previous flush; the background worker
+    calls it every ``flush_interval`` seconds and broadcasts the devices and
+    gateways that came online.
+    """
+
+    def __init__(self, flush_interval: float = 10.0, realtime: Optional["RealtimeService"] = None):
+        self.flush_interval = flush_interval
+        self.running = False
+        self._realtime = realtime
+        self._devices: Dict[int, datetime] = {}
+        self._gateways: Dict[int, datetime] = {}
+        self._changes: List[StatusChange] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"flushes": 0, "devices": 0, "gateways": 0, "failed": 0}
+
+    @property
+    def realtime(self) -> "RealtimeService":
+        if self._realtime is None:
+            from app.services.realtime_service import get_realtime_service
+            self._realtime = get_realtime_service()
+        return self._realtime
+
+    @property
+    def pending(self) -> int:
+        return len(self._devices) + len(self._gateways) + len(self._changes)
+
+    def device_seen(self, device_id: int, timestamp: Optional[datetime] = None):
+        """Record telemetry from a device (thread-safe)."""
+        self._record(self._devices, device_id, timestamp or datetime.utcnow())
+
+    def gateway_seen(self, gateway_id: int, timestamp: Optional[datetime] = None):
+        """Record a heartbeat or data from a gateway (thread-safe)."""
+        self._record(self._gateways, gateway_id, timestamp or datetime.utcnow())
+
+    def set_device_online(self, db: Session, device: Device, timestamp: Optional[datetime] = None) -> bool:
+        """
+        Bring an offline device online immediately; the caller commits.
+
+        Records the device_online event uptime is computed from and queues
+        the transition so the next flush broadcasts it. Devices already
+        online are left to the batched last-seen updates.
+
+        Returns:
+            True if the device was offline
+        """
+        if device.is_online == 1:
+            return False
+        timestamp = timestamp or datetime.utcnow()
+        device.is_online = 1
+        device.last_seen_at = timestamp
+        record_status_events(db, {device.id: timestamp}, online=True)
+        with self._lock:
+            self._changes.append(StatusChange("device", device.id, True))
+        return True
+
+    def set_device_offline(self, db: Session, device: Device, timestamp: Optional[datetime] = None) -> bool:
+        """
+        Take an online device offline immediately; the caller commits.
+
+        Returns:
+            True if the device was online
+        """
+        if not device.is_online:
+            return False
+        device.is_online = 0
+        record_status_events(db, {device.id: timestamp or datetime.utcnow()}, online=False)
+        with self._lock:
+            self._changes.append(StatusChange("device", device.id, False))
+        return True
+
+    def set_devices_online(self, db: Session, seen: Dict[int, datetime]) -> List[int]:
+        """
+        Bring offline devices online in one statement; the caller commits.
+
+        Same as ``set_device_online`` for a batch: one UPDATE ... RETURNING
+        finds the devices that were offline, then their device_online events
+        are recorded and the transitions queued for broadcast.
+
+        Returns:
+            Ids of the devices that were offline
+        """
+        came_online = self._bring_online(db, seen, synchronize_session="evaluate")
+        with self._lock:
+            self._changes.extend(StatusChange("device", device_id, True) for device_id in came_online)
+        return came_online
+
+    @staticmethod
+    def _bring_online(db: Session, seen: Dict[int, datetime], synchronize_session=False) -> List[int]:
+        """Flip offline devices in ``seen`` online and record their events."""
+        if not seen:
+            return []
+        came_online = db.execute(
+            update(Device)
+            .where(Device.id.in_(seen), Device.is_online != 1)
+            .values(is_online=1)
+            .returning(Device.id)
+            .execution_options(synchronize_session=synchronize_session)
+        ).scalars().all()
+        record_status_events(db, {device_id: seen[device_id] for device_id in came_online}, online=True)
+        return list(came_online)
+
+    def _record(self, seen: Dict[int, datetime], key: int, timestamp: datetime):
+        with self._lock:
+            current = seen.get(key)
+            if current is None or timestamp > current:
+                seen[key] = timestamp
+
+    def flush(self, db: Session) -> List[StatusChange]:
+        """
+        Write pending last-seen times; the caller commits.
+
+        Returns:
+            Devices and gateways that were offline and are now online
+        """
+        with self._lock:
+            devices, self._devices = self._devices, {}
+            gateways, self._gateways = self._gateways, {}
+            queued, self._changes = self._changes, []
+        if not devices and not gateways:
+            return queued
+
+        changes = list(queued)
+        try:
+            if devices:
+                came_online = self._bring_online(db, devices)
+                db.execute(update(Device), [
+                    {"id": device_id, "last_seen_at": ts, "last_telemetry_at": ts}
+                    for device_id, ts in devices.items()
+                ])
+                changes.extend(StatusChange("device", device_id, True) for device_id in came_online)
+
+            if gateways:
+                came_online = db.execute(
+                    update(Gateway)
+                    .where(Gateway.id.in_(gateways), Gateway.status != GatewayStatus.ONLINE)
+                    .values(status=GatewayStatus.ONLINE)
+                    .returning(Gateway.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars().all()
+                db.execute(update(Gateway), [
+                    {"id": gateway_id, "last_seen_at": ts}
+                    for gateway_id, ts in gateways.items()
+                ])
+                changes.extend(StatusChange("gateway", gateway_id, True) for gateway_id in came_online)
+        except Exception:
+            # Keep the entries so the next flush retries them
+            for device_id, ts in devices.items():
+                self.device_seen(device_id, ts)
+            for gateway_id, ts in gateways.items():
+                self.gateway_seen(gateway_id, ts)
+            with self._lock:
+                self._changes[:0] = queued
+            raise
+
+        self._stats["flushes"] += 1
+        self._stats["devices"] += len(devices)
+        self._stats["gateways"] += len(gateways)
+        return changes
+
+    async def broadcast(self, changes: List[StatusChange]):
+        """Send status transitions to realtime subscribers as one batch."""
+        if not changes:
+            return
+        try:
+            await self.realtime.broadcast_status_batch([c.to_dict() for c in changes])
+        except Exception as e:
+            logger.error(f"Status broadcast failed: {e}")
+
+    async def start(self):
+        """Start the background flush worker."""
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info("Presence tracker started")
+
+    async def stop(self):
+        """Stop the worker and write what is still pending."""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush_and_broadcast()
+        logger.info("Presence tracker stopped")
+
+    async def _run_loop(self):
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_and_broadcast()
+
+    async def flush_and_broadcast(self):
+        """Flush in a session of its own, commit and broadcast transitions."""
+        if not self.pending:
+            return
+
+        from app.core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            changes = self.flush(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._stats["failed"] += 1
+            logger.error(f"Presence flush failed: {e}")
+            return
+        finally:
+            db.close()
+
+        await self.broadcast(changes)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get tracker status."""
+        return {
+            "running": self.running,
+            "pending_devices": len(self._devices),
+            "pending_gateways": len(self._gateways),
+            "pending_changes": len(self._changes),
+            "stats": self._stats.copy(),
+        }
+
+
+presence_tracker = PresenceTracker()
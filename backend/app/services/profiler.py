@@ -0,0 +1,237 @@
+"""
+Sampling profiler for live backends.
+
+A daemon thread samples the stacks of every thread and every pending
+asyncio task at a fixed interval, for a bounded time. Samples are
+wall-clock, so blocked and awaiting code shows up as well as busy code.
+Output is collapsed stacks (one "frame;frame;frame count" line per stack,
+the input format of flamegraph.pl and speedscope) or a nested
+flamegraph tree. A tracemalloc top-N snapshot can be taken alongside.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_DURATION = 60.0
+MIN_INTERVAL = 0.001
+MAX_STACK_DEPTH = 128
+
+# One profile at a time: samplers would otherwise sample each other
+_active_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is already running in this process."""
+
+
+_path_labels: Dict[str, str] = {}
+
+
+def _short_path(filename: str) -> str:
+    label = _path_labels.get(filename)
+    if label is None:
+        cwd = os.getcwd()
+        if filename.startswith(cwd + os.sep):
+            label = os.path.relpath(filename, cwd)
+        else:
+            label = os.sep.join(filename.split(os.sep)[-2:])
+        _path_labels[filename] = label
+    return label
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({_short_path(code.co_filename)})".replace(";", ":")
+
+
+def _thread_stack(frame) -> List[str]:
+    """Frame labels from outermost to innermost."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """Frame labels down the await chain of a task, outermost first."""
+    labels = []
+    coro = task.get_coro()
+    while coro is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+@dataclass
+class ProfileResult:
+    """Aggregated samples of one profile."""
+    started_at: datetime
+    duration_seconds: float
+    interval: float
+    samples: int
+    stacks: Counter = field(default_factory=Counter)
+    memory: Optional[List[Dict[str, Any]]] = None
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, heaviest stacks first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def flamegraph(self) -> Dict[str, Any]:
+        """Nested {name, value, children} tree, as used by d3-flame-graph."""
+        root: Dict[str, Any] = {"name": "root", "value": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            root["value"] += count
+            node = root
+            for label in stack.split(";"):
+                node = node["children"].setdefault(label, {"name": label, "value": 0, "children": {}})
+                node["value"] += count
+
+        def finish(node):
+            node["children"] = [finish(child) for child in node["children"].values()]
+            return node
+
+        return finish(root)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(self.duration_seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+            "flamegraph": self.flamegraph(),
+            "memory": self.memory,
+        }
+
+
+class SamplingProfiler:
+    """Time-boxed wall-clock sampler of threads and asyncio tasks."""
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+        threads: bool = True,
+        tasks: bool = True,
+        memory_top: int = 0,
+        max_duration: float = MAX_DURATION,
+    ):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.threads = threads
+        self.tasks = tasks
+        self.memory_top = memory_top
+        self.max_duration = min(max_duration, MAX_DURATION)
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started_at: Optional[datetime] = None
+        self._start = 0.0
+        self._tracemalloc_started = False
+
+    def start(self):
+        """Start sampling; call from the event loop to include its tasks."""
+        if not _active_lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        if self.memory_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_started = True
+        self._started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        """Stop sampling and return the aggregated profile."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        duration = time.perf_counter() - self._start
+        try:
+            memory = self._memory_snapshot() if self.memory_top else None
+        finally:
+            if self._tracemalloc_started:
+                tracemalloc.stop()
+                self._tracemalloc_started = False
+            _active_lock.release()
+
+        logger.info(f"Profile finished: {self._samples} samples over {duration:.1f}s")
+        return ProfileResult(
+            started_at=self._started_at,
+            duration_seconds=duration,
+            interval=self.interval,
+            samples=self._samples,
+            stacks=self._stacks,
+            memory=memory,
+        )
+
+    async def run(self, duration: float) -> ProfileResult:
+        """Profile the process for a number of seconds."""
+        self.start()
+        try:
+            await asyncio.sleep(min(duration, self.max_duration))
+        finally:
+            result = self.stop()
+        return result
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + self.max_duration
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() >= deadline:
+                logger.warning("Profile reached its time limit, sampling stopped")
+                break
+            try:
+                self._sample(own)
+            except Exception as e:
+                logger.debug(f"Profiler sample failed: {e}")
+
+    def _sample(self, own: int):
+        self._samples += 1
+        if self.threads:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _thread_stack(frame)
+                stack.insert(0, f"thread:{names.get(ident, ident)}")
+                self._stacks[";".join(stack)] += 1
+        if self.tasks and self._loop is not None:
+            for task in asyncio.all_tasks(self._loop):
+                stack = _task_stack(task)
+                if stack:
+                    stack.insert(0, f"task:{task.get_name()}")
+                    self._stacks[";".join(stack)] += 1
+
+    def _memory_snapshot(self) -> List[Dict[str, Any]]:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        return [
+            {
+                "location": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:self.memory_top]
+        ]
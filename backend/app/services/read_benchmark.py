@@ -0,0 +1,494 @@
+"""
+Read-path benchmark for SAVE-IT.AI.
+
+Seeds a synthetic fleet (sites, meters and bills, devices on the seeded
+Energy Meter model, months of telemetry, daily aggregations, alarms, KPIs
+and a dashboard) and drives the read endpoints through their routers:
+telemetry history, dashboard widget data, KPI listing, site comparison
+and telemetry export.
+
+Reports latency percentiles and statements per request for each endpoint.
+Statement counts are deterministic for a given fleet, so any increase over
+the recorded baseline is a regression (usually a new query in a loop).
+"""
+import glob
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.models.core import Bill, Meter, Site
+from app.models.devices import (
+    AlarmCondition, AlarmRule, AlarmSeverity, Datapoint, Device, DeviceModel, DeviceTelemetry
+)
+from app.models.platform import Organization, User
+from app.models.telemetry import (
+    AggregationPeriod, AlarmStatus, DeviceAlarm, KPIDefinition, KPIType, KPIValue, TelemetryAggregation
+)
+from app.services.dashboard_service import Dashboard, DashboardWidget, WidgetType
+from app.services.export_service import ExportJob, ExportService
+from app.services.ingest_benchmark import _percentile
+from app.services.seed_device_data import seed_device_models
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "Energy Meter"
+HISTORY_DATAPOINT = "voltage_l1"
+
+# Nominal readings for the Energy Meter datapoints the fleet reports
+NOMINAL = {
+    "voltage_l1": 230.0, "current_l1": 40.0, "active_power": 27.0,
+    "power_factor": 0.95, "frequency": 50.0, "total_energy": 150000.0,
+}
+
+TELEMETRY_CHUNK = 5000
+
+
+@dataclass
+class ReadFleetConfig:
+    """Shape of the seeded fleet and the measurement."""
+    sites: int = 5
+    devices_per_site: int = 10
+    months: int = 3
+    interval_minutes: int = 15
+    datapoints: int = 4  # first N of NOMINAL reported by every device
+    alarms_per_device: int = 20
+    kpis_per_site: int = 5
+    iterations: int = 20
+    seed: int = 42
+
+
+@dataclass
+class ReadFleet:
+    """Rows created for one benchmark run."""
+    organization_id: int
+    user_id: int
+    site_ids: List[int]
+    device_ids: List[int]
+    alarm_rule_id: int
+    dashboard_id: int
+    widgets: Dict[str, int]
+    start: datetime
+    end: datetime
+    datapoints: List[str] = field(default_factory=list)
+
+
+def _telemetry_rows(device_id: int, datapoints: Dict[str, int], start: datetime, end: datetime,
+                    interval: timedelta, rng: random.Random):
+    ts = start
+    while ts < end:
+        for name, datapoint_id in datapoints.items():
+            yield {
+                "device_id": device_id,
+                "datapoint_id": datapoint_id,
+                "timestamp": ts,
+                "value": round(NOMINAL[name] * rng.uniform(0.97, 1.03), 3),
+                "quality": "good",
+            }
+        ts += interval
+
+
+def seed_read_fleet(db: Session, config: ReadFleetConfig) -> ReadFleet:
+    """Create the organization, sites, devices and their history for a run."""
+    tag = uuid.uuid4().hex[:8]
+    rng = random.Random(config.seed)
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=30 * config.months)
+
+    interval = timedelta(minutes=config.interval_minutes)
+    per_day = int(timedelta(days=1) / interval)
+
+    seed_device_models(db)
+    db.flush()
+    model = db.query(DeviceModel).filter(DeviceModel.name == MODEL_NAME).first()
+    names = list(NOMINAL)[:config.datapoints]
+    datapoints = {
+        dp.name: dp.id
+        for dp in db.query(Datapoint).filter(Datapoint.model_id == model.id, Datapoint.name.in_(names))
+    }
+
+    organization = Organization(name=f"Read benchmark {tag}", slug=f"read-benchmark-{tag}")
+    db.add(organization)
+    db.flush()
+    user = User(organization_id=organization.id, email=f"read-benchmark-{tag}@example.com",
+                password_hash="!")
+    rule = AlarmRule(
+        model_id=model.id,
+        datapoint_id=datapoints[HISTORY_DATAPOINT],
+        name=f"Read benchmark {tag} voltage high",
+        condition=AlarmCondition.GREATER_THAN,
+        threshold_value=NOMINAL[HISTORY_DATAPOINT] * 1.1,
+        severity=AlarmSeverity.WARNING,
+    )
+    db.add_all([user, rule])
+    db.flush()
+
+    site_ids, device_ids = [], []
+    months = [(start + timedelta(days=30 * m)).date() for m in range(config.months + 1)]
+    for s in range(config.sites):
+        site = Site(name=f"Read benchmark {tag} site {s}")
+        db.add(site)
+        db.flush()
+        site_ids.append(site.id)
+
+        devices = [
+            Device(site_id=site.id, model_id=model.id, name=f"Read benchmark meter {s}.{d}",
+                   edge_key=f"rb-{tag}-{s}-{d}", is_active=1, is_online=int(d % 4 != 0))
+            for d in range(config.devices_per_site)
+        ]
+        db.add_all(devices)
+        db.add_all([
+            Meter(site_id=site.id, meter_id=f"RB-{tag}-{s}-{d}", name=f"Meter {s}.{d}")
+            for d in range(config.devices_per_site)
+        ])
+        db.add_all([
+            Bill(site_id=site.id, period_start=period_start, period_end=period_end,
+                 total_kwh=round(rng.uniform(20000, 40000), 1), total_amount=round(rng.uniform(3000, 6000), 2))
+            for period_start, period_end in zip(months, months[1:])
+        ])
+        db.flush()
+        device_ids.extend(d.id for d in devices)
+
+        for k in range(config.kpis_per_site):
+            device = devices[k % len(devices)]
+            name = names[k % len(names)]
+            kpi = KPIDefinition(
+                organization_id=organization.id, site_id=site.id, name=f"{name}_avg_{k}",
+                kpi_type=KPIType.AVG, source_device_id=device.id, source_datapoint_id=datapoints[name],
+                calculation_interval="daily", last_calculated_at=end,
+            )
+            db.add(kpi)
+            db.flush()
+            db.add_all([
+                KPIValue(kpi_id=kpi.id, period_start=start + timedelta(days=day),
+                         period_end=start + timedelta(days=day + 1), value=NOMINAL[name], data_points_used=per_day)
+                for day in range((end - start).days)
+            ])
+
+    for device_id in device_ids:
+        rows = _telemetry_rows(device_id, datapoints, start, end, interval, rng)
+        while True:
+            chunk = [row for _, row in zip(range(TELEMETRY_CHUNK), rows)]
+            if not chunk:
+                break
+            db.execute(insert(DeviceTelemetry), chunk)
+
+        db.add_all([
+            TelemetryAggregation(
+                device_id=device_id, datapoint_id=datapoint_id, period=AggregationPeriod.DAILY,
+                period_start=start + timedelta(days=day), period_end=start + timedelta(days=day + 1),
+                value_min=NOMINAL[name] * 0.97, value_max=NOMINAL[name] * 1.03, value_avg=NOMINAL[name],
+                value_count=per_day,
+            )
+            for name, datapoint_id in datapoints.items()
+            for day in range((end - start).days)
+        ])
+        status = [AlarmStatus.TRIGGERED, AlarmStatus.ACKNOWLEDGED, AlarmStatus.CLEARED]
+        db.add_all([
+            DeviceAlarm(
+                device_id=device_id, alarm_rule_id=rule.id, datapoint_id=datapoints[HISTORY_DATAPOINT],
+                status=status[a % len(status)], severity="warning", title="Voltage high",
+                message="voltage_l1 above threshold", trigger_value=NOMINAL[HISTORY_DATAPOINT] * 1.12,
+                threshold_value=rule.threshold_value, condition="gt",
+                triggered_at=start + (end - start) * rng.random(),
+            )
+            for a in range(config.alarms_per_device)
+        ])
+        db.flush()
+
+    dashboard = Dashboard(organization_id=organization.id, owner_id=user.id, name=f"Read benchmark {tag}")
+    db.add(dashboard)
+    db.flush()
+    sources = {
+        "line_chart": (WidgetType.LINE_CHART, {"device_id": device_ids[0], "datapoints": names, "hours": 24 * 7}),
+        "gauge": (WidgetType.GAUGE, {"device_id": device_ids[0], "datapoint": HISTORY_DATAPOINT}),
+        "alarm_list": (WidgetType.ALARM_LIST, {"limit": 20}),
+        "device_status": (WidgetType.DEVICE_STATUS, {"site_id": site_ids[0]}),
+    }
+    widgets = {}
+    for name, (widget_type, source) in sources.items():
+        widget = DashboardWidget(dashboard_id=dashboard.id, widget_type=widget_type.value,
+                                 title=name, data_source=json.dumps(source))
+        db.add(widget)
+        db.flush()
+        widgets[name] = widget.id
+
+    db.commit()
+    return ReadFleet(
+        organization_id=organization.id,
+        user_id=user.id,
+        site_ids=site_ids,
+        device_ids=device_ids,
+        alarm_rule_id=rule.id,
+        dashboard_id=dashboard.id,
+        widgets=widgets,
+        start=start,
+        end=end,
+        datapoints=names,
+    )
+
+
+def teardown_read_fleet(db: Session, fleet: ReadFleet):
+    """Delete everything a run created; the seeded device models are kept."""
+    kpi_ids = [k for (k,) in db.query(KPIDefinition.id).filter(KPIDefinition.site_id.in_(fleet.site_ids))]
+    for model, column, ids in (
+        (KPIValue, KPIValue.kpi_id, kpi_ids),
+        (KPIDefinition, KPIDefinition.id, kpi_ids),
+        (DashboardWidget, DashboardWidget.dashboard_id, [fleet.dashboard_id]),
+        (Dashboard, Dashboard.id, [fleet.dashboard_id]),
+        (ExportJob, ExportJob.user_id, [fleet.user_id]),
+        (DeviceAlarm, DeviceAlarm.device_id, fleet.device_ids),
+        (TelemetryAggregation, TelemetryAggregation.device_id, fleet.device_ids),
+        (DeviceTelemetry, DeviceTelemetry.device_id, fleet.device_ids),
+        (Device, Device.id, fleet.device_ids),
+        (AlarmRule, AlarmRule.id, [fleet.alarm_rule_id]),
+        (Bill, Bill.site_id, fleet.site_ids),
+        (Meter, Meter.site_id, fleet.site_ids),
+        (Site, Site.id, fleet.site_ids),
+        (User, User.id, [fleet.user_id]),
+        (Organization, Organization.id, [fleet.organization_id]),
+    ):
+        db.query(model).filter(column.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+@dataclass
+class ReadScenario:
+    """One endpoint call, parameterised by the iteration number."""
+    name: str
+    method: str
+    path: Callable[[int], str]
+    body: Optional[Callable[[int], Dict[str, Any]]] = None
+
+
+def build_scenarios(fleet: ReadFleet) -> List[ReadScenario]:
+    """The read endpoints under test, rotating over the fleet's devices."""
+    devices = fleet.device_ids
+    week_ago = (fleet.end - timedelta(days=7)).isoformat()
+    sites = ",".join(str(s) for s in fleet.site_ids[:5])
+
+    def device(i: int) -> int:
+        return devices[i % len(devices)]
+
+    scenarios = [
+        ReadScenario(
+            "telemetry_history", "GET",
+            lambda i: f"/telemetry/devices/{device(i)}/history?datapoint={HISTORY_DATAPOINT}&start={week_ago}",
+        ),
+    ]
+    scenarios += [
+        ReadScenario(f"widget_{name}", "GET", lambda i, w=widget_id: f"/dashboards/widgets/{w}/data")
+        for name, widget_id in fleet.widgets.items()
+    ]
+    scenarios += [
+        ReadScenario("kpis", "GET", lambda i: f"/kpis?site_id={fleet.site_ids[i % len(fleet.site_ids)]}"),
+        ReadScenario("compare_sites", "GET", lambda i: f"/api/v1/analysis/compare-sites?site_ids={sites}"),
+        ReadScenario(
+            "export_telemetry", "POST", lambda i: f"/exports?user_id={fleet.user_id}",
+            lambda i: {
+                "export_type": "telemetry",
+                "format": "csv",
+                "filters": {"device_id": device(i), "start_time": week_ago},
+            },
+        ),
+    ]
+    return scenarios
+
+
+def build_app(session_factory: Callable[[], Session]) -> FastAPI:
+    """The routers under test without middleware, so only the endpoint's own statements count."""
+    from app.api.routers import (
+        analysis_router, dashboards_router, exports_router, kpis_router, telemetry_router
+    )
+
+    app = FastAPI()
+    for router in (telemetry_router, dashboards_router, kpis_router, analysis_router, exports_router):
+        app.include_router(router)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+class StatementCounter:
+    """Counts statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def _response_error(response) -> Optional[str]:
+    if response.status_code >= 400:
+        return f"HTTP {response.status_code}"
+    body = response.json()
+    if isinstance(body, dict) and body.get("error"):
+        return body["error"]
+    return None
+
+
+@dataclass
+class EndpointResult:
+    """Measurements for one scenario."""
+    name: str
+    latencies: List[float]
+    queries: List[int]
+    errors: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(self.latencies),
+            "queries": max(self.queries, default=0),
+            "latency_p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "latency_p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "errors": sorted(set(self.errors)),
+        }
+
+
+@dataclass
+class ReadBenchmarkResult:
+    """Outcome of one benchmark run."""
+    config: ReadFleetConfig
+    database: str
+    started_at: datetime
+    telemetry_rows: int
+    endpoints: List[EndpointResult]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "database": self.database,
+            "started_at": self.started_at.isoformat(),
+            "config": asdict(self.config),
+            "telemetry_rows": self.telemetry_rows,
+            "endpoints": {e.name: e.to_dict() for e in self.endpoints},
+        }
+
+
+def _remove_export_files(storage_path: str, response):
+    if response.status_code < 400:
+        for path in glob.glob(os.path.join(storage_path, f"export_{response.json()['job_id']}_*")):
+            os.remove(path)
+
+
+def run_read_benchmark(
+    config: ReadFleetConfig,
+    session_factory: Optional[Callable[[], Session]] = None,
+    keep_data: bool = False,
+) -> ReadBenchmarkResult:
+    """Seed a fleet, call each read endpoint config.iterations times and measure it."""
+    if session_factory is None:
+        from app.core.database import SessionLocal as session_factory
+
+    db = session_factory()
+    engine = db.get_bind()
+    started_at = datetime.utcnow()
+    seed_started = time.perf_counter()
+    fleet = seed_read_fleet(db, config)
+    try:
+        telemetry_rows = db.query(DeviceTelemetry).filter(
+            DeviceTelemetry.device_id.in_(fleet.device_ids)
+        ).count()
+        logger.info(
+            f"Read benchmark: seeded {telemetry_rows} telemetry rows for {len(fleet.device_ids)} devices "
+            f"in {time.perf_counter() - seed_started:.1f}s"
+        )
+
+        client = TestClient(build_app(session_factory), raise_server_exceptions=False)
+        counter = StatementCounter(engine)
+        results = []
+        for scenario in build_scenarios(fleet):
+            result = EndpointResult(scenario.name, [], [], [])
+            # One unmeasured call warms caches and compiled statements
+            for i in range(-1, config.iterations):
+                body = scenario.body(i) if scenario.body else None
+                with counter:
+                    request_started = time.perf_counter()
+                    response = client.request(scenario.method, scenario.path(i), json=body)
+                    elapsed = time.perf_counter() - request_started
+                if scenario.name.startswith("export"):
+                    _remove_export_files(ExportService(db).storage_path, response)
+                if i < 0:
+                    continue
+                result.latencies.append(elapsed)
+                result.queries.append(counter.count)
+                error = _response_error(response)
+                if error:
+                    result.errors.append(error)
+            results.append(result)
+
+        return ReadBenchmarkResult(
+            config=config,
+            database=engine.dialect.name,
+            started_at=started_at,
+            telemetry_rows=telemetry_rows,
+            endpoints=results,
+        )
+    finally:
+        if not keep_data:
+            db.rollback()
+            teardown_read_fleet(db, fleet)
+        db.close()
+
+
+def compare_with_baseline(
+    result: Dict[str, Any],
+    baseline: Dict[str, Any],
+    latency_tolerance: Optional[float] = None,
+) -> List[str]:
+    """
+    Regressions of a result against a baseline, both as from to_dict().
+
+    Any endpoint issuing more statements per request than the baseline
+    regressed, as did one that now errors. Latency is only compared when a
+    tolerance (a fraction) is given. Runs with another fleet shape are not
+    compared, since statement counts depend on it.
+    """
+    if baseline.get("config") != result["config"]:
+        raise ValueError("Baseline was recorded with a different fleet configuration")
+
+    regressions = []
+    for name, actual in result["endpoints"].items():
+        expected = baseline["endpoints"].get(name)
+        if expected is None:
+            continue
+        if actual["queries"] > expected["queries"]:
+            regressions.append(f"{name}: {actual['queries']} queries/request > baseline {expected['queries']}")
+        if actual["errors"] and not expected["errors"]:
+            regressions.append(f"{name}: errors {actual['errors']}")
+        if latency_tolerance is not None and baseline.get("database") == result["database"]:
+            limit = expected["latency_p95_ms"] * (1 + latency_tolerance)
+            if actual["latency_p95_ms"] > limit:
+                regressions.append(
+                    f"{name}: latency_p95_ms {actual['latency_p95_ms']} > baseline {expected['latency_p95_ms']}"
+                )
+    return regressions
@@ -15,6 +15,8 @@ from dataclasses import dataclass, field
 
 from fastapi import WebSocket, WebSocketDisconnect
 
+from app.services.pipeline_metrics import pipeline
+
 logger = logging.getLogger(__name__)
 
 
@@ -131,7 +133,8 @@ class RealtimeService:
         - site:{site_id} - All devices at site
         - alarm:* - All alarms
         - alarm:{severity} - Alarms of specific severity
-        - status:* - All device status changes
+        - gateway:{gateway_id} - Gateway status changes
+        - status:* - All device and gateway status changes
 
         Args:
             client_id: Client identifier
@@ -213,22 +216,54 @@ class RealtimeService:
         Args:
             alarm: Alarm data (device_id, severity, title, etc.)
         """
-        device_id = alarm.get("device_id")
-        severity = alarm.get("severity", "unknown")
-
         message = {
             "type": "alarm",
             "alarm": alarm,
             "timestamp": datetime.utcnow().isoformat()
         }
 
-        topics = [
-            f"device:{device_id}",
-            "alarm:*",
-            f"alarm:{severity}"
+        await self._broadcast(self._alarm_topics(alarm), message)
+
+    async def broadcast_alarm_batch(self, alarms: List[Dict[str, Any]]):
+        """
+        Broadcast many alarm events as one message per subscriber.
+        Each client receives only the alarms matching its subscriptions.
+
+        Args:
+            alarms: Alarm data dicts, as for broadcast_alarm
+        """
+        per_client: Dict[str, List[Dict[str, Any]]] = {}
+
+        async with self._lock:
+            for alarm in alarms:
+                client_ids = set()
+                for topic in self._alarm_topics(alarm):
+                    client_ids.update(self._subscriptions.get(topic, ()))
+                for client_id in client_ids:
+                    per_client.setdefault(client_id, []).append(alarm)
+
+        timestamp = datetime.utcnow().isoformat()
+        tasks = [
+            self._send_to_client(client_id, {
+                "type": "alarm_batch",
+                "alarms": client_alarms,
+                "count": len(client_alarms),
+                "timestamp": timestamp
+            })
+            for client_id, client_alarms in per_client.items()
         ]
 
-        await self._broadcast(topics, message)
+        if tasks:
+            with pipeline.stage("broadcast", message_type="alarm_batch"):
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _alarm_topics(self, alarm: Dict[str, Any]) -> List[str]:
+        """Topics an alarm is delivered on."""
+        return [
+            f"device:{alarm.get('device_id')}",
+            "alarm:*",
+            f"alarm:{alarm.get('severity', 'unknown')}"
+        ]
 
     async def broadcast_status(self, device_id: int, online: bool):
         """
@@ -252,6 +287,42 @@ class RealtimeService:
 
         await self._broadcast(topics, message)
 
+    async def broadcast_status_batch(self, changes: List[Dict[str, Any]]):
+        """
+        Broadcast many device/gateway status changes as one message per subscriber.
+
+        Args:
+            changes: Dicts with device_id or gateway_id, and online
+        """
+        per_client: Dict[str, List[Dict[str, Any]]] = {}
+
+        async with self._lock:
+            for change in changes:
+                if "gateway_id" in change:
+                    topics = [f"gateway:{change['gateway_id']}", "status:*"]
+                else:
+                    topics = [f"device:{change.get('device_id')}", "status:*"]
+                client_ids = set()
+                for topic in topics:
+                    client_ids.update(self._subscriptions.get(topic, ()))
+                for client_id in client_ids:
+                    per_client.setdefault(client_id, []).append(change)
+
+        timestamp = datetime.utcnow().isoformat()
+        tasks = [
+            self._send_to_client(client_id, {
+                "type": "status_batch",
+                "changes": client_changes,
+                "count": len(client_changes),
+                "timestamp": timestamp
+            })
+            for client_id, client_changes in per_client.items()
+        ]
+
+        if tasks:
+            with pipeline.stage("broadcast", message_type="status_batch"):
+                await asyncio.gather(*tasks, return_exceptions=True)
+
     async def broadcast_event(
         self,
         device_id: int,
@@ -280,21 +351,22 @@ class RealtimeService:
 
     async def _broadcast(self, topics: List[str], message: Dict[str, Any]):
         """Broadcast message to all subscribers of given topics."""
-        client_ids = set()
-
-        async with self._lock:
-            for topic in topics:
-                if topic in self._subscriptions:
-                    client_ids.update(self._subscriptions[topic])
-
-        # Send to all matching clients
-        tasks = [
-            self._send_to_client(client_id, message)
-            for client_id in client_ids
-        ]
-
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        with pipeline.stage("broadcast", message_type=message.get("type")):
+            client_ids = set()
+
+            async with self._lock:
+                for topic in topics:
+                    if topic in self._subscriptions:
+                        client_ids.update(self._subscriptions[topic])
+
+            # Send to all matching clients
+            tasks = [
+                self._send_to_client(client_id, message)
+                for client_id in client_ids
+            ]
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
 
     async def _send_to_client(self, client_id: str, message: Dict[str, Any]):
         """Send message to a specific client."""
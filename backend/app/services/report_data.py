@@ -0,0 +1,260 @@
+"""
+Report data layer for SAVE-IT.AI
+Resolves report sections against pre-aggregated data:
+- Telemetry statistics come from the coarsest TelemetryAggregation rollup
+  that covers each part of the period; only unaligned edges and periods the
+  aggregation jobs have not reached yet fall back to raw telemetry
+- Per-device and per-KPI lookups are single grouped queries
+- Gathered sections are cached per (template, period) so several formats and
+  recipients of the same report share one computation
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.middleware.cache import InMemoryCache
+from app.models.devices import Datapoint, Device, DeviceTelemetry
+from app.models.telemetry import AggregationPeriod, KPIDefinition, KPIValue, TelemetryAggregation
+
+logger = logging.getLogger(__name__)
+
+# Gathered sections are reused for this long, e.g. across the schedules due in one run
+SECTION_CACHE_TTL = 600
+
+report_section_cache = InMemoryCache(max_size=100)
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _floor_month(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def _combine(fn: Callable, a, b):
+    if a is None:
+        return b
+    return a if b is None else fn(a, b)
+
+
+def _ceil(value: datetime, floor: Callable[[datetime], datetime], step: Callable[[datetime], datetime]) -> datetime:
+    floored = floor(value)
+    return floored if floored == value else step(floored)
+
+
+# Coarsest first: (period, floor, next bucket start)
+ROLLUP_LEVELS: List[Tuple[AggregationPeriod, Callable, Callable]] = [
+    (AggregationPeriod.MONTHLY, _floor_month, _next_month),
+    (AggregationPeriod.DAILY, _floor_day, lambda d: d + timedelta(days=1)),
+    (AggregationPeriod.HOURLY, _floor_hour, lambda d: d + timedelta(hours=1)),
+]
+
+
+@dataclass
+class RollupSegment:
+    """Part of a report period answered from one source."""
+    period: Optional[AggregationPeriod]  # None reads raw telemetry
+    start: datetime
+    end: datetime
+
+
+def plan_rollups(
+    start: datetime,
+    end: datetime,
+    watermarks: Dict[AggregationPeriod, datetime],
+    level: int = 0,
+) -> List[RollupSegment]:
+    """
+    Split [start, end) into segments served by the coarsest usable rollup.
+
+    A rollup level covers the whole buckets inside the range that end before
+    its watermark (the latest aggregated period_end); the remaining edges are
+    planned against the next finer level, and finally raw telemetry.
+    """
+    if start >= end:
+        return []
+    if level >= len(ROLLUP_LEVELS):
+        return [RollupSegment(None, start, end)]
+
+    period, floor, step = ROLLUP_LEVELS[level]
+    watermark = watermarks.get(period)
+    inner_start = _ceil(start, floor, step)
+    inner_end = floor(min(end, watermark)) if watermark else inner_start
+
+    if inner_start >= inner_end:
+        return plan_rollups(start, end, watermarks, level + 1)
+
+    return [
+        *plan_rollups(start, inner_start, watermarks, level + 1),
+        RollupSegment(period, inner_start, inner_end),
+        *plan_rollups(inner_end, end, watermarks, level + 1),
+    ]
+
+
+class ReportDataLayer:
+    """Batched, rollup-aware queries behind report sections."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def rollup_watermarks(self) -> Dict[AggregationPeriod, datetime]:
+        """Latest aggregated period_end per rollup level."""
+        rows = self.db.query(
+            TelemetryAggregation.period,
+            func.max(TelemetryAggregation.period_end)
+        ).group_by(TelemetryAggregation.period).all()
+        return {period: period_end for period, period_end in rows if period_end}
+
+    def telemetry_summary(
+        self,
+        period_start: datetime,
+        period_end: datetime,
+        device_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """Count, average, min and max per device datapoint over the period."""
+        segments = plan_rollups(period_start, period_end, self.rollup_watermarks())
+
+        by_source: Dict[Optional[AggregationPeriod], List[RollupSegment]] = defaultdict(list)
+        for segment in segments:
+            by_source[segment.period].append(segment)
+
+        totals: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for source, source_segments in by_source.items():
+            for row in self._summary_rows(source, source_segments, device_ids):
+                self._merge(totals, row)
+
+        names = dict(self.db.query(Datapoint.id, Datapoint.name).filter(
+            Datapoint.id.in_({dp_id for _, dp_id in totals if dp_id is not None})
+        ).all()) if totals else {}
+
+        return [
+            {
+                "device_id": device_id,
+                "datapoint": names.get(datapoint_id),
+                "count": t["count"],
+                "avg": round(t["sum"] / t["count"], 2) if t["count"] else None,
+                "min": t["min"],
+                "max": t["max"],
+            }
+            for (device_id, datapoint_id), t in sorted(
+                totals.items(), key=lambda item: (item[0][0], item[0][1] or 0)
+            )
+        ]
+
+    def _summary_rows(
+        self,
+        source: Optional[AggregationPeriod],
+        segments: List[RollupSegment],
+        device_ids: Optional[List[int]]
+    ):
+        """One grouped query over all segments served by ``source``."""
+        if source is None:
+            model = DeviceTelemetry
+            query = self.db.query(
+                model.device_id,
+                model.datapoint_id,
+                func.count(model.value).label("count"),
+                func.sum(model.value).label("sum"),
+                func.min(model.value).label("min"),
+                func.max(model.value).label("max"),
+            ).filter(
+                model.value.isnot(None),
+                or_(*(and_(model.timestamp >= s.start, model.timestamp < s.end) for s in segments))
+            )
+        else:
+            model = TelemetryAggregation
+            query = self.db.query(
+                model.device_id,
+                model.datapoint_id,
+                func.sum(model.value_count).label("count"),
+                func.sum(model.value_sum).label("sum"),
+                func.min(model.value_min).label("min"),
+                func.max(model.value_max).label("max"),
+            ).filter(
+                model.period == source,
+                or_(*(and_(model.period_start >= s.start, model.period_end <= s.end) for s in segments))
+            )
+
+        if device_ids:
+            query = query.filter(model.device_id.in_(device_ids))
+        return query.group_by(model.device_id, model.datapoint_id).all()
+
+    @staticmethod
+    def _merge(totals: Dict[Tuple[int, int], Dict[str, Any]], row):
+        if not row.count:
+            return
+        key = (row.device_id, row.datapoint_id)
+        current = totals.get(key)
+        if current is None:
+            totals[key] = {"count": int(row.count), "sum": float(row.sum or 0), "min": row.min, "max": row.max}
+            return
+        current["count"] += int(row.count)
+        current["sum"] += float(row.sum or 0)
+        current["min"] = _combine(min, current["min"], row.min)
+        current["max"] = _combine(max, current["max"], row.max)
+
+    def kpi_values(
+        self,
+        period_start: datetime,
+        period_end: datetime
+    ) -> List[Dict[str, Any]]:
+        """Active KPIs with their values in the period, in two queries."""
+        kpis = self.db.query(KPIDefinition).filter(
+            KPIDefinition.is_active == 1
+        ).all()
+        if not kpis:
+            return []
+
+        values = self.db.query(KPIValue).filter(
+            KPIValue.kpi_id.in_([k.id for k in kpis]),
+            KPIValue.period_start >= period_start,
+            KPIValue.period_end <= period_end
+        ).order_by(KPIValue.kpi_id, KPIValue.period_start).all()
+
+        by_kpi: Dict[int, List[KPIValue]] = defaultdict(list)
+        for value in values:
+            by_kpi[value.kpi_id].append(value)
+
+        return [
+            {
+                "kpi_id": kpi.id,
+                "name": kpi.name,
+                "values": [
+                    {
+                        "period_start": v.period_start.isoformat(),
+                        "period_end": v.period_end.isoformat(),
+                        "value": v.value
+                    }
+                    for v in by_kpi[kpi.id]
+                ]
+            }
+            for kpi in kpis
+        ]
+
+    def active_devices(self, device_ids: Optional[List[int]] = None) -> List[Device]:
+        query = self.db.query(Device).filter(Device.is_active == 1)
+        if device_ids:
+            query = query.filter(Device.id.in_(device_ids))
+        return query.all()
+
+
+def section_cache_key(template_id: int, updated_at: Optional[datetime], period_start: datetime, period_end: datetime) -> str:
+    """Cache key for a template's sections over a period; edits to the template change it."""
+    version = updated_at.isoformat() if updated_at else ""
+    return f"report:{template_id}:{version}:{period_start.isoformat()}:{period_end.isoformat()}"
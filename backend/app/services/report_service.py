@@ -17,6 +17,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
 
 from app.core.database import Base
+from app.services.report_data import (
+    SECTION_CACHE_TTL,
+    ReportDataLayer,
+    report_section_cache,
+    section_cache_key,
+)
+from app.services.uptime_engine import DeviceUptime, UptimeEngine
 
 logger = logging.getLogger(__name__)
 
@@ -347,18 +354,12 @@ class ReportService:
         config = json.loads(template.config) if template.config else {}
         filters = json.loads(template.filters) if template.filters else {}
 
-        sections = []
-
-        if report_type == ReportType.TELEMETRY_SUMMARY.value:
-            sections = self._gather_telemetry_summary(period_start, period_end, filters)
-        elif report_type == ReportType.ALARM_SUMMARY.value:
-            sections = self._gather_alarm_summary(period_start, period_end, filters)
-        elif report_type == ReportType.DEVICE_STATUS.value:
-            sections = self._gather_device_status(period_start, period_end, filters)
-        elif report_type == ReportType.UPTIME_REPORT.value:
-            sections = self._gather_uptime_report(period_start, period_end, filters)
-        elif report_type == ReportType.KPI_REPORT.value:
-            sections = self._gather_kpi_report(period_start, period_end, filters)
+        # Every format and recipient of the same template and period shares one gather
+        key = section_cache_key(template.id, template.updated_at, period_start, period_end)
+        sections = report_section_cache.get(key)
+        if sections is None:
+            sections = self._gather_sections(report_type, period_start, period_end, filters)
+            report_section_cache.set(key, sections, ttl=SECTION_CACHE_TTL)
 
         return ReportData(
             title=template.name,
@@ -372,49 +373,43 @@ class ReportService:
             generated_at=datetime.utcnow()
         )
 
-    def _gather_telemetry_summary(
+    def _gather_sections(
         self,
+        report_type: str,
         period_start: datetime,
         period_end: datetime,
         filters: Dict
     ) -> List[Dict]:
-        """Gather telemetry summary data."""
-        from app.models.devices import DeviceTelemetry
-        from sqlalchemy import func
+        """Gather section data for a report type."""
+        sections = []
 
-        query = self.db.query(
-            DeviceTelemetry.device_id,
-            DeviceTelemetry.datapoint_name,
-            func.count(DeviceTelemetry.id).label('count'),
-            func.avg(DeviceTelemetry.value).label('avg'),
-            func.min(DeviceTelemetry.value).label('min'),
-            func.max(DeviceTelemetry.value).label('max')
-        ).filter(
-            DeviceTelemetry.timestamp >= period_start,
-            DeviceTelemetry.timestamp <= period_end
-        )
+        if report_type == ReportType.TELEMETRY_SUMMARY.value:
+            sections = self._gather_telemetry_summary(period_start, period_end, filters)
+        elif report_type == ReportType.ALARM_SUMMARY.value:
+            sections = self._gather_alarm_summary(period_start, period_end, filters)
+        elif report_type == ReportType.DEVICE_STATUS.value:
+            sections = self._gather_device_status(period_start, period_end, filters)
+        elif report_type == ReportType.UPTIME_REPORT.value:
+            sections = self._gather_uptime_report(period_start, period_end, filters)
+        elif report_type == ReportType.KPI_REPORT.value:
+            sections = self._gather_kpi_report(period_start, period_end, filters)
 
-        if filters.get("device_ids"):
-            query = query.filter(DeviceTelemetry.device_id.in_(filters["device_ids"]))
+        return sections
 
-        results = query.group_by(
-            DeviceTelemetry.device_id,
-            DeviceTelemetry.datapoint_name
-        ).all()
+    def _gather_telemetry_summary(
+        self,
+        period_start: datetime,
+        period_end: datetime,
+        filters: Dict
+    ) -> List[Dict]:
+        """Gather telemetry summary data from the coarsest usable rollups."""
+        data = ReportDataLayer(self.db).telemetry_summary(
+            period_start, period_end, filters.get("device_ids")
+        )
 
         return [{
             "type": "telemetry_summary",
-            "data": [
-                {
-                    "device_id": r.device_id,
-                    "datapoint": r.datapoint_name,
-                    "count": r.count,
-                    "avg": round(float(r.avg), 2) if r.avg else None,
-                    "min": r.min,
-                    "max": r.max
-                }
-                for r in results
-            ]
+            "data": data
         }]
 
     def _gather_alarm_summary(
@@ -480,30 +475,22 @@ class ReportService:
         period_end: datetime,
         filters: Dict
     ) -> List[Dict]:
-        """Gather uptime report data."""
-        # Simplified uptime calculation
-        from app.models.devices import DeviceEvent, Device
-
-        devices = self.db.query(Device).filter(Device.is_active == 1).all()
+        """Gather uptime report data from materialized daily availability."""
+        devices = ReportDataLayer(self.db).active_devices(filters.get("device_ids"))
+        uptime = UptimeEngine(self.db).availability(
+            period_start, period_end, filters.get("device_ids")
+        )
 
         uptime_data = []
         for device in devices:
-            # Calculate uptime based on online/offline events
-            events = self.db.query(DeviceEvent).filter(
-                DeviceEvent.device_id == device.id,
-                DeviceEvent.event_type.in_(['device_online', 'device_offline']),
-                DeviceEvent.timestamp >= period_start,
-                DeviceEvent.timestamp <= period_end
-            ).order_by(DeviceEvent.timestamp.asc()).all()
-
-            # Simplified: assume 100% if currently online, 0% if offline
-            uptime_percent = 100 if device.is_online == 1 else 0
-
+            device_uptime = uptime.get(device.id) or DeviceUptime(device.id)
             uptime_data.append({
                 "device_id": device.id,
                 "device_name": device.name,
-                "uptime_percent": uptime_percent,
-                "events_count": len(events)
+                "uptime_percent": device_uptime.availability_percent,
+                "online_seconds": round(device_uptime.online_seconds),
+                "offline_seconds": round(device_uptime.offline_seconds),
+                "transitions": device_uptime.transitions
             })
 
         return [{
@@ -518,36 +505,9 @@ class ReportService:
         filters: Dict
     ) -> List[Dict]:
         """Gather KPI report data."""
-        from app.models.telemetry import KPIDefinition, KPIValue
-
-        kpis = self.db.query(KPIDefinition).filter(
-            KPIDefinition.is_active == 1
-        ).all()
-
-        kpi_data = []
-        for kpi in kpis:
-            values = self.db.query(KPIValue).filter(
-                KPIValue.kpi_id == kpi.id,
-                KPIValue.period_start >= period_start,
-                KPIValue.period_end <= period_end
-            ).all()
-
-            kpi_data.append({
-                "kpi_id": kpi.id,
-                "name": kpi.name,
-                "values": [
-                    {
-                        "period_start": v.period_start.isoformat(),
-                        "period_end": v.period_end.isoformat(),
-                        "value": v.value
-                    }
-                    for v in values
-                ]
-            })
-
         return [{
             "type": "kpi_report",
-            "data": kpi_data
+            "data": ReportDataLayer(self.db).kpi_values(period_start, period_end)
         }]
 
     def _generate_file(
@@ -5,12 +5,18 @@ from datetime import datetime, timedelta
 from enum import Enum
 import asyncio
 import logging
+import os
+import time
+
+from app.services.timer_queue import TimerQueue
 
 if TYPE_CHECKING:
     from app.services.alarm_engine import AlarmEngine
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1)
+
 
 class ScheduleType(str, Enum):
     INTERVAL = "interval"
@@ -42,13 +48,26 @@ class ScheduledTask:
 
 
 class SchedulerService:
-    """Cron-like scheduler for background tasks."""
+    """
+    Cron-like scheduler for background tasks.
+    
+    Run times are kept in a wall-clock deadline heap, so tasks fire at their
+    scheduled time instead of on the next periodic scan. Sleeps are capped
+    at a minute to absorb system clock adjustments.
+    """
     
-    def __init__(self):
+    def __init__(self, max_concurrent_tasks: int = 8):
         self.tasks: Dict[str, ScheduledTask] = {}
         self.running = False
         self._task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
+        self._timers = TimerQueue(
+            "scheduler",
+            self._dispatch,
+            max_concurrency=max_concurrent_tasks,
+            clock=time.time,
+            max_sleep=60,
+        )
     
     async def start(self):
         """Start the scheduler service."""
@@ -57,12 +76,13 @@ class SchedulerService:
         
         self.running = True
         self._calculate_next_runs()
-        self._task = asyncio.create_task(self._run_loop())
+        self._task = asyncio.create_task(self._timers.run())
         logger.info("Scheduler service started")
     
     async def stop(self):
         """Stop the scheduler service."""
         self.running = False
+        await self._timers.stop()
         if self._task:
             self._task.cancel()
             try:
@@ -106,6 +126,7 @@ class SchedulerService:
         """Remove a scheduled task."""
         if task_id in self.tasks:
             del self.tasks[task_id]
+            self._timers.cancel(task_id)
             logger.info(f"Removed scheduled task: {task_id}")
     
     def enable_task(self, task_id: str):
@@ -118,6 +139,7 @@ class SchedulerService:
         """Disable a scheduled task."""
         if task_id in self.tasks:
             self.tasks[task_id].enabled = False
+            self._timers.cancel(task_id)
     
     def _calculate_next_runs(self):
         """Calculate next run times for all tasks."""
@@ -125,7 +147,12 @@ class SchedulerService:
             self._calculate_next_run(task)
     
     def _calculate_next_run(self, task: ScheduledTask):
-        """Calculate the next run time for a task."""
+        """Calculate the next run time for a task and arm its timer."""
+        self._compute_next_run(task)
+        if task.enabled and task.next_run:
+            self._timers.schedule(task.id, (task.next_run - EPOCH).total_seconds())
+    
+    def _compute_next_run(self, task: ScheduledTask):
         now = datetime.utcnow()
         
         if task.schedule_type == ScheduleType.INTERVAL:
@@ -172,27 +199,12 @@ class SchedulerService:
                     next_run = next_run.replace(month=now.month + 1)
             task.next_run = next_run
     
-    async def _run_loop(self):
-        """Main scheduler loop."""
-        while self.running:
-            try:
-                now = datetime.utcnow()
-                tasks_to_run = []
-                
-                for task in self.tasks.values():
-                    if not task.enabled:
-                        continue
-                    if task.next_run and task.next_run <= now:
-                        tasks_to_run.append(task)
-                
-                for task in tasks_to_run:
-                    asyncio.create_task(self._execute_task(task))
-                
-                await asyncio.sleep(30)
-            
-            except Exception as e:
-                logger.error(f"Scheduler loop error: {e}")
-                await asyncio.sleep(60)
+    async def _dispatch(self, task_id: str):
+        """Run a due task; its next run is armed when it finishes."""
+        task = self.tasks.get(task_id)
+        if task is None or not task.enabled:
+            return
+        await self._execute_task(task)
     
     async def _execute_task(self, task: ScheduledTask):
         """Execute a scheduled task."""
@@ -210,13 +222,15 @@ class SchedulerService:
             logger.error(f"Scheduled task error {task.id}: {e}")
         
         finally:
-            self._calculate_next_run(task)
+            if self.tasks.get(task.id) is task:
+                self._calculate_next_run(task)
     
     def get_status(self) -> dict:
         """Get scheduler status."""
         return {
             "running": self.running,
             "task_count": len(self.tasks),
+            "in_flight": self._timers.in_flight,
             "tasks": [
                 {
                     "id": t.id,
@@ -249,7 +263,26 @@ async def refresh_materialized_views(metadata: Dict):
 
 async def cleanup_old_data(metadata: Dict):
     """Clean up old data based on retention policy."""
+    from app.services.backup_service import backup_service
     logger.info("Cleaning up old data...")
+    await backup_service.cleanup_old_data()
+
+
+async def maintain_telemetry_partitions(metadata: Dict):
+    """Create upcoming telemetry partitions ahead of the data that needs them."""
+    from app.core.database import SessionLocal
+    from app.services.telemetry_partitions import ensure_partitions
+    db = SessionLocal()
+    try:
+        created = ensure_partitions(db, hash_partitions=metadata.get("hash_partitions", 0))
+        db.commit()
+        if created:
+            logger.info(f"Partition maintenance: created {len(created)} partitions")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Partition maintenance failed: {e}")
+    finally:
+        db.close()
 
 
 async def send_billing_reminders(metadata: Dict):
@@ -319,21 +352,20 @@ async def run_kpi_calculations(metadata: Dict):
         engine = KPIEngine(db)
         now = datetime.utcnow()
         kpis = db.query(KPIDefinition).filter(KPIDefinition.is_active == 1).all()
-        calculated = 0
-        for kpi in kpis:
-            interval = kpi.calculation_interval or "hourly"
-            if interval == "hourly":
-                time_range = TimeRange(start=now - timedelta(hours=1), end=now)
-            elif interval == "daily":
-                time_range = TimeRange(start=now - timedelta(days=1), end=now)
-            elif interval == "monthly":
-                time_range = TimeRange(start=now - timedelta(days=30), end=now)
-            else:
-                time_range = TimeRange(start=now - timedelta(hours=1), end=now)
-            engine.calculate(kpi.id, time_range)
-            calculated += 1
+        windows = {
+            "hourly": TimeRange(start=now - timedelta(hours=1), end=now),
+            "daily": TimeRange(start=now - timedelta(days=1), end=now),
+            "monthly": TimeRange(start=now - timedelta(days=30), end=now),
+        }
+        # One shared query plan per time window instead of several queries per KPI
+        jobs = [
+            (kpi, windows.get(kpi.calculation_interval or "hourly", windows["hourly"]))
+            for kpi in kpis
+        ]
+        results = engine.calculate_batch(jobs)
         db.commit()
-        logger.info(f"KPI calculations: {calculated} KPIs calculated")
+        failed = sum(1 for r in results.values() if r.error_message)
+        logger.info(f"KPI calculations: {len(results)} KPIs calculated, {failed} failed")
     except Exception as e:
         db.rollback()
         logger.error(f"KPI calculations failed: {e}")
@@ -357,34 +389,74 @@ async def run_no_data_check(metadata: Dict):
         logger.error(f"No-data check failed: {e}")
 
 
+async def materialize_uptime(metadata: Dict):
+    """Materialize per-device daily uptime for recent and missed days."""
+    from app.core.database import SessionLocal
+    from app.services.uptime_engine import UptimeEngine
+    db = SessionLocal()
+    try:
+        today = datetime.utcnow().date()
+        rows = UptimeEngine(db).backfill(today, recent_days=metadata.get("days", 2))
+        db.commit()
+        logger.info(f"Uptime materialization: {rows} device-days written")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Uptime materialization failed: {e}")
+    finally:
+        db.close()
+
+
+async def flush_last_seen(metadata: Dict):
+    """Write in-memory last-seen times to the no-data trackers."""
+    from app.core.database import SessionLocal
+    from app.services.last_seen import last_seen_map
+    db = SessionLocal()
+    try:
+        updated = last_seen_map.flush(db)
+        db.commit()
+        if updated:
+            logger.debug(f"Last-seen flush: {updated} trackers updated")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Last-seen flush failed: {e}")
+    finally:
+        db.close()
+
+
 async def check_gateway_staleness(metadata: Dict):
     """Mark gateways as OFFLINE if they haven't sent a heartbeat within their configured interval."""
+    from app.services.device_status_monitor import check_gateway_offline_status
+    await _check_presence("Gateway staleness", "gateway", check_gateway_offline_status)
+
+
+async def check_device_offline(metadata: Dict):
+    """Mark devices as offline when their telemetry stops."""
+    from app.services.device_status_monitor import check_device_offline_status
+    await _check_presence("Device offline", "device", check_device_offline_status)
+
+
+async def _check_presence(label: str, kind: str, check: Callable):
+    """Flush pending presence, run an offline check and broadcast what changed."""
     from app.core.database import SessionLocal
-    from app.models.integrations import Gateway, GatewayStatus
+    from app.services.presence_tracker import StatusChange, presence_tracker
     db = SessionLocal()
     try:
-        now = datetime.utcnow()
-        gateways = db.query(Gateway).filter(
-            Gateway.status == GatewayStatus.ONLINE
-        ).all()
-        stale_count = 0
-        for gw in gateways:
-            interval = gw.heartbeat_interval_seconds or 300  # default 5 min
-            # Give 2x grace period before marking offline
-            max_silence = timedelta(seconds=interval * 2)
-            if gw.last_seen_at and (now - gw.last_seen_at) > max_silence:
-                gw.status = GatewayStatus.OFFLINE
-                stale_count += 1
-                logger.info(f"Gateway {gw.id} ({gw.name}) marked OFFLINE — last seen {gw.last_seen_at}")
-        if stale_count > 0:
-            db.commit()
-            logger.info(f"Gateway staleness check: {stale_count} gateways marked offline")
+        # Recent heartbeats must reach the table before staleness is judged
+        came_online = presence_tracker.flush(db)
+        db.commit()
+        result = check(db)
+        went_offline = [StatusChange(kind, i, False) for i in result[f"{kind}_ids"]]
+        if went_offline:
+            logger.info(f"{label} check: {len(went_offline)} {kind}s marked offline")
     except Exception as e:
         db.rollback()
-        logger.error(f"Gateway staleness check failed: {e}")
+        logger.error(f"{label} check failed: {e}")
+        return
     finally:
         db.close()
 
+    await presence_tracker.broadcast(came_online + went_offline)
+
 
 def register_default_tasks(alarm_engine: Optional["AlarmEngine"] = None):
     """Register default scheduled tasks."""
@@ -414,6 +486,17 @@ def register_default_tasks(alarm_engine: Optional["AlarmEngine"] = None):
         run_at_hour=3,
     )
 
+    # Future telemetry partitions (no-op unless the table is partitioned)
+    scheduler_service.add_task(
+        "telemetry_partitions",
+        "Telemetry Partition Maintenance",
+        maintain_telemetry_partitions,
+        ScheduleType.DAILY,
+        run_at_hour=1,
+        run_at_minute=0,
+        metadata={"hash_partitions": int(os.getenv("TELEMETRY_HASH_PARTITIONS", "0"))},
+    )
+
     scheduler_service.add_task(
         "billing_reminders",
         "Billing Reminders",
@@ -451,6 +534,15 @@ def register_default_tasks(alarm_engine: Optional["AlarmEngine"] = None):
         run_at_minute=0,
     )
 
+    scheduler_service.add_task(
+        "uptime_daily",
+        "Daily Device Uptime",
+        materialize_uptime,
+        ScheduleType.DAILY,
+        run_at_hour=0,
+        run_at_minute=15,
+    )
+
     # KPI calculations (run hourly alongside aggregation)
     scheduler_service.add_task(
         "kpi_calculations",
@@ -469,6 +561,24 @@ def register_default_tasks(alarm_engine: Optional["AlarmEngine"] = None):
         interval_minutes=2,
     )
 
+    # Device offline check (every 2 min)
+    scheduler_service.add_task(
+        "device_offline",
+        "Device Offline Check",
+        check_device_offline,
+        ScheduleType.INTERVAL,
+        interval_minutes=2,
+    )
+
+    # No-data trackers are fed from memory (every 1 min)
+    scheduler_service.add_task(
+        "last_seen_flush",
+        "Last-Seen Tracker Flush",
+        flush_last_seen,
+        ScheduleType.INTERVAL,
+        interval_minutes=1,
+    )
+
     # No-data alarm check
     if alarm_engine:
         scheduler_service.add_task(
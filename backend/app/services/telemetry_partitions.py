@@ -0,0 +1,216 @@
+"""Native PostgreSQL range partitioning for device telemetry.
+
+Used when TimescaleDB is not installed:
+- device_telemetry is partitioned by month on ``timestamp``, optionally
+  sub-partitioned by a hash of ``device_id``
+- Future partitions are created ahead of time by a scheduled task
+- Retention detaches and drops whole partitions instead of DELETEing rows
+- Queries bounded on ``timestamp`` only scan the partitions they need
+
+Partitions are named ``<table>_pYYYYMM`` (and ``<table>_pYYYYMM_hN`` for hash
+sub-partitions). A ``<table>_default`` partition catches rows outside the
+created ranges so ingestion never fails on an unexpected timestamp.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_TABLE = "device_telemetry"
+MONTHS_AHEAD = 3
+
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m}"
+
+
+def partition_bounds(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """[start, end) covered by a monthly partition, from its name."""
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    start = datetime(int(match["year"]), int(match["month"]), 1)
+    return start, add_months(start, 1)
+
+
+def is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def is_partitioned(db: Session, table: str = TELEMETRY_TABLE) -> bool:
+    """Check whether ``table`` is a declaratively partitioned table."""
+    if not is_postgres(db):
+        return False
+    relkind = db.execute(text(
+        "SELECT relkind FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"
+    ), {"table": table}).scalar()
+    return relkind == "p"
+
+
+def list_partitions(db: Session, table: str = TELEMETRY_TABLE) -> List[str]:
+    """Direct monthly partitions of ``table``, oldest first."""
+    names = db.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": table}).scalars().all()
+    return sorted(n for n in names if partition_bounds(n))
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_partition(
+    db: Session,
+    start: datetime,
+    table: str = TELEMETRY_TABLE,
+    hash_partitions: int = 0,
+) -> str:
+    """
+    Create the monthly partition starting at ``start`` if it does not exist.
+
+    Postgres refuses to add a range while the default partition holds rows
+    for it, so the default is detached, its rows for the new month are
+    moved into the new partition, and it is attached again. All of this
+    runs in the caller's transaction.
+    """
+    start = month_start(start)
+    end = add_months(start, 1)
+    name = partition_name(table, start)
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return name
+
+    default = default_partition_name(table)
+    has_default = bool(db.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar())
+    if has_default:
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+
+    sub = " PARTITION BY HASH (device_id)" if hash_partitions else ""
+    db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}'){sub}"
+    ))
+    for remainder in range(hash_partitions):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name}_h{remainder} PARTITION OF {name} "
+            f"FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder})"
+        ))
+
+    if has_default:
+        moved = db.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {default}
+                WHERE timestamp >= :start AND timestamp < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {"start": start, "end": end}).rowcount
+        db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+        if moved:
+            logger.info(f"Moved {moved} rows from {default} into {name}")
+    return name
+
+
+def ensure_partitions(
+    db: Session,
+    table: str = TELEMETRY_TABLE,
+    months_ahead: int = MONTHS_AHEAD,
+    hash_partitions: int = 0,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """
+    Create partitions from the current month to ``months_ahead`` months out.
+
+    Returns:
+        Names of partitions that were missing and have been created
+    """
+    if not is_partitioned(db, table):
+        return []
+
+    existing = set(list_partitions(db, table))
+    current = month_start(now or datetime.utcnow())
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if partition_name(table, start) not in existing:
+            created.append(create_partition(db, start, table, hash_partitions))
+
+    if created:
+        logger.info(f"Created telemetry partitions: {', '.join(created)}")
+    return created
+
+
+def drop_partitions_before(
+    db: Session,
+    cutoff: datetime,
+    table: str = TELEMETRY_TABLE,
+) -> Dict[str, int]:
+    """
+    Detach and drop every partition that lies entirely before ``cutoff``.
+
+    Returns:
+        Dropped partition names mapped to their estimated row counts
+    """
+    if not is_partitioned(db, table):
+        return {}
+
+    dropped = {}
+    for name in list_partitions(db, table):
+        _, end = partition_bounds(name)
+        if end > cutoff:
+            break
+        # Sub-partitions included; reltuples is the planner's estimate
+        rows = db.execute(text("""
+            SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+            FROM pg_partition_tree(CAST(:name AS regclass)) tree
+            JOIN pg_class c ON c.oid = tree.relid
+            WHERE tree.isleaf
+        """), {"name": name}).scalar() or 0
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        db.execute(text(f"DROP TABLE {name}"))
+        dropped[name] = int(rows)
+
+    if dropped:
+        logger.info(f"Dropped telemetry partitions before {cutoff:%Y-%m-%d}: {', '.join(dropped)}")
+    return dropped
+
+
+def get_partition_stats(db: Session, table: str = TELEMETRY_TABLE) -> dict:
+    """Partition layout and sizes for the status endpoint."""
+    if not is_partitioned(db, table):
+        return {"table_name": table, "partitioned": False}
+
+    partitions = []
+    for name in list_partitions(db, table):
+        start, end = partition_bounds(name)
+        size = db.execute(text("""
+            SELECT COALESCE(SUM(pg_total_relation_size(tree.relid)), 0)
+            FROM pg_partition_tree(CAST(:name AS regclass)) tree
+        """), {"name": name}).scalar()
+        partitions.append({
+            "name": name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "size_bytes": int(size or 0),
+        })
+
+    return {"table_name": table, "partitioned": True, "partitions": partitions}
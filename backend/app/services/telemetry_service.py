@@ -15,8 +15,11 @@ from app.models.devices import (
     Device, Datapoint, DeviceDatapoint, DeviceTelemetry
 )
 from app.models.telemetry import (
-    TelemetryAggregation, AggregationPeriod, NoDataTracker
+    TelemetryAggregation, AggregationPeriod
 )
+from app.services.last_seen import last_seen_map
+from app.services.presence_tracker import presence_tracker
+from app.services.telemetry_partitions import drop_partitions_before
 
 logger = logging.getLogger(__name__)
 
@@ -125,13 +128,17 @@ class TelemetryService:
             if dp_def:
                 self._update_device_datapoint(device_id, dp_def.id, value, timestamp)
 
-            # Update no-data tracker
-            self._update_no_data_tracker(device_id, dp_def.id if dp_def else None, timestamp)
+        # No-data tracking stays in memory; trackers are bulk-flushed by the scheduler
+        last_seen_map.touch(
+            device_id,
+            (model_datapoints[name].id for name in datapoints if name in model_datapoints),
+            timestamp
+        )
 
         # Update device last seen
+        presence_tracker.set_device_online(self.db, device, timestamp)
         device.last_seen_at = timestamp
         device.last_telemetry_at = timestamp
-        device.is_online = 1
 
         self.db.flush()
         logger.debug(f"Stored {stored_count} telemetry points for device {device_id}")
@@ -165,6 +172,8 @@ class TelemetryService:
             self.db.add(telemetry)
             stored_count += 1
 
+            last_seen_map.touch(record.device_id, (record.datapoint_id,), record.timestamp)
+
             # Track device updates
             if record.device_id not in device_updates:
                 device_updates[record.device_id] = record.timestamp
@@ -172,12 +181,12 @@ class TelemetryService:
                 if record.timestamp > device_updates[record.device_id]:
                     device_updates[record.device_id] = record.timestamp
 
-        # Bulk update devices
+        # Offline devices come online through the tracker so uptime events and broadcasts follow
+        presence_tracker.set_devices_online(self.db, device_updates)
         for device_id, last_timestamp in device_updates.items():
             self.db.query(Device).filter(Device.id == device_id).update({
                 "last_seen_at": last_timestamp,
                 "last_telemetry_at": last_timestamp,
-                "is_online": 1
             })
 
         self.db.flush()
@@ -315,22 +324,22 @@ class TelemetryService:
             Dict mapping datapoint names to latest TelemetryValue
         """
         # Use DeviceDatapoint for current values (more efficient than scanning telemetry)
-        device_dps = self.db.query(DeviceDatapoint).filter(
+        device_dps = self.db.query(DeviceDatapoint, Datapoint).join(
+            Datapoint, Datapoint.id == DeviceDatapoint.datapoint_id
+        ).filter(
             DeviceDatapoint.device_id == device_id
         ).all()
 
         result = {}
-        for ddp in device_dps:
-            dp = self.db.query(Datapoint).filter(Datapoint.id == ddp.datapoint_id).first()
-            if dp:
-                value = self._parse_stored_value(ddp.current_value)
-                result[dp.name] = TelemetryValue(
-                    timestamp=ddp.last_updated_at or datetime.utcnow(),
-                    value=value,
-                    quality=ddp.quality or "good",
-                    datapoint_name=dp.name,
-                    datapoint_id=dp.id,
-                )
+        for ddp, dp in device_dps:
+            value = self._parse_stored_value(ddp.current_value)
+            result[dp.name] = TelemetryValue(
+                timestamp=ddp.last_updated_at or datetime.utcnow(),
+                value=value,
+                quality=ddp.quality or "good",
+                datapoint_name=dp.name,
+                datapoint_id=dp.id,
+            )
 
         return result
 
@@ -400,6 +409,13 @@ class TelemetryService:
         """
         cutoff = datetime.utcnow() - timedelta(days=retention_days)
 
+        deleted = 0
+        if not device_id:
+            # Whole months past the cutoff go as partitions; the DELETE below
+            # then only has to prune the partition the cutoff falls in
+            dropped = drop_partitions_before(self.db, cutoff)
+            deleted += sum(dropped.values())
+
         query = self.db.query(DeviceTelemetry).filter(
             DeviceTelemetry.timestamp < cutoff
         )
@@ -407,7 +423,7 @@ class TelemetryService:
         if device_id:
             query = query.filter(DeviceTelemetry.device_id == device_id)
 
-        deleted = query.delete(synchronize_session=False)
+        deleted += query.delete(synchronize_session=False)
         self.db.flush()
 
         logger.info(f"Deleted {deleted} telemetry records older than {retention_days} days")
@@ -568,26 +584,6 @@ class TelemetryService:
             )
             self.db.add(device_dp)
 
-    def _update_no_data_tracker(
-        self,
-        device_id: int,
-        datapoint_id: Optional[int],
-        timestamp: datetime
-    ):
-        """Update no-data tracker for alarm detection."""
-        tracker = self.db.query(NoDataTracker).filter(
-            NoDataTracker.device_id == device_id,
-            NoDataTracker.datapoint_id == datapoint_id
-        ).first()
-
-        if tracker:
-            tracker.last_data_at = timestamp
-            # Clear any triggered alarm since we received data
-            if tracker.alarm_triggered:
-                tracker.alarm_triggered = 0
-                tracker.alarm_triggered_at = None
-        # Tracker will be created by alarm engine if needed
-
 
 def get_telemetry_service(db: Session) -> TelemetryService:
     """Get TelemetryService instance."""
@@ -67,6 +67,15 @@ class TeltonikaMessageHandler:
             "FLOAT32": self._convert_float32,
         }
 
+    @staticmethod
+    def is_teltonika_message(payload: Dict[str, Any]) -> bool:
+        """Whether a payload is in one of the Data to Server formats above."""
+        return (
+            isinstance(payload.get("registers"), list)
+            or isinstance(payload.get("values"), dict)
+            or isinstance(payload.get("io"), dict)
+        )
+
     def parse_teltonika_message(self, payload: Dict[str, Any], gateway_id: Optional[int] = None) -> Dict[str, Any]:
         """
         Convert Teltonika format to SAVE-IT.AI format.
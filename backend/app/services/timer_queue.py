@@ -0,0 +1,149 @@
+"""
+Deadline-ordered timer queue shared by the polling and scheduler services.
+
+- Min-heap of deadlines with lazy cancellation (O(log n) schedule/cancel)
+- The run loop sleeps until the earliest deadline and is woken early when an
+  earlier one is scheduled, so idle CPU does not grow with the task count
+- Global and per-group (protocol, gateway, ...) concurrency limits
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TimerQueue:
+    """
+    Fires ``dispatch(key)`` for each key when its deadline is reached.
+
+    Deadlines are absolute values of ``clock``. Each key has at most one
+    pending deadline; scheduling it again replaces the previous one. A key is
+    not re-armed automatically - the dispatch coroutine (or the owning
+    service) schedules the next run, so a slow run never overlaps itself.
+
+    Groups are strings of the form ``"<kind>:<name>"``, e.g.
+    ``"gateway:12"``. ``group_limits`` maps a kind to the maximum number of
+    concurrent dispatches per group of that kind.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dispatch: Callable[[str], Awaitable[None]],
+        max_concurrency: Optional[int] = None,
+        group_limits: Optional[Dict[str, int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        max_sleep: Optional[float] = None,
+    ):
+        self.name = name
+        self.clock = clock
+        self.max_sleep = max_sleep
+        self._dispatch = dispatch
+        self._group_limits = group_limits or {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int, Tuple[str, ...]]] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._global = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._inflight: Set[asyncio.Task] = set()
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def schedule(self, key: str, deadline: float, groups: Sequence[str] = ()):
+        """Arm ``key`` to fire at ``deadline``, replacing any pending deadline."""
+        seq = next(self._seq)
+        self._entries[key] = (deadline, seq, tuple(sorted(groups)))
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def schedule_in(self, key: str, delay: float, groups: Sequence[str] = ()):
+        """Arm ``key`` to fire ``delay`` seconds from now."""
+        self.schedule(key, self.clock() + max(delay, 0.0), groups)
+
+    def cancel(self, key: str):
+        """Drop the pending deadline for ``key``; its heap entry is discarded lazily."""
+        self._entries.pop(key, None)
+
+    def deadline(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def _pop_due(self, now: float) -> List[Tuple[str, Tuple[str, ...]]]:
+        due = []
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != seq:
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            due.append((key, entry[2]))
+        return due
+
+    async def run(self):
+        """Dispatch due keys until ``stop`` is called."""
+        self._running = True
+        while self._running:
+            now = self.clock()
+            for key, groups in self._pop_due(now):
+                task = asyncio.create_task(self._run_limited(key, groups))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            if self.max_sleep is not None:
+                timeout = self.max_sleep if timeout is None else min(timeout, self.max_sleep)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Stop the run loop and cancel in-flight dispatches."""
+        self._running = False
+        self._wakeup.set()
+        for task in list(self._inflight):
+            task.cancel()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _semaphore(self, group: str) -> Optional[asyncio.Semaphore]:
+        limit = self._group_limits.get(group.split(":", 1)[0])
+        if not limit:
+            return None
+        semaphore = self._semaphores.get(group)
+        if semaphore is None:
+            semaphore = self._semaphores[group] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def _run_limited(self, key: str, groups: Tuple[str, ...]):
+        # Groups are sorted so every dispatch acquires semaphores in the same order
+        async with AsyncExitStack() as stack:
+            for group in groups:
+                semaphore = self._semaphore(group)
+                if semaphore is not None:
+                    await stack.enter_async_context(semaphore)
+            if self._global is not None:
+                await stack.enter_async_context(self._global)
+            try:
+                await self._dispatch(key)
+            except Exception as e:
+                logger.error(f"{self.name} dispatch error for {key}: {e}")
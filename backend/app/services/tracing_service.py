@@ -274,6 +274,20 @@ def create_span(name: str, attributes: Optional[Dict[str, Any]] = None):
     return None
 
 
+def end_span(span, status: str = "ok"):
+    """End a span returned by create_span."""
+    if span is None:
+        return
+    if isinstance(span, Span):
+        context = _trace_context.get()
+        if context and context.current_span is span:
+            context.end_span(status)
+        return
+    if status != "ok":
+        span.set_attribute("error", True)
+    span.end()
+
+
 # Initialize OpenTelemetry on module import (if enabled)
 if OTEL_ENABLED:
     init_opentelemetry()
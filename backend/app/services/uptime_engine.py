@@ -0,0 +1,306 @@
+"""
+Uptime engine for device availability reporting.
+- Presence transitions are recorded as device_online/device_offline events
+- Online and offline intervals are derived from those events in SQL, with
+  LEAD giving each event's interval end and LAG spotting real transitions
+- Results are materialized per device per day in device_uptime_daily, so
+  monthly and yearly SLA reports are a grouped SUM over precomputed rows
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, String, delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.devices import AlarmSeverity, DeviceEvent
+from app.models.telemetry import DeviceUptimeDaily
+
+logger = logging.getLogger(__name__)
+
+DEVICE_ONLINE = "device_online"
+DEVICE_OFFLINE = "device_offline"
+STATUS_EVENTS = (DEVICE_ONLINE, DEVICE_OFFLINE)
+
+# Days materialized per pass when catching up on missed days
+BACKFILL_CHUNK_DAYS = 31
+
+
+def record_status_events(db: Session, seen: Dict[int, datetime], online: bool) -> int:
+    """
+    Record devices going online or offline as one bulk insert; the caller commits.
+
+    Args:
+        db: Database session
+        seen: Device id mapped to when the transition happened
+        online: Whether the devices came online or went offline
+
+    Returns:
+        Number of events recorded
+    """
+    if not seen:
+        return 0
+    db.execute(insert(DeviceEvent), [
+        {
+            "device_id": device_id,
+            "event_type": DEVICE_ONLINE if online else DEVICE_OFFLINE,
+            "severity": AlarmSeverity.INFO if online else AlarmSeverity.WARNING,
+            "title": "Device online" if online else "Device offline",
+            "triggered_at": at,
+            # Historical records, not conditions awaiting acknowledgement
+            "is_active": 0,
+        }
+        for device_id, at in seen.items()
+    ])
+    return len(seen)
+
+
+@dataclass
+class DeviceUptime:
+    """Online and offline time for one device over a period."""
+    device_id: int
+    online_seconds: float = 0.0
+    offline_seconds: float = 0.0
+    transitions: int = 0
+
+    @property
+    def availability_percent(self) -> Optional[float]:
+        """Share of observed time online; None when the device has no status history."""
+        observed = self.online_seconds + self.offline_seconds
+        if observed <= 0:
+            return None
+        return round(self.online_seconds / observed * 100, 3)
+
+    def add(self, other: "DeviceUptime"):
+        self.online_seconds += other.online_seconds
+        self.offline_seconds += other.offline_seconds
+        self.transitions += other.transitions
+
+
+def _day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class UptimeEngine:
+    """Computes and materializes device availability from status events."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _intervals_query(self, start: datetime, end: datetime, device_ids: Optional[List[int]]):
+        """
+        Status events in [start, end) plus each device's last event before
+        start, with LEAD for the interval end and LAG for the previous state.
+        """
+        status = DeviceEvent.event_type.in_(STATUS_EVENTS)
+        scope = [status]
+        if device_ids:
+            scope.append(DeviceEvent.device_id.in_(device_ids))
+
+        # State carried into the window
+        ranked = select(
+            DeviceEvent.device_id,
+            DeviceEvent.event_type,
+            DeviceEvent.triggered_at,
+            func.row_number().over(
+                partition_by=DeviceEvent.device_id,
+                order_by=DeviceEvent.triggered_at.desc()
+            ).label("rank"),
+        ).where(*scope, DeviceEvent.triggered_at < start).subquery()
+
+        events = union_all(
+            select(ranked.c.device_id, ranked.c.event_type, ranked.c.triggered_at).where(ranked.c.rank == 1),
+            select(DeviceEvent.device_id, DeviceEvent.event_type, DeviceEvent.triggered_at).where(
+                *scope, DeviceEvent.triggered_at >= start, DeviceEvent.triggered_at < end
+            ),
+        ).subquery()
+
+        window = {"partition_by": events.c.device_id, "order_by": events.c.triggered_at}
+        return select(
+            events.c.device_id,
+            events.c.event_type,
+            events.c.triggered_at,
+            func.lead(events.c.triggered_at, type_=DateTime).over(**window).label("next_at"),
+            func.lag(events.c.event_type, type_=String).over(**window).label("previous_type"),
+        )
+
+    def compute(
+        self,
+        start: datetime,
+        end: datetime,
+        device_ids: Optional[List[int]] = None
+    ) -> Dict[Tuple[int, date], DeviceUptime]:
+        """
+        Online/offline seconds per device per day for [start, end).
+
+        Time before a device's first status event is not counted, and
+        intervals stop at the present rather than running to ``end``.
+        """
+        end = min(end, datetime.utcnow())
+        results: Dict[Tuple[int, date], DeviceUptime] = {}
+        if start >= end:
+            return results
+
+        for row in self.db.execute(self._intervals_query(start, end, device_ids)):
+            online = row.event_type == DEVICE_ONLINE
+            if row.triggered_at >= start and row.previous_type and row.previous_type != row.event_type:
+                self._bucket(results, row.device_id, row.triggered_at).transitions += 1
+
+            # Split the interval at day boundaries
+            current = max(row.triggered_at, start)
+            interval_end = min(row.next_at or end, end)
+            while current < interval_end:
+                boundary = min(_day_start(current) + timedelta(days=1), interval_end)
+                uptime = self._bucket(results, row.device_id, current)
+                seconds = (boundary - current).total_seconds()
+                if online:
+                    uptime.online_seconds += seconds
+                else:
+                    uptime.offline_seconds += seconds
+                current = boundary
+
+        return results
+
+    @staticmethod
+    def _bucket(results: Dict[Tuple[int, date], DeviceUptime], device_id: int, at: datetime) -> DeviceUptime:
+        key = (device_id, at.date())
+        if key not in results:
+            results[key] = DeviceUptime(device_id)
+        return results[key]
+
+    def materialize(self, start_day: date, end_day: date) -> int:
+        """
+        Rewrite device_uptime_daily for days in [start_day, end_day); the caller commits.
+
+        Returns:
+            Number of device-day rows written
+        """
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day, datetime.min.time())
+        daily = self.compute(start, end)
+
+        self.db.execute(delete(DeviceUptimeDaily).where(
+            DeviceUptimeDaily.day >= start_day,
+            DeviceUptimeDaily.day < end_day
+        ))
+        if daily:
+            now = datetime.utcnow()
+            self.db.execute(insert(DeviceUptimeDaily), [
+                {
+                    "device_id": device_id,
+                    "day": day,
+                    "online_seconds": uptime.online_seconds,
+                    "offline_seconds": uptime.offline_seconds,
+                    "transitions": uptime.transitions,
+                    "computed_at": now,
+                }
+                for (device_id, day), uptime in daily.items()
+            ])
+
+        logger.info(f"Materialized uptime for {start_day} to {end_day}: {len(daily)} device-days")
+        return len(daily)
+
+    def backfill(self, end_day: date, recent_days: int = 2) -> int:
+        """
+        Materialize every day missing before end_day plus the last recent_days; the caller commits.
+
+        Catches up from the last materialized day, or from the first status
+        event when nothing has been materialized yet, so days the daily job
+        missed (or that predate it) get rows too.
+
+        Returns:
+            Number of device-day rows written
+        """
+        last = self.db.query(func.max(DeviceUptimeDaily.day)).scalar()
+        if last is not None:
+            start_day = last + timedelta(days=1)
+        else:
+            first_event = self.db.query(func.min(DeviceEvent.triggered_at)).filter(
+                DeviceEvent.event_type.in_(STATUS_EVENTS)
+            ).scalar()
+            start_day = first_event.date() if first_event else end_day
+        # Re-deriving a few days picks up late events
+        start_day = min(start_day, end_day - timedelta(days=recent_days))
+
+        written = 0
+        while start_day < end_day:
+            chunk_end = min(start_day + timedelta(days=BACKFILL_CHUNK_DAYS), end_day)
+            written += self.materialize(start_day, chunk_end)
+            start_day = chunk_end
+        return written
+
+    def _materialized_days(self, first_day: date, last_day: date) -> set:
+        """Days in [first_day, last_day) that have device_uptime_daily rows."""
+        return {
+            row[0] for row in self.db.query(DeviceUptimeDaily.day).filter(
+                DeviceUptimeDaily.day >= first_day,
+                DeviceUptimeDaily.day < last_day
+            ).distinct()
+        }
+
+    def availability(
+        self,
+        start: datetime,
+        end: datetime,
+        device_ids: Optional[List[int]] = None
+    ) -> Dict[int, DeviceUptime]:
+        """
+        Availability per device over [start, end).
+
+        Whole days are summed from device_uptime_daily in one grouped query;
+        partial days at either edge, including today, and whole days that
+        were never materialized are computed from events.
+        """
+        first_day = _day_start(start)
+        if first_day < start:
+            first_day += timedelta(days=1)
+        last_day = min(_day_start(end), _day_start(datetime.utcnow()))
+
+        totals: Dict[int, DeviceUptime] = defaultdict(lambda: DeviceUptime(0))
+
+        if first_day < last_day:
+            query = self.db.query(
+                DeviceUptimeDaily.device_id,
+                func.sum(DeviceUptimeDaily.online_seconds).label("online"),
+                func.sum(DeviceUptimeDaily.offline_seconds).label("offline"),
+                func.sum(DeviceUptimeDaily.transitions).label("transitions"),
+            ).filter(
+                DeviceUptimeDaily.day >= first_day.date(),
+                DeviceUptimeDaily.day < last_day.date()
+            )
+            if device_ids:
+                query = query.filter(DeviceUptimeDaily.device_id.in_(device_ids))
+            for row in query.group_by(DeviceUptimeDaily.device_id):
+                totals[row.device_id].add(DeviceUptime(
+                    row.device_id, float(row.online or 0), float(row.offline or 0), int(row.transitions or 0)
+                ))
+            edges = [(start, first_day), (last_day, end)]
+
+            # Runs of days without rows, e.g. before the daily job was deployed
+            materialized = self._materialized_days(first_day.date(), last_day.date())
+            day = first_day
+            while day < last_day:
+                if day.date() in materialized:
+                    day += timedelta(days=1)
+                    continue
+                gap_start = day
+                while day < last_day and day.date() not in materialized:
+                    day += timedelta(days=1)
+                edges.append((gap_start, day))
+        else:
+            edges = [(start, end)]
+
+        for edge_start, edge_end in edges:
+            for (device_id, _), uptime in self.compute(edge_start, edge_end, device_ids).items():
+                totals[device_id].add(uptime)
+
+        for device_id, uptime in totals.items():
+            uptime.device_id = device_id
+        return dict(totals)
+
+
+def get_uptime_engine(db: Session) -> UptimeEngine:
+    """Get UptimeEngine instance."""
+    return UptimeEngine(db)
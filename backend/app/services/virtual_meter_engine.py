@@ -0,0 +1,415 @@
+"""
+Virtual Meter Engine for SAVE-IT.AI
+Evaluates calculated, aggregated, allocated and differential virtual meters:
+- Dependency graph across virtual meters (expressions may reference each other)
+- Topological evaluation order with cycle detection
+- Per-meter failure isolation: a broken meter and its dependents are
+  reported as failed while the rest of the site still evaluates
+- Bulk fetch of all physical meter series for a site in one query
+- Aligned NumPy interval arrays, memoized per site and time window;
+  dropped when readings are written or component meters change
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Any, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session, selectinload
+
+from app.middleware.cache import InMemoryCache
+from app.models.core import Meter, MeterReading
+from app.models.virtual_meters import VirtualMeter, VirtualMeterType
+from app.services.formula_engine import compile_formula
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {
+    "15min": 900,
+    "30min": 1800,
+    "hourly": 3600,
+    "daily": 86400,
+}
+
+MAX_INTERVALS = 100_000
+SERIES_CACHE_TTL = 300
+
+_series_cache = InMemoryCache(max_size=256)
+# session.info key for site ids whose series are dropped on commit
+_PENDING_INVALIDATIONS = "virtual_meter_invalidations"
+
+
+class VirtualMeterError(ValueError):
+    """Raised when a virtual meter cannot be evaluated (bad reference, cycle, ...)."""
+
+
+@dataclass
+class SeriesWindow:
+    """Aligned interval grid for a time window."""
+    start: datetime
+    end: datetime
+    interval_seconds: int
+
+    @property
+    def size(self) -> int:
+        return max(0, int((self.end - self.start).total_seconds() // self.interval_seconds))
+
+    @property
+    def timestamps(self) -> List[datetime]:
+        step = timedelta(seconds=self.interval_seconds)
+        return [self.start + step * i for i in range(self.size)]
+
+
+@dataclass
+class VirtualMeterSeries:
+    """Evaluated series for one virtual meter."""
+    virtual_meter_id: int
+    name: str
+    unit: str
+    window: SeriesWindow
+    values: np.ndarray
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "virtual_meter_id": self.virtual_meter_id,
+            "name": self.name,
+            "unit": self.unit,
+            "error": self.error,
+            "interval_seconds": self.window.interval_seconds,
+            "total": float(np.nansum(self.values)),
+            "points": [
+                {"timestamp": ts.isoformat(), "value": None if np.isnan(v) else float(v)}
+                for ts, v in zip(self.window.timestamps, self.values)
+            ],
+        }
+
+
+def _identifier(text: str) -> str:
+    """Normalize a meter code or name into a formula identifier."""
+    return re.sub(r"\W+", "_", text or "").strip("_")
+
+
+def invalidate_virtual_meter_cache(site_id: Optional[int] = None) -> int:
+    """Drop memoized series for a site (or all sites)."""
+    if site_id is None:
+        count = _series_cache.stats()["size"]
+        _series_cache.clear()
+        return count
+    return _series_cache.clear_pattern(f"vm:{site_id}:")
+
+
+def invalidate_meter_series(db: Session, meter_ids: Iterable[int]) -> int:
+    """Drop memoized series for the sites of these meters; call after committing their readings."""
+    meter_ids = set(meter_ids)
+    if not meter_ids:
+        return 0
+    site_ids = {
+        row[0] for row in db.query(Meter.site_id).filter(Meter.id.in_(meter_ids)).distinct().all()
+    }
+    return sum(invalidate_virtual_meter_cache(site_id) for site_id in site_ids if site_id is not None)
+
+
+def _meter_changed(mapper, connection, target):
+    # Renames change formula identifiers; a meter moved between sites affects both
+    site_ids = {target.site_id, *inspect(target).attrs.site_id.history.deleted} - {None}
+    session = object_session(target)
+    if session is None:
+        for site_id in site_ids:
+            invalidate_virtual_meter_cache(site_id)
+    else:
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(site_ids)
+
+
+def _apply_invalidations(session):
+    for site_id in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        invalidate_virtual_meter_cache(site_id)
+
+
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Meter, _event, _meter_changed)
+event.listen(Session, "after_commit", _apply_invalidations)
+event.listen(Session, "after_rollback", _discard_invalidations)
+
+
+class VirtualMeterEngine:
+    """
+    Evaluates virtual meters for a site as aligned interval series.
+
+    Expressions reference meters by identifier: a physical meter's code or
+    name (non-word characters replaced with "_"), a virtual meter's name,
+    or the explicit forms ``meter_<id>`` / ``vm_<id>``.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def evaluate(
+        self,
+        virtual_meter_id: int,
+        start: datetime,
+        end: datetime,
+        interval: str = "hourly"
+    ) -> VirtualMeterSeries:
+        """
+        Evaluate a single virtual meter.
+
+        The whole site graph is evaluated (and memoized) so that sibling
+        requests for the same window reuse the intermediate series.
+        """
+        vm = self.db.query(VirtualMeter).filter(VirtualMeter.id == virtual_meter_id).first()
+        if not vm:
+            raise VirtualMeterError("Virtual meter not found")
+
+        results = self.evaluate_site(vm.site_id, start, end, interval)
+        if virtual_meter_id not in results:
+            raise VirtualMeterError("Virtual meter is inactive")
+        series = results[virtual_meter_id]
+        if series.error:
+            raise VirtualMeterError(series.error)
+        return series
+
+    def evaluate_site(
+        self,
+        site_id: int,
+        start: datetime,
+        end: datetime,
+        interval: str = "hourly"
+    ) -> Dict[int, VirtualMeterSeries]:
+        """
+        Evaluate every active virtual meter of a site for a time window.
+
+        Meters that cannot be evaluated (bad expression, unknown reference,
+        cycle, or a failed dependency) come back with ``error`` set and NaN
+        values; the others are unaffected.
+        """
+        window = self._window(start, end, interval)
+        cache_key = f"vm:{site_id}:{window.start.isoformat()}:{window.end.isoformat()}:{window.interval_seconds}"
+
+        cached = _series_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        results = self._evaluate_site(site_id, window)
+        _series_cache.set(cache_key, results, ttl=SERIES_CACHE_TTL)
+        return results
+
+    def _window(self, start: datetime, end: datetime, interval: str) -> SeriesWindow:
+        if interval not in INTERVALS:
+            raise VirtualMeterError(f"Invalid interval: {interval}")
+        if end <= start:
+            raise VirtualMeterError("End must be after start")
+
+        seconds = INTERVALS[interval]
+        # Align the window to interval boundaries so cache keys are shared
+        epoch = datetime(1970, 1, 1)
+        first = int((start - epoch).total_seconds() // seconds)
+        last = -int(-(end - epoch).total_seconds() // seconds)
+        window = SeriesWindow(
+            start=epoch + timedelta(seconds=first * seconds),
+            end=epoch + timedelta(seconds=last * seconds),
+            interval_seconds=seconds,
+        )
+        if window.size > MAX_INTERVALS:
+            raise VirtualMeterError(f"Time window exceeds {MAX_INTERVALS} intervals")
+        return window
+
+    def _evaluate_site(self, site_id: int, window: SeriesWindow) -> Dict[int, VirtualMeterSeries]:
+        vms = self.db.query(VirtualMeter).options(
+            selectinload(VirtualMeter.components)
+        ).filter(
+            VirtualMeter.site_id == site_id,
+            VirtualMeter.is_active == 1
+        ).all()
+        if not vms:
+            return {}
+
+        meters = self.db.query(Meter.id, Meter.meter_id, Meter.name).filter(
+            Meter.site_id == site_id,
+            Meter.is_deleted == 0
+        ).all()
+
+        # Symbol table: later entries win, so explicit ids override names
+        meter_symbols: Dict[str, int] = {}
+        for meter in meters:
+            meter_symbols[_identifier(meter.name)] = meter.id
+        for meter in meters:
+            meter_symbols[_identifier(meter.meter_id)] = meter.id
+        for meter in meters:
+            meter_symbols[f"meter_{meter.id}"] = meter.id
+
+        vm_symbols: Dict[str, int] = {_identifier(vm.name): vm.id for vm in vms}
+        vm_symbols.update({f"vm_{vm.id}": vm.id for vm in vms})
+
+        by_id = {vm.id: vm for vm in vms}
+        dependencies: Dict[int, Set[int]] = {}
+        bindings: Dict[int, Dict[str, tuple]] = {}
+        errors: Dict[int, str] = {}
+        meter_ids: Set[int] = set()
+
+        for vm in vms:
+            deps: Set[int] = set()
+            binding: Dict[str, tuple] = {}
+            try:
+                if vm.expression:
+                    compiled = compile_formula(vm.expression)
+                    for name in compiled.variables:
+                        if name in vm_symbols and vm_symbols[name] != vm.id:
+                            binding[name] = ("vm", vm_symbols[name])
+                            deps.add(vm_symbols[name])
+                        elif name in meter_symbols:
+                            binding[name] = ("meter", meter_symbols[name])
+                        else:
+                            raise VirtualMeterError(f"references unknown meter '{name}'")
+            except ValueError as e:
+                errors[vm.id] = f"Virtual meter '{vm.name}': {e}"
+                deps, binding = set(), {}
+            meter_ids.update(ref for kind, ref in binding.values() if kind == "meter")
+            meter_ids.update(c.meter_id for c in vm.components if c.meter_id)
+            dependencies[vm.id] = deps
+            bindings[vm.id] = binding
+
+        order, cyclic = self._partial_order(dependencies)
+        for vm_id in cyclic:
+            errors[vm_id] = f"Circular virtual meter references: {cyclic}"
+        meter_series = self._fetch_meter_series(meter_ids, window)
+        zeros = np.zeros(window.size)
+        failed = np.full(window.size, np.nan)
+
+        values: Dict[int, np.ndarray] = {}
+        for vm_id in order:
+            vm = by_id[vm_id]
+            broken = sorted(dep for dep in dependencies[vm_id] if dep in errors)
+            if broken:
+                errors.setdefault(
+                    vm_id, f"Virtual meter '{vm.name}' depends on failed virtual meter '{by_id[broken[0]].name}'"
+                )
+            if vm_id in errors:
+                values[vm_id] = failed
+                continue
+            try:
+                values[vm_id] = self._compute(vm, bindings[vm_id], meter_series, values, zeros)
+            except (ValueError, ArithmeticError, TypeError) as e:
+                logger.warning(f"Virtual meter {vm_id} failed to evaluate: {e}")
+                errors[vm_id] = f"Virtual meter '{vm.name}': {e}"
+                values[vm_id] = failed
+
+        return {
+            vm_id: VirtualMeterSeries(
+                virtual_meter_id=vm_id,
+                name=by_id[vm_id].name,
+                unit=by_id[vm_id].unit or "kWh",
+                window=window,
+                values=values.get(vm_id, failed),
+                error=errors.get(vm_id),
+            )
+            for vm_id in order + cyclic
+        }
+
+    @staticmethod
+    def topological_order(dependencies: Dict[int, Set[int]]) -> List[int]:
+        """
+        Order virtual meters so every meter follows its dependencies (Kahn's algorithm).
+
+        Raises:
+            VirtualMeterError: If the references form a cycle
+        """
+        order, cyclic = VirtualMeterEngine._partial_order(dependencies)
+        if cyclic:
+            raise VirtualMeterError(f"Circular virtual meter references: {cyclic}")
+        return order
+
+    @staticmethod
+    def _partial_order(dependencies: Dict[int, Set[int]]) -> Tuple[List[int], List[int]]:
+        """Kahn's algorithm; returns the ordered nodes and those on or behind a cycle."""
+        remaining = {node: set(deps) for node, deps in dependencies.items()}
+        dependents: Dict[int, List[int]] = {node: [] for node in remaining}
+        for node, deps in remaining.items():
+            for dep in deps:
+                dependents.setdefault(dep, []).append(node)
+
+        ready = sorted(node for node, deps in remaining.items() if not deps)
+        order = []
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for dependent in dependents.get(node, []):
+                remaining[dependent].discard(node)
+                if not remaining[dependent]:
+                    ready.append(dependent)
+
+        cyclic = sorted(node for node, deps in remaining.items() if deps)
+        return order, cyclic
+
+    def _fetch_meter_series(self, meter_ids: Set[int], window: SeriesWindow) -> Dict[int, np.ndarray]:
+        """Load all component readings in one query and bucket them onto the window grid."""
+        if not meter_ids or window.size == 0:
+            return {}
+
+        rows = self.db.query(
+            MeterReading.meter_id, MeterReading.timestamp, MeterReading.energy_kwh
+        ).filter(
+            MeterReading.meter_id.in_(meter_ids),
+            MeterReading.timestamp >= window.start,
+            MeterReading.timestamp < window.end
+        ).all()
+        if not rows:
+            return {}
+
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        offsets = np.fromiter(
+            ((r[1] - window.start).total_seconds() for r in rows), dtype=np.float64, count=len(rows)
+        )
+        energy = np.fromiter((r[2] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+        buckets = (offsets // window.interval_seconds).astype(np.int64)
+
+        series = {}
+        for meter_id in np.unique(ids):
+            mask = ids == meter_id
+            series[int(meter_id)] = np.bincount(buckets[mask], weights=energy[mask], minlength=window.size)
+        return series
+
+    def _compute(
+        self,
+        vm: VirtualMeter,
+        binding: Dict[str, tuple],
+        meter_series: Dict[int, np.ndarray],
+        vm_series: Dict[int, np.ndarray],
+        zeros: np.ndarray
+    ) -> np.ndarray:
+        """Compute one virtual meter from already-evaluated inputs."""
+        if vm.expression:
+            inputs = {
+                name: vm_series[ref] if kind == "vm" else meter_series.get(ref, zeros)
+                for name, (kind, ref) in binding.items()
+            }
+            compiled = compile_formula(vm.expression)
+            if not inputs:
+                return np.full(zeros.shape, compiled.evaluate({}))
+            return compiled.evaluate_series(inputs)
+
+        result = zeros.copy()
+        components = [c for c in vm.components if c.meter_id]
+        for i, component in enumerate(components):
+            series = meter_series.get(component.meter_id, zeros) * (component.weight if component.weight is not None else 1.0)
+            if vm.meter_type == VirtualMeterType.ALLOCATED:
+                series = series * ((component.allocation_percent or 0.0) / 100.0)
+
+            if vm.meter_type == VirtualMeterType.DIFFERENTIAL:
+                # Differential meters: first component minus the rest
+                subtract = i > 0
+            else:
+                subtract = component.operator == "-"
+            result = result - series if subtract else result + series
+        return result
+
+
+def get_virtual_meter_engine(db: Session) -> VirtualMeterEngine:
+    """Get VirtualMeterEngine instance."""
+    return VirtualMeterEngine(db)
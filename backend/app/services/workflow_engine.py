@@ -5,21 +5,37 @@ Automation rules engine:
 - Condition evaluation
 - Action execution
 - Rule chaining
+- In-memory rule index with compiled conditions and rate limits
 """
 import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional, List, Callable
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Callable, Deque, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum as SQLEnum, event, inspect
 
 from app.core.database import Base
+from app.middleware.cache import InMemoryCache
 
 logger = logging.getLogger(__name__)
 
+RULE_INDEX_TTL = 60
+
+# Columns that change how a rule matches or fires; execution stats are excluded
+RULE_DEFINITION_FIELDS = (
+    "trigger_type", "trigger_config", "conditions", "actions",
+    "priority", "is_active", "max_executions_per_hour", "name",
+)
+
+TRIGGER_MATCH_KEYS = ("device_id", "site_id", "datapoint")
+
+_rule_index = InMemoryCache(max_size=64)
+
 
 class TriggerType(Enum):
     """Types of workflow triggers."""
@@ -111,6 +127,23 @@ class ExecutionResult:
     action_results: List[Dict[str, Any]] = field(default_factory=list)
 
 
+@dataclass
+class CompiledRule:
+    """Session-independent snapshot of an active rule with pre-parsed matchers."""
+    id: int
+    name: str
+    priority: int
+    max_executions_per_hour: Optional[int]
+    trigger_match: Dict[str, Any]
+    predicate: Callable[[Dict[str, Any]], bool]
+
+    def matches(self, context: Dict[str, Any]) -> bool:
+        for key, expected in self.trigger_match.items():
+            if context.get(key) != expected:
+                return False
+        return self.predicate(context)
+
+
 @dataclass
 class WorkflowAction:
     """Action to execute in workflow."""
@@ -153,32 +186,42 @@ class ConditionEvaluator:
         Returns:
             True if all conditions are met
         """
+        return self.compile(conditions)(context)
+
+    def compile(self, conditions: List[Dict]) -> Callable[[Dict[str, Any]], bool]:
+        """
+        Compile conditions into a predicate over a context.
+
+        Field paths are split and operators resolved once, so evaluating the
+        predicate does no parsing. Unknown operators compile to a predicate
+        that never matches.
+        """
         if not conditions:
-            return True
+            return lambda context: True
 
+        checks: List[Tuple[List[str], Callable, Any]] = []
         for cond in conditions:
-            field = cond.get("field")
             operator = cond.get("operator", "eq")
-            expected = cond.get("value")
-
-            # Get actual value from context
-            actual = self._get_nested_value(context, field)
-
-            # Get operator function
             op_func = self.OPERATORS.get(operator)
             if not op_func:
                 logger.warning(f"Unknown operator: {operator}")
-                return False
-
-            # Evaluate
-            try:
-                if not op_func(actual, expected):
+                return lambda context: False
+            checks.append((cond.get("field").split("."), op_func, cond.get("value")))
+
+        def predicate(context: Dict[str, Any]) -> bool:
+            for path, op_func, expected in checks:
+                actual = context
+                for part in path:
+                    actual = actual.get(part) if isinstance(actual, dict) else None
+                try:
+                    if not op_func(actual, expected):
+                        return False
+                except Exception as e:
+                    logger.warning(f"Condition evaluation error: {e}")
                     return False
-            except Exception as e:
-                logger.warning(f"Condition evaluation error: {e}")
-                return False
+            return True
 
-        return True
+        return predicate
 
     def _get_nested_value(self, obj: Dict, path: str) -> Any:
         """Get value from nested dict using dot notation."""
@@ -194,6 +237,75 @@ class ConditionEvaluator:
         return value
 
 
+class RuleRateLimiter:
+    """
+    Sliding one-hour window of execution times per rule, kept in memory.
+
+    A rule's window is seeded from WorkflowExecution the first time it is
+    about to fire in this process; after that checks never touch the DB.
+    """
+
+    WINDOW = timedelta(hours=1)
+
+    def __init__(self):
+        self._windows: Dict[int, Deque[datetime]] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, db: Session, rule_id: int, max_per_hour: Optional[int]) -> bool:
+        """Check whether the rule may fire now."""
+        if not max_per_hour:
+            return True
+        cutoff = datetime.utcnow() - self.WINDOW
+        with self._lock:
+            window = self._windows.get(rule_id)
+        if window is None:
+            rows = db.query(WorkflowExecution.created_at).filter(
+                WorkflowExecution.rule_id == rule_id,
+                WorkflowExecution.created_at >= cutoff
+            ).order_by(WorkflowExecution.created_at).all()
+            with self._lock:
+                window = self._windows.setdefault(rule_id, deque(row[0] for row in rows))
+        with self._lock:
+            while window and window[0] < cutoff:
+                window.popleft()
+            return len(window) < max_per_hour
+
+    def record(self, rule_id: int, when: datetime):
+        """Record an execution of a rule."""
+        with self._lock:
+            window = self._windows.get(rule_id)
+            if window is not None:
+                window.append(when)
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+
+rate_limiter = RuleRateLimiter()
+
+
+def invalidate_rule_index() -> None:
+    """Drop the cached rule index; it is rebuilt on the next trigger."""
+    _rule_index.clear()
+
+
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_rule_index()
+
+
+def _invalidate_on_update(mapper, connection, target):
+    # Execution stats are written on every run and must not evict the index
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in RULE_DEFINITION_FIELDS):
+        invalidate_rule_index()
+
+
+event.listen(WorkflowRule, "after_insert", _invalidate_on_change)
+event.listen(WorkflowRule, "after_update", _invalidate_on_update)
+event.listen(WorkflowRule, "after_delete", _invalidate_on_change)
+
+
 class WorkflowEngine:
     """
     Automation rules engine.
@@ -255,25 +367,18 @@ class WorkflowEngine:
         """
         results = []
 
-        # Get matching rules
-        rules = self.db.query(WorkflowRule).filter(
-            WorkflowRule.trigger_type == trigger_type,
-            WorkflowRule.is_active == 1
-        ).order_by(WorkflowRule.priority.desc()).all()
-
-        for rule in rules:
-            # Check rate limiting
-            if not self._check_rate_limit(rule):
-                logger.debug(f"Rule {rule.id} rate limited")
+        for compiled in self.get_rules(trigger_type):
+            if not compiled.matches(context):
                 continue
 
-            # Check trigger config match
-            if not self._match_trigger_config(rule, context):
+            # Check rate limiting
+            if not self._check_rate_limit(compiled):
+                logger.debug(f"Rule {compiled.id} rate limited")
                 continue
 
-            # Evaluate conditions
-            conditions = json.loads(rule.conditions) if rule.conditions else []
-            if not self.evaluator.evaluate(conditions, context):
+            # Load the rule only once it is going to fire
+            rule = self.db.get(WorkflowRule, compiled.id)
+            if rule is None:
                 continue
 
             # Execute rule
@@ -282,6 +387,46 @@ class WorkflowEngine:
 
         return results
 
+    def get_rules(self, trigger_type: str) -> List[CompiledRule]:
+        """
+        Get the active rules for a trigger type, highest priority first.
+
+        Rules are loaded and compiled once per trigger type and cached until
+        a rule definition changes (or RULE_INDEX_TTL expires, to pick up
+        changes made by other processes).
+        """
+        cache_key = f"rules:{trigger_type}"
+        rules = _rule_index.get(cache_key)
+        if rules is not None:
+            return rules
+
+        rules = [
+            self._compile_rule(rule)
+            for rule in self.db.query(WorkflowRule).filter(
+                WorkflowRule.trigger_type == trigger_type,
+                WorkflowRule.is_active == 1
+            ).order_by(WorkflowRule.priority.desc()).all()
+        ]
+        _rule_index.set(cache_key, rules, ttl=RULE_INDEX_TTL)
+        return rules
+
+    def _compile_rule(self, rule: WorkflowRule) -> CompiledRule:
+        try:
+            conditions = json.loads(rule.conditions) if rule.conditions else []
+            predicate = self.evaluator.compile(conditions)
+        except (json.JSONDecodeError, AttributeError, TypeError) as e:
+            logger.warning(f"Rule {rule.id} has invalid conditions: {e}")
+            predicate = lambda context: False
+
+        return CompiledRule(
+            id=rule.id,
+            name=rule.name,
+            priority=rule.priority or 0,
+            max_executions_per_hour=rule.max_executions_per_hour,
+            trigger_match=self._parse_trigger_config(rule),
+            predicate=predicate,
+        )
+
     def execute_rule(
         self,
         rule: WorkflowRule,
@@ -312,6 +457,7 @@ class WorkflowEngine:
         )
         self.db.add(execution)
         self.db.flush()
+        rate_limiter.record(rule.id, execution.created_at or start_time)
 
         try:
             # Parse and execute actions
@@ -416,49 +562,21 @@ class WorkflowEngine:
 
         return handler(config, context)
 
-    def _check_rate_limit(self, rule: WorkflowRule) -> bool:
+    def _check_rate_limit(self, rule: CompiledRule) -> bool:
         """Check if rule is within rate limit."""
-        if not rule.max_executions_per_hour:
-            return True
-
-        from datetime import timedelta
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-
-        recent_executions = self.db.query(WorkflowExecution).filter(
-            WorkflowExecution.rule_id == rule.id,
-            WorkflowExecution.created_at >= one_hour_ago
-        ).count()
+        return rate_limiter.allow(self.db, rule.id, rule.max_executions_per_hour)
 
-        return recent_executions < rule.max_executions_per_hour
-
-    def _match_trigger_config(
-        self,
-        rule: WorkflowRule,
-        context: Dict[str, Any]
-    ) -> bool:
-        """Check if trigger config matches context."""
+    def _parse_trigger_config(self, rule: WorkflowRule) -> Dict[str, Any]:
+        """Extract the context keys a rule's trigger config must match."""
         if not rule.trigger_config:
-            return True
+            return {}
 
         try:
             config = json.loads(rule.trigger_config)
-
-            # Match device_id if specified
-            if "device_id" in config and config["device_id"] != context.get("device_id"):
-                return False
-
-            # Match site_id if specified
-            if "site_id" in config and config["site_id"] != context.get("site_id"):
-                return False
-
-            # Match datapoint if specified
-            if "datapoint" in config and config["datapoint"] != context.get("datapoint"):
-                return False
-
-            return True
-
         except json.JSONDecodeError:
-            return True
+            return {}
+
+        return {key: config[key] for key in TRIGGER_MATCH_KEYS if key in config}
 
     # Default action handlers
     def _action_send_notification(self, config: Dict, context: Dict) -> Dict:
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark: simulated gateways -> MQTT subscriber -> ingestion -> alarms.
+
+Runs against the database in DATABASE_URL (use a local PostgreSQL, not
+production), prints the results and compares them with the baseline for
+the same database and rate in benchmarks/ingest_baseline.json. Exits 1
+when throughput or latency regressed beyond the tolerance.
+
+The default run publishes as fast as ingestion keeps up and measures
+throughput; a paced run (--rate 10) measures latency.
+
+Usage:
+    cd backend
+    DATABASE_URL=postgresql://localhost/saveit_bench python scripts/benchmark_ingest.py
+    python scripts/benchmark_ingest.py --rate 10
+    python scripts/benchmark_ingest.py --gateways 50 --duration 60
+    python scripts/benchmark_ingest.py --rate 10 --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+# Ensure the backend directory is on the path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.ingest_benchmark import (
+    IngestLoadConfig, baseline_key, compare_with_baseline, run_ingest_benchmark
+)
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "ingest_baseline.json")
+
+
+def parse_args() -> argparse.Namespace:
+    defaults = IngestLoadConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gateways", type=int, default=defaults.gateways)
+    parser.add_argument("--devices-per-gateway", type=int, default=defaults.devices_per_gateway)
+    parser.add_argument("--datapoints", type=int, default=defaults.datapoints_per_device,
+                        help="Datapoints per device reading")
+    parser.add_argument("--rate", type=float, default=defaults.rate,
+                        help="Messages/sec across the fleet, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=defaults.duration)
+    parser.add_argument("--teltonika-ratio", type=float, default=defaults.teltonika_ratio)
+    parser.add_argument("--alarm-rules", type=int, default=defaults.alarm_rules)
+    parser.add_argument("--alarm-probability", type=float, default=defaults.alarm_probability)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed regression as a fraction of the baseline")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Record this run as the baseline for its database")
+    parser.add_argument("--keep-data", action="store_true", help="Leave the seeded fleet and telemetry")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    config = IngestLoadConfig(
+        gateways=args.gateways,
+        devices_per_gateway=args.devices_per_gateway,
+        datapoints_per_device=args.datapoints,
+        rate=args.rate,
+        duration=args.duration,
+        teltonika_ratio=args.teltonika_ratio,
+        alarm_rules=args.alarm_rules,
+        alarm_probability=args.alarm_probability,
+        seed=args.seed,
+    )
+
+    result = asyncio.run(run_ingest_benchmark(config, keep_data=args.keep_data)).to_dict()
+    print(json.dumps(result, indent=2))
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    key = baseline_key(result)
+    if args.update_baseline:
+        baselines[key] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline {key} written to {args.baseline}")
+        return 0
+
+    baseline = baselines.get(key)
+    if baseline is None:
+        print(f"No {key} baseline in {args.baseline}; record one with --update-baseline")
+        return 0
+
+    try:
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+    except ValueError as e:
+        print(f"Not compared: {e}")
+        return 0
+
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("Within tolerance of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Read-path benchmark: telemetry history, dashboard widgets, KPIs, site
+comparison and telemetry export against a seeded synthetic fleet.
+
+Runs against the database in DATABASE_URL (use a local PostgreSQL, not
+production), prints latency percentiles and statements per request for
+each endpoint and compares them with the baseline for the same database
+in benchmarks/read_paths_baseline.json. Exits 1 when an endpoint issues
+more statements per request than the baseline, or starts failing.
+
+Usage:
+    cd backend
+    DATABASE_URL=postgresql://localhost/saveit_bench python scripts/benchmark_read_paths.py
+    python scripts/benchmark_read_paths.py --sites 20 --months 12
+    python scripts/benchmark_read_paths.py --latency-tolerance 0.5
+    python scripts/benchmark_read_paths.py --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Ensure the backend directory is on the path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.read_benchmark import ReadFleetConfig, compare_with_baseline, run_read_benchmark
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "read_paths_baseline.json")
+
+
+def parse_args() -> argparse.Namespace:
+    defaults = ReadFleetConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=defaults.sites)
+    parser.add_argument("--devices-per-site", type=int, default=defaults.devices_per_site)
+    parser.add_argument("--months", type=int, default=defaults.months, help="Months of telemetry per device")
+    parser.add_argument("--interval-minutes", type=int, default=defaults.interval_minutes,
+                        help="Telemetry reporting interval")
+    parser.add_argument("--datapoints", type=int, default=defaults.datapoints)
+    parser.add_argument("--alarms-per-device", type=int, default=defaults.alarms_per_device)
+    parser.add_argument("--kpis-per-site", type=int, default=defaults.kpis_per_site)
+    parser.add_argument("--iterations", type=int, default=defaults.iterations, help="Requests per endpoint")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--latency-tolerance", type=float, default=None,
+                        help="Also fail when p95 latency rises by more than this fraction")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Record this run as the baseline for its database")
+    parser.add_argument("--keep-data", action="store_true", help="Leave the seeded fleet in the database")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("app.services.read_benchmark").setLevel(logging.INFO)
+    config = ReadFleetConfig(
+        sites=args.sites,
+        devices_per_site=args.devices_per_site,
+        months=args.months,
+        interval_minutes=args.interval_minutes,
+        datapoints=args.datapoints,
+        alarms_per_device=args.alarms_per_device,
+        kpis_per_site=args.kpis_per_site,
+        iterations=args.iterations,
+        seed=args.seed,
+    )
+
+    result = run_read_benchmark(config, keep_data=args.keep_data).to_dict()
+    print(json.dumps(result, indent=2))
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    key = result["database"]
+    if args.update_baseline:
+        baselines[key] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline {key} written to {args.baseline}")
+        return 0
+
+    baseline = baselines.get(key)
+    if baseline is None:
+        print(f"No {key} baseline in {args.baseline}; record one with --update-baseline")
+        return 0
+
+    try:
+        regressions = compare_with_baseline(result, baseline, args.latency_tolerance)
+    except ValueError as e:
+        print(f"Not compared: {e}")
+        return 0
+
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("Within baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
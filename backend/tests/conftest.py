@@ -17,6 +17,8 @@ os.environ["SESSION_SECRET"] = "test-secret-key-for-testing-only"
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 # Disable rate limiting in tests
 os.environ["RATE_LIMIT_ENABLED"] = "false"
+# Fail requests that exceed their SQL statement budget
+os.environ["SQL_QUERY_BUDGET_STRICT"] = "true"
 
 # Ensure 'app' package is importable (same import path as the app itself)
 _backend_dir = os.path.join(os.path.dirname(__file__), '..')
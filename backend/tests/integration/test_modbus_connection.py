@@ -13,6 +13,7 @@ from app.services.modbus_manager import (
     DataType,
     Endianness,
     CircuitBreaker,
+    ReadPlanner,
 )
 
 
@@ -157,6 +158,45 @@ class TestCircuitBreaker:
         assert cb.state == "half-open"
 
 
+class TestReadPlanner:
+    """Test register block coalescing."""
+
+    def test_merges_nearby_registers(self):
+        """Nearby registers with the same function code share a block."""
+        mappings = [
+            RegisterMapping(name="power", address=10, data_type=DataType.FLOAT32, count=2),
+            RegisterMapping(name="voltage", address=0, data_type=DataType.FLOAT32, count=2),
+            RegisterMapping(name="current", address=4, data_type=DataType.FLOAT32, count=2),
+            RegisterMapping(name="energy", address=0, data_type=DataType.UINT32, count=2, function_code=4),
+        ]
+
+        blocks = ReadPlanner(max_gap=4).plan(mappings)
+
+        assert [(b.function_code, b.address, b.count) for b in blocks] == [(3, 0, 12), (4, 0, 2)]
+        assert [m.name for m in blocks[0].mappings] == ["voltage", "current", "power"]
+
+    def test_splits_on_gap_and_block_limit(self):
+        """Blocks break on large gaps and never exceed max_count registers."""
+        mappings = [
+            RegisterMapping(name=f"r{a}", address=a, data_type=DataType.UINT16)
+            for a in (0, 1, 50, 120, 130)
+        ]
+
+        blocks = ReadPlanner(max_gap=10, max_count=125).plan(mappings)
+
+        assert [(b.address, b.count) for b in blocks] == [(0, 2), (50, 1), (120, 11)]
+        assert all(b.count <= 125 for b in blocks)
+
+    def test_coils_are_not_coalesced(self):
+        """Coil reads stay one request per mapping."""
+        mappings = [
+            RegisterMapping(name="a", address=0, data_type=DataType.UINT16, function_code=1),
+            RegisterMapping(name="b", address=1, data_type=DataType.UINT16, function_code=1),
+        ]
+
+        assert len(ReadPlanner().plan(mappings)) == 2
+
+
 class TestModbusConnection:
     """Test Modbus connection data class."""
 
@@ -404,6 +444,56 @@ class TestModbusConnectionManager:
         assert "current" in results
         assert results["voltage"]["value"] == 230
 
+    @pytest.mark.asyncio
+    async def test_poll_device_coalesces_reads(self, manager):
+        """Adjacent registers are fetched in one request and sliced per mapping."""
+        manager.add_connection(ModbusConnection(id=1, protocol=ModbusProtocol.TCP, host="localhost"))
+
+        mock_client = MagicMock()
+        mock_result = MagicMock()
+        mock_result.isError.return_value = False
+        mock_result.registers = [230, 0, 15, 0x4120, 0x0000]
+        mock_client.read_holding_registers = AsyncMock(return_value=mock_result)
+        manager._clients[1] = mock_client
+
+        mappings = [
+            RegisterMapping(name="voltage", address=100, data_type=DataType.UINT16),
+            RegisterMapping(name="current", address=102, data_type=DataType.UINT16),
+            RegisterMapping(name="power", address=103, data_type=DataType.FLOAT32, count=2),
+        ]
+
+        results = await manager.poll_device(1, mappings)
+
+        mock_client.read_holding_registers.assert_called_once_with(100, 5, slave=1)
+        assert results["voltage"]["value"] == 230
+        assert results["current"]["value"] == 15
+        assert abs(results["power"]["value"] - 10.0) < 1e-6
+
+    @pytest.mark.asyncio
+    async def test_poll_device_falls_back_when_block_rejected(self, manager):
+        """A rejected block read is retried one mapping at a time."""
+        manager.add_connection(ModbusConnection(id=1, protocol=ModbusProtocol.TCP, host="localhost"))
+
+        async def mock_read(address, count, slave):
+            if count > 1:
+                return MagicMock(isError=lambda: True)
+            return MagicMock(isError=lambda: False, registers=[address])
+
+        mock_client = MagicMock()
+        mock_client.read_holding_registers = mock_read
+        manager._clients[1] = mock_client
+
+        mappings = [
+            RegisterMapping(name="a", address=7, data_type=DataType.UINT16),
+            RegisterMapping(name="b", address=9, data_type=DataType.UINT16),
+        ]
+
+        results = await manager.poll_device(1, mappings)
+
+        assert results["a"]["value"] == 7
+        assert results["b"]["value"] == 9
+        assert manager.get_status()["stats"]["block_fallbacks"] == 1
+
     @pytest.mark.asyncio
     async def test_test_connection(self, manager):
         """Test connection test method."""
@@ -0,0 +1,179 @@
+"""Tests for alarm storm coalescing and batched commits."""
+
+import asyncio
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.devices import AlarmCondition, AlarmRule, AlarmSeverity, Datapoint, Device, DeviceModel
+from app.models.telemetry import AlarmStatus, DeviceAlarm
+from app.services.alarm_aggregator import AlarmEventAggregator
+from app.services.alarm_engine import AlarmEngine
+from app.services.notification_service import DeliveryMessage, DeliveryPreference
+
+
+class RecordingRealtime:
+    """Stands in for RealtimeService and records batch broadcasts."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def broadcast_alarm_batch(self, alarms):
+        self.batches.append(alarms)
+
+
+@pytest.fixture(autouse=True)
+def alarm_ids():
+    """BigInteger primary keys don't autoincrement on SQLite, so assign alarm ids on insert."""
+    ids = itertools.count(1)
+
+    def assign(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+
+    event.listen(DeviceAlarm, "before_insert", assign)
+    yield
+    event.remove(DeviceAlarm, "before_insert", assign)
+
+
+@pytest.fixture
+def alarm_setup(db: Session, test_site):
+    """Two devices of one model with a 'power > 100' rule."""
+    model = DeviceModel(name="Meter")
+    db.add(model)
+    db.flush()
+    datapoint = Datapoint(model_id=model.id, name="power", unit="kW")
+    db.add(datapoint)
+    db.flush()
+    rule = AlarmRule(
+        model_id=model.id,
+        datapoint_id=datapoint.id,
+        name="High power",
+        condition=AlarmCondition.GREATER_THAN,
+        threshold_value=100,
+        severity=AlarmSeverity.CRITICAL,
+        auto_clear=1,
+    )
+    devices = [Device(site_id=test_site.id, model_id=model.id, name=f"Meter {i}") for i in range(2)]
+    db.add_all([rule, *devices])
+    db.commit()
+    return devices, datapoint, rule
+
+
+def replay(engine: AlarmEngine, device: Device, datapoint: Datapoint, values, start: datetime):
+    for i, value in enumerate(values):
+        engine.evaluate(device.id, datapoint, value, start + timedelta(seconds=i))
+
+
+class TestAlarmEngineFlapping:
+    """Test that a flapping value reuses its alarm row."""
+
+    def test_retrigger_within_window_reopens_alarm(self, db: Session, alarm_setup):
+        """Trigger/clear cycles inside the reopen window keep one alarm."""
+        (device, _), datapoint, _ = alarm_setup
+        engine = AlarmEngine(db, reopen_window_seconds=60)
+
+        replay(engine, device, datapoint, [150, 50, 150, 50, 150], datetime(2024, 1, 1))
+        db.commit()
+
+        alarms = db.query(DeviceAlarm).all()
+        assert len(alarms) == 1
+        assert alarms[0].status == AlarmStatus.TRIGGERED
+        assert alarms[0].cleared_at is None
+
+    def test_retrigger_after_window_creates_alarm(self, db: Session, alarm_setup):
+        """A re-trigger after the window is a new alarm."""
+        (device, _), datapoint, _ = alarm_setup
+        engine = AlarmEngine(db, reopen_window_seconds=60)
+        start = datetime(2024, 1, 1)
+
+        replay(engine, device, datapoint, [150, 50], start)
+        engine.evaluate(device.id, datapoint, 150, start + timedelta(minutes=5))
+        db.commit()
+
+        statuses = sorted(a.status.value for a in db.query(DeviceAlarm).all())
+        assert statuses == ["auto_cleared", "triggered"]
+
+    def test_reopening_is_off_by_default(self, db: Session, alarm_setup):
+        """Without a reopen window every trigger after a clear is a new alarm."""
+        (device, _), datapoint, _ = alarm_setup
+
+        replay(AlarmEngine(db), device, datapoint, [150, 50, 150], datetime(2024, 1, 1))
+        db.commit()
+
+        statuses = sorted(a.status.value for a in db.query(DeviceAlarm).all())
+        assert statuses == ["auto_cleared", "triggered"]
+
+
+class TestAlarmEventAggregator:
+    """Test coalescing, commit and fan-out per batch."""
+
+    @pytest.mark.asyncio
+    async def test_storm_becomes_one_batch(self, db: Session, alarm_setup, user_factory):
+        """Thousands of events give one commit, one broadcast and one digest per user."""
+        devices, datapoint, rule = alarm_setup
+        user = user_factory(email="ops@example.com")
+        db.add(DeliveryPreference(user_id=user.id, email=user.email, email_enabled=1, in_app_enabled=0))
+        db.commit()
+
+        # Flap suppression keeps device 0's trigger/clear storm on one alarm row
+        engine = AlarmEngine(db, reopen_window_seconds=60)
+        realtime = RecordingRealtime()
+        aggregator = AlarmEventAggregator(engine, realtime=realtime, notify_user_ids=[user.id])
+
+        commits = []
+        digest_sessions = []
+        event.listen(db, "after_commit", lambda session: commits.append(threading.get_ident()))
+        def record_digest(mapper, connection, target):
+            digest_sessions.append(Session.object_session(target))
+
+        event.listen(DeliveryMessage, "after_insert", record_digest)
+        start = datetime(2024, 1, 1)
+        replay(engine, devices[0], datapoint, [150, 50] * 1000, start)
+        replay(engine, devices[1], datapoint, [200] * 1000, start)
+
+        assert commits == []
+        try:
+            assert await aggregator.flush() == 2
+        finally:
+            event.remove(DeliveryMessage, "after_insert", record_digest)
+        # Committed once, off the event loop; the digest used its own session
+        assert len(commits) == 1
+        assert commits[0] != threading.get_ident()
+        assert digest_sessions and digest_sessions[0] is not db
+
+        assert db.query(DeviceAlarm).count() == 2
+        assert len(realtime.batches) == 1
+        by_device = {a["device_id"]: a for a in realtime.batches[0]}
+        assert by_device[devices[0].id]["count"] == 2000
+        assert by_device[devices[0].id]["triggered"] == 1000
+        assert by_device[devices[0].id]["event_type"] == "cleared"
+        assert by_device[devices[1].id]["count"] == 1
+
+        messages = db.query(DeliveryMessage).all()
+        assert len(messages) == 1
+        assert messages[0].subject == "2 alarms triggered"
+        assert messages[0].priority == "urgent"
+        assert all(a.notification_sent == 1 for a in db.query(DeviceAlarm).all())
+        assert aggregator.get_status()["stats"]["events"] == 2001
+
+    @pytest.mark.asyncio
+    async def test_worker_flushes_after_window(self, db: Session, alarm_setup):
+        """The background worker flushes once the window closes."""
+        (device, _), datapoint, _ = alarm_setup
+        engine = AlarmEngine(db)
+        realtime = RecordingRealtime()
+        aggregator = AlarmEventAggregator(engine, realtime=realtime, window_seconds=0.02)
+        await aggregator.start()
+
+        replay(engine, device, datapoint, [150, 160, 170], datetime(2024, 1, 1))
+        await asyncio.sleep(0.1)
+        await aggregator.stop()
+
+        assert len(realtime.batches) == 1
+        assert realtime.batches[0][0]["count"] == 1
+        assert aggregator.get_status()["pending"] == 0
@@ -0,0 +1,228 @@
+"""Tests for the interval-data BESS dispatch simulator."""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import BESSDataReading, BESSDataset, BESSModel, BESSVendor, Tariff, TariffRate
+from app.services.optimization.bess_dispatch import (
+    BatteryConfig,
+    DispatchStrategy,
+    LoadProfile,
+    build_tou_rates,
+    simulate_dispatch,
+    sweep,
+)
+
+START = datetime(2026, 1, 5)  # a Monday
+
+
+def _profile(rates=None, demand_charge=10.0, days=2):
+    """Hourly profile: 50 kW base load with a 100 kW evening peak (18:00-20:00)."""
+    hours = days * 24
+    demand = np.full(hours, 50.0)
+    for day in range(days):
+        demand[day * 24 + 18: day * 24 + 20] = 100.0
+    return LoadProfile(
+        timestamps=np.datetime64(START, "m") + np.arange(hours).astype("timedelta64[h]"),
+        demand_kw=demand,
+        rates=np.full(hours, 0.10) if rates is None else rates,
+        interval_hours=1.0,
+        demand_charges=np.full(12, demand_charge),
+    )
+
+
+def _tou_rates(hours=48):
+    """0.30 $/kWh from 17:00 to 21:00, 0.10 otherwise."""
+    rates = np.full(hours, 0.10)
+    for day in range(hours // 24):
+        rates[day * 24 + 17: day * 24 + 21] = 0.30
+    return rates
+
+
+def _battery(**kwargs):
+    values = dict(capacity_kwh=100.0, power_kw=30.0, round_trip_efficiency=1.0, depth_of_discharge=1.0)
+    values.update(kwargs)
+    return BatteryConfig(**values)
+
+
+class TestTouRates:
+    """Test TOU rate arrays built from TariffRate windows."""
+
+    def test_rates_follow_windows_and_days(self):
+        """Peak window applies on weekdays only; midnight-wrapping windows are honoured."""
+        tariff = Tariff(base_rate=0.10, rates=[
+            TariffRate(id=1, name="Peak", rate_per_kwh=0.30, time_start=time(17), time_end=time(21), days_of_week="mon-fri"),
+            TariffRate(id=2, name="Night", rate_per_kwh=0.05, time_start=time(23), time_end=time(6)),
+        ])
+        # Friday 2026-01-09 through Saturday 2026-01-10
+        timestamps = np.datetime64("2026-01-09T00:00") + np.arange(48).astype("timedelta64[h]")
+
+        rates = build_tou_rates(timestamps, tariff)
+
+        assert rates[18] == 0.30          # Friday evening
+        assert rates[24 + 18] == 0.10     # Saturday evening
+        assert rates[2] == rates[23] == 0.05
+        assert rates[12] == 0.10
+
+
+    def test_seasons_do_not_overlap(self):
+        """September is autumn only, so summer and autumn rates never both apply."""
+        tariff = Tariff(base_rate=0.10, rates=[
+            TariffRate(id=1, name="Summer", rate_per_kwh=0.30, season="summer"),
+            TariffRate(id=2, name="Autumn", rate_per_kwh=0.20, season="autumn"),
+        ])
+        timestamps = np.array(["2026-08-15T12:00", "2026-09-15T12:00", "2026-10-15T12:00"], dtype="datetime64[m]")
+
+        assert build_tou_rates(timestamps, tariff).tolist() == [0.30, 0.20, 0.20]
+
+
+class TestDispatch:
+    """Test the vectorized state-of-charge model."""
+
+    def test_peak_shaving_caps_monthly_peak(self):
+        """Discharging at full power removes the battery rating from the peak."""
+        result = simulate_dispatch(_profile(), [_battery()], DispatchStrategy.PEAK_SHAVING)[0]
+
+        assert result.baseline_peak_kw == 100.0
+        assert result.peak_kw == pytest.approx(70.0)
+        assert result.peak_shaving_savings == pytest.approx(300.0)
+        assert result.monthly_peak_reduction_kw == [pytest.approx(30.0)]
+
+    def test_demand_savings_annualized_by_billing_month(self):
+        """Two days of data are one billing month: demand savings scale by 12, energy by hours."""
+        result = simulate_dispatch(_profile(rates=_tou_rates()), [_battery()], DispatchStrategy.COMBINED)[0]
+
+        assert result.billing_months == 1
+        assert result.annual_peak_shaving_savings == pytest.approx(result.peak_shaving_savings * 12)
+        assert result.annual_arbitrage_savings == pytest.approx(result.arbitrage_savings * 8760 / 48)
+        assert result.to_dict()["annual_savings"] == round(
+            result.annual_peak_shaving_savings + result.annual_arbitrage_savings, 2
+        )
+
+    def test_energy_limits_state_of_charge(self):
+        """A small battery cannot hold the target through the whole peak."""
+        result = simulate_dispatch(_profile(), [_battery(capacity_kwh=40.0)], DispatchStrategy.PEAK_SHAVING)[0]
+
+        assert result.peak_kw > 70.0
+        assert result.energy_discharged_kwh <= 2 * 40.0 + 1e-9
+
+    def test_arbitrage_needs_a_price_spread(self):
+        """Flat rates give no arbitrage; a TOU spread is exploited."""
+        flat = simulate_dispatch(_profile(), [_battery()], DispatchStrategy.ARBITRAGE)[0]
+        tou = simulate_dispatch(_profile(rates=_tou_rates()), [_battery()], DispatchStrategy.ARBITRAGE)[0]
+
+        assert flat.arbitrage_savings == pytest.approx(0.0)
+        assert tou.arbitrage_savings > 0
+        assert tou.peak_kw <= tou.baseline_peak_kw
+
+    def test_configurations_are_independent(self):
+        """Simulating side by side gives the same result as one at a time."""
+        configs = [_battery(), _battery(capacity_kwh=40.0), _battery(round_trip_efficiency=0.8)]
+        profile = _profile(rates=_tou_rates())
+
+        together = simulate_dispatch(profile, configs)
+        separate = [simulate_dispatch(profile, [c])[0] for c in configs]
+
+        for a, b in zip(together, separate):
+            assert a.total_savings == pytest.approx(b.total_savings)
+
+    def test_sweep_across_process_pool_matches_serial(self):
+        """Chunks dispatched to worker processes come back in input order."""
+        configs = [_battery(capacity_kwh=float(c)) for c in (20, 40, 60, 80)]
+        profile = _profile(rates=_tou_rates())
+
+        serial = simulate_dispatch(profile, configs)
+        parallel = sweep(profile, configs, max_workers=2, chunk_size=2)
+
+        assert [r.config for r in parallel] == configs
+        assert [r.total_savings for r in parallel] == pytest.approx([r.total_savings for r in serial])
+
+
+@pytest.fixture
+def bess_dataset(db: Session, test_site):
+    """Two days of hourly demand, a TOU tariff and two catalog models."""
+    vendor = BESSVendor(name="Test Vendor")
+    db.add(vendor)
+    db.flush()
+    db.add_all([
+        BESSModel(vendor_id=vendor.id, model_name="Small", chemistry="LFP", capacity_kwh=40.0,
+                  power_rating_kw=20.0, cycle_life=6000, warranty_years=10, price_usd=20000),
+        BESSModel(vendor_id=vendor.id, model_name="Large", chemistry="LFP", capacity_kwh=100.0,
+                  power_rating_kw=30.0, cycle_life=6000, warranty_years=10, price_usd=45000),
+    ])
+    tariff = Tariff(site_id=test_site.id, name="TOU", base_rate=0.10, demand_charge_per_kw=10.0, is_active=1)
+    db.add(tariff)
+    db.flush()
+    db.add(TariffRate(tariff_id=tariff.id, name="Peak", rate_per_kwh=0.30, time_start=time(17), time_end=time(21)))
+
+    dataset = BESSDataset(site_id=test_site.id, name="Load", interval_minutes=60)
+    db.add(dataset)
+    db.flush()
+    profile = _profile()
+    db.add_all([
+        BESSDataReading(dataset_id=dataset.id, timestamp=START + timedelta(hours=i), demand_kw=float(kw))
+        for i, kw in enumerate(profile.demand_kw)
+    ])
+    db.commit()
+    return dataset
+
+
+class TestDispatchEndpoints:
+    """Test the dataset simulation and financial simulation endpoints."""
+
+    def test_simulate_dataset(self, client: TestClient, auth_headers: dict, bess_dataset):
+        """Every model and size is simulated and ranked by savings."""
+        response = client.post(
+            f"/api/v1/bess/datasets/{bess_dataset.id}/simulate",
+            json={"unit_counts": [1, 2]},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 4
+        assert data[0]["total_savings"] >= data[-1]["total_savings"]
+        assert data[0]["arbitrage_savings"] > 0
+        assert data[0]["peak_shaving_savings"] > 0
+
+    def test_simulate_rejects_unknown_strategy(self, client: TestClient, auth_headers: dict, bess_dataset):
+        """Unknown strategies are a client error."""
+        response = client.post(
+            f"/api/v1/bess/datasets/{bess_dataset.id}/simulate",
+            json={"strategy": "moon"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+    def test_simulate_missing_dataset(self, client: TestClient, auth_headers: dict, bess_dataset):
+        """Unknown datasets return 404."""
+        response = client.post("/api/v1/bess/datasets/9999/simulate", json={}, headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_financial_simulation(self, client: TestClient, auth_headers: dict):
+        """Hourly profile simulation reports both savings streams and projections."""
+        profile = _profile(days=365)
+        response = client.post(
+            "/api/v1/analysis/bess-simulation",
+            json={
+                "load_profile_kwh": profile.demand_kw.tolist(),
+                "tariff_rates": _tou_rates(365 * 24).tolist(),
+                "demand_charges": [10.0] * 12,
+                "battery_capacity_kwh": 100.0,
+                "battery_power_kw": 30.0,
+                "capex": 40000.0,
+                "analysis_years": 10,
+            },
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["peak_shaving_savings_year1"] == pytest.approx(3600.0)
+        assert data["arbitrage_savings_year1"] > 0
+        assert len(data["annual_projections"]) == 10
+        assert len(data["monthly_peak_reduction"]) == 12
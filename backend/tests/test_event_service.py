@@ -0,0 +1,131 @@
+"""Tests for SQL-side event correlation, timelines and statistics."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.middleware.query_budget import assert_max_queries
+from app.models.core import Site
+from app.models.devices import AlarmSeverity, Device, DeviceEvent
+from app.services.event_service import EventService
+
+
+@pytest.fixture
+def devices(db: Session, test_site):
+    devices = [Device(site_id=test_site.id, name=f"Meter {i}") for i in range(3)]
+    db.add_all(devices)
+    db.commit()
+    return devices
+
+
+def add_event(db: Session, device: Device, at: datetime, event_type: str = "alarm",
+              severity: AlarmSeverity = AlarmSeverity.WARNING, **fields) -> DeviceEvent:
+    event = DeviceEvent(device_id=device.id, event_type=event_type, severity=severity,
+                        title=event_type, triggered_at=at, **fields)
+    db.add(event)
+    db.flush()
+    return event
+
+
+class TestCorrelate:
+    """Test grouping a device's events into islands."""
+
+    def test_gap_beyond_window_starts_new_group(self, db: Session, devices):
+        now = datetime.utcnow().replace(microsecond=0)
+        device = devices[0]
+        first = [add_event(db, device, now - timedelta(hours=2, seconds=s)) for s in (120, 60, 0)]
+        add_event(db, device, now - timedelta(hours=1))
+        second = [
+            add_event(db, device, now - timedelta(minutes=10), "status_change"),
+            add_event(db, device, now - timedelta(minutes=9, seconds=30)),
+        ]
+        # Outside the lookback
+        add_event(db, device, now - timedelta(hours=30))
+        add_event(db, device, now - timedelta(hours=30, seconds=5))
+        db.commit()
+
+        groups = EventService(db).correlate(device.id, time_window_seconds=60)
+
+        assert [[g.primary_event_id, *g.related_event_ids] for g in groups] == [
+            [e.id for e in first], [e.id for e in second]
+        ]
+        assert groups[0].time_window_end - groups[0].time_window_start == timedelta(seconds=120)
+        assert groups[0].summary == "3 events (alarm) within 120s"
+        assert groups[1].summary == "2 events (alarm, status_change) within 30s"
+        assert groups[1].device_ids == [device.id]
+
+    def test_no_events(self, db: Session, devices):
+        assert EventService(db).correlate(devices[0].id) == []
+
+
+class TestCorrelateSite:
+    """Test correlating events across a site's devices."""
+
+    def test_groups_need_several_devices(self, db: Session, devices):
+        start = datetime(2024, 3, 1, 12)
+        trip = [add_event(db, device, start + timedelta(seconds=10 * i)) for i, device in enumerate(devices)]
+        # Repeated alarms on a single device
+        add_event(db, devices[0], start + timedelta(hours=1))
+        add_event(db, devices[0], start + timedelta(hours=1, seconds=20))
+        # Another site's device firing at the same time
+        other_site = Site(name="Other")
+        db.add(other_site)
+        db.flush()
+        other = Device(site_id=other_site.id, name="Other meter")
+        db.add(other)
+        db.flush()
+        add_event(db, other, start + timedelta(seconds=5))
+        db.commit()
+        site_id = devices[0].site_id
+
+        with assert_max_queries(1):
+            groups = EventService(db).correlate_site(site_id, start, start + timedelta(hours=2), time_window_seconds=30)
+
+        assert len(groups) == 1
+        assert [groups[0].primary_event_id, *groups[0].related_event_ids] == [e.id for e in trip]
+        assert groups[0].device_ids == sorted(d.id for d in devices)
+        assert groups[0].site_id == site_id
+        assert groups[0].summary == "3 events (alarm) within 20s on 3 devices"
+
+
+class TestTimelineAndStatistics:
+    """Test counts computed with GROUP BY."""
+
+    @pytest.fixture
+    def events(self, db: Session, devices):
+        start = datetime(2024, 3, 1)
+        add_event(db, devices[0], start + timedelta(minutes=1), severity=AlarmSeverity.CRITICAL)
+        add_event(db, devices[0], start + timedelta(minutes=2), acknowledged_at=start, is_active=0,
+                  cleared_at=start)
+        add_event(db, devices[0], start + timedelta(minutes=3), "maintenance", AlarmSeverity.INFO)
+        add_event(db, devices[1], start + timedelta(minutes=4), "maintenance", AlarmSeverity.INFO)
+        add_event(db, devices[0], start + timedelta(days=2))
+        db.commit()
+        return start
+
+    def test_timeline_counts_whole_range(self, db: Session, devices, events):
+        timeline = EventService(db).get_timeline(devices[0].id, events, events + timedelta(days=1), limit=2)
+
+        assert timeline.event_count == 3
+        assert [e["timestamp"] for e in timeline.events] == [
+            (events + timedelta(minutes=m)).isoformat() for m in (1, 2)
+        ]
+        assert timeline.events[1]["is_active"] is False
+        assert timeline.by_type == {"alarm": 2, "maintenance": 1}
+        assert timeline.by_severity == {"critical": 1, "warning": 1, "info": 1}
+
+    def test_statistics_for_site(self, db: Session, devices, events):
+        site_id = devices[0].site_id
+
+        with assert_max_queries(1):
+            stats = EventService(db).get_event_statistics(site_id=site_id, start=events, end=events + timedelta(days=1))
+
+        assert stats == {
+            "total": 4,
+            "active": 3,
+            "acknowledged": 1,
+            "cleared": 1,
+            "by_type": {"alarm": 2, "maintenance": 2},
+            "by_severity": {"critical": 1, "warning": 1, "info": 2},
+        }
@@ -0,0 +1,149 @@
+"""Tests for the site hierarchy engine and energy balance."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import Asset, MeterReading
+from app.services.digital_twin.hierarchy import (
+    AssetNode,
+    HierarchyService,
+    SiteHierarchy,
+    invalidate_site_hierarchy,
+)
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def clear_hierarchy_cache():
+    """Each test starts with an empty hierarchy cache."""
+    invalidate_site_hierarchy()
+    yield
+    invalidate_site_hierarchy()
+
+
+@pytest.fixture
+def site_tree(db: Session, test_site, asset_factory, meter_factory):
+    """
+    main (metered, 100 kWh)
+    ├── panel_a (metered, 60 kWh)
+    │   └── motor (metered, 55 kWh)
+    └── panel_b (unmetered)
+        └── lights (metered, 30 kWh)
+    """
+    main = asset_factory(site_id=test_site.id, name="Main", asset_type="main_breaker")
+    panel_a = asset_factory(site_id=test_site.id, name="Panel A", parent_id=main.id)
+    panel_b = asset_factory(site_id=test_site.id, name="Panel B", parent_id=main.id)
+    motor = asset_factory(site_id=test_site.id, name="Motor", asset_type="load", parent_id=panel_a.id)
+    lights = asset_factory(site_id=test_site.id, name="Lights", asset_type="load", parent_id=panel_b.id)
+
+    energy = {main: 100.0, panel_a: 60.0, motor: 55.0, lights: 30.0}
+    for asset, kwh in energy.items():
+        meter = meter_factory(site_id=test_site.id, name=f"{asset.name} Meter", asset_id=asset.id)
+        db.add(MeterReading(meter_id=meter.id, timestamp=START + timedelta(hours=1), energy_kwh=kwh))
+    db.commit()
+    return {"main": main, "panel_a": panel_a, "panel_b": panel_b, "motor": motor, "lights": lights}
+
+
+class TestSiteHierarchy:
+    """Test tree construction and caching."""
+
+    def test_build_orders_parents_first(self, db: Session, test_site, site_tree):
+        """Nodes are ordered breadth-first and paths resolve to the root."""
+        hierarchy = HierarchyService(db).get_hierarchy(test_site.id)
+
+        names = [n.name for n in hierarchy.nodes]
+        assert names.index("Main") < names.index("Panel A") < names.index("Motor")
+        assert hierarchy.path(site_tree["lights"].id) == ["Main", "Panel B", "Lights"]
+
+    def test_cycles_and_orphans_are_kept(self):
+        """Assets in a parent cycle or with a missing parent become roots instead of vanishing."""
+        def node(asset_id, parent_id):
+            return AssetNode(asset_id, f"A{asset_id}", "panel", parent_id, None, None, False, False)
+
+        assets = [node(1, None), node(2, 1), node(3, 5), node(4, 3), node(5, 4), node(6, 99)]
+
+        hierarchy = SiteHierarchy.build(1, assets, [])
+
+        assert sorted(n.id for n in hierarchy.nodes) == [1, 2, 3, 4, 5, 6]
+        assert hierarchy.path(5) == ["A3", "A4", "A5"]
+        assert hierarchy.path(6) == ["A6"]
+        assert all(hierarchy.parent_index[i] < i for i in range(len(hierarchy.nodes)))
+
+    def test_hierarchy_is_cached_and_invalidated(self, db: Session, test_site, site_tree, asset_factory):
+        """Cached tree is reused until an asset changes."""
+        service = HierarchyService(db)
+        first = service.get_hierarchy(test_site.id)
+        assert service.get_hierarchy(test_site.id) is first
+
+        asset_factory(site_id=test_site.id, name="Spare", parent_id=site_tree["main"].id)
+
+        rebuilt = service.get_hierarchy(test_site.id)
+        assert rebuilt is not first
+        assert len(rebuilt.nodes) == len(first.nodes) + 1
+
+    def test_invalidated_on_commit_not_flush(self, db: Session, test_site, site_tree):
+        """Flushed changes keep the cache until commit; rolled back ones never evict it."""
+        service = HierarchyService(db)
+        first = service.get_hierarchy(test_site.id)
+
+        site_tree["lights"].name = "Lamps"
+        db.flush()
+        assert service.get_hierarchy(test_site.id) is first
+        db.rollback()
+        assert service.get_hierarchy(test_site.id) is first
+
+        db.query(Asset).filter(Asset.id == site_tree["lights"].id).update({"name": "Lamps"})
+        db.commit()
+        assert service.get_hierarchy(test_site.id) is not first
+
+
+class TestEnergyBalance:
+    """Test parent-vs-children energy balance."""
+
+    def test_balance_uses_nearest_metered_descendants(self, db: Session, test_site, site_tree):
+        """Unmetered panels are skipped so their metered children count toward the parent."""
+        result = HierarchyService(db).energy_balance(
+            test_site.id, START, START + timedelta(days=1), loss_threshold_percent=5.0
+        )
+
+        branches = {b["asset_name"]: b for b in result["branches"]}
+        assert branches["Main"]["children_kwh"] == 90.0
+        assert branches["Main"]["loss_kwh"] == 10.0
+        assert branches["Main"]["unmetered_children"] == 1
+        assert branches["Main"]["flagged"] is True
+        assert branches["Panel A"]["loss_kwh"] == 5.0
+        assert branches["Panel A"]["flagged"] is True
+        assert result["total_metered_kwh"] == 100.0
+
+    def test_energy_balance_endpoint(self, client: TestClient, auth_headers: dict, test_site, site_tree):
+        """Endpoint returns per-branch balances."""
+        response = client.get(
+            f"/api/v1/analysis/energy-balance/{test_site.id}",
+            params={
+                "start": START.isoformat(),
+                "end": (START + timedelta(days=1)).isoformat(),
+                "loss_threshold_percent": 10,
+            },
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["flagged_branches"] == 0
+        assert len(data["branches"]) == 2
+
+    def test_panel_diagram(self, client: TestClient, auth_headers: dict, test_site, site_tree):
+        """Panel diagram nests children under their parents."""
+        response = client.get(f"/api/v1/analysis/panel-diagram/{test_site.id}", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_assets"] == 5
+        assert data["metered_assets"] == 4
+        root = data["nodes"][0]
+        assert root["name"] == "Main"
+        assert {c["name"] for c in root["children"]} == {"Panel A", "Panel B"}
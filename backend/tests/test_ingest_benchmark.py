@@ -0,0 +1,116 @@
+"""Tests for the ingestion load generator and benchmark."""
+
+import asyncio
+import itertools
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.devices import Device, DeviceTelemetry
+from app.models.telemetry import DeviceAlarm
+from app.services.ingest_benchmark import (
+    IngestLoadConfig, PayloadFactory, compare_with_baseline, run_ingest_benchmark, seed_fleet
+)
+from app.services.mqtt_subscriber import DataIngestionHandler, MQTTMessage
+
+
+@pytest.fixture(autouse=True)
+def bigint_ids():
+    """BigInteger primary keys don't autoincrement on SQLite, so assign ids on insert."""
+    ids = itertools.count(1)
+
+    def assign(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+
+    event.listen(DeviceAlarm, "before_insert", assign)
+    yield
+    event.remove(DeviceAlarm, "before_insert", assign)
+
+
+SMALL = dict(gateways=2, devices_per_gateway=2, datapoints_per_device=3, duration=0.3)
+
+
+class TestPayloads:
+    """Test the generated payloads against the real handler."""
+
+    def test_teltonika_registers_map_to_datapoints(self, db: Session):
+        config = IngestLoadConfig(**SMALL, teltonika_ratio=1.0, alarm_probability=0)
+        fleet = seed_fleet(db, config)
+        gateway = fleet.gateways[0]
+        device = gateway.devices[1]
+        handler = DataIngestionHandler(lambda: db)
+
+        topic, payload = PayloadFactory(fleet, config).message(gateway, device)
+        asyncio.run(handler.handle_data_message(MQTTMessage.from_raw(topic, payload)))
+
+        reading = handler._buffer[0]
+        assert reading["data"]["edge_key"] == device.edge_key
+        assert set(reading["data"]) == {"edge_key", *fleet.datapoints}
+        assert reading["data"]["voltage_l1"] == pytest.approx(230, rel=0.05)
+
+    @pytest.mark.parametrize("payload, expected", [
+        ({"edge_key": "meter-7", "values": {"Active Power": 4.2}}, {"edge_key": "meter-7", "active_power": 4.2}),
+        ({"edgeKey": "meter-7", "values": {"kwh": 10}}, {"edge_key": "meter-7", "kwh": 10}),
+        ({"edge_key": "meter-7", "voltage": 231.0}, {"edge_key": "meter-7", "voltage": 231.0}),
+    ])
+    def test_saveit_payload_keeps_edge_key(self, payload, expected):
+        """Top-level edge keys survive parsing, including payloads with a values dict."""
+        handler = DataIngestionHandler(lambda: None)
+
+        message = MQTTMessage.from_raw("saveit/1/telemetry", json.dumps(payload).encode())
+        asyncio.run(handler.handle_data_message(message))
+
+        assert handler._buffer[0]["data"] == expected
+
+
+class TestBenchmark:
+    """Test a full run on the test database."""
+
+    def test_run_reports_and_cleans_up(self, db: Session):
+        config = IngestLoadConfig(**SMALL, alarm_probability=1.0)
+        factory = sessionmaker(bind=db.get_bind(), autoflush=False)
+
+        result = asyncio.run(run_ingest_benchmark(config, session_factory=factory))
+
+        data = result.to_dict()
+        assert data["messages"] > 0
+        assert data["rows"] == data["messages"] * 3
+        assert data["alarms"] > 0
+        assert len(result.latencies) == data["messages"]
+        assert data["metrics"]["latency_p99_ms"] >= data["metrics"]["latency_p50_ms"]
+        json.dumps(data)
+        assert db.query(Device).count() == 0
+        assert db.query(DeviceTelemetry).count() == 0
+
+
+class TestBaseline:
+    """Test regression detection against a baseline."""
+
+    def result(self, **metrics):
+        values = {
+            "messages_per_second": 100.0,
+            "rows_per_second": 1400.0,
+            "latency_p50_ms": 10.0,
+            "latency_p95_ms": 20.0,
+            "latency_p99_ms": 30.0,
+            **metrics,
+        }
+        return {"database": "postgresql", "config": {"gateways": 10, "rate": 10}, "metrics": values}
+
+    def test_within_tolerance(self):
+        baseline = self.result()
+        assert compare_with_baseline(self.result(messages_per_second=85, latency_p95_ms=23), baseline) == []
+
+    def test_regressions_reported(self):
+        regressions = compare_with_baseline(
+            self.result(rows_per_second=1000, latency_p99_ms=40), self.result()
+        )
+        assert [r.split(":")[0] for r in regressions] == ["rows_per_second", "latency_p99_ms"]
+
+    def test_other_config_not_compared(self):
+        baseline = {**self.result(), "config": {"gateways": 50, "rate": 10}}
+        with pytest.raises(ValueError):
+            compare_with_baseline(self.result(), baseline)
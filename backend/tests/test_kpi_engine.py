@@ -0,0 +1,267 @@
+"""Tests for the KPI engine: compiled formulas and batch calculation."""
+import json
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+
+from app.services.formula_engine import compile_formula
+from app.services.kpi_engine import FormulaEvaluator, KPIEngine, TimeRange
+
+
+@pytest.fixture
+def metered_device(db: Session, test_site):
+    """Create a device with power and energy datapoints."""
+    from app.models.devices import Device, DeviceModel, Datapoint, DeviceType
+
+    model = DeviceModel(name="KPI Model")
+    db.add(model)
+    db.commit()
+    device = Device(
+        site_id=test_site.id, model_id=model.id, name="Meter",
+        device_type=DeviceType.PERIPHERAL, is_active=1,
+    )
+    power = Datapoint(model_id=model.id, name="power")
+    energy = Datapoint(model_id=model.id, name="energy")
+    db.add_all([device, power, energy])
+    db.commit()
+    return device, power, energy
+
+
+class TestFormulaCompilation:
+    """Test formula parsing, validation and caching."""
+
+    def test_compiled_formula_is_cached(self):
+        """Same formula text returns the same compiled object."""
+        assert compile_formula("a + b") is compile_formula("a + b")
+
+    def test_collects_variables(self):
+        """Free variables exclude functions and constants."""
+        compiled = compile_formula("sqrt(a) * pi + max(b, c)")
+        assert compiled.variables == {"a", "b", "c"}
+
+    def test_caret_is_power(self):
+        """^ is power with ** precedence."""
+        assert FormulaEvaluator().evaluate("2^3 + 1", {}) == 9.0
+
+    @pytest.mark.parametrize("formula", [
+        "__import__('os')",
+        "a.__class__",
+        "[a for a in b]",
+        "a if b else c",
+        "lambda: 1",
+        "'text'",
+        "open('x')",
+        "a < b",
+    ])
+    def test_rejects_unsafe_syntax(self, formula):
+        """Anything outside the whitelist is rejected at compile time."""
+        with pytest.raises(ValueError):
+            compile_formula(formula)
+
+    def test_rejects_empty_formula(self):
+        """Empty formulas are invalid."""
+        with pytest.raises(ValueError):
+            compile_formula("  ")
+
+
+class TestFormulaEvaluation:
+    """Test scalar and vectorized evaluation."""
+
+    def test_scalar_evaluation(self):
+        """Evaluate with scalar variables."""
+        result = FormulaEvaluator().evaluate("var1 + var2 * 0.95", {"var1": 10, "var2": 20})
+        assert result == pytest.approx(29.0)
+
+    def test_variadic_functions(self):
+        """min/max/avg accept any number of arguments."""
+        evaluator = FormulaEvaluator()
+        assert evaluator.evaluate("max(a, b, 3)", {"a": 1, "b": 7}) == 7.0
+        assert evaluator.evaluate("min(a, b, 3)", {"a": 1, "b": 7}) == 1.0
+        assert evaluator.evaluate("avg(a, b)", {"a": 1, "b": 7}) == 4.0
+
+    def test_scalar_division_by_zero_raises(self):
+        """Division by zero is an evaluation error for scalars."""
+        with pytest.raises(ValueError):
+            FormulaEvaluator().evaluate("a / b", {"a": 1, "b": 0})
+
+    def test_missing_variable_raises(self):
+        """Missing variables are reported."""
+        with pytest.raises(ValueError, match="Missing formula variables"):
+            FormulaEvaluator().evaluate("a + b", {"a": 1})
+
+    def test_series_evaluation(self):
+        """Whole series evaluate in one pass; invalid intervals become NaN."""
+        result = FormulaEvaluator().evaluate_series(
+            "a / b * 100", {"a": [1, 2, 3], "b": [2, 0, 3]}
+        )
+        assert result[0] == pytest.approx(50.0)
+        assert math.isnan(result[1])
+        assert result[2] == pytest.approx(100.0)
+
+    def test_series_leaves_inputs_untouched(self):
+        """Non-finite results become NaN in the result, not in the caller's array."""
+        values = np.array([1.0, np.inf, 3.0])
+        result = FormulaEvaluator().evaluate_series("a", {"a": values})
+        assert math.isnan(result[1])
+        assert values[1] == np.inf
+
+    def test_huge_powers_overflow_quickly(self):
+        """Powers are evaluated in float, so 9**9**9 fails instead of hanging."""
+        with pytest.raises(ValueError):
+            compile_formula("9**9**9").evaluate({})
+        assert compile_formula("pow(2, 10) + a ^ 2").evaluate({"a": 3}) == 1033.0
+
+    def test_series_constant_broadcasts(self):
+        """A constant formula broadcasts to the series length."""
+        result = FormulaEvaluator().evaluate_series("a * 0 + 5", {"a": np.arange(4)})
+        assert result.tolist() == [5.0, 5.0, 5.0, 5.0]
+
+
+class TestFormulaSeries:
+    """Test per-interval formula KPIs over aggregations."""
+
+    def test_calculate_formula_series(self, db: Session, metered_device):
+        """Formula KPI evaluates per hour from aggregation rows."""
+        from app.models.telemetry import (
+            KPIDefinition, KPIType, TelemetryAggregation, AggregationPeriod
+        )
+
+        device, power, energy = metered_device
+
+        # BigInteger primary keys don't autoincrement on SQLite, so set ids explicitly
+        start = datetime(2026, 1, 1)
+        agg_id = 0
+        for hour in range(3):
+            period_start = start + timedelta(hours=hour)
+            for dp, value in ((power, 10.0 * (hour + 1)), (energy, 2.0)):
+                agg_id += 1
+                db.add(TelemetryAggregation(
+                    id=agg_id, device_id=device.id, datapoint_id=dp.id,
+                    period=AggregationPeriod.HOURLY,
+                    period_start=period_start,
+                    period_end=period_start + timedelta(hours=1),
+                    value_avg=value, value_sum=value, value_count=4,
+                ))
+
+        kpi = KPIDefinition(
+            name="ratio",
+            kpi_type=KPIType.FORMULA,
+            formula="p / e",
+            formula_variables=json.dumps({
+                "p": {"device_id": device.id, "datapoint_id": power.id, "aggregation": "avg"},
+                "e": {"device_id": device.id, "datapoint_id": energy.id, "aggregation": "sum"},
+            }),
+            precision=2,
+            is_active=1,
+        )
+        db.add(kpi)
+        db.commit()
+
+        engine = KPIEngine(db)
+        series = engine.calculate_formula_series(
+            kpi.id, TimeRange(start=start, end=start + timedelta(hours=3))
+        )
+
+        assert [r["value"] for r in series] == [5.0, 10.0, 15.0]
+        assert all(r["data_points_used"] == 8 for r in series)
+        assert all(r["status"] == "normal" for r in series)
+
+
+class TestBatchCalculation:
+    """Test batch KPI calculation with a shared query plan."""
+
+    def test_batch_uses_shared_queries(self, db: Session, metered_device):
+        """Many KPIs over one time range are computed from a few grouped queries."""
+        from sqlalchemy import event
+        from app.models.devices import DeviceTelemetry
+        from app.models.telemetry import KPIDefinition, KPIType
+
+        device, power, energy = metered_device
+        end = datetime(2026, 1, 1, 12, 0)
+        for minute, (p, e) in enumerate([(10.0, 1.0), (20.0, 2.0), (30.0, 3.0)]):
+            ts = end - timedelta(minutes=30 - minute * 10)
+            db.add(DeviceTelemetry(device_id=device.id, datapoint_id=power.id, timestamp=ts, value=p))
+            db.add(DeviceTelemetry(device_id=device.id, datapoint_id=energy.id, timestamp=ts, value=e))
+
+        def aggregation_kpi(name, kpi_type, datapoint):
+            return KPIDefinition(
+                name=name, kpi_type=kpi_type, is_active=1,
+                source_device_id=device.id, source_datapoint_id=datapoint.id,
+            )
+
+        kpis = [
+            aggregation_kpi("power_sum", KPIType.SUM, power),
+            aggregation_kpi("power_avg", KPIType.AVG, power),
+            aggregation_kpi("power_max", KPIType.MAX, power),
+            aggregation_kpi("energy_count", KPIType.COUNT, energy),
+            KPIDefinition(
+                name="efficiency", kpi_type=KPIType.FORMULA, is_active=1, precision=2,
+                formula="p_avg / e_last",
+                formula_variables=json.dumps({
+                    "p_avg": {"device_id": device.id, "datapoint_id": power.id, "aggregation": "avg"},
+                    "e_last": {"device_id": device.id, "datapoint_id": energy.id, "aggregation": "last"},
+                }),
+            ),
+            KPIDefinition(name="broken", kpi_type=KPIType.SUM, is_active=1),
+        ]
+        db.add_all(kpis)
+        db.commit()
+        for kpi in kpis:
+            db.refresh(kpi)
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = KPIEngine(db)
+        time_range = TimeRange(start=end - timedelta(hours=1), end=end)
+        event.listen(db.get_bind(), "before_cursor_execute", count_statement)
+        try:
+            results = engine.calculate_batch([(kpi, time_range) for kpi in kpis], store=False)
+        finally:
+            event.remove(db.get_bind(), "before_cursor_execute", count_statement)
+
+        by_name = {r.kpi_name: r for r in results.values()}
+        assert by_name["power_sum"].value == 60.0
+        assert by_name["power_avg"].value == 20.0
+        assert by_name["power_max"].value == 30.0
+        assert by_name["energy_count"].value == 3.0
+        assert by_name["efficiency"].value == pytest.approx(6.67)
+        assert by_name["broken"].status == "error"
+        # Raw stats + last values, regardless of KPI count
+        assert len(statements) <= 2
+
+    def test_batch_prefers_rollups(self, db: Session, metered_device):
+        """Longer ranges read from aggregations instead of raw telemetry."""
+        from app.models.telemetry import (
+            KPIDefinition, KPIType, TelemetryAggregation, AggregationPeriod
+        )
+
+        device, power, _ = metered_device
+        start = datetime(2026, 1, 1)
+        for hour in range(4):
+            period_start = start + timedelta(hours=hour)
+            db.add(TelemetryAggregation(
+                id=hour + 1, device_id=device.id, datapoint_id=power.id,
+                period=AggregationPeriod.HOURLY,
+                period_start=period_start,
+                period_end=period_start + timedelta(hours=1),
+                value_sum=100.0, value_count=10, value_min=1.0, value_max=float(hour),
+            ))
+        kpi = KPIDefinition(
+            name="daily_max", kpi_type=KPIType.MAX, is_active=1,
+            source_device_id=device.id, source_datapoint_id=power.id,
+        )
+        db.add(kpi)
+        db.commit()
+
+        results = KPIEngine(db).calculate_batch(
+            [(kpi, TimeRange(start=start, end=start + timedelta(days=1)))], store=False
+        )
+
+        assert results[kpi.id].value == 3.0
+        assert results[kpi.id].data_points_used == 40
@@ -4,7 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from app.models import Meter, Site, Organization
+from app.models import Meter, MeterReading, Site, Organization
 from app.models.platform import OrgSite
 
 
@@ -214,3 +214,97 @@ class TestMeterReadings:
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+
+    def test_batch_readings_upsert_and_echo(
+        self, client: TestClient, auth_headers: dict, test_meter: Meter
+    ):
+        """Batch readings are echoed from the insert and can be resent safely."""
+        readings = [
+            {"meter_id": test_meter.id, "timestamp": f"2026-01-01T0{h}:00:00", "energy_kwh": 1.0 + h}
+            for h in range(3)
+        ]
+        first = client.post("/api/v1/meters/readings/batch", json=readings, headers=auth_headers)
+        readings[0]["energy_kwh"] = 9.0
+        second = client.post("/api/v1/meters/readings/batch", json=readings, headers=auth_headers)
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert [r["id"] for r in second.json()] == [r["id"] for r in first.json()]
+        assert second.json()[0]["energy_kwh"] == 9.0
+
+    def test_batch_readings_unknown_meter(
+        self, client: TestClient, auth_headers: dict, db: Session, test_meter: Meter
+    ):
+        """Unknown meters are reported as 404 and nothing is written."""
+        readings = [
+            {"meter_id": test_meter.id, "timestamp": "2026-01-01T00:00:00", "energy_kwh": 1.0},
+            {"meter_id": 999999, "timestamp": "2026-01-01T00:00:00", "energy_kwh": 1.0},
+        ]
+        response = client.post("/api/v1/meters/readings/batch", json=readings, headers=auth_headers)
+
+        assert response.status_code == 404
+        assert "999999" in response.json()["detail"]
+        assert db.query(MeterReading).filter(MeterReading.meter_id == test_meter.id).count() == 0
+
+    def test_duplicate_single_reading_conflicts(
+        self, client: TestClient, auth_headers: dict, test_meter: Meter
+    ):
+        """A second reading for the same timestamp is a conflict."""
+        reading = {"meter_id": test_meter.id, "timestamp": "2026-01-01T00:00:00", "energy_kwh": 1.0}
+        assert client.post("/api/v1/meters/readings", json=reading, headers=auth_headers).status_code == 200
+        response = client.post("/api/v1/meters/readings", json=reading, headers=auth_headers)
+        assert response.status_code == 409
+
+
+class TestBulkReadings:
+    """Tests for the columnar and NDJSON bulk reading endpoints."""
+
+    def test_columnar_bulk_is_idempotent(
+        self, client: TestClient, auth_headers: dict, db: Session, test_meter: Meter
+    ):
+        """Resending a columnar batch inserts nothing twice."""
+        payload = {
+            "meter_id": test_meter.id,
+            "timestamp": [f"2026-01-01T{h:02d}:00:00Z" for h in range(24)],
+            "energy_kwh": [float(h) for h in range(24)],
+            "power_kw": [None] * 24,
+        }
+        first = client.post(
+            "/api/v1/meters/readings/bulk", params={"return_ids": True}, json=payload, headers=auth_headers
+        )
+        second = client.post("/api/v1/meters/readings/bulk", json=payload, headers=auth_headers)
+
+        assert first.status_code == 200
+        assert first.json()["inserted"] == 24
+        assert len(first.json()["ids"]) == 24
+        assert second.json() == {"received": 24, "inserted": 0, "duplicates": 24, "rejected": 0, "ids": None}
+
+    def test_columnar_bulk_rejects_ragged_columns(
+        self, client: TestClient, auth_headers: dict, test_meter: Meter
+    ):
+        """Columns must all have the same length."""
+        payload = {"meter_id": test_meter.id, "timestamp": ["2026-01-01T00:00:00"], "energy_kwh": [1.0, 2.0]}
+        response = client.post("/api/v1/meters/readings/bulk", json=payload, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_ndjson_bulk_counts_rejected_lines(
+        self, client: TestClient, auth_headers: dict, test_meter: Meter
+    ):
+        """Malformed lines and unknown meters are rejected; the rest are inserted."""
+        lines = [
+            f'{{"meter_id": {test_meter.id}, "timestamp": "2026-01-01T00:00:00", "energy_kwh": 1.5}}',
+            f'{{"meter_id": {test_meter.id}, "timestamp": "2026-01-01T00:15:00", "energy_kwh": 2.5, "voltage": 230}}',
+            "not json",
+            '{"meter_id": 99999, "timestamp": "2026-01-01T00:00:00", "energy_kwh": 1.0}',
+        ]
+        response = client.post(
+            "/api/v1/meters/readings/bulk/ndjson",
+            content="\n".join(lines),
+            headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["received"] == 4
+        assert data["inserted"] == 2
+        assert data["rejected"] == 2
@@ -0,0 +1,99 @@
+"""Tests for the metrics registry, exposition cache and multi-process merge."""
+
+import os
+import shutil
+import threading
+
+from app.services.metrics_service import MetricsRegistry
+
+
+class TestMetricChildren:
+    """Test bound children and per-thread cells."""
+
+    def test_labels_resolve_to_one_child(self):
+        """Bound handles and the label-dict API share the same values."""
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total")
+        handle = counter.labels(method="GET")
+
+        handle.inc()
+        counter.inc(2, {"method": "GET"})
+
+        assert counter.labels({"method": "GET"}) is handle
+        assert counter.get({"method": "GET"}) == 3
+
+    def test_threads_do_not_lose_increments(self):
+        registry = MetricsRegistry()
+        handle = registry.counter("events_total").labels()
+
+        def work():
+            for _ in range(10000):
+                handle.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert handle.get() == 40000
+
+    def test_histogram_buckets_are_cumulative(self):
+        """A value equal to a bound lands in that bucket; exposition is cumulative."""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        text = registry.to_prometheus()
+
+        assert 'latency_seconds_bucket{le="0.1"} 2.0' in text
+        assert 'latency_seconds_bucket{le="1.0"} 3.0' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4.0' in text
+        assert "latency_seconds_count 4.0" in text
+        assert "latency_seconds_sum 3.65" in text
+
+
+class TestExposition:
+    """Test the incremental exposition cache."""
+
+    def test_only_changed_children_rerender(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs_total", "Jobs")
+        counter.labels(kind="a").inc()
+        counter.labels(kind="b").inc()
+        registry.to_prometheus()
+        cached_a = registry._rendered[("jobs_total", (("kind", "a"),))][1]
+
+        counter.labels(kind="b").inc()
+        text = registry.to_prometheus()
+
+        assert registry._rendered[("jobs_total", (("kind", "a"),))][1] is cached_a
+        assert 'jobs_total{kind="b"} 2.0' in text
+        assert text.startswith("# HELP jobs_total Jobs\n# TYPE jobs_total counter\n")
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("paths_total").inc(labels={"path": 'a"b'})
+
+        assert 'paths_total{path="a\\"b"} 1.0' in registry.to_prometheus()
+
+
+class TestMultiprocess:
+    """Test merging snapshots written by several workers."""
+
+    def test_counters_sum_and_dead_gauges_drop(self, tmp_path):
+        registry = MetricsRegistry(multiproc_dir=str(tmp_path))
+        registry.counter("ingested_total").inc(5)
+        registry.gauge("connections").set(2)
+        registry.write_snapshot()
+
+        own = tmp_path / f"metrics_{os.getpid()}.json"
+        # A live sibling worker and one that has exited, with the same values
+        shutil.copy(own, tmp_path / f"metrics_{os.getppid()}.json")
+        shutil.copy(own, tmp_path / "metrics_999999999.json")
+
+        text = registry.to_prometheus()
+
+        assert "ingested_total 15.0" in text
+        assert "connections 4.0" in text
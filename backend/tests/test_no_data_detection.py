@@ -0,0 +1,145 @@
+"""Tests for in-memory last-seen tracking and no-data detection."""
+
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.devices import AlarmCondition, AlarmRule, Datapoint, Device, DeviceModel
+from app.models.telemetry import AlarmStatus, DeviceAlarm, NoDataTracker
+from app.services.alarm_engine import AlarmEngine
+from app.services.last_seen import LastSeenMap, last_seen_map
+from app.services.telemetry_service import TelemetryService
+
+
+@pytest.fixture(autouse=True)
+def alarm_ids():
+    """BigInteger primary keys don't autoincrement on SQLite, so assign alarm ids on insert."""
+    ids = itertools.count(1)
+
+    def assign(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+
+    event.listen(DeviceAlarm, "before_insert", assign)
+    yield
+    event.remove(DeviceAlarm, "before_insert", assign)
+
+
+@pytest.fixture
+def no_data_setup(db: Session, test_site):
+    """Two devices that last reported an hour ago, and a 5 minute no-data rule."""
+    model = DeviceModel(name="Meter")
+    db.add(model)
+    db.flush()
+    datapoint = Datapoint(model_id=model.id, name="power")
+    db.add(datapoint)
+    db.flush()
+    rule = AlarmRule(
+        model_id=model.id,
+        name="Silent meter",
+        condition=AlarmCondition.NO_DATA,
+        threshold_value=300,
+        auto_clear=1,
+    )
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    devices = [
+        Device(site_id=test_site.id, model_id=model.id, name=f"Meter {i}", last_telemetry_at=an_hour_ago)
+        for i in range(2)
+    ]
+    db.add_all([rule, *devices])
+    db.commit()
+    return devices, datapoint, rule
+
+
+def count_statements(db: Session):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+class TestLastSeenMap:
+    """Test the in-memory map and its bulk flush."""
+
+    def test_touch_never_moves_backwards(self):
+        """Replayed data does not make a device look older."""
+        seen = LastSeenMap()
+        now = datetime(2024, 1, 1, 12)
+        seen.touch(1, [10], now)
+        seen.touch(1, [10, 11], now - timedelta(minutes=5))
+
+        assert seen.get(1) == now
+        assert seen.get(1, 10) == now
+        assert seen.get(1, 11) == now - timedelta(minutes=5)
+
+    def test_flush_updates_existing_trackers(self, db: Session, no_data_setup):
+        """Changed entries reach existing trackers and reset their triggered flag."""
+        devices, _, rule = no_data_setup
+        db.add(NoDataTracker(
+            device_id=devices[0].id,
+            alarm_rule_id=rule.id,
+            last_data_at=datetime(2024, 1, 1),
+            alarm_triggered=1,
+        ))
+        db.commit()
+
+        seen = LastSeenMap()
+        now = datetime(2024, 1, 2)
+        seen.touch(devices[0].id, [], now)
+        seen.touch(devices[1].id, [], now)
+
+        assert seen.flush(db) == 1
+        db.commit()
+        tracker = db.query(NoDataTracker).one()
+        db.refresh(tracker)
+        assert tracker.last_data_at == now
+        assert tracker.alarm_triggered == 0
+        assert seen.flush(db) == 0
+
+
+class TestNoDataDetection:
+    """Test the set-based no-data check."""
+
+    def test_memory_map_keeps_device_alive(self, db: Session, no_data_setup):
+        """A device seen in memory is not alarmed even if the DB is stale."""
+        devices, _, _ = no_data_setup
+        seen = LastSeenMap()
+        seen.touch(devices[0].id, [], datetime.utcnow())
+        engine = AlarmEngine(db)
+
+        events = engine.check_no_data_conditions(seen)
+        db.commit()
+
+        assert [e.device_id for e in events] == [devices[1].id]
+        assert events[0].value > 3500
+        alarm = db.query(DeviceAlarm).one()
+        assert alarm.title == "No Data: Meter 1"
+
+        assert engine.check_no_data_conditions(seen) == []
+
+        seen.touch(devices[1].id, [], datetime.utcnow())
+        assert engine.check_no_data_conditions(seen) == []
+        db.commit()
+        db.refresh(alarm)
+        assert alarm.status == AlarmStatus.AUTO_CLEARED
+
+    def test_ingestion_does_not_query_trackers(self, db: Session, no_data_setup):
+        """Storing telemetry updates last-seen without touching no_data_trackers."""
+        devices, datapoint, _ = no_data_setup
+        service = TelemetryService(db)
+
+        statements, stop = count_statements(db)
+        try:
+            service.store_telemetry(devices[0].id, {"power": 5.0})
+        finally:
+            stop()
+
+        assert not any("no_data_trackers" in s for s in statements)
+        assert last_seen_map.get(devices[0].id, datapoint.id) is not None
@@ -0,0 +1,165 @@
+"""Tests for queued bulk notifications and the async dispatcher."""
+
+import asyncio
+import smtplib
+from email.message import EmailMessage
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.services.notification_dispatcher import NotificationDispatcher, SMTPPool
+from app.services.notification_service import (
+    DeliveryMessage,
+    DeliveryPreference,
+    NotificationChannel,
+    NotificationService,
+    NotificationStatus,
+)
+
+
+@pytest.fixture
+def users(db: Session, user_factory):
+    """Three users with email enabled; one also gets SMS."""
+    created = [user_factory(email=f"user{i}@example.com") for i in range(3)]
+    for i, user in enumerate(created):
+        db.add(DeliveryPreference(
+            user_id=user.id,
+            email=user.email,
+            email_enabled=1,
+            phone="+100000000" if i == 0 else None,
+            sms_enabled=1 if i == 0 else 0,
+            in_app_enabled=1,
+            push_enabled=0,
+        ))
+    db.commit()
+    return created
+
+
+class RecordingSender:
+    """Async sender that records calls and can fail for chosen recipients."""
+
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = set(fail_for)
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, message):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if message.recipient in self.fail_for:
+            raise ConnectionError("refused")
+        self.sent.append(message)
+
+
+def _statuses(db: Session, channel: NotificationChannel):
+    rows = db.query(DeliveryMessage).filter(DeliveryMessage.channel == channel.value).all()
+    return sorted(r.status for r in rows)
+
+
+class TestSendBulk:
+    """Test that bulk sends queue external delivery."""
+
+    def test_bulk_queues_external_channels(self, db: Session, users):
+        """In-app messages are delivered at once; email and SMS are queued."""
+        results = NotificationService(db).send_bulk([u.id for u in users], body="Alarm", subject="Site A")
+        db.commit()
+
+        statuses = {r.channel: r.status for r in results[users[0].id]}
+        assert statuses == {
+            NotificationChannel.EMAIL: NotificationStatus.QUEUED,
+            NotificationChannel.SMS: NotificationStatus.QUEUED,
+            NotificationChannel.IN_APP: NotificationStatus.SENT,
+        }
+        assert _statuses(db, NotificationChannel.EMAIL) == ["queued"] * 3
+
+
+class TestNotificationDispatcher:
+    """Test batched, concurrent delivery."""
+
+    @pytest.mark.asyncio
+    async def test_process_due_delivers_and_retries(self, db: Session, users):
+        """Successful sends are marked sent; failures are re-queued with backoff."""
+        NotificationService(db).send_bulk([u.id for u in users], body="Alarm", subject="Site A")
+        db.commit()
+
+        email = RecordingSender(fail_for={users[2].email})
+        dispatcher = NotificationDispatcher(channel_limits={NotificationChannel.EMAIL: 2})
+        dispatcher.register_sender(NotificationChannel.EMAIL, email)
+        dispatcher.register_sender(NotificationChannel.SMS, RecordingSender())
+
+        assert await dispatcher.process_due(db) == 4
+
+        assert email.peak <= 2
+        assert sorted(m.recipient for m in email.sent) == [users[0].email, users[1].email]
+        assert _statuses(db, NotificationChannel.EMAIL) == ["queued", "sent", "sent"]
+        failed = db.query(DeliveryMessage).filter(DeliveryMessage.recipient == users[2].email).one()
+        assert failed.retry_count == 1
+        assert failed.error_message == "refused"
+        assert await dispatcher.process_due(db) == 0
+
+    @pytest.mark.asyncio
+    async def test_messages_claimed_before_sending(self, db: Session, users):
+        """Rows are committed as sending before delivery, so no lock is held meanwhile."""
+        NotificationService(db).send_bulk([users[0].id], body="Alarm", channels=[NotificationChannel.EMAIL])
+        db.commit()
+        seen = []
+
+        async def sender(message):
+            # The row lock is released, so its committed status is visible here
+            seen.append(db.query(DeliveryMessage.status).scalar())
+
+        dispatcher = NotificationDispatcher()
+        dispatcher.register_sender(NotificationChannel.EMAIL, sender)
+
+        assert await dispatcher.process_due(db) == 1
+        assert seen == ["sending"]
+        assert _statuses(db, NotificationChannel.EMAIL) == ["sent"]
+
+    @pytest.mark.asyncio
+    async def test_digest_and_dedup(self, db: Session, users):
+        """Several messages to one recipient become a digest; repeats are not resent."""
+        service = NotificationService(db)
+        user_ids = [users[1].id]
+        service.send_bulk(user_ids, body="Voltage high", subject="Meter 1", channels=[NotificationChannel.EMAIL])
+        service.send_bulk(user_ids, body="Voltage low", subject="Meter 2", channels=[NotificationChannel.EMAIL])
+        db.commit()
+
+        email = RecordingSender()
+        dispatcher = NotificationDispatcher()
+        dispatcher.register_sender(NotificationChannel.EMAIL, email)
+        await dispatcher.process_due(db)
+
+        assert len(email.sent) == 1
+        assert email.sent[0].subject == "2 notifications"
+        assert "Voltage high" in email.sent[0].body and "Voltage low" in email.sent[0].body
+        assert _statuses(db, NotificationChannel.EMAIL) == ["sent", "sent"]
+
+        service.send_bulk(user_ids, body="Voltage high", subject="Meter 1", channels=[NotificationChannel.EMAIL])
+        service.send_bulk(user_ids, body="Voltage low", subject="Meter 2", channels=[NotificationChannel.EMAIL])
+        db.commit()
+        await dispatcher.process_due(db)
+
+        assert len(email.sent) == 1
+        assert dispatcher.get_status()["stats"]["deduplicated"] == 2
+
+
+class TestSMTPPool:
+    """Test connection handling in the SMTP pool."""
+
+    @pytest.mark.asyncio
+    async def test_failed_send_closes_connection(self):
+        """A connection whose send fails is closed before it is discarded."""
+        server = MagicMock()
+        server.send_message.side_effect = smtplib.SMTPDataError(554, b"rejected")
+        pool = SMTPPool(size=1)
+        pool._connect = lambda: server
+
+        with pytest.raises(smtplib.SMTPDataError):
+            await pool.send(EmailMessage())
+
+        server.quit.assert_called_once()
+        assert pool._idle.get_nowait() is None
@@ -0,0 +1,82 @@
+"""Tests for telemetry pipeline stage instrumentation."""
+
+import pytest
+
+from app.services.config_service import feature_flags
+from app.services.pipeline_metrics import pipeline
+from app.services.tracing_service import tracing_service
+
+
+@pytest.fixture
+def flags():
+    """Restore the pipeline feature flags after each test."""
+    saved = {flag: feature_flags.is_enabled(flag) for flag in ("pipeline_metrics", "pipeline_tracing")}
+    yield feature_flags
+    for flag, enabled in saved.items():
+        if enabled:
+            feature_flags.enable(flag)
+        else:
+            feature_flags.disable(flag)
+
+
+def stage_count(name: str) -> int:
+    return pipeline.get_status()["stages"][name]["count"]
+
+
+class TestPipelineStages:
+    """Test stage timing and its runtime switches."""
+
+    def test_stage_observes_duration(self, flags):
+        flags.enable("pipeline_metrics")
+        before = stage_count("normalize")
+
+        with pipeline.stage("normalize"):
+            pass
+
+        assert stage_count("normalize") == before + 1
+
+    def test_disabled_flags_skip_instrumentation(self, flags):
+        """Turning both flags off at runtime makes stages no-ops."""
+        flags.disable("pipeline_metrics")
+        flags.disable("pipeline_tracing")
+        before = stage_count("normalize")
+
+        with pipeline.stage("normalize") as timer:
+            pass
+
+        assert timer is None
+        assert stage_count("normalize") == before
+
+    def test_errors_counted_and_reraised(self, flags):
+        flags.enable("pipeline_metrics")
+        errors = pipeline._error_children["db_write"]
+        before = errors.get()
+
+        with pytest.raises(ValueError):
+            with pipeline.stage("db_write"):
+                raise ValueError("boom")
+
+        assert errors.get() == before + 1
+
+    def test_tracing_records_nested_spans(self, flags):
+        """A root stage starts a trace; inner stages become its child spans."""
+        flags.enable("pipeline_tracing")
+        with pipeline.stage("receive", root=True, topic="t"):
+            context = tracing_service.get_current_trace()
+            with pipeline.stage("resolve_device"):
+                pass
+
+        receive, resolve = context.spans
+        assert receive.name == "pipeline.receive"
+        assert resolve.parent_id == receive.id
+        assert resolve.end_time is not None
+        assert tracing_service.get_current_trace() is None
+
+    def test_flush_metrics(self, flags):
+        flags.enable("pipeline_metrics")
+        before = pipeline._flush_size.values()
+
+        pipeline.flush(42, 0.01)
+
+        after = pipeline._flush_size.values()
+        assert after[-1] - before[-1] == 42
@@ -0,0 +1,118 @@
+"""Tests for batched presence updates and set-based offline detection."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.devices import Device
+from app.models.integrations import GatewayStatus
+from app.services.device_status_monitor import check_device_offline_status, check_gateway_offline_status
+from app.services.mqtt_subscriber import DataIngestionHandler, MQTTMessage
+from app.services.presence_tracker import PresenceTracker, StatusChange
+
+
+def count_statements(db: Session):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+class TestPresenceTracker:
+    """Test in-memory recording and batched flushes."""
+
+    def test_heartbeats_flush_as_one_batch(self, db: Session, test_site, gateway_factory):
+        """Many heartbeats become one status UPDATE and one last_seen write."""
+        gateway = gateway_factory(site_id=test_site.id)
+        gateway.status = GatewayStatus.OFFLINE
+        db.commit()
+
+        tracker = PresenceTracker()
+        start = datetime(2024, 1, 1)
+        for i in range(100):
+            tracker.gateway_seen(gateway.id, start + timedelta(seconds=i))
+
+        statements, stop = count_statements(db)
+        try:
+            changes = tracker.flush(db)
+        finally:
+            stop()
+        db.commit()
+
+        assert len(statements) == 2
+        assert changes == [StatusChange("gateway", gateway.id, True)]
+        db.refresh(gateway)
+        assert gateway.status == GatewayStatus.ONLINE
+        assert gateway.last_seen_at == start + timedelta(seconds=99)
+        assert tracker.flush(db) == []
+
+    @pytest.mark.asyncio
+    async def test_mqtt_heartbeat_does_not_open_session(self):
+        """The MQTT heartbeat handler only records the heartbeat in memory."""
+        from app.services.presence_tracker import presence_tracker
+
+        factory = MagicMock()
+        msg = MQTTMessage.from_raw("saveit/5/heartbeat", b"{}")
+        msg.gateway_id = 5
+
+        await DataIngestionHandler(factory).handle_heartbeat(msg)
+
+        factory.assert_not_called()
+        assert presence_tracker.get_status()["pending_gateways"] >= 1
+
+    def test_ingestion_queues_online_transition(self, db: Session, test_site):
+        """A device flipped online by ingestion is broadcast by the next flush."""
+        device = Device(site_id=test_site.id, name="Meter", is_online=0)
+        db.add(device)
+        db.commit()
+        tracker = PresenceTracker()
+
+        assert tracker.set_device_online(db, device)
+        assert not tracker.set_device_online(db, device)
+        tracker.device_seen(device.id)
+        db.commit()
+
+        assert tracker.flush(db) == [StatusChange("device", device.id, True)]
+        assert tracker.flush(db) == []
+
+
+class TestOfflineDetection:
+    """Test the UPDATE ... RETURNING offline checks."""
+
+    def test_gateways_use_their_own_interval(self, db: Session, test_site, gateway_factory):
+        """Each gateway is judged against twice its own heartbeat interval."""
+        five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
+        fast = gateway_factory(site_id=test_site.id, name="Fast", heartbeat_interval_seconds=60,
+                               last_seen_at=five_minutes_ago)
+        slow = gateway_factory(site_id=test_site.id, name="Slow", heartbeat_interval_seconds=600,
+                               last_seen_at=five_minutes_ago)
+
+        result = check_gateway_offline_status(db)
+
+        assert result["gateway_ids"] == [fast.id]
+        db.refresh(fast)
+        db.refresh(slow)
+        assert fast.status == GatewayStatus.OFFLINE
+        assert slow.status == GatewayStatus.ONLINE
+
+    def test_devices_marked_offline(self, db: Session, test_site):
+        """Only online devices with stale telemetry are returned."""
+        old = datetime.utcnow() - timedelta(hours=1)
+        stale = Device(site_id=test_site.id, name="Stale", is_online=1, last_telemetry_at=old)
+        fresh = Device(site_id=test_site.id, name="Fresh", is_online=1, last_telemetry_at=datetime.utcnow())
+        db.add_all([stale, fresh])
+        db.commit()
+
+        result = check_device_offline_status(db)
+
+        assert result["device_ids"] == [stale.id]
+        assert result["devices_marked_offline"] == 1
+        db.refresh(fresh)
+        assert fresh.is_online == 1
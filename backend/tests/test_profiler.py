@@ -0,0 +1,138 @@
+"""Tests for the sampling profiler and its load test integration."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.load_testing import LoadTestRunner
+from app.services.profiler import ProfilerBusyError, SamplingProfiler
+
+
+def spin_until(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+async def wait_forever(event: asyncio.Event):
+    await event.wait()
+
+
+class TestSamplingProfiler:
+    """Test thread and task sampling."""
+
+    def test_samples_threads_and_tasks(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=spin_until, args=(stop,), name="busy-worker")
+        worker.start()
+
+        async def main():
+            event = asyncio.Event()
+            task = asyncio.create_task(wait_forever(event), name="waiter")
+            profile = await SamplingProfiler(interval=0.005).run(0.2)
+            event.set()
+            await task
+            return profile
+
+        try:
+            profile = asyncio.run(main())
+        finally:
+            stop.set()
+            worker.join()
+
+        collapsed = profile.collapsed()
+        assert profile.samples > 0
+        assert any(
+            line.startswith("thread:busy-worker;") and "spin_until" in line
+            for line in collapsed.splitlines()
+        )
+        assert any(
+            line.startswith("task:waiter;") and "wait_forever" in line
+            for line in collapsed.splitlines()
+        )
+
+    def test_flamegraph_values_sum_children(self):
+        profile = asyncio.run(SamplingProfiler(interval=0.005, tasks=False).run(0.05))
+
+        tree = profile.flamegraph()
+
+        assert tree["value"] == sum(profile.stacks.values())
+        assert tree["value"] == sum(child["value"] for child in tree["children"])
+
+    def test_one_profile_at_a_time(self):
+        first = SamplingProfiler()
+        first.start()
+        try:
+            with pytest.raises(ProfilerBusyError):
+                SamplingProfiler().start()
+        finally:
+            first.stop()
+
+        second = SamplingProfiler()
+        second.start()
+        second.stop()
+
+    def test_memory_top(self):
+        async def allocate():
+            profiler = SamplingProfiler(memory_top=3)
+            profiler.start()
+            data = [bytearray(1024) for _ in range(200)]
+            profile = profiler.stop()
+            return profile, data
+
+        profile, _ = asyncio.run(allocate())
+
+        assert 0 < len(profile.memory) <= 3
+        assert {"location", "size_kb", "count"} <= set(profile.memory[0])
+
+
+class TestLoadTestProfiling:
+    """Test running a load test under the profiler."""
+
+    def test_profile_attached_to_result(self):
+        def work():
+            time.sleep(0.002)
+
+        result = asyncio.run(LoadTestRunner().run_test(
+            "profiled",
+            work,
+            num_requests=20,
+            concurrency=5,
+            profiler=SamplingProfiler(interval=0.002),
+        ))
+
+        data = result.to_dict()
+        assert data["successful_requests"] == 20
+        assert data["profile"]["samples"] > 0
+
+    def test_endpoint_requires_admin(self, client: TestClient, auth_headers: dict):
+        response = client.post("/api/v1/system/profile?duration=0.1", headers=auth_headers)
+        assert response.status_code == 403
+
+    def test_endpoint_returns_collapsed_stacks(self, client: TestClient, admin_auth_headers: dict):
+        response = client.post(
+            "/api/v1/system/profile?duration=0.1&interval_ms=5&output=collapsed",
+            headers=admin_auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "thread:" in response.text
+
+    @pytest.mark.parametrize("path", ["http://example.com/", "//example.com/", "api/v1/sites"])
+    def test_load_test_rejects_other_hosts(self, client: TestClient, admin_auth_headers: dict, path):
+        """Load tests only target paths on this server."""
+        response = client.post(
+            "/api/v1/system/profile/load-test", params={"path": path}, headers=admin_auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_load_test_volume_is_capped(self, client: TestClient, admin_auth_headers: dict):
+        response = client.post(
+            "/api/v1/system/profile/load-test",
+            params={"path": "/health", "num_requests": 5000},
+            headers=admin_auth_headers,
+        )
+        assert response.status_code == 422
@@ -0,0 +1,115 @@
+"""Tests for per-request SQL statement counting and budgets."""
+
+import logging
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.middleware.query_budget import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, assert_max_queries, fingerprint, track_queries
+)
+from app.models.devices import Datapoint, Device, DeviceDatapoint, DeviceModel
+
+
+def budget_app(db: Session, **options) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(QueryBudgetMiddleware, **options)
+
+    @app.get("/sites/{site_id}/loop")
+    def loop(site_id: int, db: Session = Depends(get_db)):
+        for i in range(3):
+            db.execute(text("SELECT :i"), {"i": i})
+        return {"ok": True}
+
+    app.dependency_overrides[get_db] = lambda: db
+    return app
+
+
+class TestFingerprint:
+    """Test statement normalisation."""
+
+    def test_literals_and_parameters_collapse(self):
+        assert fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'x'") == fingerprint(
+            "SELECT *\n  FROM t WHERE id = ? AND name = 'it''s'"
+        )
+
+    def test_in_lists_collapse(self):
+        assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (...)"
+        assert fingerprint("SELECT * FROM t WHERE id IN (%(id_1)s)") == "SELECT * FROM t WHERE id IN (...)"
+
+
+class TestTracking:
+    """Test counting statements in a block."""
+
+    def test_nested_blocks_count_toward_outer(self, db: Session):
+        with track_queries() as outer:
+            db.execute(text("SELECT 1"))
+            with track_queries() as inner:
+                db.execute(text("SELECT 2"))
+        db.execute(text("SELECT 3"))
+
+        assert (outer.count, inner.count) == (2, 1)
+        assert outer.seconds >= inner.seconds
+
+    def test_assert_max_queries_names_repeated_statement(self, db: Session):
+        with pytest.raises(QueryBudgetExceeded) as exc:
+            with assert_max_queries(2, "loop"):
+                for i in range(4):
+                    db.execute(text(f"SELECT {i}"))
+
+        assert "loop exceeded its budget of 2" in str(exc.value)
+        assert "x4: SELECT ?" in str(exc.value)
+
+
+class TestMiddleware:
+    """Test per-request headers, warnings and strict mode."""
+
+    def test_headers_report_count_and_time(self, db: Session):
+        response = TestClient(budget_app(db)).get("/sites/1/loop")
+
+        assert response.headers["X-DB-Query-Count"] == "3"
+        assert float(response.headers["X-DB-Time-Ms"]) >= 0
+
+    def test_warning_names_route_and_fingerprint(self, db: Session, caplog):
+        client = TestClient(budget_app(db, route_budgets={"/sites/{site_id}/loop": 2}))
+
+        with caplog.at_level(logging.WARNING, logger="app.middleware.query_budget"):
+            assert client.get("/sites/7/loop").status_code == 200
+
+        assert "GET /sites/{site_id}/loop (budget 2)" in caplog.text
+        assert "x3: SELECT ?" in caplog.text
+
+    def test_strict_mode_fails_request(self, db: Session):
+        client = TestClient(budget_app(db, default_budget=2, strict=True))
+
+        with pytest.raises(QueryBudgetExceeded):
+            client.get("/sites/1/loop")
+
+
+class TestLatestTelemetry:
+    """Latest values used to issue one query per datapoint."""
+
+    def test_query_count_independent_of_datapoints(self, client: TestClient, db: Session, test_site):
+        model = DeviceModel(name="Meter")
+        db.add(model)
+        db.flush()
+        device = Device(site_id=test_site.id, model_id=model.id, name="Meter 1")
+        db.add(device)
+        db.flush()
+        for i in range(12):
+            dp = Datapoint(model_id=model.id, name=f"dp_{i}")
+            db.add(dp)
+            db.flush()
+            db.add(DeviceDatapoint(device_id=device.id, datapoint_id=dp.id, current_value="1.5"))
+        db.commit()
+
+        with assert_max_queries(2):
+            response = client.get(f"/telemetry/devices/{device.id}/latest")
+
+        assert response.status_code == 200
+        assert len(response.json()["datapoints"]) == 12
+        assert int(response.headers["X-DB-Query-Count"]) <= 2
@@ -0,0 +1,90 @@
+"""Tests for the read-path benchmark."""
+
+import itertools
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.core import Site
+from app.models.devices import DeviceTelemetry
+from app.models.telemetry import DeviceAlarm, KPIValue, TelemetryAggregation
+from app.services.read_benchmark import ReadFleetConfig, compare_with_baseline, run_read_benchmark
+
+
+@pytest.fixture(autouse=True)
+def bigint_ids():
+    """BigInteger primary keys don't autoincrement on SQLite, so assign ids on insert."""
+    ids = itertools.count(1)
+
+    def assign(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+
+    models = (DeviceAlarm, TelemetryAggregation, KPIValue)
+    for model in models:
+        event.listen(model, "before_insert", assign)
+    yield
+    for model in models:
+        event.remove(model, "before_insert", assign)
+
+
+SMALL = dict(sites=2, devices_per_site=2, months=1, interval_minutes=240, alarms_per_device=3,
+             kpis_per_site=2, iterations=3)
+
+
+class TestBenchmark:
+    """Test a full run on the test database."""
+
+    def test_run_reports_and_cleans_up(self, db: Session):
+        factory = sessionmaker(bind=db.get_bind(), autoflush=False)
+
+        result = run_read_benchmark(ReadFleetConfig(**SMALL), session_factory=factory).to_dict()
+
+        json.dumps(result)
+        assert result["telemetry_rows"] == 2 * 2 * 30 * 6 * 4
+        endpoints = result["endpoints"]
+        assert set(endpoints) == {
+            "telemetry_history", "widget_line_chart", "widget_gauge", "widget_alarm_list",
+            "widget_device_status", "kpis", "compare_sites", "export_telemetry",
+        }
+        for name, data in endpoints.items():
+            assert data["errors"] == [], name
+            assert data["requests"] == 3
+            assert data["queries"] > 0
+        assert endpoints["telemetry_history"]["queries"] == 2
+        assert db.query(Site).count() == 0
+        assert db.query(DeviceTelemetry).count() == 0
+
+
+class TestBaseline:
+    """Test regression detection against a baseline."""
+
+    def result(self, queries=3, errors=(), latency=10.0):
+        return {
+            "database": "postgresql",
+            "config": {"sites": 5},
+            "endpoints": {
+                "kpis": {"queries": queries, "errors": list(errors), "latency_p95_ms": latency},
+            },
+        }
+
+    def test_same_counts_pass(self):
+        assert compare_with_baseline(self.result(), self.result()) == []
+
+    def test_more_queries_reported(self):
+        regressions = compare_with_baseline(self.result(queries=8), self.result())
+        assert regressions == ["kpis: 8 queries/request > baseline 3"]
+
+    def test_new_errors_reported(self):
+        assert compare_with_baseline(self.result(errors=["HTTP 500"]), self.result())
+
+    def test_latency_only_with_tolerance(self):
+        assert compare_with_baseline(self.result(latency=50), self.result()) == []
+        assert compare_with_baseline(self.result(latency=50), self.result(), latency_tolerance=0.5)
+
+    def test_other_config_not_compared(self):
+        baseline = {**self.result(), "config": {"sites": 50}}
+        with pytest.raises(ValueError):
+            compare_with_baseline(self.result(), baseline)
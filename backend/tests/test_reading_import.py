@@ -0,0 +1,169 @@
+"""Tests for chunked CSV reading imports."""
+
+import io
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import BESSDataReading, BESSDataset, MeterReading
+from app.services.job_queue import JobQueue, job_queue
+from app.services.reading_import import _run_import_job, import_bess_readings_csv, import_meter_readings_csv
+
+CSV = (
+    "timestamp,energy_kwh,power_kw\n"
+    "2026-01-01 00:00:00,1.5,6\n"
+    "2026-01-01 00:15:00,2.0,8\n"
+    "not a date,3.0,12\n"
+    "2026-01-01 00:30:00,,4\n"
+    "2026-01-01 00:15:00,2.5,10\n"
+    "2026-01-01 00:45:00,1.0,4\n"
+)
+
+
+def _readings(db: Session, meter_id: int):
+    return db.query(MeterReading).filter(MeterReading.meter_id == meter_id).order_by(MeterReading.timestamp).all()
+
+
+class TestMeterCsvImport:
+    """Test the streaming meter reading import."""
+
+    def test_chunks_are_validated_and_deduplicated(self, db: Session, test_meter):
+        """Bad rows are rejected and repeated timestamps keep the last value, across chunks too."""
+        progress = []
+        result = import_meter_readings_csv(
+            db, io.BytesIO(CSV.encode()), test_meter.id,
+            power_column="power_kw", chunk_rows=2, progress=lambda r: progress.append(r.to_dict()),
+        )
+
+        readings = _readings(db, test_meter.id)
+        assert [r.energy_kwh for r in readings] == [1.5, 2.5, 1.0]
+        assert readings[1].power_kw == 10.0
+        assert result.rows_read == 6
+        assert result.rows_rejected == 2
+        assert result.chunks == 3
+        assert len(progress) == 3
+        assert progress[-1]["percent"] == 100.0
+
+    def test_reimport_upserts(self, db: Session, test_meter):
+        """Importing an overlapping file updates existing readings instead of duplicating them."""
+        import_meter_readings_csv(db, io.BytesIO(CSV.encode()), test_meter.id)
+        update = "timestamp,energy_kwh\n2026-01-01 00:00:00,9.0\n2026-01-01 01:00:00,4.0\n"
+        import_meter_readings_csv(db, io.BytesIO(update.encode()), test_meter.id)
+
+        readings = _readings(db, test_meter.id)
+        assert len(readings) == 4
+        assert readings[0].energy_kwh == 9.0
+        assert readings[0].reading_type == "interval"
+
+
+class TestCsvEndpoints:
+    """Test the upload endpoints."""
+
+    def test_meter_csv_upload(self, client: TestClient, auth_headers: dict, db: Session, test_meter):
+        """Upload reports imported, rejected and duplicate rows."""
+        response = client.post(
+            "/api/v1/ingestion/meter-readings/csv",
+            data={"meter_id": str(test_meter.id)},
+            files={"file": ("readings.csv", CSV, "text/csv")},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["records_imported"] == 3
+        assert data["records_rejected"] == 2
+        assert data["duplicate_rows"] == 1
+
+    def test_missing_column_is_rejected(self, client: TestClient, auth_headers: dict, test_meter):
+        """A missing column is reported before anything is written."""
+        response = client.post(
+            "/api/v1/ingestion/meter-readings/csv",
+            data={"meter_id": str(test_meter.id), "energy_column": "kwh"},
+            files={"file": ("readings.csv", CSV, "text/csv")},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 400
+        assert "kwh" in response.json()["detail"]
+
+    def test_bess_csv_upload_replaces_readings(self, client: TestClient, auth_headers: dict, db: Session, test_site):
+        """BESS uploads replace the dataset and refresh its statistics."""
+        dataset = BESSDataset(site_id=test_site.id, name="Load", interval_minutes=30)
+        db.add(dataset)
+        db.commit()
+        db.add(BESSDataReading(dataset_id=dataset.id, timestamp=datetime(2025, 1, 1), demand_kw=999.0))
+        db.commit()
+
+        csv = "timestamp,demand_kw\n2026-01-01 00:00:00,100\n2026-01-01 00:30:00,300\n2026-01-01 00:30:00,200\n"
+        response = client.post(
+            f"/api/v1/bess/datasets/{dataset.id}/upload-csv",
+            files={"file": ("load.csv", csv, "text/csv")},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["records_imported"] == 2
+        assert data["peak_demand_kw"] == 200.0
+        db.refresh(dataset)
+        assert dataset.total_records == 2
+        assert dataset.total_consumption_kwh == 150.0
+        assert dataset.upload_status == "completed"
+
+    def test_bess_import_failing_midway_keeps_old_readings(self, db: Session, test_site):
+        """The delete and insert of a replace-import commit together."""
+        dataset = BESSDataset(site_id=test_site.id, name="Load", interval_minutes=30)
+        db.add(dataset)
+        db.commit()
+        db.add(BESSDataReading(dataset_id=dataset.id, timestamp=datetime(2025, 1, 1), demand_kw=999.0))
+        db.commit()
+
+        def fail_on_second_chunk(result):
+            if result.chunks == 2:
+                raise RuntimeError("connection lost")
+
+        csv = "timestamp,demand_kw\n2026-01-01 00:00:00,100\n2026-01-01 00:30:00,300\n2026-01-01 01:00:00,200\n"
+        with pytest.raises(RuntimeError):
+            import_bess_readings_csv(db, io.BytesIO(csv.encode()), dataset, chunk_rows=1,
+                                     progress=fail_on_second_chunk)
+        db.rollback()
+
+        readings = db.query(BESSDataReading).filter(BESSDataReading.dataset_id == dataset.id).all()
+        assert [r.demand_kw for r in readings] == [999.0]
+
+
+class TestJobProgress:
+    """Test progress reporting on the job queue."""
+
+    def test_progress_is_exposed_in_status(self):
+        """Jobs can be enqueued under a known id and report progress."""
+        queue = JobQueue()
+        job_id = queue.enqueue(lambda: None, name="import", job_id="import-1")
+
+        queue.update_progress(job_id, rows_imported=500, percent=50.0)
+
+        assert job_id == "import-1"
+        assert queue.get_status(job_id)["progress"] == {"rows_imported": 500, "percent": 50.0}
+
+    def test_spooled_file_kept_for_retries(self, tmp_path):
+        """A failed attempt that will be retried keeps the upload; the last one removes it."""
+        path = tmp_path / "upload.csv"
+        path.write_text(CSV)
+        job_id = job_queue.enqueue(lambda: None, name="import", max_retries=2, job_id="import-retry")
+
+        def failing(db, source, **kwargs):
+            raise ValueError("database unavailable")
+
+        try:
+            with pytest.raises(ValueError):
+                _run_import_job(job_id, str(path), failing)
+            assert path.exists()
+
+            job_queue.get_job(job_id).retries = 1
+            with pytest.raises(ValueError):
+                _run_import_job(job_id, str(path), failing)
+            assert not path.exists()
+        finally:
+            job_queue._jobs.pop(job_id, None)
@@ -0,0 +1,154 @@
+"""Tests for rollup-aware report data and the section cache."""
+
+import itertools
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.devices import Datapoint, Device, DeviceModel, DeviceTelemetry
+from app.models.telemetry import AggregationPeriod, KPIDefinition, KPIType, KPIValue, TelemetryAggregation
+from app.services.report_data import ReportDataLayer, RollupSegment, plan_rollups, report_section_cache
+from app.services.report_service import ReportService, ReportType
+
+
+@pytest.fixture(autouse=True)
+def bigint_ids():
+    """BigInteger primary keys don't autoincrement on SQLite, so assign ids on insert."""
+    ids = itertools.count(1)
+
+    def assign(mapper, connection, target):
+        if target.id is None:
+            target.id = next(ids)
+
+    for model in (TelemetryAggregation, KPIValue):
+        event.listen(model, "before_insert", assign)
+    yield
+    for model in (TelemetryAggregation, KPIValue):
+        event.remove(model, "before_insert", assign)
+
+
+@pytest.fixture(autouse=True)
+def clear_section_cache():
+    yield
+    report_section_cache.clear()
+
+
+def count_statements(db: Session):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+class TestPlanRollups:
+    """Test splitting a period across rollup levels."""
+
+    def test_coarsest_level_with_finer_edges(self):
+        """Whole months use monthly rollups; unaligned edges use finer ones."""
+        watermarks = {
+            AggregationPeriod.MONTHLY: datetime(2024, 3, 1),
+            AggregationPeriod.DAILY: datetime(2024, 3, 10),
+            AggregationPeriod.HOURLY: datetime(2024, 3, 10, 6),
+        }
+
+        segments = plan_rollups(datetime(2024, 1, 15, 12, 30), datetime(2024, 3, 10, 8), watermarks)
+
+        assert segments == [
+            RollupSegment(None, datetime(2024, 1, 15, 12, 30), datetime(2024, 1, 15, 13)),
+            RollupSegment(AggregationPeriod.HOURLY, datetime(2024, 1, 15, 13), datetime(2024, 1, 16)),
+            RollupSegment(AggregationPeriod.DAILY, datetime(2024, 1, 16), datetime(2024, 2, 1)),
+            RollupSegment(AggregationPeriod.MONTHLY, datetime(2024, 2, 1), datetime(2024, 3, 1)),
+            RollupSegment(AggregationPeriod.DAILY, datetime(2024, 3, 1), datetime(2024, 3, 10)),
+            RollupSegment(AggregationPeriod.HOURLY, datetime(2024, 3, 10), datetime(2024, 3, 10, 6)),
+            RollupSegment(None, datetime(2024, 3, 10, 6), datetime(2024, 3, 10, 8)),
+        ]
+
+    def test_no_rollups_reads_raw(self):
+        segments = plan_rollups(datetime(2024, 1, 1), datetime(2024, 2, 1), {})
+
+        assert segments == [RollupSegment(None, datetime(2024, 1, 1), datetime(2024, 2, 1))]
+
+
+class TestReportDataLayer:
+    """Test the batched section queries."""
+
+    def test_summary_combines_rollups_and_raw(self, db: Session, test_site):
+        """Aggregated days and raw edge readings are merged per datapoint."""
+        model = DeviceModel(name="Meter")
+        db.add(model)
+        db.flush()
+        datapoint = Datapoint(model_id=model.id, name="power")
+        device = Device(site_id=test_site.id, model_id=model.id, name="Meter 1")
+        db.add_all([datapoint, device])
+        db.flush()
+        db.add(TelemetryAggregation(
+            device_id=device.id, datapoint_id=datapoint.id, period=AggregationPeriod.DAILY,
+            period_start=datetime(2024, 1, 1), period_end=datetime(2024, 1, 2),
+            value_min=1.0, value_max=9.0, value_sum=50.0, value_count=10,
+        ))
+        db.add_all([
+            DeviceTelemetry(device_id=device.id, datapoint_id=datapoint.id,
+                            timestamp=datetime(2024, 1, 2, 0, 30), value=20.0),
+            # Covered by the rollup, must not be counted twice
+            DeviceTelemetry(device_id=device.id, datapoint_id=datapoint.id,
+                            timestamp=datetime(2024, 1, 1, 5), value=100.0),
+        ])
+        db.commit()
+
+        data = ReportDataLayer(db).telemetry_summary(datetime(2024, 1, 1), datetime(2024, 1, 2, 1))
+
+        assert data == [{
+            "device_id": device.id,
+            "datapoint": "power",
+            "count": 11,
+            "avg": 6.36,
+            "min": 1.0,
+            "max": 20.0,
+        }]
+
+    def test_kpi_values_in_two_queries(self, db: Session, test_site):
+        """All KPI values come from one query however many KPIs are active."""
+        kpis = [KPIDefinition(site_id=test_site.id, name=f"kpi{i}", kpi_type=KPIType.SUM) for i in range(5)]
+        db.add_all(kpis)
+        db.flush()
+        db.add_all([
+            KPIValue(kpi_id=k.id, period_start=datetime(2024, 1, 1), period_end=datetime(2024, 1, 2), value=1.0)
+            for k in kpis
+        ])
+        db.commit()
+
+        statements, stop = count_statements(db)
+        try:
+            data = ReportDataLayer(db).kpi_values(datetime(2024, 1, 1), datetime(2024, 2, 1))
+        finally:
+            stop()
+
+        assert len(statements) == 2
+        assert [len(k["values"]) for k in data] == [1] * 5
+
+
+class TestSectionCache:
+    """Test reuse of gathered sections."""
+
+    def test_formats_share_one_gather(self, db: Session, test_organization):
+        """Generating the same template and period twice gathers once."""
+        service = ReportService(db)
+        template = service.create_template(test_organization.id, "KPIs", ReportType.KPI_REPORT)
+        db.commit()
+        start, end = datetime(2024, 1, 1), datetime(2024, 2, 1)
+
+        first = service._gather_report_data(template, start, end)
+        statements, stop = count_statements(db)
+        try:
+            second = service._gather_report_data(template, start, end)
+        finally:
+            stop()
+
+        assert statements == []
+        assert second.sections == first.sections
@@ -0,0 +1,104 @@
+"""Tests for telemetry partition naming and retention fallback."""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.devices import Device, DeviceTelemetry
+from app.services.telemetry_partitions import (
+    add_months,
+    drop_partitions_before,
+    list_partitions,
+    ensure_partitions,
+    partition_bounds,
+    partition_name,
+)
+from app.services.telemetry_service import TelemetryService
+
+
+class TestPartitionNames:
+    """Test the monthly naming convention."""
+
+    def test_bounds_round_trip(self):
+        """A partition name maps back to the month it covers."""
+        name = partition_name("device_telemetry", datetime(2024, 12, 1))
+
+        assert name == "device_telemetry_p202412"
+        assert partition_bounds(name) == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+
+    def test_other_tables_are_ignored(self):
+        """Default and hash sub-partitions are not monthly partitions."""
+        assert partition_bounds("device_telemetry_default") is None
+        assert partition_bounds("device_telemetry_p202401_h3") is None
+
+    def test_add_months_crosses_years(self):
+        assert add_months(datetime(2024, 11, 1), 3) == datetime(2025, 2, 1)
+        assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+
+
+class TestRetention:
+    """Test retention on an unpartitioned table."""
+
+    def test_unpartitioned_falls_back_to_delete(self, db: Session, test_site):
+        """Without partitions, old rows are deleted row by row."""
+        device = Device(site_id=test_site.id, name="Meter")
+        db.add(device)
+        db.commit()
+        now = datetime.utcnow()
+        db.add_all([
+            DeviceTelemetry(device_id=device.id, timestamp=now - timedelta(days=400), value=1.0),
+            DeviceTelemetry(device_id=device.id, timestamp=now, value=2.0),
+        ])
+        db.commit()
+
+        assert ensure_partitions(db) == []
+        assert drop_partitions_before(db, now) == {}
+        assert TelemetryService(db).delete_old_data(365) == 1
+        assert db.query(DeviceTelemetry).count() == 1
+
+
+@pytest.fixture
+def pg_session():
+    """Session on a real PostgreSQL database (set TEST_POSTGRES_URL), for partition DDL."""
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    engine = create_engine(url)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.rollback()
+    session.execute(text("DROP TABLE IF EXISTS partition_probe CASCADE"))
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+class TestEnsurePartitions:
+    """Test partition creation on PostgreSQL."""
+
+    def test_rows_in_default_partition_are_moved(self, pg_session: Session):
+        """A month that already has rows in the default partition can still be created."""
+        pg_session.execute(text("""
+            CREATE TABLE partition_probe (
+                id bigint, device_id integer, timestamp timestamp NOT NULL, value double precision
+            ) PARTITION BY RANGE (timestamp)
+        """))
+        pg_session.execute(text("CREATE TABLE partition_probe_default PARTITION OF partition_probe DEFAULT"))
+        pg_session.execute(text("""
+            INSERT INTO partition_probe VALUES
+                (1, 1, '2024-02-10', 1.0), (2, 1, '2024-02-20', 2.0), (3, 1, '2024-06-01', 3.0)
+        """))
+        pg_session.commit()
+
+        created = ensure_partitions(pg_session, table="partition_probe", months_ahead=1, now=datetime(2024, 1, 5))
+        pg_session.commit()
+
+        assert created == ["partition_probe_p202401", "partition_probe_p202402"]
+        assert list_partitions(pg_session, "partition_probe") == created
+        counts = dict(pg_session.execute(text(
+            "SELECT tableoid::regclass::text, COUNT(*) FROM partition_probe GROUP BY 1"
+        )).all())
+        assert counts == {"partition_probe_p202402": 2, "partition_probe_default": 1}
@@ -0,0 +1,146 @@
+"""Tests for the deadline timer queue and the services built on it."""
+
+import asyncio
+
+import pytest
+
+from app.services.polling_service import PollingService, PollingStatus
+from app.services.scheduler_service import SchedulerService, ScheduleType
+from app.services.timer_queue import TimerQueue
+
+
+class TestTimerQueue:
+    """Test deadline ordering, cancellation and concurrency limits."""
+
+    @pytest.mark.asyncio
+    async def test_fires_in_deadline_order(self):
+        """Keys fire in deadline order, and rescheduling replaces the old deadline."""
+        fired = []
+
+        async def dispatch(key):
+            fired.append(key)
+
+        queue = TimerQueue("test", dispatch)
+        queue.schedule_in("c", 0.06)
+        queue.schedule_in("a", 0.02)
+        queue.schedule_in("b", 0.04)
+        queue.schedule_in("a", 0.05)
+        queue.schedule_in("x", 0.01)
+        queue.cancel("x")
+
+        runner = asyncio.create_task(queue.run())
+        await asyncio.sleep(0.15)
+        await queue.stop()
+        await runner
+
+        assert fired == ["b", "a", "c"]
+        assert len(queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_wakes_for_earlier_deadline(self):
+        """Scheduling an earlier deadline interrupts a long sleep."""
+        fired = asyncio.Event()
+
+        async def dispatch(key):
+            fired.set()
+
+        queue = TimerQueue("test", dispatch)
+        queue.schedule_in("late", 3600)
+        runner = asyncio.create_task(queue.run())
+        await asyncio.sleep(0.01)
+
+        queue.schedule_in("soon", 0)
+        await asyncio.wait_for(fired.wait(), timeout=1)
+        await queue.stop()
+        await runner
+
+    @pytest.mark.asyncio
+    async def test_group_limit_bounds_concurrency(self):
+        """At most the group limit of dispatches for one gateway run at once."""
+        active = 0
+        peak = 0
+
+        async def dispatch(key):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+        queue = TimerQueue("test", dispatch, group_limits={"gateway": 2})
+        for i in range(6):
+            queue.schedule_in(f"t{i}", 0, groups=["gateway:1"])
+
+        runner = asyncio.create_task(queue.run())
+        await asyncio.sleep(0.15)
+        await queue.stop()
+        await runner
+
+        assert peak == 2
+
+
+class TestPollingService:
+    """Test polling through the timer queue."""
+
+    @pytest.mark.asyncio
+    async def test_polls_and_reschedules(self):
+        """A task polls repeatedly at its interval without overlapping runs."""
+        calls = []
+
+        async def callback(data_source_id, metadata):
+            calls.append(data_source_id)
+
+        service = PollingService(jitter_ratio=0)
+        await service.start()
+        await service.add_task("dev-1", 1, "modbus_tcp", 0.03, callback, {"gateway_id": 7})
+        await asyncio.sleep(0.1)
+        await service.stop()
+
+        task = service.tasks["dev-1"]
+        assert 2 <= len(calls) <= 4
+        assert task.success_count == len(calls)
+        assert service.get_status()["scheduled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_paused_task_is_not_polled(self):
+        """Pausing removes the pending deadline."""
+        calls = []
+
+        async def callback(data_source_id, metadata):
+            calls.append(data_source_id)
+
+        service = PollingService(jitter_ratio=0)
+        await service.add_task("dev-1", 1, "mqtt", 60, callback)
+        await service.pause_task("dev-1")
+        await service.start()
+        await asyncio.sleep(0.05)
+        await service.stop()
+
+        assert calls == []
+        assert service.tasks["dev-1"].status == PollingStatus.PAUSED
+
+
+class TestSchedulerService:
+    """Test scheduled task timing."""
+
+    @pytest.mark.asyncio
+    async def test_task_runs_at_next_run(self):
+        """A due task runs immediately rather than on the next periodic scan."""
+        ran = asyncio.Event()
+
+        async def job(metadata):
+            ran.set()
+
+        service = SchedulerService()
+        service.add_task("job", "Job", job, ScheduleType.INTERVAL, interval_minutes=60)
+        await service.start()
+        assert service._timers.deadline("job") is not None
+
+        service._timers.schedule_in("job", 0)
+        await asyncio.wait_for(ran.wait(), timeout=1)
+        await asyncio.sleep(0.01)
+        await service.stop()
+
+        task = service.tasks["job"]
+        assert task.run_count == 1
+        assert service._timers.deadline("job") is not None
@@ -0,0 +1,185 @@
+"""Tests for event-interval uptime and its daily materialization."""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.models.devices import Device, DeviceEvent
+from app.models.telemetry import DeviceUptimeDaily
+from app.services.device_status_monitor import check_device_offline_status
+from app.services.data_ingestion import DataIngestionService
+from app.services.event_service import EventService
+from app.services.lifecycle_service import LifecycleService
+from app.services.presence_tracker import StatusChange, presence_tracker
+from app.services.telemetry_service import TelemetryRecord, TelemetryService
+from app.services.uptime_engine import DEVICE_OFFLINE, DEVICE_ONLINE, UptimeEngine, record_status_events
+
+
+@pytest.fixture
+def device(db: Session, test_site):
+    device = Device(site_id=test_site.id, name="Meter")
+    db.add(device)
+    db.commit()
+    return device
+
+
+@pytest.fixture
+def empty_presence(monkeypatch):
+    """The shared presence tracker starts without devices seen by other tests."""
+    monkeypatch.setattr(presence_tracker, "_devices", {})
+    monkeypatch.setattr(presence_tracker, "_gateways", {})
+    monkeypatch.setattr(presence_tracker, "_changes", [])
+    return presence_tracker
+
+
+def day(d: int, hour: int = 0) -> datetime:
+    return datetime(2024, 1, d, hour)
+
+
+class TestUptimeEngine:
+    """Test interval computation from status events."""
+
+    def test_intervals_split_by_day(self, db: Session, device):
+        """Online 18:00 on the 1st to 06:00 on the 2nd, then offline for 6 hours."""
+        record_status_events(db, {device.id: day(1, 18)}, online=True)
+        record_status_events(db, {device.id: day(2, 6)}, online=False)
+        record_status_events(db, {device.id: day(2, 12)}, online=True)
+        db.commit()
+
+        result = UptimeEngine(db).compute(day(1), day(3))
+
+        first, second = result[(device.id, date(2024, 1, 1))], result[(device.id, date(2024, 1, 2))]
+        assert first.online_seconds == 6 * 3600
+        assert first.offline_seconds == 0
+        assert second.online_seconds == 18 * 3600
+        assert second.offline_seconds == 6 * 3600
+        assert second.transitions == 2
+
+    def test_state_carried_into_window(self, db: Session, device):
+        """A device offline since before the window counts as offline throughout."""
+        record_status_events(db, {device.id: day(1, 6)}, online=False)
+        db.commit()
+
+        result = UptimeEngine(db).compute(day(5), day(6))
+
+        uptime = result[(device.id, date(2024, 1, 5))]
+        assert uptime.offline_seconds == 24 * 3600
+        assert uptime.availability_percent == 0
+        assert uptime.transitions == 0
+
+    def test_availability_sums_materialized_days(self, db: Session, device):
+        """Whole days come from device_uptime_daily; partial edges from events."""
+        record_status_events(db, {device.id: day(1)}, online=True)
+        record_status_events(db, {device.id: day(3)}, online=False)
+        db.commit()
+        engine = UptimeEngine(db)
+
+        assert engine.materialize(date(2024, 1, 1), date(2024, 1, 5)) == 4
+        db.commit()
+        assert db.query(DeviceUptimeDaily).count() == 4
+
+        uptime = engine.availability(day(1, 12), day(5))[device.id]
+
+        assert uptime.online_seconds == 36 * 3600
+        assert uptime.offline_seconds == 48 * 3600
+        assert uptime.availability_percent == pytest.approx(42.857, abs=0.001)
+
+    def test_unmaterialized_days_computed_from_events(self, db: Session, device):
+        """Days the daily job never wrote fall back to events."""
+        record_status_events(db, {device.id: day(1)}, online=True)
+        record_status_events(db, {device.id: day(3)}, online=False)
+        db.commit()
+        engine = UptimeEngine(db)
+        # Only the 2nd was materialized
+        engine.materialize(date(2024, 1, 2), date(2024, 1, 3))
+        db.commit()
+
+        uptime = engine.availability(day(1), day(5))[device.id]
+
+        assert uptime.online_seconds == 48 * 3600
+        assert uptime.offline_seconds == 48 * 3600
+
+    def test_backfill_catches_up_from_first_event(self, db: Session, device):
+        """The first run materializes every day since the first status event."""
+        record_status_events(db, {device.id: day(1)}, online=True)
+        db.commit()
+        engine = UptimeEngine(db)
+
+        assert engine.backfill(date(2024, 3, 1)) == 60
+        db.commit()
+        # Later runs cover the new days (Mar 1-2) plus the recent ones (Feb 29)
+        assert engine.backfill(date(2024, 3, 3), recent_days=3) == 3
+
+
+class TestStatusEvents:
+    """Test that presence transitions are recorded."""
+
+    def test_offline_event_at_last_telemetry(self, db: Session, test_site):
+        """Devices marked offline get an event dated at their last telemetry."""
+        last = datetime.utcnow() - timedelta(hours=1)
+        device = Device(site_id=test_site.id, name="Stale", is_online=1, last_telemetry_at=last)
+        db.add(device)
+        db.commit()
+
+        check_device_offline_status(db)
+
+        event = db.query(DeviceEvent).filter(DeviceEvent.device_id == device.id).one()
+        assert event.event_type == DEVICE_OFFLINE
+        assert event.triggered_at == last
+        assert EventService(db).get_active_events(device_id=device.id) == []
+
+    @pytest.mark.parametrize("path", ["telemetry", "event"])
+    def test_device_back_over_http_records_online_event(self, db: Session, device, path):
+        """Every offline to online flip records a device_online event."""
+        if path == "telemetry":
+            TelemetryService(db).store_telemetry(device.id, {"power": 5.0})
+        else:
+            DataIngestionService(db).ingest_event(device.id, "status_change", "info", "Rebooted")
+        db.commit()
+
+        db.refresh(device)
+        assert device.is_online == 1
+        event = db.query(DeviceEvent).filter(DeviceEvent.event_type == DEVICE_ONLINE).one()
+        assert event.device_id == device.id
+
+    def test_batch_store_brings_offline_device_back(self, db: Session, test_site, empty_presence):
+        """A batch store after an offline check records the online event and queues a broadcast."""
+        last = datetime.utcnow() - timedelta(hours=1)
+        device = Device(site_id=test_site.id, name="Stale", is_online=1, last_telemetry_at=last)
+        db.add(device)
+        db.commit()
+        check_device_offline_status(db)
+
+        now = datetime.utcnow()
+        TelemetryService(db).store_batch([
+            TelemetryRecord(device_id=device.id, datapoint_id=None, datapoint_name="power", timestamp=now, value=1.0)
+        ])
+        db.commit()
+
+        db.refresh(device)
+        assert device.is_online == 1
+        events = db.query(DeviceEvent).filter(DeviceEvent.device_id == device.id).order_by(DeviceEvent.id).all()
+        assert [e.event_type for e in events] == [DEVICE_OFFLINE, DEVICE_ONLINE]
+        assert events[1].triggered_at == now
+        assert StatusChange("device", device.id, True) in empty_presence.flush(db)
+
+    @pytest.mark.parametrize("action", ["decommission", "replace"])
+    def test_taken_out_of_service_records_offline_event(self, db: Session, test_site, device, action):
+        """Decommissioned and replaced devices stop counting as online."""
+        service = LifecycleService(db)
+        service.provision_device(device.id)
+        service.commission_device(device.id, test_site.id)
+        if action == "decommission":
+            service.decommission_device(device.id, "Removed")
+        else:
+            spare = Device(site_id=test_site.id, name="Spare")
+            db.add(spare)
+            db.flush()
+            service.replace_device(device.id, spare.id, "Failed")
+        db.commit()
+
+        db.refresh(device)
+        assert device.is_online == 0
+        events = db.query(DeviceEvent).filter(DeviceEvent.device_id == device.id).order_by(DeviceEvent.id).all()
+        assert [e.event_type for e in events] == [DEVICE_ONLINE, DEVICE_OFFLINE]
@@ -0,0 +1,196 @@
+"""Tests for virtual meter evaluation."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import MeterReading, VirtualMeter, VirtualMeterComponent, VirtualMeterType
+from app.services.virtual_meter_engine import (
+    VirtualMeterEngine,
+    VirtualMeterError,
+    invalidate_virtual_meter_cache,
+)
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def clear_series_cache():
+    """Each test starts with an empty series cache."""
+    invalidate_virtual_meter_cache()
+    yield
+    invalidate_virtual_meter_cache()
+
+
+@pytest.fixture
+def site_meters(db: Session, test_site, meter_factory):
+    """Main meter and two sub-meters with four hourly readings each."""
+    main = meter_factory(site_id=test_site.id, name="Main Meter", meter_id="MAIN-01")
+    sub_a = meter_factory(site_id=test_site.id, name="Sub A", meter_id="SUB-A")
+    sub_b = meter_factory(site_id=test_site.id, name="Sub B", meter_id="SUB-B")
+    for hour in range(4):
+        ts = START + timedelta(hours=hour, minutes=15)
+        db.add(MeterReading(meter_id=main.id, timestamp=ts, energy_kwh=100.0))
+        db.add(MeterReading(meter_id=sub_a.id, timestamp=ts, energy_kwh=30.0 + hour))
+        db.add(MeterReading(meter_id=sub_b.id, timestamp=ts, energy_kwh=50.0))
+    db.commit()
+    return main, sub_a, sub_b
+
+
+def _virtual_meter(db, site_id, name, meter_type, expression=None, components=()):
+    vm = VirtualMeter(site_id=site_id, name=name, meter_type=meter_type, expression=expression)
+    db.add(vm)
+    db.commit()
+    for meter_id, kwargs in components:
+        db.add(VirtualMeterComponent(virtual_meter_id=vm.id, meter_id=meter_id, **kwargs))
+    db.commit()
+    return vm
+
+
+class TestVirtualMeterEngine:
+    """Test dependency-ordered virtual meter evaluation."""
+
+    def test_expressions_reference_meters_and_virtual_meters(self, db: Session, test_site, site_meters):
+        """Virtual meters can build on each other through expressions."""
+        main, sub_a, sub_b = site_meters
+        submetered = _virtual_meter(
+            db, test_site.id, "Submetered", VirtualMeterType.AGGREGATED,
+            components=[(sub_a.id, {}), (sub_b.id, {})],
+        )
+        unmetered = _virtual_meter(
+            db, test_site.id, "Unmetered", VirtualMeterType.CALCULATED,
+            expression="MAIN_01 - Submetered",
+        )
+
+        results = VirtualMeterEngine(db).evaluate_site(test_site.id, START, START + timedelta(hours=4))
+
+        assert results[submetered.id].values.tolist() == [80.0, 81.0, 82.0, 83.0]
+        assert results[unmetered.id].values.tolist() == [20.0, 19.0, 18.0, 17.0]
+
+    def test_allocated_and_differential(self, db: Session, test_site, site_meters):
+        """Allocation applies percentages; differential subtracts the rest from the first."""
+        main, sub_a, sub_b = site_meters
+        tenant = _virtual_meter(
+            db, test_site.id, "Tenant", VirtualMeterType.ALLOCATED,
+            components=[(main.id, {"allocation_percent": 25.0})],
+        )
+        losses = _virtual_meter(
+            db, test_site.id, "Losses", VirtualMeterType.DIFFERENTIAL,
+            components=[(main.id, {}), (sub_a.id, {}), (sub_b.id, {})],
+        )
+
+        results = VirtualMeterEngine(db).evaluate_site(test_site.id, START, START + timedelta(hours=2))
+
+        assert results[tenant.id].values.tolist() == [25.0, 25.0]
+        assert results[losses.id].values.tolist() == [20.0, 19.0]
+
+    def test_daily_interval_buckets_readings(self, db: Session, test_site, site_meters):
+        """Readings are summed into the requested interval."""
+        main, _, _ = site_meters
+        vm = _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="meter_%d" % main.id)
+
+        series = VirtualMeterEngine(db).evaluate(vm.id, START, START + timedelta(hours=4), "daily")
+
+        assert series.values.tolist() == [400.0]
+
+    def test_cycle_is_rejected(self, db: Session, test_site, site_meters):
+        """Circular references are reported instead of recursing."""
+        alpha = _virtual_meter(db, test_site.id, "Alpha", VirtualMeterType.CALCULATED, expression="Beta + 1")
+        _virtual_meter(db, test_site.id, "Beta", VirtualMeterType.CALCULATED, expression="Alpha + 1")
+
+        with pytest.raises(VirtualMeterError, match="Circular"):
+            VirtualMeterEngine(db).evaluate(alpha.id, START, START + timedelta(hours=1))
+
+    def test_unknown_reference_is_rejected(self, db: Session, test_site, site_meters):
+        """Expressions must reference known meters."""
+        ghost = _virtual_meter(db, test_site.id, "Ghost", VirtualMeterType.CALCULATED, expression="Nowhere * 2")
+
+        with pytest.raises(VirtualMeterError, match="unknown meter"):
+            VirtualMeterEngine(db).evaluate(ghost.id, START, START + timedelta(hours=1))
+
+    def test_failures_are_isolated_per_meter(self, db: Session, test_site, site_meters):
+        """A broken meter fails with its dependents; the rest of the site still evaluates."""
+        ghost = _virtual_meter(db, test_site.id, "Ghost", VirtualMeterType.CALCULATED, expression="Nowhere * 2")
+        haunted = _virtual_meter(db, test_site.id, "Haunted", VirtualMeterType.CALCULATED, expression="Ghost + 1")
+        alpha = _virtual_meter(db, test_site.id, "Alpha", VirtualMeterType.CALCULATED, expression="Beta + 1")
+        beta = _virtual_meter(db, test_site.id, "Beta", VirtualMeterType.CALCULATED, expression="Alpha + 1")
+        total = _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="MAIN_01 * 2")
+
+        results = VirtualMeterEngine(db).evaluate_site(test_site.id, START, START + timedelta(hours=2))
+
+        assert results[total.id].error is None
+        assert results[total.id].values.tolist() == [200.0, 200.0]
+        assert "unknown meter 'Nowhere'" in results[ghost.id].error
+        assert "depends on failed virtual meter 'Ghost'" in results[haunted.id].error
+        assert "Circular" in results[alpha.id].error and "Circular" in results[beta.id].error
+        assert results[haunted.id].to_dict()["points"][0]["value"] is None
+
+    def test_site_series_is_memoized(self, db: Session, test_site, site_meters):
+        """A second request for the same window reuses the cached series."""
+        main, _, _ = site_meters
+        _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="MAIN_01")
+        engine = VirtualMeterEngine(db)
+
+        first = engine.evaluate_site(test_site.id, START, START + timedelta(hours=4))
+        db.add(MeterReading(meter_id=main.id, timestamp=START, energy_kwh=1000.0))
+        db.commit()
+        second = engine.evaluate_site(test_site.id, START, START + timedelta(hours=4))
+
+        assert second is first
+        invalidate_virtual_meter_cache(test_site.id)
+        third = engine.evaluate_site(test_site.id, START, START + timedelta(hours=4))
+        assert third[next(iter(third))].values[0] == 1100.0
+
+    def test_meter_changes_drop_cached_series(self, db: Session, test_site, site_meters):
+        """Editing a component meter drops the site's series once committed."""
+        main, _, _ = site_meters
+        _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="MAIN_01")
+        engine = VirtualMeterEngine(db)
+        first = engine.evaluate_site(test_site.id, START, START + timedelta(hours=4))
+
+        main.name = "Main Incomer"
+        db.flush()
+        assert engine.evaluate_site(test_site.id, START, START + timedelta(hours=4)) is first
+        db.commit()
+        assert engine.evaluate_site(test_site.id, START, START + timedelta(hours=4)) is not first
+
+
+class TestVirtualMeterSeriesEndpoint:
+    """Test the series endpoint."""
+
+    def test_get_series(self, client: TestClient, auth_headers: dict, db: Session, test_site, site_meters):
+        """Series endpoint returns aligned points and a total."""
+        vm = _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="MAIN_01 * 2")
+
+        response = client.get(
+            f"/api/v1/virtual-meters/{vm.id}/series",
+            params={"start": START.isoformat(), "end": (START + timedelta(hours=4)).isoformat()},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 800.0
+        assert len(data["points"]) == 4
+
+    def test_get_series_not_found(self, client: TestClient, auth_headers: dict):
+        """Unknown virtual meters return 404."""
+        response = client.get("/api/v1/virtual-meters/9999/series", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_new_readings_refresh_series(self, client: TestClient, auth_headers: dict, db: Session,
+                                         test_site, site_meters):
+        """Readings written through the API are reflected without waiting for the cache TTL."""
+        main, _, _ = site_meters
+        vm = _virtual_meter(db, test_site.id, "Total", VirtualMeterType.CALCULATED, expression="MAIN_01")
+        params = {"start": START.isoformat(), "end": (START + timedelta(hours=4)).isoformat()}
+        assert client.get(f"/api/v1/virtual-meters/{vm.id}/series", params=params,
+                          headers=auth_headers).json()["total"] == 400.0
+
+        reading = {"meter_id": main.id, "timestamp": START.isoformat(), "energy_kwh": 50.0}
+        assert client.post("/api/v1/meters/readings", json=reading, headers=auth_headers).status_code == 200
+
+        response = client.get(f"/api/v1/virtual-meters/{vm.id}/series", params=params, headers=auth_headers)
+        assert response.json()["total"] == 450.0
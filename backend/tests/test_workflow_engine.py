@@ -0,0 +1,120 @@
+"""Tests for the workflow rule index and rate limiting."""
+
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.workflow_engine import (
+    WorkflowEngine,
+    WorkflowRule,
+    invalidate_rule_index,
+    rate_limiter,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_rule_state():
+    """Each test starts with an empty rule index and rate windows."""
+    invalidate_rule_index()
+    rate_limiter.reset()
+    yield
+    invalidate_rule_index()
+    rate_limiter.reset()
+
+
+@pytest.fixture
+def make_rule(db: Session):
+    def create_rule(**kwargs) -> WorkflowRule:
+        rule = WorkflowRule(
+            name=kwargs.pop("name", "High power"),
+            trigger_type=kwargs.pop("trigger_type", "telemetry_received"),
+            conditions=json.dumps(kwargs.pop("conditions", [{"field": "value", "operator": "gt", "value": 100}])),
+            actions=json.dumps([{"type": "log_event", "config": {"message": "high"}}]),
+            **kwargs,
+        )
+        db.add(rule)
+        db.commit()
+        return rule
+    return create_rule
+
+
+def count_statements(db: Session):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+class TestRuleIndex:
+    """Test the cached, compiled rule index."""
+
+    def test_non_matching_triggers_do_not_query(self, db: Session, make_rule):
+        """Once the index is built, non-matching events run no SQL."""
+        make_rule(trigger_config=json.dumps({"device_id": 1}))
+        make_rule(name="Other trigger", trigger_type="alarm_triggered")
+        engine = WorkflowEngine(db)
+        engine.evaluate_trigger("telemetry_received", {"device_id": 1, "value": 5})
+
+        statements, stop = count_statements(db)
+        try:
+            for value in range(50):
+                engine.evaluate_trigger("telemetry_received", {"device_id": 1, "value": value})
+            engine.evaluate_trigger("telemetry_received", {"device_id": 2, "value": 500})
+        finally:
+            stop()
+
+        assert statements == []
+
+    def test_matching_rule_executes_in_priority_order(self, db: Session, make_rule):
+        """Matching rules fire highest priority first."""
+        low = make_rule(name="Low", priority=1)
+        high = make_rule(name="High", priority=10)
+        make_rule(name="Nested", conditions=[{"field": "meta.kind", "operator": "eq", "value": "x"}])
+
+        results = WorkflowEngine(db).evaluate_trigger("telemetry_received", {"value": 150})
+
+        assert [r.rule_id for r in results] == [high.id, low.id]
+        assert all(r.success for r in results)
+
+    def test_rule_changes_refresh_index(self, db: Session, make_rule):
+        """Editing a rule's definition is visible on the next trigger; stats updates are not."""
+        rule = make_rule()
+        engine = WorkflowEngine(db)
+        cached = engine.get_rules("telemetry_received")
+        assert len(engine.evaluate_trigger("telemetry_received", {"value": 150})) == 1
+        db.commit()
+        assert engine.get_rules("telemetry_received") is cached
+
+        rule.conditions = json.dumps([{"field": "value", "operator": "gt", "value": 1000}])
+        db.commit()
+
+        assert engine.get_rules("telemetry_received") is not cached
+        assert engine.evaluate_trigger("telemetry_received", {"value": 150}) == []
+
+
+class TestRateLimit:
+    """Test the in-memory execution window."""
+
+    def test_rate_limit_stops_executions(self, db: Session, make_rule):
+        """A rule fires at most max_executions_per_hour times."""
+        make_rule(max_executions_per_hour=2)
+        engine = WorkflowEngine(db)
+
+        fired = [len(engine.evaluate_trigger("telemetry_received", {"value": 150})) for _ in range(4)]
+
+        assert fired == [1, 1, 0, 0]
+
+    def test_window_is_seeded_from_history(self, db: Session, make_rule):
+        """Executions recorded before the process started count towards the limit."""
+        make_rule(max_executions_per_hour=1)
+        WorkflowEngine(db).evaluate_trigger("telemetry_received", {"value": 150})
+        db.commit()
+        rate_limiter.reset()
+
+        assert WorkflowEngine(db).evaluate_trigger("telemetry_received", {"value": 150}) == []